@@ -5,16 +5,34 @@ PPT模板制作工具 - Streamlit Web应用
 """
 
 import streamlit as st
+import os
 import json
+import uuid
+import functools
+import threading
 from datetime import datetime
 
 from config_presets import (
     THEME_PRESETS, 
     AVAILABLE_FONTS, 
     LAYOUT_TYPES, 
+    TEXT_FIT_MODES,
+    SLIDE_RATIOS,
     DEFAULT_CONFIG
 )
+from artifact_store import DEFAULT_LINK_PORT, LocalArtifactStore, start_link_server, store_from_env
+from base_template import load_base_template, store_template_bytes
+from deck_merge import merge_presentations
+from governor import BudgetExceeded, BuildBudget
+from image_check import ImageRejected, inspect_image, validate_images
+from metrics import DEFAULT_METRICS_PORT, UI_RERUN_SECONDS, start_http_server
+from output_cache import cached_build, prewarm
+from palette import THEME_COLORS, explore_palettes
 from ppt_generator import build_presentation
+from plan_estimator import DEFAULT_LIMITS, check_limits, estimate_presentation
+from profiler import PROFILE_MODES, profile_build
+from scheduler import PRIORITY_INTERACTIVE, scheduled_build
+from speculative import SpeculativeBuilder
 
 
 # ==================== 页面配置 ====================
@@ -184,6 +202,72 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
+# ==================== 局部刷新与静态内容缓存 ====================
+def ui_fragment(scope: str):
+    """
+    将页面函数声明为可独立重新执行的片段，并记录每次执行的耗时
+
+    片段内的控件变化只重新执行该片段，不再重新执行整个页面。
+
+    参数:
+        scope: 片段名称（用作指标标签）
+    返回:
+        装饰器
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            with UI_RERUN_SECONDS.time(scope=scope):
+                return func(*args, **kwargs)
+        return st.fragment(timed)
+    return decorator
+
+
+@functools.lru_cache(maxsize=None)
+def layout_card_html(index: int, name: str, description: str) -> str:
+    """版式卡片的HTML（只与版式有关，生成一次后复用）"""
+    return f"""
+            <div class="layout-card-container">
+                <div class="layout-title">
+                    <span style="background:#eff6ff; padding:4px 8px; border-radius:6px; font-size:0.8rem; color:#3b82f6;">#{index}</span>
+                    {name}
+                </div>
+                <div class="layout-desc">{description}</div>
+            </div>
+            """
+
+
+@functools.lru_cache(maxsize=256)
+def color_card_html(label: str, color: str, background: bool = False) -> str:
+    """色彩卡片的HTML"""
+    if background:
+        bg_text = "#1a202c" if color.lower() in ['#ffffff', '#fff', '#f8fafc'] else "#ffffff"
+        return f"""<div class="color-card" style="background:{color};color:{bg_text};border:1px solid #e2e8f0;">
+            <span class="color-name">{label}</span><span class="color-hex" style="background:rgba(0,0,0,0.05)">{color}</span></div>"""
+    return f"""<div class="color-card" style="background:{color};">
+            <span class="color-name">{label}</span><span class="color-hex">{color}</span></div>"""
+
+
+@functools.lru_cache(maxsize=256)
+def slide_preview_html(primary: str, secondary: str, accent: str, background: str,
+                       title: str, year: int) -> str:
+    """幻灯片预览卡片的HTML"""
+    return f'''
+    <div style="border:1px solid #e2e8f0; border-top:none; border-radius:0 0 8px 8px; padding:1.5rem; background:{background};">
+        <h2 style="color:{primary}; margin:0 0 0.5rem 0;">{title}</h2>
+        <p style="color:{secondary}; opacity:0.8; margin:0;">在此输入副标题或简短描述内容</p>
+        <div style="width:60px; height:4px; background:{accent}; margin:1rem 0;"></div>
+        <p style="color:{secondary}; opacity:0.6; font-size:0.85rem;">汇报人姓名 | {year}年度汇报</p>
+    </div>
+    '''
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def config_json(config: dict) -> str:
+    """配置的JSON文本（配置不变时直接复用）"""
+    return json.dumps(config, ensure_ascii=False, indent=2)
+
+
 # ==================== 初始化会话状态 ====================
 def init_session_state():
     """初始化Streamlit会话状态"""
@@ -193,15 +277,41 @@ def init_session_state():
         st.session_state.generated = False
     if 'ppt_buffer' not in st.session_state:
         st.session_state.ppt_buffer = None
+    if 'profile_zip' not in st.session_state:
+        st.session_state.profile_zip = None
+    if 'artifact_key' not in st.session_state:
+        st.session_state.artifact_key = None
+    if 'generated_slides' not in st.session_state:
+        st.session_state.generated_slides = 0
     if 'logo_bytes' not in st.session_state:
         st.session_state.logo_bytes = None
     if 'uploaded_images' not in st.session_state:
         st.session_state.uploaded_images = []
+    if 'tenant' not in st.session_state:
+        # 生成调度按会话公平分配
+        st.session_state.tenant = uuid.uuid4().hex
+    if 'speculative' not in st.session_state:
+        st.session_state.speculative = SpeculativeBuilder(tenant=st.session_state.tenant)
 
 
 init_session_state()
 
 
+def submit_speculative():
+    """
+    按当前配置登记推测生成：配置稳定后在后台提前生成，点击时直接命中缓存
+
+    配色、版式在各自片段中修改后只重新执行该片段，每个修改配置的片段末尾都需调用；
+    配置未变时重复调用不做任何事。需要溢出提示时前台生成不走缓存，不做推测。
+    """
+    config = st.session_state.config
+    if config.get('text_fit') == 'warn':
+        return
+    st.session_state.speculative.submit(config, config.get('layouts', DEFAULT_CONFIG['layouts']),
+                                        st.session_state.logo_bytes, st.session_state.uploaded_images,
+                                        budget=build_budget())
+
+
 # ==================== 侧边栏 - 全局设置 ====================
 def render_sidebar():
     """渲染侧边栏的全局设置"""
@@ -246,17 +356,7 @@ def render_sidebar():
             if selected_theme in THEME_PRESETS:
                 st.caption(f"💡 {THEME_PRESETS[selected_theme]['description']}")
 
-        # 3. 自定义配色
-        with st.expander("🖌️ 自定义配色", expanded=False):
-            c1, c2 = st.columns(2)
-            with c1:
-                st.session_state.config['primary'] = st.color_picker("主色", value=st.session_state.config.get('primary', '#1a365d'))
-                st.session_state.config['accent'] = st.color_picker("强调色", value=st.session_state.config.get('accent', '#3182ce'))
-            with c2:
-                st.session_state.config['secondary'] = st.color_picker("辅色", value=st.session_state.config.get('secondary', '#4a5568'))
-                st.session_state.config['background'] = st.color_picker("背景色", value=st.session_state.config.get('background', '#ffffff'))
-
-        # 4. 字体设置
+        # 3. 字体设置
         with st.expander("Aa 字体设置", expanded=False):
             st.session_state.config['title_font'] = st.selectbox(
                 "标题字体",
@@ -268,14 +368,32 @@ def render_sidebar():
                 options=AVAILABLE_FONTS['body'],
                 index=AVAILABLE_FONTS['body'].index(st.session_state.config.get('body_font', 'Microsoft YaHei')) if st.session_state.config.get('body_font') in AVAILABLE_FONTS['body'] else 0
             )
+            fit_modes = list(TEXT_FIT_MODES.keys())
+            st.session_state.config['text_fit'] = st.selectbox(
+                "文字溢出处理",
+                options=fit_modes,
+                format_func=lambda mode: TEXT_FIT_MODES[mode],
+                index=fit_modes.index(st.session_state.config.get('text_fit', 'none')) if st.session_state.config.get('text_fit') in TEXT_FIT_MODES else 0,
+                help="按字体文件测量文字宽度，检测超出文本框的文字或自动缩小字号"
+            )
 
-        # 5. 资源库 (Logo & 图片)
+        # 4. 资源库 (Logo & 图片)
         with st.expander("📂 资源库", expanded=False):
+            render_base_template_upload()
+            
+            st.divider()
+            
             st.markdown("**Logo 上传**")
             uploaded_logo = st.file_uploader("上传Logo (PNG/JPG)", type=['png', 'jpg', 'jpeg'], key="logo_uploader")
             if uploaded_logo:
-                st.session_state.logo_bytes = uploaded_logo.read()
-                st.image(uploaded_logo, width=80, caption="Logo预览")
+                logo_bytes = uploaded_logo.read()
+                try:
+                    inspect_image(logo_bytes, uploaded_logo.name)
+                except ImageRejected as e:
+                    st.error(str(e))
+                else:
+                    st.session_state.logo_bytes = logo_bytes
+                    st.image(uploaded_logo, width=80, caption="Logo预览")
             
             if st.session_state.logo_bytes:
                 if st.button("🗑️ 清除Logo", use_container_width=True):
@@ -287,15 +405,20 @@ def render_sidebar():
             st.markdown("**图文页图片**")
             uploaded_images = st.file_uploader("上传图片 (多选)", type=['png', 'jpg', 'jpeg'], accept_multiple_files=True, key="img_uploader")
             if uploaded_images:
-                st.session_state.uploaded_images = [{'name': img.name, 'bytes': img.read()} for img in uploaded_images]
-                st.success(f"已加载 {len(uploaded_images)} 张图片")
+                # 只读文件头校验，过大或损坏的图片直接拒绝；校验结果随图片保存供生成时使用
+                accepted, rejected = validate_images([(img.name, img.read()) for img in uploaded_images])
+                st.session_state.uploaded_images = accepted
+                if accepted:
+                    st.success(f"已加载 {len(accepted)} 张图片")
+                for e in rejected:
+                    st.warning(f"已跳过 {e}")
             
             if st.session_state.uploaded_images:
                 if st.button("🗑️ 清除图片库", use_container_width=True):
                     st.session_state.uploaded_images = []
                     st.rerun()
 
-        # 6. 页脚与水印
+        # 5. 页脚与水印
         with st.expander("📑 页脚与水印", expanded=False):
             st.markdown("**水印**")
             watermark_on = st.toggle("启用水印", value=st.session_state.config.get('watermark_enabled', False))
@@ -313,40 +436,105 @@ def render_sidebar():
         
         # 导出配置
         with st.expander("💾 配置管理", expanded=False):
-            config_json = json.dumps(st.session_state.config, ensure_ascii=False, indent=2)
-            st.download_button("📥 下载配置", data=config_json, file_name="config.json", mime="application/json", use_container_width=True)
-            uploaded_config = st.file_uploader("📤 导入配置", type=['json'])
-            if uploaded_config:
-                try:
-                    st.session_state.config.update(json.load(uploaded_config))
-                    st.success("导入成功")
-                    st.rerun()
-                except:
-                    st.error("导入失败")
+            render_config_manager()
+
+
+def render_base_template_upload():
+    """渲染企业底版上传：以企业母版与版式为基础生成"""
+    config = st.session_state.config
+    st.markdown("**企业底版**")
+    uploaded_base = st.file_uploader("上传底版 (PPTX/POTX)", type=['pptx', 'potx'], key="base_uploader")
+    # 上传控件在每次重新执行时都会返回同一文件，只在文件变化时保存并建立索引
+    if uploaded_base and st.session_state.get('base_upload_id') != (uploaded_base.name, uploaded_base.size):
+        try:
+            path = store_template_bytes(uploaded_base.getvalue())
+            index = load_base_template(path).index
+        except Exception as e:
+            st.error(f"底版无法读取: {e}")
+        else:
+            st.session_state.base_upload_id = (uploaded_base.name, uploaded_base.size)
+            config['base_template'] = path
+            config['ratio'] = index.closest_ratio(SLIDE_RATIOS)
+            st.rerun()
+    
+    path = config.get('base_template')
+    if path and not os.path.exists(path):
+        # 导入的配置中的底版不在本机
+        st.warning("配置中的企业底版文件不存在，已改用默认底版")
+        config.pop('base_template')
+        path = None
+    if path:
+        index = load_base_template(path).index
+        st.caption(f"✅ {len(index.layouts)} 种版式，空白版式：{index.layouts[index.blank_layout].name}")
+        if st.button("🗑️ 清除底版", use_container_width=True):
+            config.pop('base_template')
+            st.rerun()
+
+
+@ui_fragment('config')
+def render_config_manager():
+    """渲染配置导入导出（独立片段）"""
+    # 配色、版式在各自片段中修改后侧边栏不会重新执行，下载前先按当前配置生成文件
+    if st.button("📦 导出当前配置", use_container_width=True):
+        st.download_button("📥 下载配置", data=config_json(st.session_state.config), file_name="config.json", mime="application/json", use_container_width=True)
+    uploaded_config = st.file_uploader("📤 导入配置", type=['json'])
+    if uploaded_config:
+        try:
+            st.session_state.config.update(json.load(uploaded_config))
+            st.success("导入成功")
+            st.rerun()
+        except:
+            st.error("导入失败")
 
 
 # ==================== 主区域 - Tab1: 主题预览 ====================
+@ui_fragment('theme_preview')
 def render_theme_preview():
-    """渲染主题预览页面"""
+    """渲染主题预览页面（独立片段：调整配色只重新执行本页）"""
     st.markdown("### 🎨 主题预览")
     
     config = st.session_state.config
     
+    # 自定义配色
+    with st.expander("🖌️ 自定义配色", expanded=True):
+        c1, c2, c3, c4 = st.columns(4)
+        with c1:
+            config['primary'] = st.color_picker("主色", value=config.get('primary', '#1a365d'))
+        with c2:
+            config['secondary'] = st.color_picker("辅色", value=config.get('secondary', '#4a5568'))
+        with c3:
+            config['accent'] = st.color_picker("强调色", value=config.get('accent', '#3182ce'))
+        with c4:
+            config['background'] = st.color_picker("背景色", value=config.get('background', '#ffffff'))
+    
+    # 配色探索
+    with st.expander("🎲 配色探索", expanded=False):
+        base_name = st.selectbox("起点主题", options=list(THEME_PRESETS.keys()) + ["当前配色"],
+                                 index=list(THEME_PRESETS.keys()).index(config.get('theme', '商务简约')))
+        if st.button("生成配色方案", use_container_width=True):
+            base = config if base_name == "当前配色" else base_name
+            st.session_state.palette_candidates = explore_palettes(base)
+        for i, candidate in enumerate(st.session_state.get('palette_candidates') or []):
+            c1, c2 = st.columns([4, 1])
+            with c1:
+                st.markdown(candidate.swatch_html(), unsafe_allow_html=True)
+                status = "✅ 全部达到 WCAG AA" if candidate.passes else f"⚠️ {len(candidate.failures)} 组文字对比度不足"
+                st.caption(f"{candidate.label} · 得分 {candidate.score:.3f} · {status}")
+            with c2:
+                if st.button("应用", key=f"apply_palette_{i}", use_container_width=True):
+                    config.update({name: candidate.colors[name] for name in THEME_COLORS})
+                    st.rerun(scope="fragment")
+    
     # 色彩卡片行
     c1, c2, c3, c4 = st.columns(4)
     with c1:
-        st.markdown(f"""<div class="color-card" style="background:{config['primary']};">
-            <span class="color-name">主色 Primary</span><span class="color-hex">{config['primary']}</span></div>""", unsafe_allow_html=True)
+        st.markdown(color_card_html("主色 Primary", config['primary']), unsafe_allow_html=True)
     with c2:
-        st.markdown(f"""<div class="color-card" style="background:{config['secondary']};">
-            <span class="color-name">辅色 Secondary</span><span class="color-hex">{config['secondary']}</span></div>""", unsafe_allow_html=True)
+        st.markdown(color_card_html("辅色 Secondary", config['secondary']), unsafe_allow_html=True)
     with c3:
-        st.markdown(f"""<div class="color-card" style="background:{config['accent']};">
-            <span class="color-name">强调色 Accent</span><span class="color-hex">{config['accent']}</span></div>""", unsafe_allow_html=True)
+        st.markdown(color_card_html("强调色 Accent", config['accent']), unsafe_allow_html=True)
     with c4:
-        bg_text = "#1a202c" if config['background'].lower() in ['#ffffff', '#fff', '#f8fafc'] else "#ffffff"
-        st.markdown(f"""<div class="color-card" style="background:{config['background']};color:{bg_text};border:1px solid #e2e8f0;">
-            <span class="color-name">背景 Background</span><span class="color-hex" style="background:rgba(0,0,0,0.05)">{config['background']}</span></div>""", unsafe_allow_html=True)
+        st.markdown(color_card_html("背景 Background", config['background'], background=True), unsafe_allow_html=True)
     
     st.markdown("<br>", unsafe_allow_html=True)
 
@@ -358,23 +546,21 @@ def render_theme_preview():
     st.markdown(f'<div style="background:{config["primary"]}; height:8px; border-radius:8px 8px 0 0;"></div>', unsafe_allow_html=True)
     
     # 预览卡片
-    st.markdown(f'''
-    <div style="border:1px solid #e2e8f0; border-top:none; border-radius:0 0 8px 8px; padding:1.5rem; background:{config["background"]};">
-        <h2 style="color:{config["primary"]}; margin:0 0 0.5rem 0;">{config.get("template_name", "演示文稿标题")}</h2>
-        <p style="color:{config["secondary"]}; opacity:0.8; margin:0;">在此输入副标题或简短描述内容</p>
-        <div style="width:60px; height:4px; background:{config["accent"]}; margin:1rem 0;"></div>
-        <p style="color:{config["secondary"]}; opacity:0.6; font-size:0.85rem;">汇报人姓名 | {datetime.now().year}年度汇报</p>
-    </div>
-    ''', unsafe_allow_html=True)
+    st.markdown(slide_preview_html(config["primary"], config["secondary"], config["accent"], config["background"],
+                                   config.get("template_name", "演示文稿标题"), datetime.now().year),
+                unsafe_allow_html=True)
     
     # Logo 显示
     if st.session_state.logo_bytes:
         st.image(st.session_state.logo_bytes, width=80, caption="已上传Logo")
 
+    submit_speculative()
+
 
 # ==================== 主区域 - Tab2: 版式设置 ====================
+@ui_fragment('layout_settings')
 def render_layout_settings():
-    """渲染版式设置页面"""
+    """渲染版式设置页面（独立片段：修改版式只重新执行本页）"""
     st.markdown("### 📐 版式配置")
     
     if 'layouts' not in st.session_state.config:
@@ -390,32 +576,34 @@ def render_layout_settings():
         col = cols[i % 3]
         with col:
             # 卡片容器开始
-            st.markdown(f"""
-            <div class="layout-card-container">
-                <div class="layout-title">
-                    <span style="background:#eff6ff; padding:4px 8px; border-radius:6px; font-size:0.8rem; color:#3b82f6;">#{i+1}</span>
-                    {layout_info['name']}
-                </div>
-                <div class="layout-desc">{layout_info['description']}</div>
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(layout_card_html(i + 1, layout_info['name'], layout_info['description']),
+                        unsafe_allow_html=True)
             
             # 控件区域 (放在markdown下方，利用Streamlit布局自动对齐)
             c1, c2 = st.columns([1, 1.5])
             with c1:
-                enabled = st.toggle("启用", value=layouts.get(layout_key, {}).get('enabled', True), key=f"en_{layout_key}")
+                enabled = st.toggle("启用", value=layouts.get(layout_key, {}).get('enabled', layout_info.get('default_enabled', True)), key=f"en_{layout_key}")
             with c2:
                 count = st.number_input("页数", min_value=0, max_value=20, value=layouts.get(layout_key, {}).get('count', 1), key=f"cnt_{layout_key}", disabled=not enabled, label_visibility="collapsed")
             
             # 更新状态
-            layouts[layout_key] = {'enabled': enabled, 'count': count}
+            layouts[layout_key] = dict(layouts.get(layout_key, {}), enabled=enabled, count=count)
             st.markdown("<div style='margin-bottom:12px'></div>", unsafe_allow_html=True) # Spacer
+    
+    # 版式变化后在本页即时给出成本估算
+    estimate = estimate_presentation(st.session_state.config, layouts,
+                                     st.session_state.logo_bytes, st.session_state.uploaded_images)
+    st.caption(f"预计 {estimate.slides} 页，耗时约 {estimate.seconds:.1f} 秒，"
+               f"文件约 {estimate.output_bytes / 1024:.0f} KB")
+
+    submit_speculative()
 
 
 
 # ==================== 主区域 - Tab3: 预览与导出 ====================
+@ui_fragment('export')
 def render_export():
-    """渲染预览与导出页面"""
+    """渲染预览与导出页面（独立片段：生成与下载只重新执行本页）"""
     
     config = st.session_state.config
     layouts = config.get('layouts', DEFAULT_CONFIG['layouts'])
@@ -427,29 +615,72 @@ def render_export():
     </div>
     """, unsafe_allow_html=True)
 
-    # 统计幻灯片总数
-    total_slides = sum(
-        layouts.get(k, {}).get('count', 0) 
-        for k in LAYOUT_TYPES.keys() 
-        if layouts.get(k, {}).get('enabled', False)
-    )
+    logo_bytes = st.session_state.get('logo_bytes', None)
+    uploaded_images = st.session_state.get('uploaded_images', [])
+
+    # 侧边栏的修改会重新执行整个页面，由本片段登记推测生成
+    speculative = st.session_state.speculative
+    submit_speculative()
     
     # 居中布局生成按钮
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
+        with st.expander("🔬 性能分析"):
+            profile_enabled = st.checkbox("分析本次生成", value=False,
+                                          help="生成速度异常时使用，分析期间生成会变慢")
+            profile_mode = st.selectbox(
+                "分析方式",
+                options=list(PROFILE_MODES.keys()),
+                format_func=lambda x: PROFILE_MODES[x]
+            )
+            profile_memory = st.checkbox("跟踪内存分配", value=True)
         if st.button("✨ 立即生成 PPT 模板", use_container_width=True, type="primary"):
+            # 生成前先编译幻灯片计划并估算成本
+            estimate = estimate_presentation(config, layouts, logo_bytes, uploaded_images)
+            total_slides = estimate.slides
+            problems = check_limits(estimate)
             if total_slides == 0:
                 st.error("请至少启用一种版式并设置页数大于0！")
                 return
+            if problems:
+                st.error("任务过大，请减少页数或数据量：" + "；".join(problems))
+                return
             
             with st.spinner("🎨 正在绘制幻灯片..."):
                 try:
-                    logo_bytes = st.session_state.get('logo_bytes', None)
-                    uploaded_images = st.session_state.get('uploaded_images', [])
-                    ppt_buffer = build_presentation(config, layouts, logo_bytes, uploaded_images)
+                    # 溢出提示收集到本次生成自己的列表中，不经全局的 warnings 机制
+                    overflows = []
+                    if profile_enabled:
+                        report = profile_build(config, layouts, logo_bytes, uploaded_images,
+                                               mode=profile_mode, trace_memory=profile_memory,
+                                               overflows=overflows)
+                        ppt_buffer = report.ppt_buffer
+                        st.session_state.profile_zip = report.zip_bytes()
+                    else:
+                        # 溢出提示在生成过程中产生，需要提示时不走缓存
+                        if config.get('text_fit') == 'warn':
+                            build = functools.partial(build_presentation, overflows=overflows)
+                        else:
+                            build = cached_build
+                            # 推测生成进行中时提升为交互式优先级并等待其完成，而不是再生成一次；
+                            # 等待超时则取消推测任务，在前台生成
+                            speculative.claim(config, layouts, logo_bytes, uploaded_images)
+                        ppt_buffer = scheduled_build(config, layouts, logo_bytes, uploaded_images,
+                                                     budget=build_budget(), priority=PRIORITY_INTERACTIVE,
+                                                     tenant=st.session_state.tenant, build=build)
+                        st.session_state.profile_zip = None
+                    for message in overflows[:5]:
+                        st.warning(message)
+                    if len(overflows) > 5:
+                        st.caption(f"另有 {len(overflows) - 5} 处文字溢出")
                     st.session_state.ppt_buffer = ppt_buffer
+                    st.session_state.artifact_key = upload_artifact(ppt_buffer)
+                    st.session_state.generated_slides = total_slides
                     st.session_state.generated = True
                     st.balloons() # 成功动画
+                except BudgetExceeded as e:
+                    st.error(f"生成已中止：{e}")
+                    return
                 except Exception as e:
                     st.error(f"生成失败: {e}")
                     return
@@ -462,7 +693,7 @@ def render_export():
         st.markdown(f"""
         <div class="stCard" style="background:#f0fdf4; border-color:#bbf7d0; text-align:center;">
             <h3 style="color:#166534; margin:0;">🎉 生成成功！</h3>
-            <p style="color:#15803d; margin:8px 0;">共计 {total_slides} 页幻灯片，文件大小约 {len(st.session_state.ppt_buffer.getvalue())/1024:.1f} KB</p>
+            <p style="color:#15803d; margin:8px 0;">共计 {st.session_state.generated_slides} 页幻灯片，文件大小约 {len(st.session_state.ppt_buffer.getvalue())/1024:.1f} KB</p>
         </div>
         """, unsafe_allow_html=True)
         
@@ -471,18 +702,155 @@ def render_export():
             template_name = config.get('template_name', '我的PPT模板')
             file_name = f"{template_name}_模板.pptx"
             
-            st.download_button(
-                label="📥 点击下载文件",
-                data=st.session_state.ppt_buffer,
-                file_name=file_name,
-                mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-                use_container_width=True
-            )
+            if st.session_state.artifact_key:
+                # 文件由产物存储直接提供，不经页面传输
+                st.link_button(
+                    label="📥 点击下载文件",
+                    url=artifact_store().url(st.session_state.artifact_key, filename=file_name),
+                    use_container_width=True
+                )
+            else:
+                st.download_button(
+                    label="📥 点击下载文件",
+                    data=st.session_state.ppt_buffer,
+                    file_name=file_name,
+                    mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
+                    use_container_width=True
+                )
+            
+            if st.session_state.profile_zip:
+                st.download_button(
+                    label="🔬 下载性能分析结果",
+                    data=st.session_state.profile_zip,
+                    file_name=f"{template_name}_性能分析.zip",
+                    mime="application/zip",
+                    use_container_width=True
+                )
+
+            with st.expander("🧩 合并其他PPT"):
+                extra_decks = st.file_uploader("追加到生成结果之后 (PPTX，按顺序)", type=['pptx'],
+                                               accept_multiple_files=True, key="merge_uploader")
+                if extra_decks and st.button("合并", use_container_width=True):
+                    try:
+                        merged = merge_presentations(
+                            [st.session_state.ppt_buffer.getvalue()] + [deck.getvalue() for deck in extra_decks])
+                    except Exception as e:
+                        st.error(f"合并失败: {e}")
+                    else:
+                        st.download_button(
+                            label="📥 下载合并后的PPT",
+                            data=merged,
+                            file_name=f"{template_name}_合并.pptx",
+                            mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
+                            use_container_width=True
+                        )
+
+
+# ==================== 指标服务 ====================
+@st.cache_resource
+def start_metrics_server():
+    """
+    启动指标HTTP服务（每个服务进程只启动一次）
+
+    端口由环境变量 PPT_METRICS_PORT 指定，设为 0 表示不启动。
+
+    返回:
+        HTTP服务对象，未启动时为 None
+    """
+    port = int(os.environ.get('PPT_METRICS_PORT', DEFAULT_METRICS_PORT))
+    if not port:
+        return None
+    try:
+        return start_http_server(port)
+    except OSError:
+        # 端口被占用（如多个实例）时不影响页面使用
+        return None
+
+
+@st.cache_resource
+def build_budget() -> BuildBudget:
+    """
+    单次生成的资源预算（每个服务进程读取一次）
+
+    默认与生成前的估算上限一致，可由环境变量 PPT_BUDGET_SECONDS、PPT_BUDGET_MEMORY_MB、
+    PPT_BUDGET_SLIDES、PPT_BUDGET_OUTPUT_MB 覆盖，设为 0 表示不限制。
+
+    返回:
+        BuildBudget对象
+    """
+    return BuildBudget.from_env(DEFAULT_LIMITS)
+
+
+@st.cache_resource
+def artifact_store():
+    """
+    产物存储（每个服务进程打开一次）
+
+    由环境变量 PPT_ARTIFACT_STORE 配置（s3://存储桶 或 本地目录），未配置时生成结果经页面直接下载。
+    本地目录后端同时启动下载链接服务，端口由环境变量 PPT_ARTIFACT_PORT 指定。
+
+    返回:
+        ArtifactStore对象，未配置时为 None
+    """
+    store = store_from_env()
+    if isinstance(store, LocalArtifactStore):
+        try:
+            start_link_server(store, int(os.environ.get('PPT_ARTIFACT_PORT', DEFAULT_LINK_PORT)))
+        except OSError:
+            # 端口被占用（如多个实例共用目录与签名密钥）时由已启动的服务提供下载
+            pass
+    return store
+
+
+def upload_artifact(ppt_buffer) -> str:
+    """
+    把生成结果写入产物存储
+
+    参数:
+        ppt_buffer: 包含PPT文件的BytesIO对象
+    返回:
+        存储键，未配置或上传失败时为 None（退回页面直接下载）
+    """
+    store = artifact_store()
+    if store is None:
+        return None
+    try:
+        return store.put(ppt_buffer.getvalue())
+    except Exception as e:
+        st.caption(f"产物存储暂不可用，改为直接下载：{e}")
+        return None
+
+
+@st.cache_resource
+def start_prewarm():
+    """
+    在后台线程预热输出缓存（每个服务进程只执行一次）
+
+    预设主题 × 画布比例的默认PPT生成后，只选择主题与比例的下载无需等待生成。
+    环境变量 PPT_PREWARM 设为 0 表示不预热。
+
+    返回:
+        预热线程，未启动时为 None
+    """
+    if os.environ.get('PPT_PREWARM', '1') == '0':
+        return None
+    thread = threading.Thread(target=prewarm, name='cache-prewarm', daemon=True)
+    thread.start()
+    return thread
 
 
 # ==================== 主函数 ====================
 def main():
-    """主函数 - 应用入口"""
+    """主函数 - 应用入口（整页重新执行的耗时计入 scope=app）"""
+    with UI_RERUN_SECONDS.time(scope='app'):
+        render_page()
+
+
+def render_page():
+    """渲染整个页面"""
+    
+    start_metrics_server()
+    start_prewarm()
     
     # 渲染侧边栏
     render_sidebar()
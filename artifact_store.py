@@ -0,0 +1,832 @@
+# -*- coding: utf-8 -*-
+"""
+产物存储模块
+生成的PPT以内容摘要为键写入产物存储，页面只给出带签名与有效期的下载链接，文件本身不经 Streamlit 传输。
+两种后端：本地目录（由内置的链接服务校验签名后提供下载）与 S3 兼容的对象存储（预签名链接直连）。
+上传基于 asyncio：连接池复用 HTTP 长连接，大文件分段并发上传，内容已存在时跳过上传；
+不依赖 boto3，没有网络时可用 s3_local 的本地替身服务测试
+"""
+
+import os
+import hmac
+import time
+import asyncio
+import hashlib
+import argparse
+import threading
+import concurrent.futures
+from urllib.parse import quote, unquote, urlsplit, parse_qsl
+from xml.etree import ElementTree
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from metrics import ARTIFACT_UPLOADS, ARTIFACT_UPLOAD_SECONDS
+
+
+PPTX_MIME = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
+
+# 存储键：decks/<sha256>.pptx
+KEY_PREFIX = 'decks/'
+KEY_SUFFIX = '.pptx'
+
+# 下载链接默认有效期（秒）
+DEFAULT_LINK_SECONDS = 3600
+# 本地后端链接服务的默认端口
+DEFAULT_LINK_PORT = 9109
+
+# 超过该大小时分段上传；S3 要求除最后一段外每段不少于 5MB
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+PART_BYTES = 8 * 1024 * 1024
+MIN_PART_BYTES = 5 * 1024 * 1024
+# 每个存储同时在途的请求数（也是连接池的连接数上限）
+UPLOAD_CONCURRENCY = 8
+# 空闲超过该时间（秒）的连接不再复用，服务端可能已关闭
+IDLE_SECONDS = 20
+# 建立连接与每次读写响应的超时（秒），服务端无响应时不会一直挂起
+CONNECT_TIMEOUT_SECONDS = 10
+READ_TIMEOUT_SECONDS = 30
+# 同步调用（put / exists / get）的总超时（秒），超时后取消请求，页面可退回直接下载
+CALL_TIMEOUT_SECONDS = 120
+# 超过该大小的数据在线程中计算摘要，不阻塞事件循环
+HASH_IN_THREAD_BYTES = 256 * 1024
+# 本地链接服务流式写出的块大小
+STREAM_CHUNK_BYTES = 1024 * 1024
+
+STORE_ENV = 'PPT_ARTIFACT_STORE'
+LINK_URL_ENV = 'PPT_ARTIFACT_URL'
+SECRET_ENV = 'PPT_ARTIFACT_SECRET'
+S3_ENDPOINT_ENV = 'PPT_S3_ENDPOINT'
+
+UNSIGNED_PAYLOAD = 'UNSIGNED-PAYLOAD'
+EMPTY_SHA256 = hashlib.sha256(b'').hexdigest()
+# URI 编码时保留的字符（与 S3 签名规范一致）
+_UNRESERVED = '-_.~'
+
+
+class ArtifactStoreError(Exception):
+    """产物存储请求失败"""
+
+    def __init__(self, message: str, status: int = None, code: str = None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+def artifact_key(data) -> str:
+    """
+    产物的存储键（内容摘要，内容相同的PPT只存一份）
+
+    参数:
+        data: PPT文件字节数据（或支持缓冲区协议的对象）
+    返回:
+        存储键，如 decks/<sha256>.pptx
+    """
+    return f"{KEY_PREFIX}{hashlib.sha256(data).hexdigest()}{KEY_SUFFIX}"
+
+
+def _check_key(key: str) -> str:
+    """存储键只允许 artifact_key 的格式，防止链接服务被用来读取其他文件"""
+    digest = key[len(KEY_PREFIX):-len(KEY_SUFFIX)]
+    if (not key.startswith(KEY_PREFIX) or not key.endswith(KEY_SUFFIX) or len(digest) != 64
+            or any(c not in '0123456789abcdef' for c in digest)):
+        raise ValueError(f"无效的存储键: {key}")
+    return key
+
+
+def content_disposition(filename: str) -> str:
+    """
+    下载文件名的 Content-Disposition 头（中文文件名按 RFC 5987 编码，旧浏览器退回 ASCII 名）
+
+    参数:
+        filename: 文件名
+    返回:
+        头部取值
+    """
+    fallback = ''.join(c if 32 <= ord(c) < 127 and c not in '"\\' else '_' for c in filename)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+
+def _uri_encode(value: str, safe: str = _UNRESERVED) -> str:
+    return quote(value, safe=safe)
+
+
+def _canonical_query(params: list) -> str:
+    """签名用的规范查询串：键值分别编码后按键排序"""
+    encoded = sorted((_uri_encode(k), _uri_encode(v)) for k, v in params)
+    return '&'.join(f"{k}={v}" for k, v in encoded)
+
+
+def sign_v4(secret_key: str, region: str, method: str, path: str, params: list, headers: dict,
+            payload_hash: str, amz_date: str) -> tuple:
+    """
+    计算 S3 的 AWS 签名 V4（请求头签名与预签名链接共用）
+
+    参数:
+        secret_key: 访问密钥
+        region: 区域
+        method: HTTP 方法
+        path: 未编码的请求路径（如 /bucket/decks/xxx.pptx）
+        params: 查询参数 [(键, 值)]（预签名时不含 X-Amz-Signature）
+        headers: 参与签名的请求头 {小写名: 值}
+        payload_hash: 请求体的 SHA256 十六进制摘要，或 UNSIGNED-PAYLOAD
+        amz_date: 签名时间，格式 YYYYMMDDTHHMMSSZ
+    返回:
+        (签名, 参与签名的请求头名列表, 凭证范围)
+    """
+    date = amz_date[:8]
+    scope = f"{date}/{region}/s3/aws4_request"
+    signed_headers = ';'.join(sorted(headers))
+    canonical = '\n'.join([
+        method,
+        _uri_encode(path, safe='/' + _UNRESERVED),
+        _canonical_query(params),
+        ''.join(f"{name}:{headers[name].strip()}\n" for name in sorted(headers)),
+        signed_headers,
+        payload_hash,
+    ])
+    string_to_sign = '\n'.join(['AWS4-HMAC-SHA256', amz_date, scope,
+                                hashlib.sha256(canonical.encode('utf-8')).hexdigest()])
+    key = ('AWS4' + secret_key).encode('utf-8')
+    for part in (date, region, 's3', 'aws4_request'):
+        key = hmac.new(key, part.encode('utf-8'), hashlib.sha256).digest()
+    signature = hmac.new(key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+    return signature, signed_headers, scope
+
+
+def _amz_date(now: float = None) -> str:
+    return time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(now))
+
+
+async def _sha256_hex(data) -> str:
+    """请求体摘要：较大的数据放到线程中计算（hashlib 计算时释放 GIL）"""
+    if len(data) > HASH_IN_THREAD_BYTES:
+        return await asyncio.to_thread(lambda: hashlib.sha256(data).hexdigest())
+    return hashlib.sha256(data).hexdigest()
+
+
+class ArtifactStore:
+    """
+    产物存储的公共接口
+
+    子类实现 _upload / exists_async / get_async / url。异步代码直接调用 *_async 方法；
+    同步代码（如 Streamlit 页面）调用 put / exists / get，在存储自己的事件循环线程中执行，
+    连接池因此可以跨调用复用（不能在该线程内调用同步方法）。
+    """
+
+    backend = ''
+
+    def __init__(self, timeout: float = CALL_TIMEOUT_SECONDS):
+        """
+        参数:
+            timeout: 同步调用 put / exists / get 的总超时（秒，None 表示不限制）
+        """
+        self.timeout = timeout
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    def _run(self, coro, timeout: float = None):
+        """
+        在存储的事件循环线程中执行协程并等待结果
+
+        参数:
+            coro: 协程
+            timeout: 最长等待时间（秒，None 表示不限制），超时后取消协程并抛出 ArtifactStoreError
+        """
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name=f'artifact-{self.backend}',
+                                 daemon=True).start()
+                self._loop = loop
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise ArtifactStoreError(f"存储请求超过 {timeout} 秒未完成") from None
+
+    async def put_async(self, data) -> str:
+        """
+        写入产物：内容已存在时只查询不上传
+
+        参数:
+            data: PPT文件字节数据（或支持缓冲区协议的对象，上传完成前不能修改）
+        返回:
+            存储键
+        """
+        start = time.perf_counter()
+        try:
+            key = KEY_PREFIX + await _sha256_hex(data) + KEY_SUFFIX
+            if await self.exists_async(key):
+                result = 'deduplicated'
+            else:
+                await self._upload(key, memoryview(data).cast('B'))
+                result = 'uploaded'
+        except BaseException:
+            ARTIFACT_UPLOADS.inc(backend=self.backend, result='failed')
+            raise
+        ARTIFACT_UPLOADS.inc(backend=self.backend, result=result)
+        ARTIFACT_UPLOAD_SECONDS.observe(time.perf_counter() - start, backend=self.backend)
+        return key
+
+    async def put_many_async(self, items: list) -> list:
+        """
+        并发写入多个产物（同时在途的请求数受连接池限制）
+
+        参数:
+            items: 字节数据列表
+        返回:
+            与 items 对应的列表，成功为存储键，失败为异常对象
+        """
+        return await asyncio.gather(*(self.put_async(data) for data in items), return_exceptions=True)
+
+    async def _upload(self, key: str, view: memoryview):
+        raise NotImplementedError
+
+    async def exists_async(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def get_async(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    def url(self, key: str, filename: str = None, expires: int = DEFAULT_LINK_SECONDS) -> str:
+        """
+        带签名与有效期的下载链接
+
+        参数:
+            key: 存储键
+            filename: 浏览器保存时使用的文件名（可选）
+            expires: 有效期（秒）
+        返回:
+            下载链接
+        """
+        raise NotImplementedError
+
+    def put(self, data) -> str:
+        """同步写入产物，参数与返回值同 put_async，超过 timeout 时抛出 ArtifactStoreError"""
+        return self._run(self.put_async(data), self.timeout)
+
+    def put_many(self, items: list) -> list:
+        """同步并发写入多个产物，参数与返回值同 put_many_async（总耗时随数量增长，只受单个请求的超时限制）"""
+        return self._run(self.put_many_async(items))
+
+    def exists(self, key: str) -> bool:
+        """产物是否存在"""
+        return self._run(self.exists_async(key), self.timeout)
+
+    def get(self, key: str) -> bytes:
+        """读取产物，不存在时抛出 ArtifactStoreError"""
+        return self._run(self.get_async(key), self.timeout)
+
+    async def _close_async(self):
+        pass
+
+    def close(self):
+        """关闭连接并停止事件循环线程"""
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self._close_async(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ==================== 本地目录 ====================
+
+class LocalArtifactStore(ArtifactStore):
+    """
+    本地目录后端：文件按存储键保存，下载链接由 start_link_server 启动的服务校验签名后提供
+
+    多个服务进程共用同一目录时需设置相同的签名密钥（环境变量 PPT_ARTIFACT_SECRET）。
+    """
+
+    backend = 'local'
+
+    def __init__(self, root: str, base_url: str = None, secret: bytes = None):
+        """
+        参数:
+            root: 存储目录（不存在时创建）
+            base_url: 链接服务的外部地址（可选，默认 http://localhost:9109）
+            secret: 链接签名密钥（可选，默认读取环境变量，未设置时每个进程随机生成）
+        """
+        super().__init__()
+        self.root = root
+        self.base_url = (base_url or f"http://localhost:{DEFAULT_LINK_PORT}").rstrip('/')
+        env_secret = os.environ.get(SECRET_ENV)
+        self.secret = secret or (env_secret.encode('utf-8') if env_secret else os.urandom(32))
+
+    def path(self, key: str) -> str:
+        """
+        存储键对应的文件路径
+
+        参数:
+            key: 存储键
+        返回:
+            文件路径
+        """
+        return os.path.join(self.root, *_check_key(key).split('/'))
+
+    def _write(self, key: str, view: memoryview):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(view)
+        os.replace(tmp_path, path)
+
+    async def _upload(self, key: str, view: memoryview):
+        await asyncio.to_thread(self._write, key, view)
+
+    async def exists_async(self, key: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self.path(key))
+
+    async def get_async(self, key: str) -> bytes:
+        def read():
+            try:
+                with open(self.path(key), 'rb') as f:
+                    return f.read()
+            except FileNotFoundError:
+                raise ArtifactStoreError(f"产物不存在: {key}", 404, 'NoSuchKey') from None
+        return await asyncio.to_thread(read)
+
+    def _signature(self, key: str, expires_at: int, filename: str) -> str:
+        message = f"{key}\n{expires_at}\n{filename}".encode('utf-8')
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()
+
+    def url(self, key: str, filename: str = None, expires: int = DEFAULT_LINK_SECONDS) -> str:
+        expires_at = int(time.time()) + expires
+        filename = filename or os.path.basename(key)
+        query = '&'.join([f"expires={expires_at}", f"filename={quote(filename, safe='')}",
+                          f"signature={self._signature(_check_key(key), expires_at, filename)}"])
+        return f"{self.base_url}/{key}?{query}"
+
+    def verify(self, key: str, expires_at: str, filename: str, signature: str) -> bool:
+        """
+        校验下载链接的签名与有效期
+
+        参数:
+            key: 存储键
+            expires_at: 链接中的过期时间戳
+            filename: 链接中的文件名
+            signature: 链接中的签名
+        返回:
+            链接是否有效
+        """
+        try:
+            expires_at = int(expires_at)
+            _check_key(key)
+        except ValueError:
+            return False
+        if expires_at < time.time():
+            return False
+        return hmac.compare_digest(self._signature(key, expires_at, filename), signature)
+
+
+class _LinkHandler(BaseHTTPRequestHandler):
+    """本地产物下载请求处理：校验签名后流式返回文件"""
+
+    store = None
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        key = unquote(parts.path.lstrip('/'))
+        query = dict(parse_qsl(parts.query))
+        if not self.store.verify(key, query.get('expires', ''), query.get('filename', ''),
+                                 query.get('signature', '')):
+            self.send_error(403)
+            return
+        try:
+            f = open(self.store.path(key), 'rb')
+        except FileNotFoundError:
+            self.send_error(404)
+            return
+        with f:
+            self.send_response(200)
+            self.send_header('Content-Type', PPTX_MIME)
+            self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+            self.send_header('Content-Disposition', content_disposition(query['filename']))
+            # 内容以摘要为键，不会变化
+            self.send_header('Cache-Control', 'private, max-age=31536000, immutable')
+            self.end_headers()
+            for chunk in iter(lambda: f.read(STREAM_CHUNK_BYTES), b''):
+                self.wfile.write(chunk)
+
+    def log_message(self, format, *args):
+        pass  # 不输出访问日志
+
+
+def start_link_server(store: LocalArtifactStore, port: int = DEFAULT_LINK_PORT,
+                      addr: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """
+    在后台线程启动本地产物的下载服务
+
+    参数:
+        store: 本地目录后端
+        port: 端口（0 表示自动分配）
+        addr: 监听地址，默认只监听本机
+    返回:
+        HTTP服务对象（server.shutdown() 停止服务）
+    """
+    handler = type('LinkHandler', (_LinkHandler,), {'store': store})
+    server = ThreadingHTTPServer((addr, port), handler)
+    thread = threading.Thread(target=server.serve_forever, name='artifact-links', daemon=True)
+    thread.start()
+    return server
+
+
+# ==================== S3 兼容对象存储 ====================
+
+class _Response:
+    """HTTP 响应"""
+
+    __slots__ = ('status', 'headers', 'body', 'reusable')
+
+    def __init__(self, status: int, headers: dict, body: bytes, reusable: bool):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.reusable = reusable
+
+
+class _Connection:
+    """一条 HTTP/1.1 长连接"""
+
+    __slots__ = ('reader', 'writer', 'timeout', 'idle_since')
+
+    def __init__(self, reader, writer, timeout: float = READ_TIMEOUT_SECONDS):
+        self.reader = reader
+        self.writer = writer
+        self.timeout = timeout
+        self.idle_since = time.monotonic()
+
+    async def _io(self, awaitable):
+        """等待一次读写，超过 timeout 秒没有完成时抛出 ArtifactStoreError（连接随后被关闭）"""
+        try:
+            return await asyncio.wait_for(awaitable, self.timeout)
+        except asyncio.TimeoutError:
+            raise ArtifactStoreError(f"服务端超过 {self.timeout} 秒没有响应") from None
+
+    async def request(self, method: str, target: str, headers: dict, body) -> _Response:
+        head = f"{method} {target} HTTP/1.1\r\n" + ''.join(f"{name}: {value}\r\n" for name, value in headers.items())
+        self.writer.write((head + '\r\n').encode('latin-1'))
+        if len(body):
+            self.writer.write(body)
+        await self._io(self.writer.drain())
+
+        status_line = await self._io(self.reader.readline())
+        if not status_line:
+            raise ConnectionResetError("连接已被服务端关闭")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self._io(self.reader.readline())
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        reusable = response_headers.get('connection', '').lower() != 'close'
+        if method == 'HEAD' or status in (204, 304):
+            data = b''
+        elif 'chunked' in response_headers.get('transfer-encoding', '').lower():
+            data = await self._read_chunked()
+        elif 'content-length' in response_headers:
+            data = await self._io(self.reader.readexactly(int(response_headers['content-length'])))
+        else:
+            data = await self._io(self.reader.read())
+            reusable = False
+        return _Response(status, response_headers, data, reusable)
+
+    async def _read_chunked(self) -> bytes:
+        chunks = []
+        while True:
+            size = int((await self._io(self.reader.readline())).split(b';', 1)[0], 16)
+            if size == 0:
+                # 跳过 trailer
+                while (await self._io(self.reader.readline())) not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await self._io(self.reader.readexactly(size)))
+            await self._io(self.reader.readexactly(2))
+
+    def close(self):
+        self.writer.close()
+
+
+class _ConnectionPool:
+    """复用长连接的连接池，同时在途的请求数不超过 size"""
+
+    def __init__(self, host: str, port: int, ssl: bool, size: int,
+                 connect_timeout: float = CONNECT_TIMEOUT_SECONDS, read_timeout: float = READ_TIMEOUT_SECONDS):
+        self.host = host
+        self.port = port
+        self.ssl = ssl
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+        # 建立过的连接数（用于观察复用情况）
+        self.opened = 0
+
+    async def _connect(self) -> _Connection:
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(
+                self.host, self.port, ssl=self.ssl or None, server_hostname=self.host if self.ssl else None),
+                self.connect_timeout)
+        except asyncio.TimeoutError:
+            raise ArtifactStoreError(
+                f"连接 {self.host}:{self.port} 超过 {self.connect_timeout} 秒未建立") from None
+        self.opened += 1
+        return _Connection(reader, writer, self.read_timeout)
+
+    def _take_idle(self) -> _Connection:
+        while self._idle:
+            conn = self._idle.pop()
+            if time.monotonic() - conn.idle_since < IDLE_SECONDS:
+                return conn
+            conn.close()
+        return None
+
+    async def request(self, method: str, target: str, headers: dict, body) -> _Response:
+        async with self._slots:
+            conn = self._take_idle()
+            reused = conn is not None
+            while True:
+                if conn is None:
+                    conn = await self._connect()
+                try:
+                    response = await conn.request(method, target, headers, body)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    conn.close()
+                    if not reused:
+                        raise
+                    # 复用的连接可能已被服务端因空闲关闭，换一条新连接重试一次
+                    conn, reused = None, False
+                    continue
+                except BaseException:
+                    conn.close()
+                    raise
+                if response.reusable:
+                    conn.idle_since = time.monotonic()
+                    self._idle.append(conn)
+                else:
+                    conn.close()
+                return response
+
+    def close(self):
+        while self._idle:
+            self._idle.pop().close()
+
+
+def _xml_text(body: bytes, tag: str) -> str:
+    """取 S3 响应 XML 中第一个指定标签的文本（忽略命名空间）"""
+    try:
+        root = ElementTree.fromstring(body)
+    except ElementTree.ParseError:
+        return None
+    for element in root.iter():
+        if element.tag.rsplit('}', 1)[-1] == tag:
+            return element.text
+    return None
+
+
+class S3ArtifactStore(ArtifactStore):
+    """
+    S3 兼容对象存储后端（路径风格地址：endpoint/bucket/key，适用于 AWS S3、MinIO 与 s3_local 替身服务）
+
+    下载链接为 S3 预签名链接，浏览器直接从对象存储下载。
+    """
+
+    backend = 's3'
+
+    def __init__(self, endpoint: str, bucket: str, access_key: str, secret_key: str,
+                 region: str = 'us-east-1', part_bytes: int = PART_BYTES,
+                 concurrency: int = UPLOAD_CONCURRENCY, public_endpoint: str = None,
+                 connect_timeout: float = CONNECT_TIMEOUT_SECONDS, read_timeout: float = READ_TIMEOUT_SECONDS,
+                 timeout: float = CALL_TIMEOUT_SECONDS):
+        """
+        参数:
+            endpoint: 服务地址，如 https://s3.us-east-1.amazonaws.com 或 http://127.0.0.1:9000
+            bucket: 存储桶
+            access_key: 访问密钥ID
+            secret_key: 访问密钥
+            region: 区域
+            part_bytes: 分段上传的每段大小（不小于 5MB）
+            concurrency: 同时在途的请求数
+            public_endpoint: 下载链接使用的外部地址（可选，默认同 endpoint）
+            connect_timeout: 建立连接的超时（秒）
+            read_timeout: 每次读写响应的超时（秒）
+            timeout: 同步调用的总超时（秒，None 表示不限制）
+        """
+        super().__init__(timeout)
+        if part_bytes < MIN_PART_BYTES:
+            raise ValueError(f"分段大小不能小于 {MIN_PART_BYTES} 字节")
+        self.endpoint = endpoint.rstrip('/')
+        self.public_endpoint = (public_endpoint or endpoint).rstrip('/')
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.part_bytes = part_bytes
+        self.concurrency = concurrency
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._pool = None
+        self._pool_loop = None
+
+    @staticmethod
+    def _host(endpoint: str) -> tuple:
+        """(主机, 端口, 是否TLS, Host 头)"""
+        parts = urlsplit(endpoint)
+        ssl = parts.scheme == 'https'
+        port = parts.port or (443 if ssl else 80)
+        host_header = parts.hostname if parts.port is None else f"{parts.hostname}:{parts.port}"
+        return parts.hostname, port, ssl, host_header
+
+    def _object_path(self, key: str) -> str:
+        return f"/{self.bucket}/{key}"
+
+    def pool(self) -> _ConnectionPool:
+        """当前事件循环的连接池（每个事件循环各自一个）"""
+        loop = asyncio.get_running_loop()
+        if self._pool is None or self._pool_loop is not loop:
+            host, port, ssl, _ = self._host(self.endpoint)
+            self._pool = _ConnectionPool(host, port, ssl, self.concurrency,
+                                         self.connect_timeout, self.read_timeout)
+            self._pool_loop = loop
+        return self._pool
+
+    async def _request(self, method: str, key: str, params: list = None, body=b'',
+                       headers: dict = None, expect: tuple = (200,)) -> _Response:
+        """发送签名的请求，状态码不在 expect 中时抛出 ArtifactStoreError"""
+        params = params or []
+        path = self._object_path(key)
+        _, _, _, host_header = self._host(self.endpoint)
+        amz_date = _amz_date()
+        payload_hash = await _sha256_hex(body) if len(body) else EMPTY_SHA256
+        signed = {'host': host_header, 'x-amz-content-sha256': payload_hash, 'x-amz-date': amz_date}
+        signature, signed_headers, scope = sign_v4(
+            self.secret_key, self.region, method, path, params, signed, payload_hash, amz_date)
+        request_headers = dict(signed)
+        request_headers.update(headers or {})
+        request_headers['content-length'] = str(len(body))
+        request_headers['authorization'] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}")
+        target = _uri_encode(path, safe='/' + _UNRESERVED)
+        if params:
+            target += '?' + _canonical_query(params)
+
+        response = await self.pool().request(method, target, request_headers, body)
+        if response.status not in expect:
+            code = _xml_text(response.body, 'Code')
+            message = _xml_text(response.body, 'Message') or ''
+            raise ArtifactStoreError(f"{method} {key} 失败: {response.status} {code or ''} {message}".strip(),
+                                     response.status, code)
+        return response
+
+    async def exists_async(self, key: str) -> bool:
+        response = await self._request('HEAD', key, expect=(200, 404))
+        return response.status == 200
+
+    async def get_async(self, key: str) -> bytes:
+        return (await self._request('GET', key)).body
+
+    async def _upload(self, key: str, view: memoryview):
+        if view.nbytes <= max(MULTIPART_THRESHOLD, self.part_bytes):
+            await self._request('PUT', key, body=view, headers={'content-type': PPTX_MIME})
+            return
+        await self._upload_multipart(key, view)
+
+    async def _upload_multipart(self, key: str, view: memoryview):
+        """分段并发上传，任一段失败时中止整个上传，不留下未完成的分段"""
+        response = await self._request('POST', key, [('uploads', '')], headers={'content-type': PPTX_MIME})
+        upload_id = _xml_text(response.body, 'UploadId')
+        if not upload_id:
+            raise ArtifactStoreError(f"POST {key} 未返回 UploadId")
+
+        async def upload_part(number: int, offset: int) -> tuple:
+            part = view[offset:offset + self.part_bytes]
+            response = await self._request('PUT', key, [('partNumber', str(number)), ('uploadId', upload_id)],
+                                           body=part)
+            return number, response.headers.get('etag', '')
+
+        tasks = [asyncio.ensure_future(upload_part(number, offset))
+                 for number, offset in enumerate(range(0, view.nbytes, self.part_bytes), 1)]
+        try:
+            parts = await asyncio.gather(*tasks)
+            body = ('<CompleteMultipartUpload>' + ''.join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>" for number, etag in parts)
+                + '</CompleteMultipartUpload>').encode('utf-8')
+            response = await self._request('POST', key, [('uploadId', upload_id)], body=body,
+                                           headers={'content-type': 'application/xml'})
+            # 合并失败时 S3 也可能返回 200，错误写在响应体中
+            if _xml_text(response.body, 'Code'):
+                raise ArtifactStoreError(f"合并分段失败: {_xml_text(response.body, 'Message')}",
+                                         response.status, _xml_text(response.body, 'Code'))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            try:
+                await self._request('DELETE', key, [('uploadId', upload_id)], expect=(200, 204, 404))
+            except Exception:
+                pass  # 中止失败时由存储桶的生命周期规则清理
+            raise
+
+    def url(self, key: str, filename: str = None, expires: int = DEFAULT_LINK_SECONDS) -> str:
+        path = self._object_path(key)
+        _, _, _, host_header = self._host(self.public_endpoint)
+        amz_date = _amz_date()
+        scope = f"{amz_date[:8]}/{self.region}/s3/aws4_request"
+        params = [
+            ('X-Amz-Algorithm', 'AWS4-HMAC-SHA256'),
+            ('X-Amz-Credential', f"{self.access_key}/{scope}"),
+            ('X-Amz-Date', amz_date),
+            ('X-Amz-Expires', str(expires)),
+            ('X-Amz-SignedHeaders', 'host'),
+        ]
+        if filename:
+            params.append(('response-content-disposition', content_disposition(filename)))
+        signature, _, _ = sign_v4(self.secret_key, self.region, 'GET', path, params,
+                                  {'host': host_header}, UNSIGNED_PAYLOAD, amz_date)
+        query = _canonical_query(params + [('X-Amz-Signature', signature)])
+        return f"{self.public_endpoint}{_uri_encode(path, safe='/' + _UNRESERVED)}?{query}"
+
+    async def _close_async(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+
+# ==================== 配置 ====================
+
+def open_store(spec: str, endpoint: str = None, base_url: str = None) -> ArtifactStore:
+    """
+    按存储地址打开产物存储
+
+    参数:
+        spec: s3://存储桶 或 本地目录（也可写作 file:///目录）
+        endpoint: S3 服务地址（可选，默认读取环境变量 PPT_S3_ENDPOINT，未设置时为 AWS 区域地址）
+        base_url: 本地后端链接服务的外部地址（可选，默认读取环境变量 PPT_ARTIFACT_URL）
+    返回:
+        ArtifactStore 对象
+    """
+    if spec.startswith('s3://'):
+        region = os.environ.get('AWS_REGION', 'us-east-1')
+        return S3ArtifactStore(
+            endpoint or os.environ.get(S3_ENDPOINT_ENV) or f"https://s3.{region}.amazonaws.com",
+            spec[len('s3://'):].strip('/'),
+            os.environ.get('AWS_ACCESS_KEY_ID', ''),
+            os.environ.get('AWS_SECRET_ACCESS_KEY', ''),
+            region=region,
+        )
+    root = spec[len('file://'):] if spec.startswith('file://') else spec
+    return LocalArtifactStore(root, base_url or os.environ.get(LINK_URL_ENV))
+
+
+def store_from_env() -> ArtifactStore:
+    """
+    由环境变量 PPT_ARTIFACT_STORE 打开产物存储
+
+    返回:
+        ArtifactStore 对象，未配置时为 None
+    """
+    spec = os.environ.get(STORE_ENV)
+    return open_store(spec) if spec else None
+
+
+def main():
+    """命令行入口：python artifact_store.py s3://bucket out/*.pptx"""
+    parser = argparse.ArgumentParser(description="把PPT并发上传到产物存储并输出下载链接")
+    parser.add_argument('store', help="存储地址：s3://存储桶 或 本地目录")
+    parser.add_argument('files', nargs='+', help="PPT文件")
+    parser.add_argument('--endpoint', help="S3 服务地址（默认读取 PPT_S3_ENDPOINT）")
+    parser.add_argument('--expires', type=int, default=DEFAULT_LINK_SECONDS, help="链接有效期（秒）")
+    args = parser.parse_args()
+
+    with open_store(args.store, endpoint=args.endpoint) as store:
+        start = time.perf_counter()
+        items = []
+        for path in args.files:
+            with open(path, 'rb') as f:
+                items.append(f.read())
+        results = store.put_many(items)
+        elapsed = time.perf_counter() - start
+        failed = 0
+        for path, result in zip(args.files, results):
+            if isinstance(result, BaseException):
+                failed += 1
+                print(f"✗ {path}: {result}")
+            else:
+                print(f"✓ {path}\n  {store.url(result, os.path.basename(path), args.expires)}")
+        total = sum(len(data) for data in items)
+        print(f"\n共 {len(items)} 个文件，{total / 1024 / 1024:.1f} MB，耗时 {elapsed:.2f} 秒，失败 {failed} 个")
+
+
+if __name__ == '__main__':
+    main()
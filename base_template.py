@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""
+企业底版模块
+以企业提供的 .pptx / .potx 作为生成底版：首次使用时建立版式与占位符索引，
+去掉示例幻灯片及只被它们引用的部件，大体积媒体只留占位数据不读入内存，
+整理后的底版在进程内缓存，保存时再从原文件直接复制媒体的压缩数据
+"""
+
+import io
+import os
+import hashlib
+import tempfile
+import zipfile
+from functools import lru_cache
+
+from lxml import etree
+from pptx import Presentation
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+
+from package_io import ZipStreamWriter, read_rels, rels_name, serialize_xml
+
+
+# 超过该大小的非XML部件不读入底版，保存时再从原文件复制
+STUB_THRESHOLD = 256 * 1024
+STUB_PREFIX = b'PPTBASE-STUB:'
+
+CT_TEMPLATE_MAIN = b'application/vnd.openxmlformats-officedocument.presentationml.template.main+xml'
+CT_PRESENTATION_MAIN = b'application/vnd.openxmlformats-officedocument.presentationml.presentation.main+xml'
+
+NS_P = 'http://schemas.openxmlformats.org/presentationml/2006/main'
+NS_R = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+# 空白版式的名称（不区分大小写）
+BLANK_LAYOUT_NAMES = ('blank', '空白')
+
+# 日期、页脚、页码占位符不随版式克隆，判断空白版式时不计入
+DECORATION_PLACEHOLDERS = ('dt', 'ftr', 'sldNum')
+
+# 上传的底版按内容摘要保存的目录
+TEMPLATE_STORE_DIR = os.path.join(tempfile.gettempdir(), 'ppt_base_templates')
+
+
+class LayoutInfo:
+    """版式索引项"""
+
+    __slots__ = ('name', 'partname', 'placeholders')
+
+    def __init__(self, name: str, partname: str, placeholders: list):
+        """
+        参数:
+            name: 版式名称
+            partname: 版式部件名（如 ppt/slideLayouts/slideLayout7.xml）
+            placeholders: 占位符列表 [(类型, 序号, 名称)]
+        """
+        self.name = name
+        self.partname = partname
+        self.placeholders = placeholders
+
+    def __repr__(self):
+        return f"LayoutInfo({self.name!r}, placeholders={len(self.placeholders)})"
+
+
+class TemplateIndex:
+    """底版的版式与占位符索引"""
+
+    __slots__ = ('layouts', 'slide_width', 'slide_height', 'blank_layout')
+
+    def __init__(self, layouts: list, slide_width: int, slide_height: int):
+        """
+        参数:
+            layouts: LayoutInfo 列表，顺序与 prs.slide_layouts 一致
+            slide_width: 幻灯片宽度（EMU）
+            slide_height: 幻灯片高度（EMU）
+        """
+        self.layouts = layouts
+        self.slide_width = slide_width
+        self.slide_height = slide_height
+        self.blank_layout = choose_blank_layout(
+            [(layout.name, [ph[0] for ph in layout.placeholders]) for layout in layouts])
+
+    def find_layout(self, name: str) -> int:
+        """
+        按名称查找版式序号
+
+        参数:
+            name: 版式名称
+        返回:
+            版式序号，不存在时为 -1
+        """
+        for i, layout in enumerate(self.layouts):
+            if layout.name == name:
+                return i
+        return -1
+
+    def closest_ratio(self, ratios: dict) -> str:
+        """
+        与底版画布最接近的比例
+
+        参数:
+            ratios: {比例名称: {'width': 英寸, 'height': 英寸}}
+        返回:
+            比例名称
+        """
+        aspect = self.slide_width / self.slide_height
+        return min(ratios, key=lambda name: abs(ratios[name]['width'] / ratios[name]['height'] - aspect))
+
+
+def choose_blank_layout(layouts: list) -> int:
+    """
+    选择空白版式：优先按名称匹配，否则取内容占位符最少的版式
+
+    参数:
+        layouts: [(版式名称, [占位符类型])]，顺序与 prs.slide_layouts 一致
+    返回:
+        版式序号
+    """
+    for i, (name, _) in enumerate(layouts):
+        if (name or '').strip().lower() in BLANK_LAYOUT_NAMES:
+            return i
+    content_counts = [sum(1 for ph_type in types if ph_type not in DECORATION_PLACEHOLDERS)
+                      for _, types in layouts]
+    return content_counts.index(min(content_counts)) if content_counts else 0
+
+
+def layout_placeholder_types(layout_element) -> list:
+    """
+    读取版式XML中的占位符类型（缺省类型为 obj）
+
+    参数:
+        layout_element: 版式根元素
+    返回:
+        占位符类型列表
+    """
+    return [ph.get('type', 'obj') for ph in layout_element.iter(f'{{{NS_P}}}ph')]
+
+
+class BaseTemplate:
+    """整理后的底版：示例幻灯片已去掉，大体积媒体以占位数据代替"""
+
+    __slots__ = ('path', 'index', 'package', 'stubs', 'source_bytes', 'dropped_bytes')
+
+    def __init__(self, path: str):
+        """
+        参数:
+            path: 底版文件路径（.pptx 或 .potx）
+        """
+        self.path = path
+        self.stubs = {}
+        self.dropped_bytes = 0
+        with open(path, 'rb') as fp:
+            self.package, self.index = self._strip(fp)
+        self.source_bytes = os.path.getsize(path)
+
+    def _strip(self, fp) -> tuple:
+        """
+        整理底版文件包
+
+        参数:
+            fp: 底版文件对象
+        返回:
+            (整理后的文件包字节数据, TemplateIndex)
+        """
+        with zipfile.ZipFile(fp) as package:
+            names = set(package.namelist())
+            rewritten = {}
+
+            # 主文档部件
+            _, root_rels = read_rels(package, names, '')
+            main = next(target for _, reltype, target in root_rels if reltype == RT.OFFICE_DOCUMENT)
+
+            # 去掉示例幻灯片：幻灯片列表与对应关系
+            pres_rels_root, pres_rels = read_rels(package, names, main)
+            slide_rIds = set()
+            for rel, reltype, _ in pres_rels:
+                if reltype == RT.SLIDE:
+                    slide_rIds.add(rel.get('Id'))
+                    pres_rels_root.remove(rel)
+            presentation = etree.fromstring(package.read(main))
+            for sld_id_lst in presentation.findall(f'{{{NS_P}}}sldIdLst'):
+                presentation.remove(sld_id_lst)
+            if slide_rIds:
+                rewritten[main] = serialize_xml(presentation)
+                rewritten[rels_name(main)] = serialize_xml(pres_rels_root)
+
+            # .potx 的主文档内容类型改为演示文稿
+            content_types = package.read('[Content_Types].xml')
+            if CT_TEMPLATE_MAIN in content_types:
+                rewritten['[Content_Types].xml'] = content_types.replace(CT_TEMPLATE_MAIN, CT_PRESENTATION_MAIN)
+
+            # 从根关系出发收集仍被引用的部件
+            reachable = {'[Content_Types].xml', rels_name('')}
+            pending = [main]
+            masters = []
+            while pending:
+                partname = pending.pop()
+                if partname in reachable or partname not in names:
+                    continue
+                reachable.add(partname)
+                _, rels = read_rels(package, names, partname)
+                if rels:
+                    reachable.add(rels_name(partname))
+                for rel, reltype, target in rels:
+                    if partname == main and rel.get('Id') in slide_rIds:
+                        continue
+                    if partname == main and reltype == RT.SLIDE_MASTER:
+                        masters.append((rel.get('Id'), target))
+                    pending.append(target)
+            reachable.update(target for _, _, target in root_rels)
+
+            index = self._build_index(package, names, presentation, masters)
+
+            buffer = io.BytesIO()
+            with ZipStreamWriter(buffer) as writer:
+                for info in package.infolist():
+                    name = info.filename
+                    if name not in reachable:
+                        self.dropped_bytes += info.file_size
+                    elif name in rewritten:
+                        writer.write(name, rewritten[name])
+                    elif (info.file_size > STUB_THRESHOLD
+                          and not name.endswith(('.xml', '.rels'))):
+                        writer.write(name, STUB_PREFIX + name.encode('utf-8'))
+                        self.stubs[name] = info
+                    else:
+                        writer.copy_raw(fp, info)
+        return buffer.getvalue(), index
+
+    @staticmethod
+    def _build_index(package, names: set, presentation, masters: list) -> TemplateIndex:
+        """
+        建立版式与占位符索引，顺序与 prs.slide_layouts 一致（首个母版的版式列表）
+
+        参数:
+            package: 底版ZIP
+            names: ZIP中的条目名集合
+            presentation: 主文档根元素
+            masters: [(关系ID, 母版部件名)]
+        返回:
+            TemplateIndex
+        """
+        # 母版按主文档中的列表顺序排列
+        order = [el.get(f'{{{NS_R}}}id') for el in presentation.iter(f'{{{NS_P}}}sldMasterId')]
+        masters = sorted(masters, key=lambda m: order.index(m[0]) if m[0] in order else len(order))
+
+        layouts = []
+        if masters:
+            master_part = masters[0][1]
+            master = etree.fromstring(package.read(master_part))
+            _, rels = read_rels(package, names, master_part)
+            targets = {rel.get('Id'): target for rel, _, target in rels}
+            for layout_id in master.iter(f'{{{NS_P}}}sldLayoutId'):
+                partname = targets.get(layout_id.get(f'{{{NS_R}}}id'))
+                if partname not in names:
+                    continue
+                layout = etree.fromstring(package.read(partname))
+                c_sld = layout.find(f'{{{NS_P}}}cSld')
+                placeholders = []
+                for sp in layout.iter(f'{{{NS_P}}}sp'):
+                    ph = sp.find(f'.//{{{NS_P}}}nvPr/{{{NS_P}}}ph')
+                    if ph is None:
+                        continue
+                    c_nv_pr = sp.find(f'.//{{{NS_P}}}cNvPr')
+                    placeholders.append((ph.get('type', 'obj'), int(ph.get('idx', 0)),
+                                         c_nv_pr.get('name') if c_nv_pr is not None else ''))
+                layouts.append(LayoutInfo(c_sld.get('name', '') if c_sld is not None else '',
+                                          partname, placeholders))
+
+        sld_sz = presentation.find(f'{{{NS_P}}}sldSz')
+        width = int(sld_sz.get('cx')) if sld_sz is not None else 9144000
+        height = int(sld_sz.get('cy')) if sld_sz is not None else 6858000
+        return TemplateIndex(layouts, width, height)
+
+    def open(self):
+        """
+        以整理后的底版新建演示文稿（只解析母版、版式与主题等小部件）
+
+        返回:
+            Presentation对象
+        """
+        return Presentation(io.BytesIO(self.package))
+
+    def restore(self, data: bytes) -> bytes:
+        """
+        将生成结果中的媒体占位数据换回原文件的压缩数据（不解压、不重新压缩）
+
+        参数:
+            data: 以本底版生成并保存的PPT文件字节数据
+        返回:
+            完整的PPT文件字节数据
+        """
+        if not self.stubs:
+            return data
+        src_fp = io.BytesIO(data)
+        dst_fp = io.BytesIO()
+        with open(self.path, 'rb') as base_fp, zipfile.ZipFile(src_fp) as package, \
+                ZipStreamWriter(dst_fp) as writer:
+            for info in package.infolist():
+                stub = self.stubs.get(info.filename)
+                if stub is not None and package.read(info) == STUB_PREFIX + info.filename.encode('utf-8'):
+                    writer.copy_raw(base_fp, stub)
+                else:
+                    writer.copy_raw(src_fp, info)
+        return dst_fp.getvalue()
+
+
+@lru_cache(maxsize=8)
+def _load_base_template(path: str, mtime_ns: int, size: int) -> BaseTemplate:
+    return BaseTemplate(path)
+
+
+def load_base_template(path: str) -> BaseTemplate:
+    """
+    读取底版（按路径、修改时间与大小缓存，文件变化后自动重新整理）
+
+    参数:
+        path: 底版文件路径
+    返回:
+        BaseTemplate 对象
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return _load_base_template(path, stat.st_mtime_ns, stat.st_size)
+
+
+def store_template_bytes(data: bytes, directory: str = TEMPLATE_STORE_DIR) -> str:
+    """
+    将上传的底版按内容摘要保存为文件，配置中只记录路径
+
+    参数:
+        data: 底版文件字节数据
+        directory: 保存目录
+    返回:
+        文件路径（内容相同的上传得到相同路径）
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{hashlib.sha256(data).hexdigest()}.pptx")
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+批量任务索引模块
+以 SQLite 记录批量生成的每个任务：任务参数、参数摘要、状态、输出路径与摘要、耗时和错误。
+每完成一批提交一次作为检查点，进程崩溃或被终止后重新运行时，
+已有输出且摘要一致的任务直接跳过；耗时排名、失败原因等汇总查询走索引即时返回
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+
+
+STATUS_PENDING = 'pending'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_key TEXT PRIMARY KEY,
+    spec TEXT NOT NULL,
+    spec_hash TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    output_hash TEXT,
+    output_bytes INTEGER,
+    started REAL,
+    seconds REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE INDEX IF NOT EXISTS jobs_seconds ON jobs (seconds) WHERE status = 'done';
+CREATE INDEX IF NOT EXISTS jobs_error ON jobs (error) WHERE status = 'failed';
+CREATE TABLE IF NOT EXISTS checkpoints (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    done INTEGER NOT NULL,
+    failed INTEGER NOT NULL
+);
+"""
+
+# 错误信息只保留首行的前若干字符，便于按原因分组
+ERROR_MAX_CHARS = 200
+
+# 读取输出文件计算摘要时的块大小
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def spec_hash(template_digest: str, spec: dict, output_path: str) -> str:
+    """
+    任务参数摘要：模板、记录内容或输出路径任一变化都会得到不同的摘要
+
+    参数:
+        template_digest: 模板摘要（见 MergeTemplate.digest）
+        spec: 任务参数（记录字典）
+        output_path: 输出文件路径
+    返回:
+        十六进制摘要
+    """
+    payload = json.dumps([template_digest, spec, output_path], ensure_ascii=False,
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def file_hash(path: str) -> str:
+    """
+    文件内容摘要
+
+    参数:
+        path: 文件路径
+    返回:
+        十六进制摘要，文件不存在时为 None
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def error_reason(error: str) -> str:
+    """错误信息的首行（截断），作为失败原因分组的依据"""
+    return (error or '').strip().split('\n', 1)[0][:ERROR_MAX_CHARS]
+
+
+class BatchIndex:
+    """
+    批量任务的 SQLite 索引
+
+    只应由调度进程写入；子进程只负责生成并返回结果。
+    """
+
+    def __init__(self, path: str):
+        """
+        参数:
+            path: 索引文件路径（不存在时创建）
+        """
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        # WAL 模式下汇总查询不会被正在进行的批量写入阻塞
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def is_complete(self, job_key: str, job_hash: str, output_path: str) -> bool:
+        """
+        任务是否已完成：参数摘要一致、输出文件存在且内容摘要与记录一致
+
+        参数:
+            job_key: 任务键
+            job_hash: 本次的参数摘要
+            output_path: 输出文件路径
+        返回:
+            是否可以跳过
+        """
+        row = self.conn.execute(
+            'SELECT spec_hash, status, output_hash, output_bytes FROM jobs WHERE job_key = ?',
+            (job_key,)).fetchone()
+        if row is None or row['status'] != STATUS_DONE or row['spec_hash'] != job_hash:
+            return False
+        # 先比较大小，不一致时不必读取整个文件
+        try:
+            if os.path.getsize(output_path) != row['output_bytes']:
+                return False
+        except OSError:
+            return False
+        return file_hash(output_path) == row['output_hash']
+
+    def queue(self, jobs: list):
+        """
+        登记待生成的任务（随下一个检查点提交）
+
+        参数:
+            jobs: [(任务键, 参数摘要, 输出路径, 任务参数)]
+        """
+        self.conn.executemany(
+            """INSERT INTO jobs (job_key, spec, spec_hash, output_path, status)
+               VALUES (?, ?, ?, ?, 'pending')
+               ON CONFLICT (job_key) DO UPDATE SET
+                   spec = excluded.spec, spec_hash = excluded.spec_hash,
+                   output_path = excluded.output_path, status = 'pending',
+                   output_hash = NULL, output_bytes = NULL""",
+            [(key, json.dumps(spec, ensure_ascii=False, default=str), job_hash, path)
+             for key, job_hash, path, spec in jobs])
+
+    def checkpoint(self, results: list):
+        """
+        写入一批任务的结果并提交
+
+        参数:
+            results: [(任务键, 输出摘要, 输出字节数, 开始时间, 耗时, 错误信息)]，
+                     成功时错误信息为 None，失败时输出摘要与字节数为 None
+        """
+        self.conn.executemany(
+            """UPDATE jobs SET status = ?, output_hash = ?, output_bytes = ?, started = ?,
+                   seconds = ?, error = ?, attempts = attempts + 1
+               WHERE job_key = ?""",
+            [(STATUS_FAILED if error else STATUS_DONE, output_hash, output_bytes, started, seconds,
+              error, key)
+             for key, output_hash, output_bytes, started, seconds, error in results])
+        failed = sum(1 for result in results if result[5])
+        self.conn.execute('INSERT INTO checkpoints (created, done, failed) VALUES (?, ?, ?)',
+                          (time.time(), len(results) - failed, failed))
+        self.conn.commit()
+
+    def status_counts(self) -> dict:
+        """
+        各状态的任务数
+
+        返回:
+            {状态: 任务数}
+        """
+        return dict(self.conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+    def slowest(self, limit: int = 10) -> list:
+        """
+        耗时最长的已完成任务
+
+        参数:
+            limit: 返回条数
+        返回:
+            [(任务键, 耗时, 输出路径)]
+        """
+        return [tuple(row) for row in self.conn.execute(
+            """SELECT job_key, seconds, output_path FROM jobs
+               WHERE status = 'done' AND seconds IS NOT NULL
+               ORDER BY seconds DESC LIMIT ?""", (limit,))]
+
+    def failure_reasons(self, limit: int = 10) -> list:
+        """
+        按失败原因分组的任务数
+
+        参数:
+            limit: 返回条数
+        返回:
+            [(失败原因, 任务数, 示例任务键)]，按任务数从多到少
+        """
+        return [tuple(row) for row in self.conn.execute(
+            """SELECT error, COUNT(*) AS n, MIN(job_key) FROM jobs
+               WHERE status = 'failed'
+               GROUP BY error ORDER BY n DESC LIMIT ?""", (limit,))]
+
+    def last_checkpoint(self) -> dict:
+        """
+        最近一次检查点
+
+        返回:
+            {'created', 'done', 'failed'}，尚无检查点时为 None
+        """
+        row = self.conn.execute(
+            'SELECT created, done, failed FROM checkpoints ORDER BY id DESC LIMIT 1').fetchone()
+        return dict(row) if row else None
+
+
+def main():
+    """命令行入口：python batch_index.py batch.sqlite"""
+    parser = argparse.ArgumentParser(description="查看批量生成任务索引的汇总")
+    parser.add_argument('index', help="索引文件路径")
+    parser.add_argument('-n', '--limit', type=int, default=10, help="排名条数")
+    args = parser.parse_args()
+
+    with BatchIndex(args.index) as index:
+        counts = index.status_counts()
+        print("任务状态：" + '，'.join(f"{status} {count}" for status, count in sorted(counts.items())))
+        checkpoint = index.last_checkpoint()
+        if checkpoint:
+            print(f"最近检查点：{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(checkpoint['created']))}")
+        slowest = index.slowest(args.limit)
+        if slowest:
+            print("\n耗时最长：")
+            for key, seconds, path in slowest:
+                print(f"  {seconds * 1000:8.1f} ms  #{key}  {path}")
+        failures = index.failure_reasons(args.limit)
+        if failures:
+            print("\n失败原因：")
+            for reason, count, example in failures:
+                print(f"  {count:6d}  {reason}（如 #{example}）")
+
+
+if __name__ == '__main__':
+    main()
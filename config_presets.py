@@ -86,6 +86,13 @@ AVAILABLE_FONTS = {
     ]
 }
 
+# 文字超出文本框时的处理方式
+TEXT_FIT_MODES = {
+    "none": "不处理",
+    "warn": "溢出提示",
+    "shrink": "自动缩小字号"
+}
+
 # 画布比例配置（单位：英寸）
 SLIDE_RATIOS = {
     "16:9": {
@@ -135,6 +142,18 @@ LAYOUT_TYPES = {
         "description": "多个KPI数字 + 描述说明",
         "default_count": 1
     },
+    "chart": {
+        "name": "图表页",
+        "description": "原生折线图/柱状图，大数据自动降采样",
+        "default_count": 1,
+        "default_enabled": False
+    },
+    "table": {
+        "name": "表格页",
+        "description": "表头 + 数据行，超出自动续页",
+        "default_count": 1,
+        "default_enabled": False
+    },
     "quote": {
         "name": "引用页",
         "description": "大号引言文字 + 作者",
@@ -160,6 +179,7 @@ DEFAULT_CONFIG = {
     "body_font": "Microsoft YaHei",
     "title_size": 32,
     "body_size": 18,
+    "text_fit": "none",
     "show_page_number": True,
     "footer_text": "公司名称 | 保密",
     "watermark_enabled": False,
@@ -173,6 +193,8 @@ DEFAULT_CONFIG = {
         "comparison": {"enabled": True, "count": 1},
         "timeline": {"enabled": True, "count": 1},
         "kpi": {"enabled": True, "count": 1},
+        "chart": {"enabled": False, "count": 1},
+        "table": {"enabled": False, "count": 1},
         "quote": {"enabled": True, "count": 1},
         "thankyou": {"enabled": True, "count": 1}
     }
@@ -0,0 +1,457 @@
+# -*- coding: utf-8 -*-
+"""
+PPT等价性比较模块
+验证生成路径的优化（克隆、直接输出XML、流式写出等）没有改变结果：
+两个 .pptx 文件包逐部件规范化后比较，忽略不影响内容的差异——关系ID的编号、形状ID的编号
+（及据此自动生成的形状名）、幻灯片/母版列表ID、创建ID、文档时间戳、媒体文件的命名与
+XML 的属性顺序和命名空间写法，报告多出、缺少的部件与每个不同部件的具体差异位置。
+ZIP 目录中 CRC 与大小都一致的部件不解压直接判为相同，目录批量比较使用多进程
+"""
+
+import os
+import time
+import hashlib
+import zipfile
+import argparse
+import posixpath
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+
+from lxml import etree
+
+from package_io import NS_RELS, rels_name
+
+
+NS_P = 'http://schemas.openxmlformats.org/presentationml/2006/main'
+NS_A = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+NS_R = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+NS_P14 = 'http://schemas.microsoft.com/office/powerpoint/2010/main'
+NS_A16 = 'http://schemas.microsoft.com/office/drawing/2014/main'
+NS_DCTERMS = 'http://purl.org/dc/terms/'
+NS_CP = 'http://schemas.openxmlformats.org/package/2006/metadata/core-properties'
+
+# 编号本身没有含义的属性：{元素: (属性,)}
+DROP_ELEMENTS = {
+    f'{{{NS_P}}}sldId': ('id',),
+    f'{{{NS_P}}}sldMasterId': ('id',),
+    f'{{{NS_P}}}sldLayoutId': ('id',),
+    f'{{{NS_P14}}}creationId': ('val',),
+    f'{{{NS_A16}}}creationId': ('id',),
+}
+# 只比较是否存在、不比较取值的时间戳元素
+DROP_TEXT = (
+    f'{{{NS_DCTERMS}}}created',
+    f'{{{NS_DCTERMS}}}modified',
+    f'{{{NS_CP}}}lastPrinted',
+)
+C_NV_PR = f'{{{NS_P}}}cNvPr'
+# 引用形状ID的属性：{元素: 属性}，与 cNvPr/@id 一起按出现顺序重新编号
+SHAPE_ID_REFS = {
+    f'{{{NS_A}}}stCxn': 'id',
+    f'{{{NS_A}}}endCxn': 'id',
+    f'{{{NS_P}}}spTgt': 'spid',
+}
+# 按内容而不是文件名识别的部件目录
+CONTENT_NAMED_DIRS = ('ppt/media/', 'ppt/embeddings/')
+
+CONTENT_TYPES = '[Content_Types].xml'
+
+# 每个部件最多报告的差异条数
+DEFAULT_MAX_DIFFS = 20
+# 差异报告中文本的最大显示长度
+SHOW_CHARS = 60
+
+_PARSER = etree.XMLParser(resolve_entities=False, remove_blank_text=False, huge_tree=True)
+# 所有关系命名空间中的属性（r:id、r:embed 等）
+_R_ATTRS = etree.XPath('//@r:*', namespaces={'r': NS_R})
+
+
+def _short(value) -> str:
+    text = repr(value)
+    return text if len(text) <= SHOW_CHARS else text[:SHOW_CHARS - 4] + '...' + text[-1]
+
+
+class _Package:
+    """读取中的 .pptx 文件包：条目信息与规范部件名"""
+
+    __slots__ = ('zip', 'infos', 'canonical', 'renamed')
+
+    def __init__(self, source):
+        """
+        参数:
+            source: 文件路径或字节数据
+        """
+        self.zip = zipfile.ZipFile(BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+        self.infos = {info.filename: info for info in self.zip.infolist() if not info.is_dir()}
+        # 媒体等部件以 CRC 与大小命名，重新编号的图片仍能对应上
+        self.renamed = {}
+        for name, info in self.infos.items():
+            if name.startswith(CONTENT_NAMED_DIRS):
+                ext = posixpath.splitext(name)[1]
+                self.renamed[name] = f"{posixpath.dirname(name)}/{info.CRC:08x}-{info.file_size}{ext}"
+        self.canonical = {name: self.renamed.get(name, name) for name in self.infos}
+
+    def close(self):
+        self.zip.close()
+
+    def fingerprint(self, name: str) -> tuple:
+        """条目的 (CRC, 大小)，不存在时为 None"""
+        info = self.infos.get(name)
+        return (info.CRC, info.file_size) if info is not None else None
+
+    def canonical_name(self, name: str) -> str:
+        return self.canonical.get(name, name)
+
+    def rel_targets(self, partname: str) -> dict:
+        """
+        部件的关系ID → 规范目标
+
+        参数:
+            partname: 部件名
+        返回:
+            {关系ID: '关系类型|规范目标部件名'}（外部链接为 '关系类型|External|地址'）
+        """
+        name = rels_name(partname)
+        if name not in self.infos:
+            return {}
+        targets = {}
+        for rel in etree.fromstring(self.zip.read(name), _PARSER).iter(f'{{{NS_RELS}}}Relationship'):
+            targets[rel.get('Id')] = self._rel_target(posixpath.dirname(partname), rel)
+        return targets
+
+    def _rel_target(self, directory: str, rel) -> str:
+        rel_type = rel.get('Type', '').rsplit('/', 1)[-1]
+        target = rel.get('Target', '')
+        if rel.get('TargetMode') == 'External':
+            return f"{rel_type}|External|{target}"
+        target = target[1:] if target.startswith('/') else posixpath.normpath(posixpath.join(directory, target))
+        return f"{rel_type}|{self.canonical_name(target)}"
+
+    def canonical_part(self, name: str) -> bytes:
+        """
+        部件的规范形式：XML 部件为规范化后的 C14N 字节，其他部件为原始字节
+
+        参数:
+            name: 条目名
+        返回:
+            规范字节
+        """
+        data = self.zip.read(name)
+        if not (name.endswith('.xml') or name.endswith('.rels')):
+            return data
+        root = etree.fromstring(data, _PARSER)
+        if name.endswith('.rels'):
+            self._canonical_rels(name, root)
+        elif name == CONTENT_TYPES:
+            self._canonical_content_types(root)
+        else:
+            self._canonical_xml(root, self.rel_targets(name))
+        return etree.tostring(root, method='c14n')
+
+    def _canonical_rels(self, name: str, root):
+        """关系文件：去掉关系ID，按 (类型, 目标) 排序"""
+        # ppt/slides/_rels/slide1.xml.rels 的源部件目录为 ppt/slides
+        source_dir = posixpath.dirname(posixpath.dirname(name))
+        rels = list(root)
+        for rel in rels:
+            target = self._rel_target(source_dir, rel)
+            rel.attrib.clear()
+            rel.set('Target', target)
+            root.remove(rel)
+        for rel in sorted(rels, key=lambda rel: rel.get('Target')):
+            root.append(rel)
+
+    def _canonical_content_types(self, root):
+        """内容类型：部件名换为规范名，按元素与名称排序"""
+        entries = list(root)
+        for entry in entries:
+            partname = entry.get('PartName')
+            if partname:
+                entry.set('PartName', '/' + self.canonical_name(partname.lstrip('/')))
+            root.remove(entry)
+        for entry in sorted(entries, key=lambda e: (e.tag, e.get('Extension') or e.get('PartName') or '')):
+            root.append(entry)
+
+    @staticmethod
+    def _canonical_xml(root, rel_targets: dict):
+        """普通 XML 部件：关系ID换为目标，形状ID按出现顺序编号，去掉编号与时间戳（只访问需要改写的节点）"""
+        for value in _R_ATTRS(root):
+            value.getparent().set(value.attrname, rel_targets.get(str(value), f"?{value}"))
+        for element in root.iter(*DROP_ELEMENTS):
+            for attr in DROP_ELEMENTS[element.tag]:
+                element.attrib.pop(attr, None)
+        for element in root.iter(*DROP_TEXT):
+            element.text = None
+
+        shape_ids = {}
+        shapes = list(root.iter(C_NV_PR))
+        for element in shapes:
+            # 重复的ID映射为首次出现的序号，重复本身仍会表现为差异
+            shape_ids.setdefault(element.get('id'), str(len(shape_ids) + 1))
+        for element in shapes:
+            old_id = element.get('id')
+            new_id = shape_ids[old_id]
+            element.set('id', new_id)
+            # python-pptx 自动生成的形状名为“类型 ID-1”，随ID一起重新编号
+            prefix, _, number = element.get('name', '').rpartition(' ')
+            if prefix and old_id and old_id.isdigit() and number == str(int(old_id) - 1):
+                element.set('name', f"{prefix} {int(new_id) - 1}")
+        for element in root.iter(*SHAPE_ID_REFS):
+            attr = SHAPE_ID_REFS[element.tag]
+            if element.get(attr) in shape_ids:
+                element.set(attr, shape_ids[element.get(attr)])
+
+
+def _skip_unchanged(a: _Package, b: _Package, name_a: str, name_b: str) -> bool:
+    """原始条目与关系文件的 CRC 和大小都一致时，不必解压比较"""
+    if a.fingerprint(name_a) != b.fingerprint(name_b):
+        return False
+    # 关系与内容类型中的媒体部件名换成规范名后才可比较，两边的媒体命名一致时原始字节相同即可
+    if a.renamed != b.renamed:
+        if name_a.endswith('.rels') or name_a == CONTENT_TYPES:
+            return False
+        if rels_name(name_a) in a.infos:
+            return False
+    return a.fingerprint(rels_name(name_a)) == b.fingerprint(rels_name(name_b))
+
+
+def _path(element) -> str:
+    """元素在规范树中的位置，如 /p:sld/p:cSld/p:spTree/p:sp[2]/p:txBody"""
+    return element.getroottree().getpath(element)
+
+
+def diff_xml(canonical_a: bytes, canonical_b: bytes, max_diffs: int = DEFAULT_MAX_DIFFS) -> list:
+    """
+    两个规范 XML 的具体差异
+
+    参数:
+        canonical_a: 规范字节（旧）
+        canonical_b: 规范字节（新）
+        max_diffs: 最多报告的条数
+    返回:
+        差异描述列表，如 '/p:sld/.../a:off @x: '0' → '137160''
+    """
+    diffs = []
+    stack = [(etree.fromstring(canonical_a, _PARSER), etree.fromstring(canonical_b, _PARSER))]
+    while stack and len(diffs) < max_diffs:
+        a, b = stack.pop()
+        if a.tag != b.tag:
+            diffs.append(f"{_path(a)}: 元素 {etree.QName(a).localname} → {etree.QName(b).localname}")
+            continue
+        for attr in sorted(set(a.attrib) | set(b.attrib)):
+            if a.get(attr) != b.get(attr):
+                diffs.append(f"{_path(a)} @{etree.QName(attr).localname}: "
+                             f"{_short(a.get(attr))} → {_short(b.get(attr))}")
+        if (a.text or '') != (b.text or ''):
+            diffs.append(f"{_path(a)} 文本: {_short(a.text)} → {_short(b.text)}")
+        children_a, children_b = list(a), list(b)
+        if len(children_a) != len(children_b):
+            extra = children_b[len(children_a):] or children_a[len(children_b):]
+            diffs.append(f"{_path(a)} 子元素数: {len(children_a)} → {len(children_b)}"
+                         f"（{'新增' if len(children_b) > len(children_a) else '缺少'} "
+                         f"{etree.QName(extra[0]).localname} 等）")
+        # 逆序入栈，按文档顺序报告
+        stack.extend(reversed(list(zip(children_a, children_b))))
+    return diffs[:max_diffs]
+
+
+class DeckDiff:
+    """两个PPT的比较结果"""
+
+    __slots__ = ('only_a', 'only_b', 'changed', 'compared', 'skipped')
+
+    def __init__(self):
+        self.only_a = []
+        self.only_b = []
+        # {规范部件名: [差异描述]}
+        self.changed = {}
+        # 解压比较的部件数与凭 CRC 直接判为相同的部件数
+        self.compared = 0
+        self.skipped = 0
+
+    @property
+    def equal(self) -> bool:
+        """两个PPT是否等价"""
+        return not (self.only_a or self.only_b or self.changed)
+
+    def lines(self) -> list:
+        """
+        可读的差异报告
+
+        返回:
+            文本行列表，等价时为空
+        """
+        lines = [f"- 缺少部件 {name}" for name in self.only_a]
+        lines += [f"+ 多出部件 {name}" for name in self.only_b]
+        for name, diffs in self.changed.items():
+            lines.append(f"* {name}")
+            lines += [f"    {diff}" for diff in diffs]
+        return lines
+
+
+def compare_decks(a, b, max_diffs: int = DEFAULT_MAX_DIFFS) -> DeckDiff:
+    """
+    比较两个PPT是否等价
+
+    参数:
+        a: 旧PPT（文件路径或字节数据）
+        b: 新PPT（文件路径或字节数据）
+        max_diffs: 每个部件最多报告的差异条数
+    返回:
+        DeckDiff对象
+    """
+    package_a, package_b = _Package(a), _Package(b)
+    result = DeckDiff()
+    try:
+        names_a = {package_a.canonical_name(name): name for name in package_a.infos}
+        names_b = {package_b.canonical_name(name): name for name in package_b.infos}
+        result.only_a = sorted(set(names_a) - set(names_b))
+        result.only_b = sorted(set(names_b) - set(names_a))
+        for canonical in sorted(set(names_a) & set(names_b)):
+            name_a, name_b = names_a[canonical], names_b[canonical]
+            if _skip_unchanged(package_a, package_b, name_a, name_b):
+                result.skipped += 1
+                continue
+            result.compared += 1
+            part_a = package_a.canonical_part(name_a)
+            part_b = package_b.canonical_part(name_b)
+            if part_a == part_b:
+                continue
+            if canonical.endswith('.xml') or canonical.endswith('.rels'):
+                result.changed[canonical] = diff_xml(part_a, part_b, max_diffs)
+            else:
+                result.changed[canonical] = [f"内容不同（{len(part_a):,} → {len(part_b):,} 字节）"]
+    finally:
+        package_a.close()
+        package_b.close()
+    return result
+
+
+def part_digests(source) -> dict:
+    """
+    每个部件规范形式的摘要（可保存下来，之后与新结果逐部件比对）
+
+    参数:
+        source: 文件路径或字节数据
+    返回:
+        {规范部件名: SHA256 十六进制摘要}
+    """
+    package = _Package(source)
+    try:
+        return {package.canonical_name(name): hashlib.sha256(package.canonical_part(name)).hexdigest()
+                for name in sorted(package.infos)}
+    finally:
+        package.close()
+
+
+def deck_digest(source) -> str:
+    """
+    整个PPT规范形式的摘要：等价的PPT摘要相同
+
+    参数:
+        source: 文件路径或字节数据
+    返回:
+        SHA256 十六进制摘要
+    """
+    digest = hashlib.sha256()
+    for name, part in sorted(part_digests(source).items()):
+        digest.update(f"{name}\0{part}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _compare_task(task: tuple) -> tuple:
+    """子进程任务：比较一对文件，返回 (相对路径, DeckDiff, 错误信息)"""
+    relpath, path_a, path_b, max_diffs = task
+    try:
+        return relpath, compare_decks(path_a, path_b, max_diffs), None
+    except Exception as e:
+        return relpath, None, f"{type(e).__name__}: {e}"
+
+
+def _deck_files(directory: str) -> set:
+    files = set()
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.endswith('.pptx'):
+                files.add(os.path.relpath(os.path.join(root, name), directory))
+    return files
+
+
+def compare_dirs(dir_a: str, dir_b: str, workers: int = None, max_diffs: int = DEFAULT_MAX_DIFFS) -> dict:
+    """
+    并行比较两个目录中相同相对路径的PPT（如优化前后对同一组配置的生成结果）
+
+    参数:
+        dir_a: 旧结果目录
+        dir_b: 新结果目录
+        workers: 子进程数量（可选，默认为CPU核数）
+        max_diffs: 每个部件最多报告的差异条数
+    返回:
+        统计信息字典：files, equal, different {相对路径: DeckDiff}, failed [(相对路径, 错误)],
+        only_a, only_b（只在一侧存在的文件）, seconds, files_per_second
+    """
+    workers = workers or os.cpu_count() or 1
+    files_a, files_b = _deck_files(dir_a), _deck_files(dir_b)
+    tasks = [(relpath, os.path.join(dir_a, relpath), os.path.join(dir_b, relpath), max_diffs)
+             for relpath in sorted(files_a & files_b)]
+
+    start = time.perf_counter()
+    if workers <= 1:
+        results = [_compare_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_compare_task, tasks, chunksize=max(1, len(tasks) // (workers * 8))))
+    seconds = time.perf_counter() - start
+
+    return {
+        'files': len(tasks),
+        'equal': sum(1 for _, diff, error in results if diff is not None and diff.equal),
+        'different': {relpath: diff for relpath, diff, _ in results if diff is not None and not diff.equal},
+        'failed': [(relpath, error) for relpath, _, error in results if error],
+        'only_a': sorted(files_a - files_b),
+        'only_b': sorted(files_b - files_a),
+        'seconds': seconds,
+        'files_per_second': len(tasks) / seconds if seconds > 0 else 0.0,
+    }
+
+
+def main():
+    """命令行入口：python deck_diff.py old.pptx new.pptx 或 python deck_diff.py out_old/ out_new/"""
+    parser = argparse.ArgumentParser(description="规范化比较两个PPT（或两个目录中的同名PPT）是否等价")
+    parser.add_argument('old', help="旧PPT文件或目录")
+    parser.add_argument('new', help="新PPT文件或目录")
+    parser.add_argument('-n', '--max-diffs', type=int, default=DEFAULT_MAX_DIFFS, help="每个部件最多报告的差异条数")
+    parser.add_argument('--workers', type=int, default=None, help="子进程数量（目录比较）")
+    parser.add_argument('--digest', action='store_true', help="输出每个部件的规范摘要（单个文件）")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.old):
+        stats = compare_dirs(args.old, args.new, args.workers, args.max_diffs)
+        for relpath, diff in stats['different'].items():
+            print(f"✗ {relpath}")
+            for line in diff.lines():
+                print(f"  {line}")
+        for relpath, error in stats['failed']:
+            print(f"失败: {relpath}: {error}")
+        for relpath in stats['only_a']:
+            print(f"只在旧目录中: {relpath}")
+        for relpath in stats['only_b']:
+            print(f"只在新目录中: {relpath}")
+        print(f"比较 {stats['files']} 个文件，等价 {stats['equal']} 个，不同 {len(stats['different'])} 个，"
+              f"耗时 {stats['seconds']:.2f} 秒（{stats['files_per_second']:.1f} 个/秒）")
+        equal = not (stats['different'] or stats['failed'] or stats['only_a'] or stats['only_b'])
+    else:
+        if args.digest:
+            for name, digest in part_digests(args.new).items():
+                print(f"{digest[:16]}  {name}")
+        diff = compare_decks(args.old, args.new, args.max_diffs)
+        for line in diff.lines():
+            print(line)
+        print(f"{'等价' if diff.equal else '不等价'}（解压比较 {diff.compared} 个部件，"
+              f"CRC 一致直接跳过 {diff.skipped} 个）")
+        equal = diff.equal
+    raise SystemExit(0 if equal else 1)
+
+
+if __name__ == '__main__':
+    main()
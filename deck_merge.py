@@ -0,0 +1,444 @@
+# -*- coding: utf-8 -*-
+"""
+PPT合并模块
+将多个 .pptx 文件的幻灯片按顺序追加到第一个文件之后，合并为一份PPT。
+以ZIP条目为单位流式处理：幻灯片与媒体直接复制压缩数据，只改写关系文件；
+内容相同的媒体只保留一份，相同的母版与版式直接复用，
+逐个读取源文件，内存占用不随文件数量增长
+"""
+
+import io
+import os
+import re
+import time
+import hashlib
+import zipfile
+import argparse
+import posixpath
+
+from lxml import etree
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+
+from metrics import OUTPUT_BYTES, track_build
+from package_io import NS_RELS, ZipStreamWriter, read_rels, rels_name, serialize_xml
+
+
+NS_P = 'http://schemas.openxmlformats.org/presentationml/2006/main'
+NS_R = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+NS_CT = 'http://schemas.openxmlformats.org/package/2006/content-types'
+
+# 幻灯片ID从256开始，母版与版式ID共用 2^31 起的编号空间
+MIN_SLIDE_ID = 256
+MIN_MASTER_ID = 2147483648
+
+# 主文档中 sldIdLst 之前的元素（新建 sldIdLst 时插在它们之后）
+PRESENTATION_HEAD = ('sldMasterIdLst', 'notesMasterIdLst', 'handoutMasterIdLst')
+
+# 计算内容摘要时每次读取的字节数
+HASH_CHUNK_SIZE = 1 << 20
+
+# 部件名中的序号，如 ppt/slides/slide12.xml → ('ppt/slides/slide', '12', '.xml')
+PARTNAME_PATTERN = re.compile(r'^(.*?)(\d*)(\.[^./]+)$')
+
+SLIDES_PATTERN = re.compile(rb'<Slides>\d+</Slides>')
+
+
+class _Source:
+    """合并中的一份源文件包"""
+
+    def __init__(self, fp):
+        """
+        参数:
+            fp: 源文件的二进制文件对象（可定位）
+        """
+        self.fp = fp
+        self.package = zipfile.ZipFile(fp)
+        self.names = set(self.package.namelist())
+        # 源部件名 → 输出部件名（None 表示丢弃该关系）
+        self.imported = {}
+        self._digests = {}
+
+        content_types = etree.fromstring(self.package.read('[Content_Types].xml'))
+        self.defaults = {el.get('Extension').lower(): el.get('ContentType')
+                         for el in content_types.iter(f'{{{NS_CT}}}Default')}
+        self.overrides = {el.get('PartName').lstrip('/'): el.get('ContentType')
+                          for el in content_types.iter(f'{{{NS_CT}}}Override')}
+
+        _, root_rels = self.rels('')
+        self.main = next(target for _, reltype, target in root_rels if reltype == RT.OFFICE_DOCUMENT)
+
+    def content_type(self, partname: str) -> str:
+        """部件的内容类型"""
+        ext = posixpath.splitext(partname)[1][1:].lower()
+        return self.overrides.get(partname) or self.defaults.get(ext)
+
+    def rels(self, partname: str) -> tuple:
+        """读取部件的关系，参见 package_io.read_rels"""
+        return read_rels(self.package, self.names, partname)
+
+    def digest(self, partname: str) -> bytes:
+        """
+        部件内容摘要：部件数据加上所引用部件的摘要
+
+        母版引用的版式不计入（版式又引用母版），因此母版摘要只取决于母版自身、
+        主题与媒体，版式摘要包含所属母版的摘要。
+
+        参数:
+            partname: 部件名
+        返回:
+            SHA-1 摘要
+        """
+        cached = self._digests.get(partname)
+        if cached is not None:
+            return cached
+        # 先占位，出现循环引用时不再展开
+        self._digests[partname] = b''
+        digest = hashlib.sha1(posixpath.splitext(partname)[1].lower().encode('ascii'))
+        with self.package.open(partname) as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        _, rels = self.rels(partname)
+        for rel, reltype, target in sorted(rels, key=lambda r: r[0].get('Id')):
+            if reltype in (RT.SLIDE_LAYOUT, RT.SLIDE) or target not in self.names:
+                continue
+            digest.update(f"{rel.get('Id')}|{reltype}|".encode('utf-8'))
+            digest.update(self.digest(target))
+        self._digests[partname] = digest.digest()
+        return self._digests[partname]
+
+    def close(self):
+        self.package.close()
+
+
+class DeckMerger:
+    """
+    PPT合并器：第一个文件作为基准（保留其画布、母版与属性），
+    其后文件的幻灯片依次追加
+
+    用法:
+        with open('merged.pptx', 'wb') as f:
+            merger = DeckMerger(f)
+            for path in paths:
+                merger.append(path)
+            merger.close()
+    """
+
+    def __init__(self, output_fp):
+        """
+        参数:
+            output_fp: 可写的二进制文件对象
+        """
+        self.writer = ZipStreamWriter(output_fp)
+        self.stats = {'decks': 0, 'slides': 0, 'media_reused': 0, 'layouts_reused': 0,
+                      'masters_added': 0}
+        self._used = set()
+        self._counters = {}
+        self._content_types = {}
+        self._defaults = {}
+        self._media = {}
+        self._layouts = {}
+        self._masters = {}
+        self._main = None
+        self._presentation = None
+        self._pres_rels = None
+        self._app = None
+        self._notes_master = None
+        self._next_slide_id = MIN_SLIDE_ID
+        self._next_master_id = MIN_MASTER_ID
+        self._next_rid = 1
+
+    # ---------- 输出部件登记 ----------
+
+    def _register(self, partname: str, content_type: str):
+        self._used.add(partname)
+        if content_type:
+            self._content_types[partname] = content_type
+
+    def _new_partname(self, partname: str) -> str:
+        """按源部件名的命名方式分配未使用的输出部件名（序号递增）"""
+        prefix, _, ext = PARTNAME_PATTERN.match(partname).groups()
+        n = self._counters.get((prefix, ext), 1)
+        while f"{prefix}{n}{ext}" in self._used:
+            n += 1
+        self._counters[(prefix, ext)] = n + 1
+        return f"{prefix}{n}{ext}"
+
+    def _add_presentation_rel(self, reltype: str, partname: str) -> str:
+        """在主文档关系中添加一条关系，返回关系ID"""
+        rid = f"rId{self._next_rid}"
+        self._next_rid += 1
+        etree.SubElement(self._pres_rels, f'{{{NS_RELS}}}Relationship',
+                         Id=rid, Type=reltype,
+                         Target=posixpath.relpath(partname, posixpath.dirname(self._main)))
+        return rid
+
+    def _list(self, tag: str):
+        """主文档中的ID列表元素，不存在时按规定位置新建"""
+        element = self._presentation.find(f'{{{NS_P}}}{tag}')
+        if element is None:
+            element = etree.Element(f'{{{NS_P}}}{tag}')
+            head = [child for child in self._presentation
+                    if etree.QName(child).localname in PRESENTATION_HEAD]
+            if head:
+                head[-1].addnext(element)
+            else:
+                self._presentation.insert(0, element)
+        return element
+
+    # ---------- 基准文件 ----------
+
+    def _add_base(self, src: _Source):
+        """基准文件：除主文档、内容类型与文档属性外原样复制，并建立复用索引"""
+        self._main = src.main
+        self._presentation = etree.fromstring(src.package.read(src.main))
+        self._pres_rels, pres_rels = src.rels(src.main)
+        app = next((target for _, reltype, target in src.rels('')[1]
+                    if reltype == RT.EXTENDED_PROPERTIES), None)
+        deferred = {'[Content_Types].xml', src.main, rels_name(src.main), app}
+        self._defaults.update(src.defaults)
+
+        for info in src.package.infolist():
+            name = info.filename
+            if name in deferred:
+                continue
+            self.writer.copy_raw(src.fp, info)
+            self._register(name, src.content_type(name))
+            if not name.endswith(('.xml', '.rels')):
+                self._media.setdefault(src.digest(name), name)
+        if app in src.names:
+            self._app = (app, src.package.read(app))
+            self._register(app, src.content_type(app))
+        self._register(src.main, src.content_type(src.main))
+
+        # 母版与版式索引，以及已占用的ID
+        ids = []
+        for rel, reltype, target in pres_rels:
+            if reltype == RT.SLIDE_MASTER:
+                self._masters[src.digest(target)] = target
+                master = etree.fromstring(src.package.read(target))
+                ids.extend(int(el.get('id')) for el in master.iter(f'{{{NS_P}}}sldLayoutId'))
+                for _, layout_type, layout in src.rels(target)[1]:
+                    if layout_type == RT.SLIDE_LAYOUT:
+                        self._layouts.setdefault(src.digest(layout), layout)
+            elif reltype == RT.NOTES_MASTER:
+                self._notes_master = target
+        ids.extend(int(el.get('id')) for el in self._presentation.iter(f'{{{NS_P}}}sldMasterId'))
+        self._next_master_id = max(ids + [MIN_MASTER_ID - 1]) + 1
+        slide_ids = [int(el.get('id')) for el in self._presentation.iter(f'{{{NS_P}}}sldId')]
+        self._next_slide_id = max(slide_ids + [MIN_SLIDE_ID - 1]) + 1
+        rids = [int(rel.get('Id')[3:]) for rel in self._pres_rels
+                if (rel.get('Id') or '').startswith('rId') and rel.get('Id')[3:].isdigit()]
+        self._next_rid = max(rids + [0]) + 1
+        self.stats['slides'] += len(slide_ids)
+
+    # ---------- 追加文件 ----------
+
+    def _append_slides(self, src: _Source):
+        """按源文件的幻灯片顺序导入幻灯片"""
+        presentation = etree.fromstring(src.package.read(src.main))
+        targets = {rel.get('Id'): target for rel, _, target in src.rels(src.main)[1]}
+        sld_id_lst = self._list('sldIdLst')
+        for sld_id in presentation.iter(f'{{{NS_P}}}sldId'):
+            target = targets.get(sld_id.get(f'{{{NS_R}}}id'))
+            partname = self._import(src, target, RT.SLIDE)
+            if partname is None:
+                continue
+            etree.SubElement(sld_id_lst, f'{{{NS_P}}}sldId', id=str(self._next_slide_id)).set(
+                f'{{{NS_R}}}id', self._add_presentation_rel(RT.SLIDE, partname))
+            self._next_slide_id += 1
+            self.stats['slides'] += 1
+
+    def _import(self, src: _Source, partname: str, reltype: str) -> str:
+        """
+        导入源文件中的部件及其引用的部件
+
+        参数:
+            src: 源文件
+            partname: 源部件名
+            reltype: 引用该部件的关系类型
+        返回:
+            输出部件名，None 表示丢弃该关系
+        """
+        if partname in src.imported:
+            return src.imported[partname]
+        if partname not in src.names:
+            return None
+
+        if reltype == RT.SLIDE_LAYOUT:
+            existing = self._layouts.get(src.digest(partname))
+            if existing is None:
+                master = next(target for _, t, target in src.rels(partname)[1] if t == RT.SLIDE_MASTER)
+                self._import_master(src, master)
+                return src.imported[partname]
+            self.stats['layouts_reused'] += 1
+        elif reltype == RT.SLIDE_MASTER:
+            existing = self._masters.get(src.digest(partname))
+            if existing is None:
+                return self._import_master(src, partname)
+        elif reltype == RT.NOTES_MASTER:
+            existing = self._notes_master
+        elif reltype == RT.NOTES_SLIDE and self._notes_master is None:
+            # 基准文件没有备注母版时不保留备注
+            existing = None
+        elif not partname.endswith('.xml'):
+            existing = self._media.get(src.digest(partname))
+            if existing is None:
+                existing = self._new_partname(partname)
+                self.writer.copy_raw(src.fp, src.package.getinfo(partname), existing)
+                self._register(existing, src.content_type(partname))
+                self._media[src.digest(partname)] = existing
+            else:
+                self.stats['media_reused'] += 1
+        else:
+            return self._copy_part(src, partname)
+        src.imported[partname] = existing
+        return existing
+
+    def _rewrite_rels(self, src: _Source, partname: str, new_partname: str, skip: str = None):
+        """导入部件引用的部件，并写出改写目标后的关系文件"""
+        root, rels = src.rels(partname)
+        if root is None:
+            return
+        for rel, reltype, target in rels:
+            if reltype == skip:
+                continue
+            new_target = self._import(src, target, reltype)
+            if new_target is None:
+                root.remove(rel)
+            else:
+                rel.set('Target', posixpath.relpath(new_target, posixpath.dirname(new_partname)))
+        self.writer.write(rels_name(new_partname), serialize_xml(root))
+
+    def _copy_part(self, src: _Source, partname: str) -> str:
+        """以新部件名复制XML部件（内容不变，只改写关系）"""
+        new_partname = self._new_partname(partname)
+        src.imported[partname] = new_partname
+        self._register(new_partname, src.content_type(partname))
+        self._rewrite_rels(src, partname, new_partname)
+        self.writer.copy_raw(src.fp, src.package.getinfo(partname), new_partname)
+        return new_partname
+
+    def _import_master(self, src: _Source, partname: str) -> str:
+        """导入母版及其全部版式与主题，母版与版式重新编号"""
+        new_partname = self._new_partname(partname)
+        src.imported[partname] = new_partname
+        self._register(new_partname, src.content_type(partname))
+
+        master = etree.fromstring(src.package.read(partname))
+        for layout_id in master.iter(f'{{{NS_P}}}sldLayoutId'):
+            layout_id.set('id', str(self._next_master_id))
+            self._next_master_id += 1
+        layouts = [target for _, reltype, target in src.rels(partname)[1] if reltype == RT.SLIDE_LAYOUT]
+        for layout in layouts:
+            if layout not in src.imported:
+                self._copy_part(src, layout)
+            self._layouts.setdefault(src.digest(layout), src.imported[layout])
+        self._rewrite_rels(src, partname, new_partname)
+        self.writer.write(new_partname, serialize_xml(master))
+        self._masters[src.digest(partname)] = new_partname
+
+        etree.SubElement(self._list('sldMasterIdLst'), f'{{{NS_P}}}sldMasterId',
+                         id=str(self._next_master_id)).set(
+            f'{{{NS_R}}}id', self._add_presentation_rel(RT.SLIDE_MASTER, new_partname))
+        self._next_master_id += 1
+        self.stats['masters_added'] += 1
+        return new_partname
+
+    # ---------- 对外接口 ----------
+
+    def append(self, source):
+        """
+        追加一份PPT（第一份作为基准）
+
+        参数:
+            source: 文件路径、字节数据或可定位的二进制文件对象
+        """
+        if isinstance(source, (str, os.PathLike)):
+            fp = open(source, 'rb')
+        elif isinstance(source, (bytes, bytearray)):
+            fp = io.BytesIO(source)
+        else:
+            fp = source
+        try:
+            src = _Source(fp)
+            try:
+                if self._presentation is None:
+                    self._add_base(src)
+                else:
+                    self._append_slides(src)
+            finally:
+                src.close()
+        finally:
+            if fp is not source:
+                fp.close()
+        self.stats['decks'] += 1
+
+    def close(self):
+        """写出主文档、文档属性与内容类型，完成文件"""
+        if self._presentation is None:
+            raise ValueError("没有需要合并的PPT")
+        self.writer.write(self._main, serialize_xml(self._presentation))
+        self.writer.write(rels_name(self._main), serialize_xml(self._pres_rels))
+        if self._app is not None:
+            # 文档属性中的幻灯片数量
+            app_name, app_xml = self._app
+            self.writer.write(app_name, SLIDES_PATTERN.sub(
+                f"<Slides>{self.stats['slides']}</Slides>".encode('ascii'), app_xml))
+
+        types = etree.Element(f'{{{NS_CT}}}Types', nsmap={None: NS_CT})
+        for ext, content_type in self._defaults.items():
+            etree.SubElement(types, f'{{{NS_CT}}}Default', Extension=ext, ContentType=content_type)
+        for partname in sorted(self._content_types):
+            content_type = self._content_types[partname]
+            ext = posixpath.splitext(partname)[1][1:].lower()
+            if self._defaults.get(ext) != content_type:
+                etree.SubElement(types, f'{{{NS_CT}}}Override',
+                                 PartName=f'/{partname}', ContentType=content_type)
+        self.writer.write('[Content_Types].xml', serialize_xml(types))
+        self.writer.close()
+
+
+def merge_presentations(sources: list, output=None):
+    """
+    合并多份PPT：第一份作为基准，其后各份的幻灯片依次追加
+
+    参数:
+        sources: PPT列表，元素为文件路径、字节数据或二进制文件对象
+        output: 输出文件路径或可写的二进制文件对象（可选）
+    返回:
+        未指定输出时为包含合并结果的BytesIO对象，否则为合并统计信息字典
+    """
+    buffer = io.BytesIO() if output is None else None
+    fp = buffer or (open(output, 'wb') if isinstance(output, (str, os.PathLike)) else output)
+    try:
+        with track_build('deck_merge'):
+            merger = DeckMerger(fp)
+            for source in sources:
+                merger.append(source)
+            merger.close()
+        OUTPUT_BYTES.observe(fp.tell(), kind='presentation')
+    finally:
+        if fp is not buffer and fp is not output:
+            fp.close()
+    if buffer is not None:
+        buffer.seek(0)
+        return buffer
+    return merger.stats
+
+
+def main():
+    """命令行入口：python deck_merge.py a.pptx b.pptx ... -o merged.pptx"""
+    parser = argparse.ArgumentParser(description="合并多个PPT（媒体去重、相同母版与版式复用）")
+    parser.add_argument('sources', nargs='+', help="PPT文件，第一个作为基准")
+    parser.add_argument('-o', '--output', required=True, help="输出文件路径")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = merge_presentations(args.sources, args.output)
+    print(f"合并 {stats['decks']} 个文件，共 {stats['slides']} 页；复用媒体 {stats['media_reused']} 个、"
+          f"版式 {stats['layouts_reused']} 次，新增母版 {stats['masters_added']} 个；"
+          f"耗时 {time.perf_counter() - start:.2f} 秒，输出 {os.path.getsize(args.output) / 1024:.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
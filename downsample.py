@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+数据降采样模块
+在写入图表XML与内嵌工作簿之前，用NumPy向量化算法压缩大规模数值序列，
+使图表的文件大小与生成时间有上界，同时保留曲线形状
+"""
+
+import csv
+from array import array
+
+import numpy as np
+
+
+# 图表默认最多保留的数据点数
+DEFAULT_MAX_POINTS = 1000
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax', 'mean')
+
+
+def _bucket_bounds(n: int, n_buckets: int) -> np.ndarray:
+    """
+    将 [0, n) 均匀切分为若干桶
+
+    参数:
+        n: 数据点数
+        n_buckets: 桶数
+    返回:
+        长度为 n_buckets + 1 的边界下标数组
+    """
+    return np.linspace(0, n, n_buckets + 1).astype(np.int64)
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    最值分桶降采样：每个桶保留最小值与最大值两个点
+
+    缺失值（NaN）不参与比较，整桶缺失时该桶不保留点。
+
+    参数:
+        y: 数值序列（NaN 表示缺失）
+        n_out: 目标点数
+    返回:
+        升序排列的保留点下标
+    """
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+
+    n_buckets = max(1, n_out // 2)
+    bucket_size = n // n_buckets
+    head = n_buckets * bucket_size
+
+    # 缺失值求最小时视为 +inf、求最大时视为 -inf，不会被选为极值
+    missing = np.isnan(y)
+    low = np.where(missing, np.inf, y)
+    high = np.where(missing, -np.inf, y)
+    offsets = np.arange(n_buckets) * bucket_size
+    indices = [offsets + low[:head].reshape(n_buckets, bucket_size).argmin(axis=1),
+               offsets + high[:head].reshape(n_buckets, bucket_size).argmax(axis=1)]
+    if head < n:
+        indices.append(np.array([head + low[head:].argmin(), head + high[head:].argmax()]))
+    indices = np.unique(np.concatenate(indices))
+    # 整桶缺失时 argmin/argmax 落在缺失点上，去掉
+    return indices[~missing[indices]]
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    最大三角形三桶（LTTB）降采样
+
+    桶均值一次性向量化计算，逐桶循环只处理对上一选中点的依赖，
+    每个桶内的三角形面积同样向量化计算。
+    缺失值（NaN）不参与计算：只在有值的点上降采样，再映射回原下标。
+
+    参数:
+        x: 横坐标序列（数值）
+        y: 数值序列（NaN 表示缺失）
+        n_out: 目标点数（至少为3）
+    返回:
+        升序排列的保留点下标
+    """
+    missing = np.isnan(y)
+    if missing.any():
+        present = np.flatnonzero(~missing)
+        return present[lttb_indices(x[present], y[present], n_out)]
+
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+
+    # 首尾两点固定保留，中间分为 n_out - 2 个桶
+    bounds = _bucket_bounds(n - 2, n_out - 2) + 1
+    counts = np.diff(bounds)
+    mean_x = np.add.reduceat(x[1:-1], bounds[:-1] - 1) / counts
+    mean_y = np.add.reduceat(y[1:-1], bounds[:-1] - 1) / counts
+    # 最后一个桶的“下一桶”为末尾点
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = bounds[i], bounds[i + 1]
+        bx = x[start:end]
+        by = y[start:end]
+        area = np.abs(
+            (x[prev] - next_x[i]) * (by - y[prev])
+            - (x[prev] - bx) * (next_y[i] - y[prev])
+        )
+        prev = start + int(area.argmax())
+        selected[i + 1] = prev
+    return selected
+
+
+def mean_buckets(y: np.ndarray, n_out: int) -> tuple:
+    """
+    均值分桶降采样，适合柱状图
+
+    参数:
+        y: 数值序列（NaN 表示缺失）
+        n_out: 目标桶数
+    返回:
+        (每桶首点下标, 每桶均值)
+    """
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n), y
+    bounds = _bucket_bounds(n, n_out)
+    starts = bounds[:-1]
+    # 缺失值（NaN）不计入均值，整桶缺失时结果仍为 NaN
+    missing = np.isnan(y)
+    counts = np.add.reduceat((~missing).astype(np.int64), starts)
+    sums = np.add.reduceat(np.where(missing, 0.0, y), starts)
+    return starts, np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def downsample_series(categories, series: dict, max_points: int = DEFAULT_MAX_POINTS,
+                      method: str = 'lttb') -> tuple:
+    """
+    对共享横轴的多条序列降采样
+
+    lttb / minmax 按序列分配点数预算后取下标并集，保证所有序列共用同一组类别；
+    mean 按桶求均值，类别取每桶首点。
+
+    参数:
+        categories: 横轴（类别）序列，可为None（使用序号）
+        series: {序列名: 数值序列}
+        max_points: 最多保留的点数
+        method: 'lttb'、'minmax' 或 'mean'
+    返回:
+        (类别数组, {序列名: 数值数组})
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"未知的降采样方法: {method}")
+
+    values = {name: np.asarray(y, dtype=np.float64) for name, y in series.items()}
+    lengths = [len(y) for y in values.values()]
+    if categories is not None:
+        lengths.append(len(categories))
+    n = min(lengths) if lengths else 0
+    values = {name: y[:n] for name, y in values.items()}
+    categories = np.arange(1, n + 1) if categories is None else np.asarray(categories)[:n]
+
+    if n <= max_points:
+        return categories, values
+
+    if method == 'mean':
+        starts = None
+        reduced = {}
+        for name, y in values.items():
+            starts, reduced[name] = mean_buckets(y, max_points)
+        return categories[starts], reduced
+
+    budget = max(3, max_points // len(values))
+    x = categories.astype(np.float64) if np.issubdtype(categories.dtype, np.number) else np.arange(n, dtype=np.float64)
+    picked = []
+    for y in values.values():
+        if method == 'lttb':
+            picked.append(lttb_indices(x, y, budget))
+        else:
+            picked.append(minmax_indices(y, budget))
+    indices = np.unique(np.concatenate(picked))
+    return categories[indices], {name: y[indices] for name, y in values.items()}
+
+
+def load_csv_columns(path: str, category_column: str, value_columns: list) -> tuple:
+    """
+    从CSV流式读取指定列，数值直接写入紧凑数组，不保留原始行
+
+    参数:
+        path: CSV文件路径
+        category_column: 类别（横轴）列名，可为None
+        value_columns: 数值列名列表
+    返回:
+        (类别数组或None, {列名: 数值数组})
+    """
+    categories = [] if category_column else None
+    columns = {name: array('d') for name in value_columns}
+
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            if categories is not None:
+                categories.append(row[category_column])
+            for name, column in columns.items():
+                try:
+                    column.append(float(row[name]))
+                except (TypeError, ValueError):
+                    column.append(float('nan'))
+
+    if categories is not None:
+        categories = np.array(categories)
+        # 类别列可以解析为数值时按数值处理，便于LTTB计算
+        try:
+            categories = categories.astype(np.float64)
+        except ValueError:
+            pass
+    return categories, {name: np.frombuffer(column, dtype=np.float64) for name, column in columns.items()}
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+资源预算模块
+为单次生成设置耗时、内存增量、页数与输出大小的预算。
+生成过程在每页之间主动检查，超出预算时以结构化异常中止并报告已完成的进度，
+避免单个异常任务占满服务资源
+"""
+
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+
+
+BUDGET_NAMES = {
+    'seconds': '耗时（秒）',
+    'memory_bytes': '内存增量（字节）',
+    'slides': '页数',
+    'output_bytes': '文件大小（字节）',
+}
+
+# 预算可由环境变量设置（服务端统一限制），值为 0 表示不限制
+BUDGET_ENV = {
+    'seconds': 'PPT_BUDGET_SECONDS',
+    'memory_bytes': 'PPT_BUDGET_MEMORY_MB',
+    'slides': 'PPT_BUDGET_SLIDES',
+    'output_bytes': 'PPT_BUDGET_OUTPUT_MB',
+}
+
+# 以 MB 为单位的环境变量
+MB_BUDGETS = ('memory_bytes', 'output_bytes')
+
+
+def current_rss() -> int:
+    """
+    当前进程的常驻内存（字节）
+
+    返回:
+        常驻内存，无法读取 /proc 时退回为历史峰值，两者都不可用（如 Windows）时为 0
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 的单位为字节，Linux 为 KB
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _format(value) -> str:
+    """格式化用量：整数加千分位，小数保留两位"""
+    return f"{value:,.2f}" if isinstance(value, float) and not value.is_integer() else f"{value:,.0f}"
+
+
+class BuildBudget:
+    """
+    单次生成的资源预算，值为 None 表示不限制
+
+    内存按进程常驻内存相对生成开始时的增量计算，是进程级的保护上限而非单次生成的精确用量：
+    同一进程中并发的其他生成、缓存等也会计入，其他生成释放内存也会让本次增量偏小。
+    无法读取进程内存的平台（如 Windows）上内存预算不生效。
+    """
+
+    __slots__ = tuple(BUDGET_NAMES)
+
+    def __init__(self, seconds: float = None, memory_bytes: int = None,
+                 slides: int = None, output_bytes: int = None):
+        """
+        参数:
+            seconds: 墙钟耗时上限
+            memory_bytes: 进程常驻内存增量上限（按整个进程计）
+            slides: 页数上限
+            output_bytes: 输出文件大小上限
+        """
+        self.seconds = seconds
+        self.memory_bytes = memory_bytes
+        self.slides = slides
+        self.output_bytes = output_bytes
+
+    @classmethod
+    def from_limits(cls, limits: dict) -> 'BuildBudget':
+        """
+        由上限字典创建（如 plan_estimator.DEFAULT_LIMITS，未知的键忽略）
+
+        参数:
+            limits: {预算名称: 上限}
+        返回:
+            BuildBudget对象
+        """
+        return cls(**{name: value for name, value in limits.items() if name in BUDGET_NAMES})
+
+    @classmethod
+    def from_env(cls, defaults: dict = None, environ: dict = None) -> 'BuildBudget':
+        """
+        由环境变量创建（见 BUDGET_ENV），未设置的预算取默认值
+
+        参数:
+            defaults: 默认上限字典（可选，如 plan_estimator.DEFAULT_LIMITS）
+            environ: 环境变量字典（可选，默认 os.environ）
+        返回:
+            BuildBudget对象
+        """
+        environ = os.environ if environ is None else environ
+        budget = cls.from_limits(defaults or {})
+        for name, env in BUDGET_ENV.items():
+            if environ.get(env) is None:
+                continue
+            value = float(environ[env])
+            if name in MB_BUDGETS:
+                value = int(value * 1024 * 1024)
+            # 设为 0 表示不限制
+            setattr(budget, name, value or None)
+        return budget
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        limits = ', '.join(f"{name}={value}" for name, value in self.as_dict().items() if value is not None)
+        return f"BuildBudget({limits})"
+
+
+class BudgetExceeded(Exception):
+    """
+    生成超出预算
+
+    属性:
+        resource: 超出的预算名称（seconds / memory_bytes / slides / output_bytes）
+        limit: 预算上限
+        used: 超出时的用量
+        progress: 已完成的进度字典（见 ResourceGovernor.progress）
+    """
+
+    # metrics.track_build 据此将本次生成记为超出预算而非出错
+    metrics_status = 'over_budget'
+
+    def __init__(self, resource_name: str, limit, used, progress: dict):
+        self.resource = resource_name
+        self.limit = limit
+        self.used = used
+        self.progress = progress
+        super().__init__(
+            f"{BUDGET_NAMES.get(resource_name, resource_name)} {_format(used)} 超过预算 {_format(limit)}，"
+            f"已完成 {progress['slides_done']}/{progress['slides_planned']} 页，"
+            f"用时 {progress['seconds']:.1f} 秒"
+        )
+
+    def as_dict(self) -> dict:
+        """结构化的错误信息，可直接序列化为JSON返回给调用方"""
+        return {
+            'error': 'budget_exceeded',
+            'resource': self.resource,
+            'limit': self.limit,
+            'used': self.used,
+            'progress': self.progress,
+        }
+
+
+class BuildCancelled(Exception):
+    """生成在检查点被取消（如推测生成的配置已变化）"""
+
+    metrics_status = 'cancelled'
+
+
+# 当前线程的检查点回调，由 checkpoint_hook() 设置
+_checkpoint_state = threading.local()
+
+
+@contextmanager
+def checkpoint_hook(hook):
+    """
+    在当前线程此后创建的生成中，每个检查点额外调用 hook()
+
+    回调可抛出 BuildCancelled 中止生成，也可在检查点让出CPU（调度器据此在页与页之间暂停低优先级任务）。
+    可以嵌套，外层的回调先被调用。
+
+    参数:
+        hook: 无参数的回调函数
+    """
+    previous = getattr(_checkpoint_state, 'hook', None)
+    if previous is not None:
+        inner = hook
+
+        def hook():
+            previous()
+            inner()
+    _checkpoint_state.hook = hook
+    try:
+        yield
+    finally:
+        _checkpoint_state.hook = previous
+
+
+class ResourceGovernor:
+    """
+    资源预算检查器：生成开始时创建，在每页之间调用 check()
+
+    只在检查点判断，不中断正在执行的单页生成。
+    """
+
+    def __init__(self, budget: BuildBudget = None, slides_planned: int = 0):
+        """
+        参数:
+            budget: 资源预算（可选，None 表示不限制）
+            slides_planned: 计划页数（用于报告进度）
+        """
+        self.budget = budget or BuildBudget()
+        self.slides_planned = slides_planned
+        self.slides_done = 0
+        self.stage = 'plan'
+        self.start = time.perf_counter()
+        self._watch_memory = self.budget.memory_bytes is not None
+        self.rss_start = current_rss() if self._watch_memory else 0
+        self.peak_memory = 0
+        self._hook = getattr(_checkpoint_state, 'hook', None)
+
+    def progress(self) -> dict:
+        """
+        当前进度
+
+        返回:
+            {'stage', 'slides_done', 'slides_planned', 'seconds', 'peak_memory_bytes'}
+        """
+        return {
+            'stage': self.stage,
+            'slides_done': self.slides_done,
+            'slides_planned': self.slides_planned,
+            'seconds': time.perf_counter() - self.start,
+            'peak_memory_bytes': self.peak_memory,
+        }
+
+    def _exceeded(self, name: str, used):
+        raise BudgetExceeded(name, getattr(self.budget, name), used, self.progress())
+
+    def check_planned(self, slides_planned: int):
+        """
+        生成前检查计划页数
+
+        参数:
+            slides_planned: 计划页数
+        """
+        self.slides_planned = slides_planned
+        if self.budget.slides is not None and slides_planned > self.budget.slides:
+            self._exceeded('slides', slides_planned)
+
+    def check(self, slides_done: int = None, stage: str = None):
+        """
+        检查点：更新进度，检查页数、耗时与内存，并调用当前线程的检查点回调
+
+        参数:
+            slides_done: 已完成页数（可选）
+            stage: 当前阶段名称（可选，如 'slides'、'decorate'、'save'）
+        """
+        if slides_done is not None:
+            self.slides_done = slides_done
+        if stage is not None:
+            self.stage = stage
+        budget = self.budget
+        if budget.slides is not None and self.slides_done > budget.slides:
+            self._exceeded('slides', self.slides_done)
+        if budget.seconds is not None:
+            elapsed = time.perf_counter() - self.start
+            if elapsed > budget.seconds:
+                self._exceeded('seconds', elapsed)
+        if self._watch_memory:
+            self.peak_memory = max(self.peak_memory, current_rss() - self.rss_start)
+            if self.peak_memory > budget.memory_bytes:
+                self._exceeded('memory_bytes', self.peak_memory)
+        if self._hook is not None:
+            self._hook()
+
+    def check_output(self, size: int):
+        """
+        保存后检查输出大小与总耗时
+
+        参数:
+            size: 输出文件字节数
+        """
+        self.check(stage='save')
+        if self.budget.output_bytes is not None and size > self.budget.output_bytes:
+            self._exceeded('output_bytes', size)
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+图片校验模块
+上传时只读取 PNG / JPEG 的文件头得到格式、像素尺寸、颜色模式与 DPI，
+不解码像素数据；超出大小或像素上限、文件头损坏或数据被截断的图片立即拒绝，
+避免解压炸弹与损坏文件在生成阶段才暴露。校验结果随图片保存，后续环节直接使用
+"""
+
+import struct
+import argparse
+import zlib
+
+
+# 默认上限：文件大小与像素数（Pillow 的解压炸弹警告阈值约为 8900 万像素）
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+MAX_IMAGE_PIXELS = 40_000_000
+# 单边像素上限，防止 1 × 4000 万这类极端比例
+MAX_IMAGE_SIDE = 20000
+
+DEFAULT_DPI = 72
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_IEND = b'\x00\x00\x00\x00IEND\xaeB`\x82'
+_PNG_CHUNK = struct.Struct('>I4s')
+
+# PNG 颜色类型 → (颜色模式, 允许的位深)
+PNG_COLOR_TYPES = {
+    0: ('L', (1, 2, 4, 8, 16)),
+    2: ('RGB', (8, 16)),
+    3: ('P', (1, 2, 4, 8)),
+    4: ('LA', (8, 16)),
+    6: ('RGBA', (8, 16)),
+}
+
+# JPEG 帧头标记（SOF0-SOF15，不含 DHT、JPG 与 DAC）
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# 不带长度字段的 JPEG 标记：TEM 与 RST0-RST7
+JPEG_STANDALONE_MARKERS = frozenset([0x01, *range(0xD0, 0xD8)])
+JPEG_SOS = 0xDA
+JPEG_EOI = b'\xff\xd9'
+
+JPEG_COMPONENT_MODES = {1: 'L', 3: 'RGB', 4: 'CMYK'}
+
+REJECT_REASONS = {
+    'too_large': '文件过大',
+    'too_many_pixels': '像素数超过上限',
+    'unsupported': '不支持的图片格式',
+    'corrupt': '文件头损坏',
+    'truncated': '文件不完整',
+}
+
+
+class ImageRejected(ValueError):
+    """
+    图片未通过校验
+
+    属性:
+        reason: 拒绝原因（见 REJECT_REASONS）
+        name: 文件名
+        detail: 具体说明
+    """
+
+    def __init__(self, reason: str, name: str = '', detail: str = ''):
+        self.reason = reason
+        self.name = name
+        self.detail = detail
+        message = REJECT_REASONS.get(reason, reason)
+        if detail:
+            message = f"{message}：{detail}"
+        super().__init__(f"{name}：{message}" if name else message)
+
+
+class ImageInfo:
+    """由文件头读取的图片信息"""
+
+    __slots__ = ('format', 'width', 'height', 'mode', 'dpi', 'size_bytes')
+
+    def __init__(self, format: str, width: int, height: int, mode: str,
+                 dpi: tuple = (DEFAULT_DPI, DEFAULT_DPI), size_bytes: int = 0):
+        """
+        参数:
+            format: 图片格式（'PNG' 或 'JPEG'）
+            width, height: 像素尺寸
+            mode: 颜色模式（与 Pillow 的模式名称一致，如 'RGB'、'RGBA'、'L'、'CMYK'）
+            dpi: (水平, 垂直) DPI
+            size_bytes: 文件字节数
+        """
+        self.format = format
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.dpi = dpi
+        self.size_bytes = size_bytes
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+    def fit(self, max_width: float, max_height: float) -> tuple:
+        """
+        按原始比例放入区域时的尺寸
+
+        参数:
+            max_width, max_height: 区域尺寸（任意单位）
+        返回:
+            (宽, 高)，与区域单位相同
+        """
+        # 按物理尺寸计算比例，与 python-pptx 按 DPI 换算的原生尺寸一致
+        aspect = (self.width / self.dpi[0]) / (self.height / self.dpi[1])
+        if max_width / aspect <= max_height:
+            return max_width, max_width / aspect
+        return max_height * aspect, max_height
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"ImageInfo({self.format} {self.width}x{self.height} {self.mode}, {self.size_bytes:,} 字节)"
+
+
+def _normalize_dpi(value: float) -> int:
+    """与 python-pptx 相同的 DPI 取整规则：无效或超出 1-2048 时为 72"""
+    dpi = int(round(value))
+    return dpi if 1 <= dpi <= 2048 else DEFAULT_DPI
+
+
+def probe_png(data: bytes) -> ImageInfo:
+    """
+    读取 PNG 文件头（IHDR 与 IDAT 之前的 pHYs），只跳过数据块不解压
+
+    参数:
+        data: 图片字节数据
+    返回:
+        ImageInfo
+    """
+    if len(data) < 33 or _PNG_CHUNK.unpack_from(data, 8) != (13, b'IHDR'):
+        raise ImageRejected('corrupt', detail="缺少 IHDR")
+    ihdr = data[16:29]
+    if struct.unpack_from('>I', data, 29)[0] != zlib.crc32(b'IHDR' + ihdr):
+        raise ImageRejected('corrupt', detail="IHDR 校验和不符")
+    width, height, bit_depth, color_type, compression, filter_method, interlace = struct.unpack('>IIBBBBB', ihdr)
+    if color_type not in PNG_COLOR_TYPES or bit_depth not in PNG_COLOR_TYPES[color_type][1] \
+            or compression or filter_method or interlace > 1:
+        raise ImageRejected('corrupt', detail="IHDR 参数无效")
+    mode = PNG_COLOR_TYPES[color_type][0]
+    if mode == 'L' and bit_depth == 1:
+        mode = '1'
+    elif mode == 'L' and bit_depth == 16:
+        mode = 'I;16'
+
+    # 依次跳过数据块，读取 pHYs 并确认存在 IDAT
+    dpi = (DEFAULT_DPI, DEFAULT_DPI)
+    offset = 33
+    while True:
+        if offset + 12 > len(data):
+            raise ImageRejected('truncated', detail="数据块不完整")
+        length, chunk_type = _PNG_CHUNK.unpack_from(data, offset)
+        if chunk_type == b'IDAT':
+            break
+        if chunk_type == b'IEND':
+            raise ImageRejected('corrupt', detail="缺少图像数据")
+        if chunk_type == b'pHYs' and length == 9:
+            ppu_x, ppu_y, unit = struct.unpack_from('>IIB', data, offset + 8)
+            if unit == 1:
+                # 每米像素数换算为 DPI
+                dpi = (_normalize_dpi(ppu_x * 0.0254), _normalize_dpi(ppu_y * 0.0254))
+        offset += length + 12
+
+    if not data.endswith(PNG_IEND):
+        raise ImageRejected('truncated', detail="缺少 IEND")
+    return ImageInfo('PNG', width, height, mode, dpi, len(data))
+
+
+def probe_jpeg(data: bytes) -> ImageInfo:
+    """
+    读取 JPEG 标记段（JFIF 密度与 SOF 帧头），遇到扫描数据即停止
+
+    参数:
+        data: 图片字节数据
+    返回:
+        ImageInfo
+    """
+    dpi = (DEFAULT_DPI, DEFAULT_DPI)
+    frame = None
+    offset = 2
+    size = len(data)
+    while True:
+        # 标记前可有任意个填充字节 0xFF
+        if offset >= size or data[offset] != 0xFF:
+            raise ImageRejected('truncated' if offset >= size else 'corrupt', detail="标记段不完整")
+        while offset < size and data[offset] == 0xFF:
+            offset += 1
+        if offset >= size:
+            raise ImageRejected('truncated', detail="标记段不完整")
+        marker = data[offset]
+        offset += 1
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        if offset + 2 > size:
+            raise ImageRejected('truncated', detail="标记段不完整")
+        length = struct.unpack_from('>H', data, offset)[0]
+        if length < 2 or offset + length > size:
+            raise ImageRejected('truncated', detail="标记段长度超出文件")
+        segment = data[offset + 2:offset + length]
+        if marker == 0xE0 and segment[:5] == b'JFIF\x00' and len(segment) >= 12:
+            unit, density_x, density_y = struct.unpack_from('>BHH', segment, 7)
+            if unit in (1, 2):
+                # 单位 1 为每英寸，2 为每厘米
+                scale = 1 if unit == 1 else 2.54
+                dpi = (_normalize_dpi(density_x * scale), _normalize_dpi(density_y * scale))
+        elif marker in JPEG_SOF_MARKERS:
+            if len(segment) < 6:
+                raise ImageRejected('corrupt', detail="SOF 帧头不完整")
+            _, height, width, components = struct.unpack_from('>BHHB', segment)
+            frame = (width, height, components)
+        elif marker == JPEG_SOS:
+            break
+        offset += length
+
+    if frame is None:
+        raise ImageRejected('corrupt', detail="缺少 SOF 帧头")
+    width, height, components = frame
+    if components not in JPEG_COMPONENT_MODES:
+        raise ImageRejected('corrupt', detail=f"不支持的颜色分量数 {components}")
+    # 结束标记之后允许有附加数据（部分相机会写入），只要求扫描数据之后存在 EOI
+    if data.rfind(JPEG_EOI, offset) == -1:
+        raise ImageRejected('truncated', detail="缺少 EOI")
+    return ImageInfo('JPEG', width, height, JPEG_COMPONENT_MODES[components], dpi, size)
+
+
+def inspect_image(data: bytes, name: str = '', max_bytes: int = MAX_IMAGE_BYTES,
+                  max_pixels: int = MAX_IMAGE_PIXELS) -> ImageInfo:
+    """
+    校验上传的图片：先检查文件大小，再只读文件头检查格式、尺寸与完整性
+
+    参数:
+        data: 图片字节数据
+        name: 文件名（用于错误信息）
+        max_bytes: 文件大小上限（None 表示不限制）
+        max_pixels: 像素数上限（None 表示不限制）
+    返回:
+        ImageInfo
+    """
+    if max_bytes is not None and len(data) > max_bytes:
+        raise ImageRejected('too_large', name, f"{len(data):,} 字节，上限 {max_bytes:,} 字节")
+    try:
+        if data.startswith(PNG_SIGNATURE):
+            info = probe_png(data)
+        elif data.startswith(b'\xff\xd8'):
+            info = probe_jpeg(data)
+        else:
+            raise ImageRejected('unsupported', detail="仅支持 PNG 与 JPEG")
+    except (struct.error, IndexError):
+        raise ImageRejected('corrupt', name) from None
+    except ImageRejected as e:
+        raise ImageRejected(e.reason, name, e.detail) from None
+
+    if not info.width or not info.height:
+        raise ImageRejected('corrupt', name, "宽度或高度为 0")
+    if max(info.width, info.height) > MAX_IMAGE_SIDE or \
+            (max_pixels is not None and info.pixels > max_pixels):
+        raise ImageRejected('too_many_pixels', name, f"{info.width} × {info.height}")
+    return info
+
+
+def validate_images(files: list, max_bytes: int = MAX_IMAGE_BYTES,
+                    max_pixels: int = MAX_IMAGE_PIXELS) -> tuple:
+    """
+    批量校验图片，通过的图片附带校验结果
+
+    参数:
+        files: [(文件名, 字节数据)]
+        max_bytes: 单个文件大小上限
+        max_pixels: 单张像素数上限
+    返回:
+        (图片列表 [{'name', 'bytes', 'info'}], 被拒绝的 ImageRejected 列表)
+    """
+    accepted, rejected = [], []
+    for name, data in files:
+        try:
+            info = inspect_image(data, name, max_bytes, max_pixels)
+        except ImageRejected as e:
+            rejected.append(e)
+            continue
+        accepted.append({'name': name, 'bytes': data, 'info': info})
+    return accepted, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="只读取文件头校验 PNG / JPEG 图片")
+    parser.add_argument('images', nargs='+', help="图片文件")
+    parser.add_argument('--max-mb', type=float, default=MAX_IMAGE_BYTES / 1024 / 1024, help="文件大小上限（MB）")
+    parser.add_argument('--max-pixels', type=int, default=MAX_IMAGE_PIXELS, help="像素数上限")
+    args = parser.parse_args()
+
+    failed = 0
+    for path in args.images:
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            info = inspect_image(data, path, int(args.max_mb * 1024 * 1024), args.max_pixels)
+        except ImageRejected as e:
+            failed += 1
+            print(f"✗ {e}")
+            continue
+        print(f"✓ {path}：{info.format} {info.width} × {info.height} {info.mode}，"
+              f"DPI {info.dpi[0]} × {info.dpi[1]}，{info.size_bytes:,} 字节")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
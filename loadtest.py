@@ -0,0 +1,470 @@
+# -*- coding: utf-8 -*-
+"""
+并发会话压测模块
+模拟多个用户同时使用：上传Logo与图片、修改版式设置、生成PPT，
+逐级提高并发数，统计吞吐量、延迟分位数与内存峰值，并找出延迟陡增的并发级别
+"""
+
+import io
+import os
+import json
+import time
+import uuid
+import random
+import argparse
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from config_presets import DEFAULT_CONFIG, LAYOUT_TYPES, THEME_PRESETS
+from governor import BuildBudget, current_rss
+from output_cache import cached_build
+from ppt_generator import build_presentation
+from plan_estimator import DEFAULT_LIMITS, estimate_presentation
+from scheduler import PRIORITY_INTERACTIVE, scheduled_build
+from speculative import SpeculativeBuilder
+
+
+# 压测对象
+TARGETS = {
+    'direct': '不经页面调用应用的生成路径（调度器、输出缓存与推测生成，每个会话一个线程）',
+    'app': '在进程内启动应用脚本（streamlit.testing 的 AppTest）',
+}
+
+# 会话步骤，与应用中的页面函数一一对应
+STEPS = ('sidebar', 'layout', 'export')
+
+DEFAULT_LEVELS = (1, 2, 4, 8)
+DEFAULT_THINK_TIME = 0.5
+DEFAULT_ITERATIONS = 3
+
+# 模拟会话修改版式时单个版式的最大页数
+MAX_LAYOUT_COUNT = 3
+
+# 延迟陡增判定：p95 的增长倍数超过并发增长倍数的该倍数，或吞吐量低于此前最好水平的该比例
+CLIFF_LATENCY_FACTOR = 1.5
+CLIFF_THROUGHPUT_RATIO = 0.8
+
+# 内存采样间隔（秒）
+MEMORY_SAMPLE_INTERVAL = 0.05
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+GENERATE_BUTTON_LABEL = "✨ 立即生成 PPT 模板"
+APPLY_THEME_BUTTON_LABEL = "应用主题预设"
+
+
+def percentile(values: list, q: float) -> float:
+    """
+    计算分位数（线性插值）
+
+    参数:
+        values: 数值列表
+        q: 分位（0-100）
+    返回:
+        分位数，列表为空时为 0
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    pos = (len(values) - 1) * q / 100
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+
+class MemorySampler:
+    """后台线程定时采样常驻内存，记录峰值"""
+
+    def __init__(self, interval: float = MEMORY_SAMPLE_INTERVAL):
+        """
+        参数:
+            interval: 采样间隔（秒）
+        """
+        self.interval = interval
+        self.peak = 0
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='memory-sampler', daemon=True)
+
+    def _run(self):
+        while True:
+            self.peak = max(self.peak, current_rss())
+            if self._done.wait(self.interval):
+                break
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+class DirectSession:
+    """
+    不经页面的模拟会话，步骤与应用页面函数相同
+
+    生成与页面走同一条路径：推测生成、输出缓存与按会话分配的调度名额，
+    压测结果因此包含缓存命中、调度排队与推测生成之间的竞争。
+    """
+
+    def __init__(self, logo_bytes: bytes, images: list, rng: random.Random):
+        """
+        参数:
+            logo_bytes: 待上传的Logo图片字节数据
+            images: 待上传的图片字节数据列表
+            rng: 会话专用的随机数生成器
+        """
+        self.logo_bytes = logo_bytes
+        self.images = images
+        self.rng = rng
+        self.config = json.loads(json.dumps(DEFAULT_CONFIG))
+        self.session_logo = None
+        self.session_images = []
+        # 与页面会话相同：按会话分配调度名额，每个会话一个推测生成器
+        self.tenant = uuid.uuid4().hex
+        self.speculative = SpeculativeBuilder(tenant=self.tenant)
+        self.budget = BuildBudget.from_env(DEFAULT_LIMITS)
+
+    def _submit_speculative(self):
+        """与页面的 submit_speculative 相同：修改配置后登记推测生成"""
+        if self.config.get('text_fit') == 'warn':
+            return
+        self.speculative.submit(self.config, self.config['layouts'], self.session_logo,
+                                self.session_images, budget=self.budget)
+
+    def _preview(self, image_bytes: bytes):
+        """与上传后显示的缩略图一样解码并缩放图片"""
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            image.thumbnail((80, 80))
+
+    def sidebar(self):
+        """render_sidebar：应用主题预设、上传Logo与图片"""
+        theme_name = self.rng.choice(list(THEME_PRESETS))
+        theme = THEME_PRESETS[theme_name]
+        self.config.update({key: theme[key] for key in
+                            ('primary', 'secondary', 'accent', 'background', 'title_font', 'body_font')},
+                           theme=theme_name)
+        if self.logo_bytes:
+            self.session_logo = bytes(self.logo_bytes)
+            self._preview(self.session_logo)
+        self.session_images = [{'name': f'image_{i}.png', 'bytes': bytes(data)}
+                               for i, data in enumerate(self.images)]
+        self._submit_speculative()
+
+    def layout(self):
+        """render_layout_settings：修改版式启用状态与页数，页面重新计算成本估算"""
+        layouts = self.config['layouts']
+        for key in LAYOUT_TYPES:
+            layout = dict(layouts.get(key, {}))
+            if key in ('chart', 'table'):
+                layout['enabled'] = False
+            else:
+                layout['enabled'] = self.rng.random() < 0.8
+                layout['count'] = self.rng.randint(1, MAX_LAYOUT_COUNT)
+            layouts[key] = layout
+        estimate_presentation(self.config, layouts, self.session_logo, self.session_images)
+        self._submit_speculative()
+
+    def export(self):
+        """render_export：成本估算后生成PPT，推测生成进行中时等待其完成，否则经调度器生成（命中缓存时直接返回）"""
+        layouts = self.config['layouts']
+        estimate_presentation(self.config, layouts, self.session_logo, self.session_images)
+        if self.config.get('text_fit') == 'warn':
+            build = functools.partial(build_presentation, overflows=[])
+        else:
+            build = cached_build
+            self.speculative.claim(self.config, layouts, self.session_logo, self.session_images)
+        scheduled_build(self.config, layouts, self.session_logo, self.session_images,
+                        budget=self.budget, priority=PRIORITY_INTERACTIVE, tenant=self.tenant, build=build)
+
+    def close(self):
+        """会话结束：取消进行中的推测生成"""
+        self.speculative.cancel()
+
+
+class AppSession:
+    """在进程内运行应用脚本的模拟会话（需要安装 streamlit）"""
+
+    def __init__(self, logo_bytes: bytes, images: list, rng: random.Random, timeout: float = 120):
+        try:
+            from streamlit.testing.v1 import AppTest
+        except ImportError:
+            raise RuntimeError("target=app 需要安装 streamlit") from None
+        self.logo_bytes = logo_bytes
+        self.images = images
+        self.rng = rng
+        self.app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.app.run()
+        self._check()
+
+    def _check(self):
+        """脚本运行出错时抛出异常"""
+        if self.app.exception:
+            raise RuntimeError(str(self.app.exception[0].value))
+
+    def _button(self, label: str):
+        """按显示文字查找按钮"""
+        for button in self.app.button:
+            if button.label == label:
+                return button
+        raise RuntimeError(f"页面中没有按钮: {label}")
+
+    def sidebar(self):
+        """render_sidebar：选择并应用主题预设、上传Logo与图片"""
+        self.app.sidebar.selectbox[0].set_value(self.rng.choice(list(THEME_PRESETS))).run()
+        # AppTest 不支持文件上传控件，直接写入上传后保存的会话状态
+        self.app.session_state['logo_bytes'] = self.logo_bytes
+        self.app.session_state['uploaded_images'] = [
+            {'name': f'image_{i}.png', 'bytes': data} for i, data in enumerate(self.images)
+        ]
+        self._button(APPLY_THEME_BUTTON_LABEL).click().run()
+        self._check()
+
+    def layout(self):
+        """render_layout_settings：修改版式启用状态与页数"""
+        for key in LAYOUT_TYPES:
+            if key in ('chart', 'table'):
+                self.app.toggle(key=f"en_{key}").set_value(False)
+            else:
+                self.app.toggle(key=f"en_{key}").set_value(self.rng.random() < 0.8)
+                self.app.number_input(key=f"cnt_{key}").set_value(self.rng.randint(1, MAX_LAYOUT_COUNT))
+        self.app.run()
+        self._check()
+
+    def export(self):
+        """render_export：点击生成按钮"""
+        self._button(GENERATE_BUTTON_LABEL).click().run()
+        self._check()
+
+    def close(self):
+        """会话结束：取消进行中的推测生成"""
+        self.app.session_state['speculative'].cancel()
+
+
+SESSION_CLASSES = {'direct': DirectSession, 'app': AppSession}
+
+
+def _run_session(target: str, seed: int, iterations: int, think_time: float,
+                 logo_bytes: bytes, images: list) -> dict:
+    """
+    运行一个模拟会话
+
+    参数:
+        target: 压测对象
+        seed: 随机种子
+        iterations: 每个会话重复完整步骤的次数
+        think_time: 步骤间的平均停顿（秒），实际停顿在 0.5~1.5 倍之间随机
+        logo_bytes: Logo图片字节数据
+        images: 图文页图片字节数据列表
+    返回:
+        {'latency': {步骤: [秒]}, 'session': [秒], 'errors': [错误信息]}
+    """
+    rng = random.Random(seed)
+    result = {'latency': {step: [] for step in STEPS}, 'session': [], 'errors': []}
+    try:
+        session = SESSION_CLASSES[target](logo_bytes, images, rng)
+    except Exception as e:
+        result['errors'].append(str(e))
+        return result
+
+    for _ in range(iterations):
+        session_start = time.perf_counter()
+        try:
+            for step in STEPS:
+                start = time.perf_counter()
+                getattr(session, step)()
+                result['latency'][step].append(time.perf_counter() - start)
+                if think_time > 0:
+                    time.sleep(think_time * rng.uniform(0.5, 1.5))
+        except Exception as e:
+            result['errors'].append(f"{step}: {e}")
+            continue
+        result['session'].append(time.perf_counter() - session_start)
+    session.close()
+    return result
+
+
+def run_level(concurrency: int, target: str = 'direct', iterations: int = DEFAULT_ITERATIONS,
+              think_time: float = DEFAULT_THINK_TIME, logo_bytes: bytes = None,
+              images: list = None, seed: int = 0) -> dict:
+    """
+    以指定并发数运行一轮压测
+
+    Streamlit 在同一进程中为每个会话分配一个脚本线程，这里同样每个会话一个线程。
+
+    参数:
+        concurrency: 同时在线的会话数
+        target: 压测对象
+        iterations: 每个会话重复完整步骤的次数
+        think_time: 步骤间的平均停顿（秒）
+        logo_bytes: Logo图片字节数据（可选）
+        images: 图文页图片字节数据列表（可选）
+        seed: 随机种子
+    返回:
+        本轮统计结果字典
+    """
+    images = images or []
+    with MemorySampler() as memory:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(
+                lambda i: _run_session(target, seed * 10007 + i, iterations, think_time, logo_bytes, images),
+                range(concurrency)
+            ))
+        elapsed = time.perf_counter() - start
+
+    steps = {step: [v for r in results for v in r['latency'][step]] for step in STEPS}
+    exports = steps['export']
+    stats = {
+        'concurrency': concurrency,
+        'seconds': elapsed,
+        'builds': len(exports),
+        'throughput': len(exports) / elapsed if elapsed > 0 else 0.0,
+        'errors': [e for r in results for e in r['errors']],
+        'peak_rss': memory.peak,
+        'steps': {},
+    }
+    for step, values in list(steps.items()) + [('session', [v for r in results for v in r['session']])]:
+        stats['steps'][step] = {
+            'count': len(values),
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'p99': percentile(values, 99),
+        }
+    return stats
+
+
+def find_cliff(levels: list) -> int:
+    """
+    找出延迟陡增的并发级别
+
+    并发数翻倍时若生成延迟 p95 的增长明显超过并发增长（排队之外还有额外开销，如内存换页、锁竞争），
+    或吞吐量反而下降，即认为到达陡增点。
+
+    参数:
+        levels: run_level 的结果列表（按并发数升序）
+    返回:
+        陡增点的并发数，未出现时为 None
+    """
+    best_throughput = 0.0
+    for prev, cur in zip(levels, levels[1:]):
+        best_throughput = max(best_throughput, prev['throughput'])
+        prev_p95 = prev['steps']['export']['p95']
+        cur_p95 = cur['steps']['export']['p95']
+        growth = cur['concurrency'] / prev['concurrency']
+        if prev_p95 > 0 and cur_p95 / prev_p95 > growth * CLIFF_LATENCY_FACTOR:
+            return cur['concurrency']
+        if cur['throughput'] < best_throughput * CLIFF_THROUGHPUT_RATIO:
+            return cur['concurrency']
+    return None
+
+
+def run_load_test(levels=DEFAULT_LEVELS, target: str = 'direct', iterations: int = DEFAULT_ITERATIONS,
+                  think_time: float = DEFAULT_THINK_TIME, logo_bytes: bytes = None,
+                  images: list = None, slo: float = None, progress=None) -> dict:
+    """
+    逐级提高并发数进行压测
+
+    参数:
+        levels: 并发数列表
+        target: 压测对象，'direct' 或 'app'
+        iterations: 每个会话重复完整步骤的次数
+        think_time: 步骤间的平均停顿（秒）
+        logo_bytes: Logo图片字节数据（可选）
+        images: 图文页图片字节数据列表（可选）
+        slo: 生成延迟 p95 的目标（秒，可选），用于计算可承载的并发数
+        progress: 每轮结束后的回调 progress(stats)（可选）
+    返回:
+        {'levels': 各轮统计, 'cliff': 陡增点并发数, 'capacity': 满足 slo 的最大并发数}
+    """
+    if target not in TARGETS:
+        raise ValueError(f"未知的压测对象: {target}")
+    if target == 'app':
+        # 压测期间不启动指标服务，避免端口冲突
+        os.environ.setdefault('PPT_METRICS_PORT', '0')
+
+    results = []
+    for seed, concurrency in enumerate(sorted(levels)):
+        stats = run_level(concurrency, target, iterations, think_time, logo_bytes, images, seed)
+        results.append(stats)
+        if progress:
+            progress(stats)
+
+    capacity = None
+    if slo is not None:
+        for stats in results:
+            if stats['steps']['export']['p95'] <= slo and not stats['errors']:
+                capacity = stats['concurrency']
+    return {'levels': results, 'cliff': find_cliff(results), 'capacity': capacity}
+
+
+def format_level(stats: dict) -> str:
+    """
+    格式化一轮压测结果
+
+    参数:
+        stats: run_level 的结果
+    返回:
+        一行文本
+    """
+    export = stats['steps']['export']
+    return (f"{stats['concurrency']:>6} {stats['builds']:>6} {stats['throughput']:>9.2f} "
+            f"{export['p50']:>8.2f} {export['p95']:>8.2f} {export['p99']:>8.2f} "
+            f"{stats['steps']['session']['p95']:>9.2f} {stats['peak_rss'] / 1024 / 1024:>9.0f} "
+            f"{len(stats['errors']):>6}")
+
+
+LEVEL_HEADER = (f"{'并发':>4} {'生成数':>3} {'次/秒':>6} {'p50':>8} {'p95':>8} {'p99':>8} "
+                f"{'会话p95':>6} {'内存MB':>6} {'错误':>4}")
+
+
+def main():
+    """命令行入口：python loadtest.py --levels 1 2 4 8 --think 0.5"""
+    parser = argparse.ArgumentParser(description="模拟多个并发会话压测PPT生成")
+    parser.add_argument('--target', choices=list(TARGETS), default='direct', help="压测对象")
+    parser.add_argument('--levels', type=int, nargs='+', default=list(DEFAULT_LEVELS), help="并发数")
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS, help="每个会话的重复次数")
+    parser.add_argument('--think', type=float, default=DEFAULT_THINK_TIME, help="步骤间平均停顿（秒）")
+    parser.add_argument('--slo', type=float, default=None, help="生成延迟 p95 目标（秒）")
+    parser.add_argument('--logo', help="Logo图片")
+    parser.add_argument('--images', nargs='*', default=[], help="图文页图片")
+    parser.add_argument('--json', dest='json_path', help="将完整结果写入JSON文件")
+    args = parser.parse_args()
+
+    logo_bytes = None
+    if args.logo:
+        with open(args.logo, 'rb') as f:
+            logo_bytes = f.read()
+    images = []
+    for path in args.images:
+        with open(path, 'rb') as f:
+            images.append(f.read())
+
+    print(f"压测对象: {TARGETS[args.target]}")
+    print(LEVEL_HEADER)
+    report = run_load_test(args.levels, args.target, args.iterations, args.think,
+                           logo_bytes, images, args.slo,
+                           progress=lambda stats: print(format_level(stats), flush=True))
+
+    for stats in report['levels']:
+        for error in stats['errors'][:3]:
+            print(f"并发 {stats['concurrency']} 出错: {error}")
+    if report['cliff'] is not None:
+        print(f"延迟在并发 {report['cliff']} 时陡增")
+    else:
+        print("测试范围内未出现延迟陡增")
+    if args.slo is not None:
+        print(f"满足 p95 ≤ {args.slo} 秒的最大并发: {report['capacity'] or '无'}")
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
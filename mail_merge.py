@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+"""
+邮件合并模块
+将带 {{字段}} 数据槽的模板编译一次，再按 CSV / JSONL 记录批量生成个性化PPT。
+编译后的模板以预序列化的XML片段保存，合并时只替换文本段，不再经过python-pptx
+"""
+
+import io
+import os
+import re
+import csv
+import json
+import time
+import hashlib
+import zipfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from batch_index import BatchIndex, error_reason, spec_hash
+from metrics import BUILDS_TOTAL, QUEUE_DEPTH
+from package_io import ZipStreamWriter, compressed_entry
+from ppt_generator import build_presentation
+
+
+# 数据槽占位符，如 {{customer_name}}
+FIELD_PATTERN = re.compile(r'\{\{\s*([A-Za-z_][\w\-]*)\s*\}\}')
+
+# 文本段：<a:r>[<a:rPr .../>]<a:t>文本</a:t></a:r>
+RUN_PATTERN = re.compile(
+    r'(<a:r>(?:<a:rPr[^>]*/>|<a:rPr[^>]*>.*?</a:rPr>)?<a:t>)(.*?)</a:t></a:r>',
+    re.S
+)
+
+# XML 1.0 不允许出现的控制字符
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# 压缩级别：静态部件只压缩一次，取最高压缩率；动态部件每份都要压缩，取速度优先
+STATIC_COMPRESS_LEVEL = 9
+DYNAMIC_COMPRESS_LEVEL = 1
+
+
+def _escape_text(value) -> str:
+    """
+    将记录值转为可直接写入 <a:t> 的文本
+
+    参数:
+        value: 记录中的值
+    返回:
+        转义后的文本
+    """
+    if value is None:
+        return ''
+    text = INVALID_XML_CHARS.sub('', str(value))
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _compile_part(xml: str) -> list:
+    """
+    将含数据槽的XML部件拆分为静态片段与字段引用
+
+    参数:
+        xml: 部件XML文本
+    返回:
+        片段列表：静态片段为bytes，字段引用为 (字段名, 文本段开头bytes)
+    """
+    segments = []
+    pos = 0
+    for run in RUN_PATTERN.finditer(xml):
+        run_open, text = run.group(1), run.group(2)
+        if not FIELD_PATTERN.search(text):
+            continue
+        segments.append(xml[pos:run.start(2)].encode('utf-8'))
+        text_pos = 0
+        for field in FIELD_PATTERN.finditer(text):
+            segments.append(text[text_pos:field.start()].encode('utf-8'))
+            segments.append((field.group(1), run_open.encode('utf-8')))
+            text_pos = field.end()
+        segments.append(text[text_pos:].encode('utf-8'))
+        pos = run.end(2)
+    segments.append(xml[pos:].encode('utf-8'))
+    return [segment for segment in segments if segment]
+
+
+class MergeTemplate:
+    """
+    编译后的邮件合并模板
+
+    静态部件预先压缩，含数据槽的部件预先拆分为片段，
+    每份输出只需拼接片段并压缩少量幻灯片XML。
+    """
+
+    def __init__(self, pptx_bytes: bytes):
+        """
+        参数:
+            pptx_bytes: 含 {{字段}} 数据槽的PPT文件字节数据
+        """
+        self._parts = []
+        self.fields = set()
+        # 模板摘要，批量任务索引据此判断已有输出是否仍然有效；
+        # 按部件名与解压后的内容计算，不受每次编译时zip条目时间戳变化的影响
+        digest = hashlib.sha256()
+
+        with zipfile.ZipFile(io.BytesIO(pptx_bytes)) as package:
+            for name in package.namelist():
+                data = package.read(name)
+                digest.update(f"{name}\0{len(data)}\0".encode('utf-8'))
+                digest.update(data)
+                if name.endswith('.xml') and b'{{' in data:
+                    segments = _compile_part(data.decode('utf-8'))
+                    fields = [segment[0] for segment in segments if isinstance(segment, tuple)]
+                    if fields:
+                        self.fields.update(fields)
+                        self._parts.append((name, segments))
+                        continue
+                self._parts.append(compressed_entry(name, data, STATIC_COMPRESS_LEVEL))
+        self.digest = digest.hexdigest()
+
+    def _render_value(self, value, run_open: bytes) -> bytes:
+        """
+        渲染单个字段值，多行文本按python-pptx的方式以 <a:br/> 分隔
+
+        参数:
+            value: 记录中的值
+            run_open: 所在文本段的开头（<a:r>…<a:t>）
+        返回:
+            XML片段字节
+        """
+        lines = _escape_text(value).replace('\r\n', '\n').replace('\r', '\n').split('\n')
+        separator = b'</a:t></a:r><a:br/>' + run_open
+        return separator.join(line.encode('utf-8') for line in lines)
+
+    def render_to(self, record: dict, fp):
+        """
+        按一条记录生成PPT并写入文件对象
+
+        参数:
+            record: 字段名到值的字典，缺失的字段填充为空
+            fp: 可写的二进制文件对象
+        """
+        with ZipStreamWriter(fp) as writer:
+            for part in self._parts:
+                if len(part) == 2:
+                    name, segments = part
+                    data = b''.join(
+                        self._render_value(record.get(segment[0]), segment[1])
+                        if isinstance(segment, tuple) else segment
+                        for segment in segments
+                    )
+                    writer.write(name, data, DYNAMIC_COMPRESS_LEVEL)
+                else:
+                    writer.write_compressed(*part)
+
+    def render(self, record: dict) -> bytes:
+        """
+        按一条记录生成PPT
+
+        参数:
+            record: 字段名到值的字典
+        返回:
+            PPT文件字节数据
+        """
+        buffer = io.BytesIO()
+        self.render_to(record, buffer)
+        return buffer.getvalue()
+
+
+def compile_template(config: dict, layouts_config: dict, logo_bytes: bytes = None,
+                     uploaded_images: list = None) -> MergeTemplate:
+    """
+    按配置生成一次模板并编译为邮件合并模板
+
+    在 layouts_config 各版式的 'slots' 中写入 {{字段}} 即可声明数据槽，例如
+    {'title': {'enabled': True, 'count': 1, 'slots': {'title': '{{customer}} 年度报告'}}}
+
+    参数:
+        config: 主题配置字典
+        layouts_config: 版式配置（含数据槽）
+        logo_bytes: Logo图片字节数据（可选）
+        uploaded_images: 上传的图片列表（可选）
+    返回:
+        MergeTemplate对象
+    """
+    ppt_buffer = build_presentation(config, layouts_config, logo_bytes, uploaded_images)
+    return MergeTemplate(ppt_buffer.getvalue())
+
+
+def iter_records(path: str):
+    """
+    逐条读取合并数据，不一次性载入整个文件
+
+    参数:
+        path: CSV 或 JSONL 文件路径
+    返回:
+        记录字典的生成器
+    """
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            yield from csv.DictReader(f)
+    else:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def _output_path(output_dir: str, filename_pattern: str, index: int, record: dict) -> str:
+    """
+    根据文件名模式生成输出路径
+
+    参数:
+        output_dir: 输出目录
+        filename_pattern: 文件名模式，如 '{index:06d}.pptx' 或 '{customer_id}.pptx'
+        index: 记录序号
+        record: 记录字典
+    返回:
+        输出文件路径
+    """
+    filename = filename_pattern.format_map(dict(record, index=index))
+    filename = filename.replace('/', '_').replace('\\', '_')
+    return os.path.join(output_dir, filename)
+
+
+# 子进程内缓存的模板，由进程池初始化函数写入
+_worker_state = {}
+
+
+def _init_worker(template: MergeTemplate):
+    """
+    子进程初始化：每个进程只接收一次编译好的模板
+
+    参数:
+        template: MergeTemplate对象
+    """
+    _worker_state['template'] = template
+
+
+def _render_batch(batch: list) -> int:
+    """
+    在子进程中生成一批记录
+
+    参数:
+        batch: [(输出路径, 记录), ...]
+    返回:
+        生成的文件数
+    """
+    template = _worker_state['template']
+    for path, record in batch:
+        with open(path, 'wb') as f:
+            template.render_to(record, f)
+    return len(batch)
+
+
+def _render_tracked(batch: list) -> list:
+    """
+    在子进程中生成一批记录并返回每个任务的结果，单个任务失败不影响同批其他任务
+
+    输出先写入临时文件再改名，进程被终止时不会留下不完整的文件。
+
+    参数:
+        batch: [(任务键, 输出路径, 记录), ...]
+    返回:
+        [(任务键, 输出摘要, 输出字节数, 开始时间, 耗时, 错误信息)]
+    """
+    template = _worker_state['template']
+    results = []
+    for key, path, record in batch:
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            data = template.render(record)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            results.append((key, None, None, started, time.perf_counter() - start,
+                            error_reason(f"{type(e).__name__}: {e}")))
+            continue
+        results.append((key, hashlib.sha256(data).hexdigest(), len(data), started,
+                        time.perf_counter() - start, None))
+    return results
+
+
+def merge_records(template: MergeTemplate, records, output_dir: str,
+                  filename_pattern: str = '{index:06d}.pptx', workers: int = 1,
+                  batch_size: int = 200, job_index: BatchIndex = None) -> int:
+    """
+    批量生成个性化PPT
+
+    记录以流的方式分批处理，同时在途的批次数有上限，内存占用与记录总数无关。
+    提供任务索引时，每完成一批写入一次检查点；中断后以同一索引重新运行，
+    已有输出且摘要一致的记录直接跳过，失败的记录只登记错误而不中止整个批次。
+
+    参数:
+        template: MergeTemplate对象
+        records: 记录可迭代对象（如 iter_records 的返回值）
+        output_dir: 输出目录
+        filename_pattern: 文件名模式，可引用 index 与记录字段
+        workers: 子进程数量，1 表示在当前进程中生成
+        batch_size: 每批记录数（也是检查点间隔）
+        job_index: 批量任务索引（可选）
+    返回:
+        本次生成的文件数（不含跳过与失败的记录）
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    def batches():
+        batch = []
+        jobs = []
+        for index, record in enumerate(records, start=1):
+            path = _output_path(output_dir, filename_pattern, index, record)
+            if job_index is None:
+                batch.append((path, record))
+            else:
+                key = str(index)
+                job_hash = spec_hash(template.digest, record, path)
+                if job_index.is_complete(key, job_hash, path):
+                    continue
+                batch.append((key, path, record))
+                jobs.append((key, job_hash, path, record))
+            if len(batch) >= batch_size:
+                if jobs:
+                    job_index.queue(jobs)
+                    jobs = []
+                yield batch
+                batch = []
+        if batch:
+            if jobs:
+                job_index.queue(jobs)
+            yield batch
+
+    render = _render_batch if job_index is None else _render_tracked
+    counts = {'ok': 0, 'error': 0}
+
+    def finish(result):
+        if job_index is None:
+            counts['ok'] += result
+            return
+        job_index.checkpoint(result)
+        failed = sum(1 for item in result if item[5])
+        counts['ok'] += len(result) - failed
+        counts['error'] += failed
+
+    def report():
+        for status, count in counts.items():
+            if count:
+                BUILDS_TOTAL.inc(count, mode='merge', status=status)
+
+    if workers <= 1:
+        _init_worker(template)
+        try:
+            for batch in batches():
+                finish(render(batch))
+        finally:
+            report()
+        return counts['ok']
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(template,)) as executor:
+        pending = []
+        try:
+            for batch in batches():
+                pending.append(executor.submit(render, batch))
+                QUEUE_DEPTH.set(len(pending), queue='mail_merge')
+                if len(pending) >= workers * 2:
+                    finish(pending.pop(0).result())
+                    QUEUE_DEPTH.set(len(pending), queue='mail_merge')
+            while pending:
+                finish(pending.pop(0).result())
+                QUEUE_DEPTH.set(len(pending), queue='mail_merge')
+        finally:
+            QUEUE_DEPTH.set(0, queue='mail_merge')
+            report()
+    return counts['ok']
+
+
+def main():
+    """命令行入口：python mail_merge.py config.json records.csv output_dir"""
+    parser = argparse.ArgumentParser(description="按模板配置与数据文件批量生成个性化PPT")
+    parser.add_argument('config', help="导出的配置JSON（版式数据槽中使用 {{字段}}）")
+    parser.add_argument('records', help="CSV 或 JSONL 数据文件")
+    parser.add_argument('output_dir', help="输出目录")
+    parser.add_argument('--filename', default='{index:06d}.pptx', help="输出文件名模式")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="子进程数量")
+    parser.add_argument('--index', help="批量任务索引文件（SQLite），中断后以同一文件重新运行即可续跑")
+    args = parser.parse_args()
+
+    with open(args.config, encoding='utf-8') as f:
+        config = json.load(f)
+
+    template = compile_template(config, config.get('layouts', {}))
+    if not args.index:
+        count = merge_records(template, iter_records(args.records), args.output_dir,
+                              args.filename, args.workers)
+        print(f"已生成 {count} 份PPT，数据槽字段：{', '.join(sorted(template.fields))}")
+        return
+
+    with BatchIndex(args.index) as job_index:
+        count = merge_records(template, iter_records(args.records), args.output_dir,
+                              args.filename, args.workers, job_index=job_index)
+        counts = job_index.status_counts()
+    print(f"已生成 {count} 份PPT，累计完成 {counts.get('done', 0)} 份，失败 {counts.get('failed', 0)} 份，"
+          f"数据槽字段：{', '.join(sorted(template.fields))}")
+
+
+if __name__ == "__main__":
+    main()
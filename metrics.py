@@ -0,0 +1,421 @@
+# -*- coding: utf-8 -*-
+"""
+运行指标模块
+在生成器与应用中记录计数器、仪表与直方图（生成耗时、页数、文件大小、图片数据量、
+队列深度、缓存命中率），以 Prometheus 文本格式在本地端口导出，并提供JSON快照
+"""
+
+import json
+import time
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# 默认直方图分桶
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SLIDES_BUCKETS = (1, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+BYTES_BUCKETS = (1 << 14, 1 << 16, 1 << 18, 1 << 20, 1 << 22, 1 << 24, 1 << 26, 1 << 28, 1 << 30)
+
+# 指标导出端口
+DEFAULT_METRICS_PORT = 9108
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value: float) -> str:
+    """按 Prometheus 文本格式输出数值"""
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: dict) -> str:
+    """按 Prometheus 文本格式输出标签"""
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+    return '{' + pairs + '}'
+
+
+class _Metric:
+    """指标基类：按标签值分别保存样本，线程安全"""
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        """
+        参数:
+            name: 指标名称
+            documentation: 说明文字
+            labelnames: 标签名称
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> dict:
+        return dict(zip(self.labelnames, key))
+
+    def clear(self):
+        """清空所有样本"""
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        """
+        增加计数
+
+        参数:
+            amount: 增量（非负）
+            labels: 标签值
+        """
+        if amount < 0:
+            raise ValueError("计数器只能增加")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        """读取当前计数"""
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> list:
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [{'labels': self._labels(key), 'value': value} for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """可增可减的仪表"""
+
+    kind = 'gauge'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        """减少数值"""
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        """设置数值"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """累计分桶直方图"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = SECONDS_BUCKETS):
+        """
+        参数:
+            name: 指标名称
+            documentation: 说明文字
+            labelnames: 标签名称
+            buckets: 分桶上界（升序）
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value: float, **labels):
+        """
+        记录一次观测值
+
+        参数:
+            value: 观测值
+            labels: 标签值
+        """
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """计时上下文：退出时记录经过的秒数"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _cumulative(self, counts: list) -> list:
+        total = 0
+        cumulative = []
+        for count in counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+    def samples(self) -> list:
+        samples = []
+        with self._lock:
+            items = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        for key, counts, total, count in items:
+            labels = self._labels(key)
+            for bound, cumulative in zip(self.buckets, self._cumulative(counts)):
+                samples.append((self.name + '_bucket', dict(labels, le=_format_value(bound)), cumulative))
+            samples.append((self.name + '_sum', labels, total))
+            samples.append((self.name + '_count', labels, count))
+        return samples
+
+    def snapshot(self) -> list:
+        with self._lock:
+            items = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        return [
+            {
+                'labels': self._labels(key),
+                'count': count,
+                'sum': total,
+                'buckets': {_format_value(bound): c for bound, c in zip(self.buckets, self._cumulative(counts))},
+            }
+            for key, counts, total, count in items
+        ]
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._caches = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        """
+        登记指标
+
+        参数:
+            metric: 指标对象
+        返回:
+            同一指标对象
+        """
+        if metric.name in self._metrics:
+            raise ValueError(f"指标已存在: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = SECONDS_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_cache(self, name: str, cached_func):
+        """
+        登记 functools.lru_cache 缓存，导出时读取其命中统计
+
+        参数:
+            name: 缓存名称（cache 标签的值）
+            cached_func: 被 lru_cache 装饰的函数
+        """
+        self._caches[name] = cached_func
+
+    def _cache_stats(self) -> dict:
+        """
+        汇总缓存命中统计：lru_cache 的 cache_info() 与手动记录的 CACHE_REQUESTS
+
+        返回:
+            {缓存名称: (命中数, 未命中数)}
+        """
+        stats = {}
+        for name, func in self._caches.items():
+            info = func.cache_info()
+            stats[name] = (info.hits, info.misses)
+        for entry in CACHE_REQUESTS.snapshot():
+            hits, misses = stats.get(entry['labels']['cache'], (0, 0))
+            if entry['labels']['result'] == 'hit':
+                hits += entry['value']
+            else:
+                misses += entry['value']
+            stats[entry['labels']['cache']] = (hits, misses)
+        return stats
+
+    def render_prometheus(self) -> str:
+        """
+        按 Prometheus 文本格式导出全部指标
+
+        返回:
+            文本内容
+        """
+        lines = []
+        for metric in self._metrics.values():
+            if metric is CACHE_REQUESTS:
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        stats = self._cache_stats()
+        lines.append(f"# HELP {CACHE_REQUESTS.name} {CACHE_REQUESTS.documentation}")
+        lines.append(f"# TYPE {CACHE_REQUESTS.name} counter")
+        for cache, (hits, misses) in stats.items():
+            lines.append(f"{CACHE_REQUESTS.name}{_format_labels({'cache': cache, 'result': 'hit'})} {_format_value(hits)}")
+            lines.append(f"{CACHE_REQUESTS.name}{_format_labels({'cache': cache, 'result': 'miss'})} {_format_value(misses)}")
+        lines.append("# HELP ppt_cache_hit_ratio 缓存命中率")
+        lines.append("# TYPE ppt_cache_hit_ratio gauge")
+        for cache, (hits, misses) in stats.items():
+            ratio = hits / (hits + misses) if hits + misses else 0.0
+            lines.append(f"ppt_cache_hit_ratio{_format_labels({'cache': cache})} {_format_value(ratio)}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> dict:
+        """
+        导出全部指标的JSON快照，便于测试与调试
+
+        返回:
+            {指标名称: {'type', 'help', 'samples'}}，另含 'caches': {缓存名称: {'hits', 'misses', 'ratio'}}
+        """
+        result = {
+            metric.name: {'type': metric.kind, 'help': metric.documentation, 'samples': metric.snapshot()}
+            for metric in self._metrics.values()
+            if metric is not CACHE_REQUESTS
+        }
+        result['caches'] = {
+            cache: {'hits': hits, 'misses': misses, 'ratio': hits / (hits + misses) if hits + misses else 0.0}
+            for cache, (hits, misses) in self._cache_stats().items()
+        }
+        return result
+
+    def reset(self):
+        """清空所有样本（lru_cache 的统计不受影响）"""
+        for metric in self._metrics.values():
+            metric.clear()
+
+
+REGISTRY = Registry()
+
+BUILD_SECONDS = REGISTRY.histogram(
+    'ppt_build_seconds', "整份PPT的生成耗时（秒）", ('mode',))
+LAYOUT_SECONDS = REGISTRY.histogram(
+    'ppt_layout_build_seconds', "单个版式生成调用的耗时（秒）", ('layout',))
+BUILD_SLIDES = REGISTRY.histogram(
+    'ppt_build_slides', "每次生成的幻灯片页数", buckets=SLIDES_BUCKETS)
+OUTPUT_BYTES = REGISTRY.histogram(
+    'ppt_output_bytes', "生成的PPT文件大小（字节）", ('kind',), buckets=BYTES_BUCKETS)
+BUILDS_TOTAL = REGISTRY.counter(
+    'ppt_builds_total', "生成次数", ('mode', 'status'))
+IMAGE_BYTES = REGISTRY.counter(
+    'ppt_image_bytes_total', "写入幻灯片的图片数据量（字节）", ('source',))
+QUEUE_DEPTH = REGISTRY.gauge(
+    'ppt_queue_depth', "等待或正在处理的任务数", ('queue',))
+CACHE_REQUESTS = REGISTRY.counter(
+    'ppt_cache_requests_total', "缓存查询次数", ('cache', 'result'))
+UI_RERUN_SECONDS = REGISTRY.histogram(
+    'ppt_ui_rerun_seconds', "页面脚本重新执行的耗时（秒），scope 为 app 或局部片段名", ('scope',))
+SCHEDULER_WAIT_SECONDS = REGISTRY.histogram(
+    'ppt_scheduler_wait_seconds', "等待生成名额的时间（秒）", ('priority',))
+SCHEDULER_YIELDS = REGISTRY.counter(
+    'ppt_scheduler_yields_total', "低优先级生成在检查点让出名额的次数", ('priority',))
+SPECULATIVE_BUILDS = REGISTRY.counter(
+    'ppt_speculative_builds_total', "推测生成次数，result 为 used / unused / cancelled / cached / failed", ('result',))
+SPECULATIVE_CPU_SECONDS = REGISTRY.counter(
+    'ppt_speculative_cpu_seconds_total', "推测生成消耗的CPU时间（秒），outcome 为 used 或 wasted", ('outcome',))
+ARTIFACT_UPLOADS = REGISTRY.counter(
+    'ppt_artifact_uploads_total', "产物上传次数，result 为 uploaded / deduplicated / failed", ('backend', 'result'))
+ARTIFACT_UPLOAD_SECONDS = REGISTRY.histogram(
+    'ppt_artifact_upload_seconds', "产物上传耗时（秒，含内容已存在时的查询）", ('backend',))
+
+
+@contextmanager
+def track_build(mode: str):
+    """
+    记录一次生成的耗时与结果
+
+    参数:
+        mode: 生成方式（如 'serial'、'parallel'）
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        # 超出资源预算等主动中止的异常带有 metrics_status，与出错分开统计
+        BUILDS_TOTAL.inc(mode=mode, status=getattr(e, 'metrics_status', 'error'))
+        raise
+    else:
+        BUILDS_TOTAL.inc(mode=mode, status='ok')
+    finally:
+        BUILD_SECONDS.observe(time.perf_counter() - start, mode=mode)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """指标导出请求处理：/metrics 为 Prometheus 文本格式，/metrics.json 为JSON快照"""
+
+    registry = REGISTRY
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            body = self.registry.render_prometheus().encode('utf-8')
+            content_type = PROMETHEUS_CONTENT_TYPE
+        elif path == '/metrics.json':
+            body = json.dumps(self.registry.snapshot(), ensure_ascii=False).encode('utf-8')
+            content_type = 'application/json; charset=utf-8'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # 不输出访问日志
+
+
+def start_http_server(port: int = DEFAULT_METRICS_PORT, addr: str = '127.0.0.1',
+                      registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """
+    在后台线程启动指标导出服务
+
+    参数:
+        port: 端口（0 表示自动分配）
+        addr: 监听地址，默认只监听本机
+        registry: 指标注册表
+    返回:
+        HTTP服务对象（server.server_address 为实际地址，server.shutdown() 停止服务）
+    """
+    handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry})
+    server = ThreadingHTTPServer((addr, port), handler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,476 @@
+# -*- coding: utf-8 -*-
+"""
+大纲导入模块
+将 Markdown 大纲逐行流式转换为PPT：标题、各级列表与段落映射到内容页，
+引用块映射到引用页，独占一行的图片映射到图文页，二级标题汇总为目录页。
+正文超出文本框时自动续页；幻灯片按块生成后流式合并，内存占用不随文档长度增长
+
+映射规则:
+    # 标题            文档第一个一级标题为标题页，其后第一段为副标题；之后的一级标题同二级标题
+    ## 标题           新的章节，汇总为目录页（标题页之后），并开始新的内容页
+    ### 标题 …        开始新的内容页
+    - / * / + / 1.   列表项：顶层为「• 」，缩进的子项为「- 」（与内容页默认正文一致）
+    > 引用            连续的引用行合并为引用页，以「——」或「--」开头的末行作为出处
+    ![说明](图片)     图文页，其后的段落与列表为说明文字（图片左右交替）
+    ---               强制分页
+"""
+
+import io
+import os
+import re
+import json
+import time
+import argparse
+import tempfile
+
+from config_presets import DEFAULT_CONFIG
+from deck_merge import merge_presentations
+from governor import ResourceGovernor
+from image_check import ImageRejected, inspect_image
+from metrics import BUILD_SLIDES, track_build
+from ppt_generator import (
+    CONTENT_BODY_FONT_SIZE,
+    DEFAULT_AGENDA_ITEMS,
+    IMAGE_TEXT_BODY_FONT_SIZE,
+    TEXT_INSET_X,
+    TEXT_INSET_Y,
+    add_agenda_slide,
+    add_content_slide,
+    add_image_text_slide,
+    add_quote_slide,
+    add_title_slide,
+    content_body_box,
+    decorate_slide,
+    get_slide_size,
+    image_text_body_box,
+    new_presentation,
+    save_presentation,
+    text_fit,
+)
+from slide_plan import SlideSpec
+from text_metrics import count_lines, line_spacing
+
+
+HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+BULLET_PATTERN = re.compile(r'^(\s*)(?:[-*+]|\d+[.)])\s+(.*)$')
+IMAGE_PATTERN = re.compile(r'^!\[([^\]]*)\]\(\s*<?([^)\s>]+)>?(?:\s+"[^"]*")?\s*\)$')
+QUOTE_PATTERN = re.compile(r'^\s*>\s?(.*)$')
+RULE_PATTERN = re.compile(r'^\s*(?:-{3,}|\*{3,}|_{3,})\s*$')
+FENCE_PATTERN = re.compile(r'^\s*(```|~~~)')
+AUTHOR_PATTERN = re.compile(r'^(?:——|--|—)\s*')
+
+# 行内标记：图片、链接只保留文字，去掉强调与代码标记
+INLINE_PATTERNS = (
+    (re.compile(r'!\[([^\]]*)\]\([^)]*\)'), r'\1'),
+    (re.compile(r'\[([^\]]*)\]\([^)]*\)'), r'\1'),
+    (re.compile(r'(\*\*|__)(.+?)\1'), r'\2'),
+    (re.compile(r'(?<![\w*])([*_])(?!\s)(.+?)(?<!\s)\1(?![\w*])'), r'\2'),
+    (re.compile(r'`([^`]*)`'), r'\1'),
+)
+MARKUP_PATTERN = re.compile(r'[*_`\[]')
+
+# 每页目录条目数，与目录页默认条目数一致
+AGENDA_ITEMS_PER_PAGE = len(DEFAULT_AGENDA_ITEMS)
+
+# 每块生成的页数：块内幻灯片在内存中生成，块之间流式合并
+CHUNK_SLIDES = 200
+
+# 子项缩进：每级缩进的空格数（制表符按4个空格计）
+INDENT_WIDTH = 2
+
+CONTINUED_SUFFIX = "（续）"
+
+IMAGE_VARIANTS = ('left-image', 'right-image')
+
+
+def strip_inline(text: str) -> str:
+    """
+    去掉行内 Markdown 标记
+
+    参数:
+        text: 一行文字
+    返回:
+        纯文本
+    """
+    if MARKUP_PATTERN.search(text):
+        for pattern, replacement in INLINE_PATTERNS:
+            text = pattern.sub(replacement, text)
+    return text.strip()
+
+
+def scan_sections(lines) -> list:
+    """
+    扫描二级标题（代码块中的除外），用于生成目录页
+
+    参数:
+        lines: 文本行的可迭代对象
+    返回:
+        章节标题列表
+    """
+    sections, in_code, seen_title = [], False, False
+    for line in lines:
+        if FENCE_PATTERN.match(line):
+            in_code = not in_code
+            continue
+        match = None if in_code else HEADING_PATTERN.match(line)
+        if match is None:
+            continue
+        level = len(match.group(1))
+        # 文档第一个一级标题是标题页，之后的一级标题同二级标题
+        if level == 1 and not seen_title:
+            seen_title = True
+        elif level <= 2:
+            sections.append(strip_inline(match.group(2)))
+    return sections
+
+
+class _TextArea:
+    """正文文本框的容量：按行数累计，放不下时续页"""
+
+    __slots__ = ('font_name', 'font_size', 'width', 'max_lines')
+
+    def __init__(self, font_name: str, font_size: float, width: float, height: float):
+        self.font_name = font_name
+        self.font_size = font_size
+        # 与 add_text_box 测量溢出时的内框一致
+        self.width = width - 2 * TEXT_INSET_X
+        line_height = font_size * line_spacing(font_name) / 72
+        self.max_lines = max(1, int((height - TEXT_INSET_Y) / line_height + 1e-9))
+
+    def lines(self, text: str) -> int:
+        return count_lines(text, self.font_name, self.font_size, self.width)
+
+
+class OutlineConverter:
+    """
+    Markdown 大纲到幻灯片计划的流式转换器
+
+    feed() 逐行输入，返回本行完成的 SlideSpec 列表；close() 输出剩余内容。
+    """
+
+    def __init__(self, config: dict, sections: list = None, base_dir: str = None):
+        """
+        参数:
+            config: 主题配置字典
+            sections: 章节标题列表（可选，见 scan_sections），非空时在标题页之后生成目录页
+            base_dir: 图片相对路径的基准目录（可选）
+        """
+        self.config = config
+        self.sections = sections or []
+        self.base_dir = base_dir or '.'
+        slide_width, slide_height = get_slide_size(config)
+        self.content_area = _TextArea(config['body_font'], CONTENT_BODY_FONT_SIZE,
+                                      *content_body_box(slide_width, slide_height)[2:])
+        self.image_areas = {
+            variant: _TextArea(config['body_font'], IMAGE_TEXT_BODY_FONT_SIZE,
+                               *image_text_body_box(variant, slide_width, slide_height)[2:])
+            for variant in IMAGE_VARIANTS
+        }
+
+        self.slides = 0
+        self.content_pages = 0
+        self.image_pages = 0
+        self.heading = ""
+        self.in_code = False
+        # 标题页：等待一级标题与副标题
+        self.title = None
+        self.title_done = False
+        # 当前页：类型（'content' / 'image'）、正文行、已用行数、图片路径与是否为续页
+        self.kind = 'content'
+        self.body = []
+        self.used_lines = 0
+        self.image = None
+        self.continued = False
+        self.quote = []
+
+    # ---------- 幻灯片输出 ----------
+
+    def _spec(self, layout: str, builder, **kwargs) -> SlideSpec:
+        self.slides += 1
+        return SlideSpec(layout, builder, kwargs, [])
+
+    def _finish_title(self) -> list:
+        """输出标题页与目录页"""
+        if self.title_done:
+            return []
+        self.title_done = True
+        specs = []
+        if self.title is not None:
+            title, subtitle = self.title
+            slots = {'title': title}
+            if subtitle:
+                slots['subtitle'] = subtitle
+            specs.append(self._spec('title', add_title_slide, slots=slots))
+        for start in range(0, len(self.sections), AGENDA_ITEMS_PER_PAGE):
+            items = [f"{i + 1:02d}  {name}" for i, name in
+                     enumerate(self.sections[start:start + AGENDA_ITEMS_PER_PAGE], start)]
+            specs.append(self._spec('agenda', add_agenda_slide, slots={'items': items}))
+        return specs
+
+    def _heading_text(self) -> str:
+        return f"{self.heading}{CONTINUED_SUFFIX}" if self.continued and self.heading else self.heading
+
+    def _flush_page(self) -> list:
+        """输出当前页（没有正文的内容页不输出）"""
+        specs = self._finish_title()
+        body = '\n'.join(self.body)
+        if self.kind == 'image':
+            variant = IMAGE_VARIANTS[self.image_pages % len(IMAGE_VARIANTS)]
+            self.image_pages += 1
+            image_bytes, image_info = self._read_image(self.image)
+            specs.append(self._spec('image_text', add_image_text_slide, layout_variant=variant,
+                                    image_bytes=image_bytes, image_info=image_info,
+                                    slots={'heading': self._heading_text(), 'body': body}))
+        elif self.body:
+            self.content_pages += 1
+            specs.append(self._spec('content', add_content_slide, page_num=self.content_pages,
+                                    slide_num=self.slides + 1,
+                                    slots={'heading': self._heading_text(), 'body': body}))
+        self.kind, self.body, self.used_lines, self.image = 'content', [], 0, None
+        return specs
+
+    def _flush_quote(self) -> list:
+        """输出累积的引用页"""
+        if not self.quote:
+            return []
+        specs = self._flush_page()
+        lines = self.quote
+        self.quote = []
+        author = None
+        if len(lines) > 1 and AUTHOR_PATTERN.match(lines[-1]):
+            author = lines.pop()
+        slots = {'quote': '\n'.join(lines)}
+        if author:
+            slots['author'] = author
+        specs.append(self._spec('quote', add_quote_slide, slots=slots))
+        # 引用之后的正文属于同一章节
+        self.continued = bool(self.heading)
+        return specs
+
+    def _read_image(self, path: str) -> tuple:
+        """读取并校验图片，返回 (字节数据, ImageInfo)；网络地址、读取失败或未通过校验时为 (None, None)（显示占位区域）"""
+        if not path or '://' in path:
+            return None, None
+        try:
+            with open(os.path.join(self.base_dir, path), 'rb') as f:
+                data = f.read()
+            return data, inspect_image(data, path)
+        except (OSError, ImageRejected):
+            return None, None
+
+    def _add_line(self, text: str) -> list:
+        """向当前页添加一行正文，放不下时续页"""
+        specs = self._finish_title()
+        area = self.image_areas[IMAGE_VARIANTS[self.image_pages % len(IMAGE_VARIANTS)]] \
+            if self.kind == 'image' else self.content_area
+        lines = area.lines(text)
+        if self.body and self.used_lines + lines > area.max_lines:
+            specs.extend(self._flush_page())
+            self.continued = True
+            area = self.content_area
+            lines = area.lines(text)
+        self.body.append(text)
+        self.used_lines += lines
+        return specs
+
+    # ---------- 逐行输入 ----------
+
+    def feed(self, line: str) -> list:
+        """
+        输入一行 Markdown
+
+        参数:
+            line: 文本行（可带换行符）
+        返回:
+            本行完成的 SlideSpec 列表
+        """
+        line = line.rstrip('\r\n')
+        if FENCE_PATTERN.match(line):
+            self.in_code = not self.in_code
+            return self._flush_quote()
+        if self.in_code:
+            # 代码块原样保留（空行除外）
+            return self._add_line(line.expandtabs(4)) if line.strip() else []
+
+        quote = QUOTE_PATTERN.match(line)
+        if quote:
+            text = strip_inline(quote.group(1))
+            if text:
+                self.quote.append(text)
+            return []
+        specs = self._flush_quote()
+
+        stripped = line.strip()
+        if not stripped:
+            return specs
+
+        heading = HEADING_PATTERN.match(line)
+        if heading:
+            level, text = len(heading.group(1)), strip_inline(heading.group(2))
+            if level == 1 and self.title is None and not self.title_done and self.slides == 0:
+                self.title = (text, None)
+                return specs
+            specs.extend(self._flush_page())
+            self.heading, self.continued = text, False
+            return specs
+
+        if RULE_PATTERN.match(line):
+            specs.extend(self._flush_page())
+            self.continued = bool(self.heading)
+            return specs
+
+        image = IMAGE_PATTERN.match(stripped)
+        if image:
+            specs.extend(self._flush_page())
+            self.kind, self.image = 'image', image.group(2)
+            if image.group(1) and not self.heading:
+                self.heading = image.group(1)
+            return specs
+
+        bullet = BULLET_PATTERN.match(line)
+        if bullet:
+            indent = len(bullet.group(1).expandtabs(4)) // INDENT_WIDTH
+            text = strip_inline(bullet.group(2))
+            text = f"• {text}" if indent == 0 else f"{'    ' * min(indent, 3)}- {text}"
+        else:
+            text = strip_inline(line)
+            # 一级标题之后的第一段为副标题
+            if self.title is not None and not self.title_done and self.title[1] is None:
+                self.title = (self.title[0], text)
+                return specs
+        return specs + self._add_line(text)
+
+    def close(self) -> list:
+        """
+        输入结束，输出剩余内容
+
+        返回:
+            SlideSpec 列表
+        """
+        return self._flush_quote() + self._flush_page()
+
+
+def iter_outline_slides(lines, config: dict, sections: list = None, base_dir: str = None):
+    """
+    将 Markdown 文本行流式转换为幻灯片计划
+
+    参数:
+        lines: 文本行的可迭代对象
+        config: 主题配置字典
+        sections: 目录页的章节标题（可选，见 scan_sections）
+        base_dir: 图片相对路径的基准目录（可选）
+    返回:
+        SlideSpec 的生成器
+    """
+    converter = OutlineConverter(config, sections, base_dir)
+    for line in lines:
+        yield from converter.feed(line)
+    yield from converter.close()
+
+
+def _build_chunk(config: dict, specs: list, first_index: int, logo_bytes: bytes,
+                 governor: ResourceGovernor) -> io.BytesIO:
+    """生成一块幻灯片，页脚与页码按在整份文档中的位置添加"""
+    prs = new_presentation(config)
+    slide_width, slide_height = get_slide_size(config)
+    with text_fit(config.get('text_fit', 'none')):
+        for spec in specs:
+            spec.builder(prs, config, **spec.kwargs)
+            governor.check(governor.slides_done + 1, 'slides')
+        for offset, slide in enumerate(prs.slides):
+            decorate_slide(slide, first_index + offset, config, logo_bytes, slide_width, slide_height)
+    return save_presentation(prs, config)
+
+
+def build_from_markdown(source, config: dict = None, output=None, logo_bytes: bytes = None,
+                        chunk_slides: int = CHUNK_SLIDES, budget=None):
+    """
+    由 Markdown 大纲生成PPT
+
+    先扫描一遍二级标题生成目录页，再逐行转换；每 chunk_slides 页生成一块并写入临时文件，
+    最后流式合并。非文件输入先写入临时文件（小文档留在内存中）。
+
+    参数:
+        source: Markdown 文件路径，或文本/二进制文件对象
+        config: 主题配置字典（可选，默认 DEFAULT_CONFIG）
+        output: 输出文件路径或可写的二进制文件对象（可选）
+        logo_bytes: Logo图片字节数据（可选）
+        chunk_slides: 每块页数
+        budget: BuildBudget资源预算（可选）
+    返回:
+        未指定输出时为包含PPT文件的BytesIO对象，否则为页数
+    """
+    config = config or DEFAULT_CONFIG
+    base_dir = None
+    if isinstance(source, (str, os.PathLike)):
+        base_dir = os.path.dirname(os.path.abspath(source))
+        text = open(source, encoding='utf-8')
+    else:
+        # 不可回读的输入先写入临时文件，供两遍读取
+        text = tempfile.SpooledTemporaryFile(max_size=1 << 20, mode='w+', encoding='utf-8')
+        for line in source:
+            text.write(line.decode('utf-8') if isinstance(line, bytes) else line)
+        text.seek(0)
+
+    chunks = []
+    try:
+        with track_build('outline'), text:
+            sections = scan_sections(text)
+            text.seek(0)
+            governor = ResourceGovernor(budget)
+            pending, total = [], 0
+            for spec in iter_outline_slides(text, config, sections, base_dir):
+                pending.append(spec)
+                if len(pending) >= chunk_slides:
+                    chunks.append(_spool(_build_chunk(config, pending, total, logo_bytes, governor)))
+                    total += len(pending)
+                    pending = []
+            if pending or not chunks:
+                chunks.append(_spool(_build_chunk(config, pending, total, logo_bytes, governor)))
+                total += len(pending)
+
+            if output is None and len(chunks) == 1:
+                chunks[0].seek(0)
+                result = io.BytesIO(chunks[0].read())
+            else:
+                for chunk in chunks:
+                    chunk.seek(0)
+                result = merge_presentations(chunks, output)
+            governor.check(stage='save')
+    finally:
+        for chunk in chunks:
+            chunk.close()
+
+    BUILD_SLIDES.observe(total)
+    return result if output is None else total
+
+
+def _spool(buffer: io.BytesIO):
+    """将一块生成结果转入临时文件（超过阈值时写入磁盘）"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=4 << 20)
+    spooled.write(buffer.getbuffer())
+    return spooled
+
+
+def main():
+    """命令行入口：python outline_import.py outline.md -o deck.pptx [--config config.json]"""
+    parser = argparse.ArgumentParser(description="将 Markdown 大纲转换为PPT")
+    parser.add_argument('markdown', help="Markdown 文件")
+    parser.add_argument('-o', '--output', required=True, help="输出文件路径")
+    parser.add_argument('--config', help="导出的配置 JSON（可选）")
+    args = parser.parse_args()
+
+    config = DEFAULT_CONFIG
+    if args.config:
+        with open(args.config, encoding='utf-8') as f:
+            config = dict(DEFAULT_CONFIG, **json.load(f))
+
+    start = time.perf_counter()
+    slides = build_from_markdown(args.markdown, config, args.output)
+    elapsed = time.perf_counter() - start
+    print(f"共 {slides} 页，耗时 {elapsed:.2f} 秒（{slides / elapsed:.0f} 页/秒），"
+          f"输出 {os.path.getsize(args.output) / 1024:.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+"""
+输出缓存模块
+按配置、版式与素材内容的摘要缓存生成的PPT，相同请求直接返回缓存结果；
+服务启动时可预热全部预设主题 × 画布比例的默认版式PPT，
+同一比例只完整生成一次，其余主题由已生成的PPT换肤得到
+"""
+
+import io
+import os
+import json
+import time
+import zipfile
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from config_presets import DEFAULT_CONFIG, SLIDE_RATIOS, THEME_PRESETS
+from metrics import CACHE_REQUESTS
+from ppt_generator import build_presentation
+from scheduler import PRIORITY_BATCH, SCHEDULER
+from retheme import (
+    RETHEME_PART_PATTERN,
+    SRGB_PATTERN,
+    TYPEFACE_PATTERN,
+    build_mapping,
+    is_lossless,
+    retheme_bytes,
+)
+from shm_result import share_buffer, start_tracker
+
+
+# 预设主题应用到配置中的字段，与页面上「应用主题预设」一致
+THEME_FIELDS = ('primary', 'secondary', 'accent', 'background', 'title_font', 'body_font')
+
+# 探测版式中写死的颜色与字体时使用的主题取值，不会与真实取值重合
+PROBE_THEME = {
+    'primary': '#000001',
+    'secondary': '#000002',
+    'accent': '#000003',
+    'background': '#000004',
+    'title_font': 'Probe Title',
+    'body_font': 'Probe Body',
+}
+
+# 内存缓存容量（MB）与磁盘缓存目录，可由环境变量覆盖
+DEFAULT_CACHE_MB = 256
+CACHE_MB_ENV = 'PPT_CACHE_MB'
+CACHE_DIR_ENV = 'PPT_CACHE_DIR'
+
+
+def _key_default(value):
+    """
+    json.dumps 不能直接序列化的取值：数组与字节数据按内容摘要，其余类型无法可靠计算摘要，直接报错
+
+    只按 str() 序列化会让内容不同、显示相同的取值（如被省略号截断的大数组）得到相同的缓存键。
+    """
+    if isinstance(value, np.ndarray):
+        if value.dtype.hasobject:
+            return value.tolist()
+        data = np.ascontiguousarray(value).tobytes()
+        return {'ndarray': value.dtype.str, 'shape': value.shape,
+                'sha256': hashlib.sha256(data).hexdigest()}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {'bytes': hashlib.sha256(value).hexdigest()}
+    raise TypeError(f"无法计算缓存键的取值类型: {type(value).__name__}")
+
+
+def _source_files(value):
+    """
+    版式数据槽中的数据源文件路径（如表格页的 CSV source）
+
+    参数:
+        value: 版式配置或其中的任意部分
+    返回:
+        文件路径的生成器
+    """
+    if isinstance(value, dict):
+        for name, item in value.items():
+            if name == 'source' and isinstance(item, (str, os.PathLike)):
+                yield item
+            else:
+                yield from _source_files(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _source_files(item)
+
+
+def cache_key(config: dict, layouts_config: dict, logo_bytes: bytes = None,
+              uploaded_images: list = None) -> str:
+    """
+    计算生成请求的缓存键
+
+    数据源文件按路径、大小与修改时间参与计算，文件被改写后缓存键随之变化；
+    配置中含有无法计算摘要的取值（如生成器）时抛出 TypeError，此时不应使用缓存。
+
+    参数:
+        config: 主题配置字典
+        layouts_config: 版式配置字典
+        logo_bytes: Logo图片字节数据（可选）
+        uploaded_images: 上传的图片列表（可选）
+    返回:
+        十六进制摘要字符串
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([config, layouts_config], sort_keys=True,
+                             ensure_ascii=False, default=_key_default).encode('utf-8'))
+    for path in _source_files(layouts_config):
+        stat = os.stat(path)
+        digest.update(f"{os.fspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode('utf-8'))
+    # 素材按内容摘要参与计算，文件名不影响生成结果
+    for data in [logo_bytes or b''] + [img['bytes'] for img in uploaded_images or []]:
+        digest.update(hashlib.sha256(data).digest())
+    return digest.hexdigest()
+
+
+class OutputCache:
+    """
+    生成结果缓存：内存中按总字节数限制的LRU，可选磁盘目录作为第二级
+
+    磁盘缓存可由构建步骤预先写好，多个服务进程共用。
+    """
+
+    def __init__(self, max_bytes: int, directory: str = None):
+        """
+        参数:
+            max_bytes: 内存缓存的最大总字节数
+            directory: 磁盘缓存目录（可选）
+        """
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pptx")
+
+    def get(self, key: str) -> bytes:
+        """
+        读取缓存
+
+        参数:
+            key: 缓存键
+        返回:
+            PPT文件字节数据，未命中时为 None
+        """
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+        if data is None and self.directory:
+            try:
+                with open(self._path(key), 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                pass
+            else:
+                self._store(key, data)
+        CACHE_REQUESTS.inc(cache='output', result='miss' if data is None else 'hit')
+        return data
+
+    def _store(self, key: str, data: bytes):
+        """写入内存缓存并按容量淘汰最久未用的条目"""
+        if len(data) > self.max_bytes:
+            return
+        # 共享内存等缓冲区在写入后即失效，内存缓存保存一份副本
+        data = bytes(data)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def put(self, key: str, data: bytes):
+        """
+        写入缓存（有磁盘目录时同时写入磁盘）
+
+        参数:
+            key: 缓存键
+            data: PPT文件字节数据（也可为 memoryview 等缓冲区，磁盘缓存直接从中写出）
+        """
+        self._store(key, data)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            if key in self._entries:
+                return True
+        return bool(self.directory) and os.path.exists(self._path(key))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        """内存缓存的总字节数"""
+        return self._size
+
+
+OUTPUT_CACHE = OutputCache(int(os.environ.get(CACHE_MB_ENV, DEFAULT_CACHE_MB)) * 1024 * 1024,
+                           os.environ.get(CACHE_DIR_ENV) or None)
+
+
+def cached_build(config: dict, layouts_config: dict, logo_bytes: bytes = None,
+                 uploaded_images: list = None, cache: OutputCache = OUTPUT_CACHE,
+                 budget=None) -> io.BytesIO:
+    """
+    生成PPT，相同请求直接返回缓存结果
+
+    参数同 build_presentation，另加:
+        cache: 输出缓存
+        budget: BuildBudget资源预算（可选，只约束未命中缓存时的生成）
+    返回:
+        包含PPT文件的BytesIO对象
+    """
+    try:
+        key = cache_key(config, layouts_config, logo_bytes, uploaded_images)
+    except TypeError:
+        # 无法计算缓存键的请求直接生成，不读写缓存
+        return build_presentation(config, layouts_config, logo_bytes, uploaded_images, budget)
+    data = cache.get(key)
+    if data is None:
+        data = build_presentation(config, layouts_config, logo_bytes, uploaded_images, budget).getvalue()
+        cache.put(key, data)
+    return io.BytesIO(data)
+
+
+def preset_config(theme_name: str, ratio: str) -> dict:
+    """
+    预设主题与画布比例对应的默认配置，与页面上只选择主题和比例的结果相同
+
+    参数:
+        theme_name: THEME_PRESETS 中的主题名称
+        ratio: SLIDE_RATIOS 中的比例
+    返回:
+        配置字典（版式配置为独立副本）
+    """
+    theme = THEME_PRESETS[theme_name]
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    config.update({key: theme[key] for key in THEME_FIELDS}, theme=theme_name, ratio=ratio)
+    return config
+
+
+def _build_task(config: dict) -> bytes:
+    """按配置的默认版式生成一份PPT"""
+    return build_presentation(config, config['layouts']).getvalue()
+
+
+def _build_shared(config: dict):
+    """子进程任务：生成结果写入共享内存，只回传句柄"""
+    return share_buffer(build_presentation(config, config['layouts']))
+
+
+def _fixed_values() -> tuple:
+    """
+    探测默认版式中写死（不随主题变化）的颜色与字体
+
+    用一组不会与真实取值重合的主题生成一份PPT，其中不属于该主题的取值即为写死的取值。
+
+    返回:
+        (颜色集合, 字体集合)
+    """
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    config.update(PROBE_THEME)
+    data = build_presentation(config, config['layouts']).getvalue()
+
+    colors, fonts = set(), set()
+    with zipfile.ZipFile(io.BytesIO(data)) as package:
+        for name in package.namelist():
+            if RETHEME_PART_PATTERN.match(name):
+                xml = package.read(name)
+                colors.update(m.group(2).decode('ascii').upper() for m in SRGB_PATTERN.finditer(xml))
+                fonts.update(m.group(2).decode('utf-8') for m in TYPEFACE_PATTERN.finditer(xml))
+    colors -= {value.lstrip('#').upper() for value in PROBE_THEME.values() if value.startswith('#')}
+    fonts -= {value for value in PROBE_THEME.values() if not value.startswith('#')}
+    return colors, fonts
+
+
+def _prewarm_groups() -> list:
+    """
+    规划预热任务：每个比例选一个基准主题完整生成，其余主题换肤得到；
+    换肤结果与直接生成不一致的主题单独生成
+
+    返回:
+        [(比例, 基准主题, [换肤得到的主题], [单独生成的主题])]
+    """
+    fixed_colors, fixed_fonts = _fixed_values()
+
+    def lossless(old, new):
+        return is_lossless(old, new, fixed_colors, fixed_fonts)
+
+    # 选可换肤得到其余主题最多的作为基准
+    base = max(THEME_PRESETS, key=lambda name: sum(lossless(name, other) for other in THEME_PRESETS))
+    derived = [name for name in THEME_PRESETS if name != base and lossless(base, name)]
+    direct = [name for name in THEME_PRESETS if name != base and name not in derived]
+    return [(ratio, base, derived, direct) for ratio in SLIDE_RATIOS]
+
+
+def prewarm(cache: OutputCache = OUTPUT_CACHE, workers: int = None) -> dict:
+    """
+    预热全部预设主题 × 画布比例的默认版式PPT
+
+    完整生成在子进程中并行执行，换肤在主进程中流式完成。
+
+    参数:
+        cache: 输出缓存
+        workers: 子进程数量（可选，默认为CPU核数）
+    返回:
+        统计信息字典：decks, built, rethemed, seconds
+    """
+    start = time.perf_counter()
+    groups = _prewarm_groups()
+    builds = [(ratio, name) for ratio, base, _, direct in groups for name in [base] + direct]
+    configs = [preset_config(name, ratio) for ratio, name in builds]
+
+    pending = [config for config in configs
+               if cache_key(config, config['layouts']) not in cache]
+    workers = min(workers or os.cpu_count() or 1, max(1, len(pending)))
+    if workers <= 1:
+        # 在服务进程内预热时让出给页面上的交互式生成
+        for config in pending:
+            with SCHEDULER.slot(PRIORITY_BATCH, 'prewarm'):
+                data = _build_task(config)
+            cache.put(cache_key(config, config['layouts']), data)
+    else:
+        start_tracker()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_build_shared, config) for config in pending]
+            try:
+                # 直接从共享内存写入缓存，PPT数据不经 pickle
+                for config, future in zip(pending, futures):
+                    with future.result().attach() as view:
+                        cache.put(cache_key(config, config['layouts']), view)
+            finally:
+                # 出错时删除其余已完成任务的共享内存段
+                for future in futures:
+                    if future.done() and not future.exception():
+                        future.result().discard()
+
+    rethemed = 0
+    for ratio, base, derived, _ in groups:
+        base_config = preset_config(base, ratio)
+        base_data = None
+        for name in derived:
+            config = preset_config(name, ratio)
+            key = cache_key(config, config['layouts'])
+            if key in cache:
+                continue
+            if base_data is None:
+                base_data = cache.get(cache_key(base_config, base_config['layouts']))
+            with SCHEDULER.slot(PRIORITY_BATCH, 'prewarm'):
+                data = retheme_bytes(base_data, build_mapping(base, name))
+            cache.put(key, data)
+            rethemed += 1
+
+    return {
+        'decks': len(THEME_PRESETS) * len(SLIDE_RATIOS),
+        'built': len(pending),
+        'rethemed': rethemed,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def main():
+    """命令行入口：python output_cache.py cache_dir/ （构建步骤中预先生成磁盘缓存）"""
+    parser = argparse.ArgumentParser(description="预先生成全部预设主题 × 画布比例的默认PPT")
+    parser.add_argument('directory', help=f"磁盘缓存目录（服务通过环境变量 {CACHE_DIR_ENV} 读取）")
+    parser.add_argument('--workers', type=int, default=None, help="子进程数量")
+    args = parser.parse_args()
+
+    stats = prewarm(OutputCache(0, args.directory), args.workers)
+    print(f"共 {stats['decks']} 份：完整生成 {stats['built']} 份，换肤 {stats['rethemed']} 份，"
+          f"耗时 {stats['seconds']:.2f} 秒")
+
+
+if __name__ == "__main__":
+    main()
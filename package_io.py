@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+PPT文件包读写模块
+以ZIP条目为单位流式读写 .pptx 文件包：未修改的条目直接复制压缩数据，
+无需解压再压缩；新条目可预先压缩后反复写入
+"""
+
+import zlib
+import struct
+import zipfile
+import posixpath
+
+from lxml import etree
+
+
+# 固定的ZIP时间戳（1980-01-01 00:00），保证相同输入得到相同输出
+DOS_TIME = 0
+DOS_DATE = (1 << 5) | 1
+
+# 复制原始压缩数据时每次读取的字节数
+COPY_CHUNK_SIZE = 1 << 20
+
+_LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+_CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+_END_RECORD = struct.Struct('<IHHHHIIH')
+
+NS_RELS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+
+def deflate(data: bytes, level: int = 6) -> bytes:
+    """
+    以ZIP使用的raw deflate格式压缩数据
+
+    参数:
+        data: 原始数据
+        level: 压缩级别
+    返回:
+        压缩后的数据
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compressed_entry(name: str, data: bytes, level: int = 6) -> tuple:
+    """
+    生成预压缩的ZIP条目，可多次写入不同的文件
+
+    参数:
+        name: 条目名称
+        data: 原始数据
+        level: 压缩级别
+    返回:
+        (名称, CRC32, 原始大小, 压缩数据)
+    """
+    return name, zlib.crc32(data), len(data), deflate(data, level)
+
+
+def rels_name(partname: str) -> str:
+    """部件对应的关系文件名，根关系为 _rels/.rels"""
+    directory, name = posixpath.split(partname)
+    return posixpath.join(directory, '_rels', f'{name}.rels')
+
+
+def read_rels(package: zipfile.ZipFile, names: set, partname: str) -> tuple:
+    """
+    读取部件的关系（外部链接不返回，保留在关系XML中）
+
+    参数:
+        package: PPT文件包ZIP
+        names: ZIP中的条目名集合
+        partname: 部件名（根关系为空字符串）
+    返回:
+        (关系XML根元素, [(关系元素, 关系类型, 目标部件名)])，无关系文件时为 (None, [])
+    """
+    name = rels_name(partname)
+    if name not in names:
+        return None, []
+    root = etree.fromstring(package.read(name))
+    rels = []
+    for rel in root.iter(f'{{{NS_RELS}}}Relationship'):
+        if rel.get('TargetMode') == 'External':
+            continue
+        target = rel.get('Target')
+        if target.startswith('/'):
+            target = target[1:]
+        else:
+            target = posixpath.normpath(posixpath.join(posixpath.dirname(partname), target))
+        rels.append((rel, rel.get('Type'), target))
+    return root, rels
+
+
+def serialize_xml(root) -> bytes:
+    """序列化部件XML（带 standalone 声明，与 python-pptx 保存的格式一致）"""
+    return etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+
+
+class ZipStreamWriter:
+    """
+    流式ZIP写入器：逐条写入条目，关闭时写出中央目录
+
+    不支持ZIP64，单个条目与整个文件均需小于4GB。
+    """
+
+    def __init__(self, fp):
+        """
+        参数:
+            fp: 可写的二进制文件对象
+        """
+        self._fp = fp
+        self._central = []
+        self._offset = 0
+
+    def _write_header(self, name: str, crc: int, size: int, compressed_size: int, method: int):
+        name_bytes = name.encode('utf-8')
+        # 名称含非ASCII字符时设置UTF-8标志位
+        flags = 0 if name.isascii() else 0x800
+        header = _LOCAL_HEADER.pack(
+            0x04034b50, 20, flags, method, DOS_TIME, DOS_DATE,
+            crc, compressed_size, size, len(name_bytes), 0
+        )
+        self._fp.write(header)
+        self._fp.write(name_bytes)
+        self._central.append(_CENTRAL_HEADER.pack(
+            0x02014b50, 20, 20, flags, method, DOS_TIME, DOS_DATE,
+            crc, compressed_size, size, len(name_bytes), 0, 0, 0, 0, 0, self._offset
+        ) + name_bytes)
+        self._offset += len(header) + len(name_bytes) + compressed_size
+
+    def write_compressed(self, name: str, crc: int, size: int, data: bytes,
+                         method: int = zipfile.ZIP_DEFLATED):
+        """
+        写入已压缩的条目
+
+        参数:
+            name: 条目名称
+            crc: 原始数据的CRC32
+            size: 原始大小
+            data: 压缩数据
+            method: 压缩方式
+        """
+        self._write_header(name, crc, size, len(data), method)
+        self._fp.write(data)
+
+    def write(self, name: str, data: bytes, level: int = 6):
+        """
+        压缩并写入条目
+
+        参数:
+            name: 条目名称
+            data: 原始数据
+            level: 压缩级别
+        """
+        self.write_compressed(*compressed_entry(name, data, level))
+
+    def copy_raw(self, src_fp, info: zipfile.ZipInfo, name: str = None):
+        """
+        从源ZIP文件直接复制条目的压缩数据，不解压
+
+        参数:
+            src_fp: 源ZIP文件的二进制文件对象（可定位）
+            info: 源条目的ZipInfo
+            name: 写入的条目名称（可选，默认与源条目相同）
+        """
+        src_fp.seek(info.header_offset)
+        local_header = _LOCAL_HEADER.unpack(src_fp.read(_LOCAL_HEADER.size))
+        src_fp.seek(local_header[9] + local_header[10], 1)
+
+        self._write_header(name or info.filename, info.CRC, info.file_size,
+                           info.compress_size, info.compress_type)
+        remaining = info.compress_size
+        while remaining:
+            chunk = src_fp.read(min(COPY_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise zipfile.BadZipFile(f"条目数据不完整: {info.filename}")
+            self._fp.write(chunk)
+            remaining -= len(chunk)
+
+    def close(self):
+        """写出中央目录与结束记录"""
+        central_dir = b''.join(self._central)
+        self._fp.write(central_dir)
+        self._fp.write(_END_RECORD.pack(
+            0x06054b50, 0, 0, len(self._central), len(self._central),
+            len(central_dir), self._offset, 0
+        ))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
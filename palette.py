@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""
+配色探索模块
+以预设主题为起点批量生成配色变体（色相、明度偏移与互补强调色），
+用NumPy一次计算全部变体中版式实际用到的文字/背景组合的WCAG对比度，
+按可读性打分返回最佳候选
+"""
+
+import time
+import argparse
+
+import numpy as np
+
+from config_presets import THEME_PRESETS
+
+
+# 变体中可调整的主题颜色
+THEME_COLORS = ('primary', 'secondary', 'accent', 'background')
+
+# 版式中写死的颜色（白色文字、浅灰卡片与占位区域）
+FIXED_COLORS = ('#ffffff', '#f8f9fa', '#e2e8f0')
+
+COLOR_SLOTS = THEME_COLORS + FIXED_COLORS
+
+# 各版式的文字/背景组合：(文字颜色, 背景颜色, 是否为大号文字, 出现次数)
+# 大号文字指 18pt 及以上，WCAG AA 要求 3:1，其余文字要求 4.5:1
+CONTRAST_PAIRS = (
+    ('primary', 'background', True, 7),     # 各页标题、时间轴节点、致谢页副标题
+    ('secondary', 'background', True, 2),   # 标题页副标题、内容页正文
+    ('secondary', 'background', False, 7),  # 图文/对比/时间轴正文、图表文字、页脚
+    ('#ffffff', 'primary', True, 4),        # 内容页标题栏、对比页左栏表头、过渡页
+    ('#ffffff', 'primary', False, 2),       # 标题页底栏、表格表头
+    ('#ffffff', 'accent', True, 1),         # 对比页右栏表头
+    ('accent', 'background', True, 1),      # 致谢页大字
+    ('secondary', '#f8f9fa', True, 1),      # 目录项
+    ('secondary', '#f8f9fa', False, 2),     # 数据卡片说明、表格隔行
+    ('primary', '#f8f9fa', True, 1),        # 数据卡片数值
+    ('secondary', '#ffffff', False, 1),     # 表格隔行
+    ('secondary', '#e2e8f0', False, 1),     # 图片占位区域
+)
+
+AA_NORMAL = 4.5
+AA_LARGE = 3.0
+
+# 对比度超过要求的部分按此上限计分，避免一味追求黑白
+MAX_MARGIN = 1.5
+
+# 综合得分中与基准配色接近程度的权重（其余为可读性）
+FIDELITY_WEIGHT = 0.3
+
+# 变体参数：色相偏移（度）、文字明度偏移、强调色明度偏移、背景明度偏移、强调色方式
+HUE_SHIFTS = (-60, -45, -30, -15, 0, 15, 30, 45, 60)
+TEXT_LIGHTNESS_SHIFTS = (-0.3, -0.2, -0.1, 0.0, 0.1, 0.2, 0.3)
+ACCENT_LIGHTNESS_SHIFTS = (-0.3, -0.15, 0.0, 0.15)
+BACKGROUND_LIGHTNESS_SHIFTS = (-0.04, 0.0, 0.04)
+ACCENT_MODES = {
+    'keep': "原强调色",
+    'complement': "互补强调色",
+    'split': "分裂互补强调色",
+}
+
+# 强调色方式对应的相对主色色相（度），None 表示随整体色相偏移
+ACCENT_HUES = {'keep': None, 'complement': 180, 'split': 150}
+
+
+def hex_to_array(colors) -> np.ndarray:
+    """
+    将十六进制颜色转为 0~1 的RGB数组
+
+    参数:
+        colors: 颜色字符串序列，如 ['#1a365d', ...]
+    返回:
+        形状为 (n, 3) 的数组
+    """
+    values = [int(color.lstrip('#'), 16) for color in colors]
+    packed = np.array(values, dtype=np.int64)[:, None]
+    return ((packed >> np.array([16, 8, 0])) & 0xFF) / 255.0
+
+
+def array_to_hex(rgb: np.ndarray) -> list:
+    """
+    将 0~1 的RGB数组转为十六进制颜色
+
+    参数:
+        rgb: 形状为 (..., 3) 的数组
+    返回:
+        颜色字符串列表（展平）
+    """
+    ints = np.rint(np.clip(rgb, 0, 1) * 255).astype(np.int64).reshape(-1, 3)
+    packed = (ints[:, 0] << 16) | (ints[:, 1] << 8) | ints[:, 2]
+    return [f"#{value:06x}" for value in packed.tolist()]
+
+
+def rgb_to_hls(rgb: np.ndarray) -> np.ndarray:
+    """
+    RGB转HLS（向量化，与 colorsys.rgb_to_hls 一致）
+
+    参数:
+        rgb: 形状为 (..., 3) 的 0~1 数组
+    返回:
+        形状相同的 (色相, 明度, 饱和度) 数组，色相取值 0~1
+    """
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    maxc = rgb.max(axis=-1)
+    minc = rgb.min(axis=-1)
+    light = (maxc + minc) / 2
+    delta = maxc - minc
+    gray = delta == 0
+    safe = np.where(gray, 1, delta)
+    sat = np.where(gray, 0, np.where(light <= 0.5, delta / np.where(gray, 1, maxc + minc),
+                                     delta / np.where(gray, 1, 2 - maxc - minc)))
+    rc, gc, bc = (maxc - r) / safe, (maxc - g) / safe, (maxc - b) / safe
+    hue = np.where(r == maxc, bc - gc, np.where(g == maxc, 2 + rc - bc, 4 + gc - rc))
+    hue = np.where(gray, 0, (hue / 6) % 1.0)
+    return np.stack([hue, light, sat], axis=-1)
+
+
+def hls_to_rgb(hls: np.ndarray) -> np.ndarray:
+    """
+    HLS转RGB（向量化，与 colorsys.hls_to_rgb 一致）
+
+    参数:
+        hls: 形状为 (..., 3) 的数组
+    返回:
+        形状相同的 0~1 RGB数组
+    """
+    hue, light, sat = hls[..., 0], hls[..., 1], hls[..., 2]
+    m2 = np.where(light <= 0.5, light * (1 + sat), light + sat - light * sat)
+    m1 = 2 * light - m2
+    channels = []
+    for offset in (1 / 3, 0, -1 / 3):
+        h = (hue + offset) % 1.0
+        channels.append(np.select(
+            [h < 1 / 6, h < 0.5, h < 2 / 3],
+            [m1 + (m2 - m1) * h * 6, m2, m1 + (m2 - m1) * (2 / 3 - h) * 6],
+            m1))
+    return np.stack(channels, axis=-1)
+
+
+def relative_luminance(rgb: np.ndarray) -> np.ndarray:
+    """
+    WCAG 相对亮度
+
+    参数:
+        rgb: 形状为 (..., 3) 的 0~1 sRGB数组
+    返回:
+        形状为 (...) 的亮度数组
+    """
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    return linear @ np.array([0.2126, 0.7152, 0.0722])
+
+
+def contrast_ratio(foreground: str, background: str) -> float:
+    """
+    两种颜色的WCAG对比度
+
+    参数:
+        foreground: 文字颜色
+        background: 背景颜色
+    返回:
+        对比度（1~21）
+    """
+    fg, bg = relative_luminance(hex_to_array([foreground, background]))
+    return float((max(fg, bg) + 0.05) / (min(fg, bg) + 0.05))
+
+
+class PaletteCandidate:
+    """配色候选"""
+
+    __slots__ = ('colors', 'label', 'score', 'min_margin', 'failures')
+
+    def __init__(self, colors: dict, label: str, score: float, min_margin: float, failures: list):
+        """
+        参数:
+            colors: {'primary', 'secondary', 'accent', 'background': 十六进制颜色}
+            label: 变体说明
+            score: 综合得分（0~1，可读性与接近基准配色的加权）
+            min_margin: 最差组合的对比度与要求之比
+            failures: 未达标的组合 [(文字颜色名, 背景颜色名, 对比度)]
+        """
+        self.colors = colors
+        self.label = label
+        self.score = score
+        self.min_margin = min_margin
+        self.failures = failures
+
+    @property
+    def passes(self) -> bool:
+        """全部组合达到 WCAG AA"""
+        return not self.failures
+
+    def swatch_html(self) -> str:
+        """预览色块的HTML（四色横条）"""
+        cells = ''.join(
+            f'<div title="{name} {self.colors[name]}" style="flex:1;height:28px;background:{self.colors[name]};"></div>'
+            for name in THEME_COLORS)
+        return (f'<div style="display:flex;border:1px solid #e2e8f0;border-radius:6px;overflow:hidden;">'
+                f'{cells}</div>')
+
+    def __repr__(self):
+        return f"PaletteCandidate({self.label!r}, score={self.score:.3f}, failures={len(self.failures)})"
+
+
+def _variant_grid() -> tuple:
+    """
+    变体参数网格
+
+    返回:
+        (色相偏移, 文字明度偏移, 强调色明度偏移, 背景明度偏移, 强调色方式序号)，
+        各为长度相同的一维数组
+    """
+    grids = np.meshgrid(np.array(HUE_SHIFTS) / 360.0, TEXT_LIGHTNESS_SHIFTS,
+                        ACCENT_LIGHTNESS_SHIFTS, BACKGROUND_LIGHTNESS_SHIFTS, np.arange(len(ACCENT_MODES)), indexing='ij')
+    return tuple(grid.ravel() for grid in grids)
+
+
+def generate_variants(base: dict) -> tuple:
+    """
+    由基准配色批量生成变体
+
+    参数:
+        base: 含 primary/secondary/accent/background 的配色字典
+    返回:
+        (形状为 (变体数, 4, 3) 的RGB数组, 变体参数元组)
+    """
+    hls = rgb_to_hls(hex_to_array([base[name] for name in THEME_COLORS]))
+    hue_shift, text_shift, accent_shift, bg_shift, accent_mode = grid = _variant_grid()
+    variants = np.broadcast_to(hls, (len(hue_shift), 4, 3)).copy()
+
+    # 整体色相偏移
+    variants[..., 0] = (variants[..., 0] + hue_shift[:, None]) % 1.0
+    # 文字用色（主色、辅色）、强调色与背景的明度偏移
+    variants[:, :2, 1] = np.clip(variants[:, :2, 1] + text_shift[:, None], 0, 1)
+    variants[:, 2, 1] = np.clip(variants[:, 2, 1] + accent_shift, 0, 1)
+    variants[:, 3, 1] = np.clip(variants[:, 3, 1] + bg_shift, 0, 1)
+    # 强调色：相对主色取互补或分裂互补色相
+    for mode_index, mode in enumerate(ACCENT_MODES):
+        offset = ACCENT_HUES[mode]
+        if offset is not None:
+            rows = accent_mode == mode_index
+            variants[rows, 2, 0] = (variants[rows, 0, 0] + offset / 360.0) % 1.0
+    return hls_to_rgb(variants), grid
+
+
+def score_variants(rgb: np.ndarray, pairs: tuple = CONTRAST_PAIRS) -> tuple:
+    """
+    批量计算变体中全部文字/背景组合的对比度并打分
+
+    参数:
+        rgb: 形状为 (变体数, 4, 3) 的主题颜色数组
+        pairs: 文字/背景组合
+    返回:
+        (对比度 (变体数, 组合数), 对比度与要求之比 (变体数, 组合数), 可读性得分 (变体数,))
+    """
+    fixed = np.broadcast_to(hex_to_array(FIXED_COLORS), (len(rgb), len(FIXED_COLORS), 3))
+    luminance = relative_luminance(np.concatenate([rgb, fixed], axis=1))
+
+    fg_index = np.array([COLOR_SLOTS.index(fg) for fg, _, _, _ in pairs])
+    bg_index = np.array([COLOR_SLOTS.index(bg) for _, bg, _, _ in pairs])
+    required = np.array([AA_LARGE if large else AA_NORMAL for _, _, large, _ in pairs])
+    weights = np.array([count for _, _, _, count in pairs], dtype=float)
+
+    fg, bg = luminance[:, fg_index], luminance[:, bg_index]
+    ratios = (np.maximum(fg, bg) + 0.05) / (np.minimum(fg, bg) + 0.05)
+    margins = ratios / required
+    score = (np.minimum(margins, MAX_MARGIN) @ weights) / (weights.sum() * MAX_MARGIN)
+    return ratios, margins, score
+
+
+def _base_colors(base) -> dict:
+    """基准配色：预设主题名称或含四种颜色的字典"""
+    theme = THEME_PRESETS[base] if isinstance(base, str) else base
+    return {name: theme[name] for name in THEME_COLORS}
+
+
+def explore_palettes(base, top_n: int = 8) -> list:
+    """
+    以一套配色为起点生成变体，按可读性返回最佳候选
+
+    未达标组合少的候选排在前面，其次按综合得分排序；
+    综合得分兼顾可读性与对基准配色的改动幅度。
+    同一色相偏移与强调色方式只保留得分最高的一个，使候选之间有明显差别。
+
+    参数:
+        base: THEME_PRESETS 中的主题名称，或含 primary/secondary/accent/background 的配色字典
+        top_n: 返回的候选数
+    返回:
+        PaletteCandidate 列表
+    """
+    colors = _base_colors(base)
+    rgb, (hue_shift, text_shift, accent_shift, bg_shift, accent_mode) = generate_variants(colors)
+    ratios, margins, readability = score_variants(rgb)
+    failing = (margins < 1).sum(axis=1)
+
+    # 与基准配色的平均RGB距离（归一化到 0~1）
+    drift = np.linalg.norm(rgb - hex_to_array([colors[name] for name in THEME_COLORS]), axis=-1).mean(axis=1)
+    score = (1 - FIDELITY_WEIGHT) * readability + FIDELITY_WEIGHT * (1 - drift / np.sqrt(3))
+
+    # 先按未达标组合数，再按综合得分排序
+    order = np.lexsort((-score, failing))
+    hexes = array_to_hex(rgb)
+    modes = list(ACCENT_MODES)
+
+    candidates, seen = [], set()
+    for i in order.tolist():
+        key = (hue_shift[i], accent_mode[i])
+        if key in seen:
+            continue
+        seen.add(key)
+        colors = dict(zip(THEME_COLORS, hexes[i * 4:i * 4 + 4]))
+        label = (f"色相{hue_shift[i] * 360:+.0f}° 文字明度{text_shift[i] * 100:+.0f}% "
+                 f"强调色明度{accent_shift[i] * 100:+.0f}% 背景明度{bg_shift[i] * 100:+.0f}% "
+                 f"{ACCENT_MODES[modes[int(accent_mode[i])]]}")
+        failures = [(fg, bg, float(ratios[i, j])) for j, (fg, bg, _, _) in enumerate(CONTRAST_PAIRS)
+                    if margins[i, j] < 1]
+        candidates.append(PaletteCandidate(colors, label, float(score[i]),
+                                           float(margins[i].min()), failures))
+        if len(candidates) >= top_n:
+            break
+    return candidates
+
+
+def main():
+    """命令行入口：python palette.py [主题名称]，输出各预设主题的最佳配色与耗时"""
+    parser = argparse.ArgumentParser(description="以预设主题为起点探索高对比度配色")
+    parser.add_argument('themes', nargs='*', help="预设主题名称（默认全部）")
+    parser.add_argument('-n', '--top', type=int, default=8, help="每个主题输出的候选数")
+    args = parser.parse_args()
+
+    for name in args.themes or list(THEME_PRESETS):
+        start = time.perf_counter()
+        candidates = explore_palettes(name, args.top)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{name}（{elapsed:.1f} ms）")
+        for candidate in candidates:
+            colors = ' '.join(candidate.colors[key] for key in THEME_COLORS)
+            status = "AA" if candidate.passes else f"{len(candidate.failures)} 项未达标"
+            print(f"  {candidate.score:.3f} {status:>8}  {colors}  {candidate.label}")
+
+
+if __name__ == "__main__":
+    main()
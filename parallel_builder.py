@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+并行PPT生成模块
+将幻灯片计划切分为若干块，在子进程中生成各块的幻灯片XML、图片与图表，
+再由主进程按顺序拼装为一个完整的演示文稿
+"""
+
+import io
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+from lxml import etree
+from pptx.opc.constants import CONTENT_TYPE as CT
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.parts.chart import ChartPart
+from pptx.parts.embeddedpackage import EmbeddedXlsxPart
+
+from ppt_generator import (
+    add_blank_slide,
+    build_presentation,
+    decorate_slide,
+    get_slide_size,
+    new_presentation,
+    plan_slides,
+    save_presentation,
+    text_fit,
+)
+from governor import BudgetExceeded, ResourceGovernor
+from metrics import BUILD_SLIDES, IMAGE_BYTES, OUTPUT_BYTES, QUEUE_DEPTH, track_build
+from slide_plan import execute_plan
+
+
+# 少于该页数时并行收益不足以抵消进程开销，直接串行生成
+MIN_PARALLEL_SLIDES = 60
+
+# 关系所属阶段：0 为版式内容（图片、图表），1 为装饰（Logo）图片
+PHASE_CONTENT = 0
+PHASE_DECORATION = 1
+
+# 各阶段图片计入的来源标签
+PHASE_IMAGE_SOURCES = {PHASE_CONTENT: 'upload', PHASE_DECORATION: 'logo'}
+
+# 子进程内共享的主题配置与Logo，由进程池初始化函数写入
+_worker_state = {}
+
+
+def _init_worker(config: dict, logo_bytes: bytes):
+    """
+    子进程初始化：缓存本次生成共用的配置，避免每个分块重复传输
+
+    参数:
+        config: 主题配置字典
+        logo_bytes: Logo图片字节数据（可选）
+    """
+    _worker_state['config'] = config
+    _worker_state['logo_bytes'] = logo_bytes
+
+
+def _media_rels(slide) -> dict:
+    """
+    获取幻灯片的图片与图表关系
+
+    参数:
+        slide: 幻灯片对象
+    返回:
+        {rId: (类型, 数据)}；图片数据为字节，图表数据为 (图表XML字节, 内嵌工作簿字节)
+    """
+    rels = {}
+    for rId, rel in slide.part.rels.items():
+        if rel.reltype == RT.IMAGE:
+            rels[rId] = (RT.IMAGE, rel.target_part.blob)
+        elif rel.reltype == RT.CHART:
+            chart_part = rel.target_part
+            xlsx_part = chart_part.chart_workbook.xlsx_part
+            rels[rId] = (RT.CHART, (chart_part.blob, xlsx_part.blob if xlsx_part else None))
+    return rels
+
+
+def _build_chunk(start_idx: int, chunk: list) -> list:
+    """
+    在子进程中生成一个分块的幻灯片
+
+    参数:
+        start_idx: 分块首页在整份演示文稿中的下标
+        chunk: 幻灯片计划的一个切片（SlideSpec 列表）
+    返回:
+        [(幻灯片XML字节, [(rId, 类型, 数据, 阶段), ...]), ...]
+    """
+    config = _worker_state['config']
+    logo_bytes = _worker_state['logo_bytes']
+
+    prs = new_presentation(config)
+    slide_width, slide_height = get_slide_size(config)
+
+    with text_fit(config.get('text_fit', 'none')):
+        execute_plan(prs, config, chunk)
+
+        # 先记录版式内容关系，再添加装饰，以便主进程按串行顺序重建关系
+        content_rels = [set(slide.part.rels.keys()) for slide in prs.slides]
+        for offset, slide in enumerate(prs.slides):
+            decorate_slide(slide, start_idx + offset, config, logo_bytes, slide_width, slide_height)
+
+    results = []
+    for offset, slide in enumerate(prs.slides):
+        rels = []
+        for rId, (reltype, payload) in _media_rels(slide).items():
+            phase = PHASE_CONTENT if rId in content_rels[offset] else PHASE_DECORATION
+            rels.append((rId, reltype, payload, phase))
+        rels.sort(key=lambda item: int(item[0][3:]))
+
+        results.append((etree.tostring(slide.part._element), rels))
+
+    return results
+
+
+def _add_chart_part(slide, chart_xml: bytes, xlsx_blob: bytes) -> str:
+    """
+    按子进程生成的图表XML与内嵌工作簿重建图表部件
+
+    部件创建顺序与 ChartPart.new 一致，保证部件编号与串行结果相同。
+
+    参数:
+        slide: 幻灯片对象
+        chart_xml: 图表XML字节
+        xlsx_blob: 内嵌工作簿字节（可为None）
+    返回:
+        幻灯片到图表的 rId
+    """
+    package = slide.part.package
+    chart_part = ChartPart.load(
+        package.next_partname(ChartPart.partname_template), CT.DML_CHART, package, chart_xml
+    )
+    if xlsx_blob is not None:
+        chart_part.relate_to(EmbeddedXlsxPart.new(xlsx_blob, package), RT.PACKAGE)
+    return slide.part.relate_to(chart_part, RT.CHART)
+
+
+def _chunk_plan(plan: list, workers: int, chunk_size: int = None) -> list:
+    """
+    将幻灯片计划切分为连续分块
+
+    参数:
+        plan: 幻灯片计划
+        workers: 子进程数量
+        chunk_size: 每块页数（可选，默认按进程数自动计算）
+    返回:
+        [(首页下标, 分块), ...]
+    """
+    if not chunk_size:
+        # 每个进程分到约4块，兼顾负载均衡与调度开销
+        chunk_size = max(1, -(-len(plan) // (workers * 4)))
+    return [(i, plan[i:i + chunk_size]) for i in range(0, len(plan), chunk_size)]
+
+
+def build_presentation_parallel(config: dict, layouts_config: dict, logo_bytes: bytes = None,
+                                uploaded_images: list = None, workers: int = None,
+                                chunk_size: int = None, budget=None) -> io.BytesIO:
+    """
+    多进程并行生成PPT模板，输出与 build_presentation 完全一致
+
+    参数:
+        config: 主题配置字典，包含颜色、字体等
+        layouts_config: 版式配置，指定每种版式的启用状态和数量
+        logo_bytes: Logo图片字节数据（可选）
+        uploaded_images: 上传的图片列表（可选）
+        workers: 子进程数量（可选，默认为CPU核数）
+        chunk_size: 每块页数（可选）
+        budget: BuildBudget资源预算（可选），在每块完成后与合并各页时检查
+
+    返回:
+        包含PPT文件的BytesIO对象
+    """
+    plan = plan_slides(layouts_config, uploaded_images)
+    workers = workers or os.cpu_count() or 1
+
+    # 表格页等按数据流续页，页数在生成前未知，无法预先确定分块的全局页序
+    if (workers < 2 or len(plan) < MIN_PARALLEL_SLIDES
+            or any(spec.paginated for spec in plan)):
+        return build_presentation(config, layouts_config, logo_bytes, uploaded_images, budget)
+
+    # 子进程中的版式耗时等指标不回传，主进程只记录整体耗时、图片与输出大小
+    with track_build('parallel'):
+        governor = ResourceGovernor(budget)
+        governor.check_planned(len(plan))
+        chunks = _chunk_plan(plan, workers, chunk_size)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(config, logo_bytes)) as executor:
+            QUEUE_DEPTH.inc(len(chunks), queue='parallel_chunks')
+            chunk_results = []
+            try:
+                for chunk_result in executor.map(_build_chunk, *zip(*chunks)):
+                    chunk_results.append(chunk_result)
+                    governor.check(governor.slides_done + len(chunk_result), 'chunks')
+            except BudgetExceeded:
+                # 取消尚未开始的块，正在执行的块无法中断
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            finally:
+                QUEUE_DEPTH.dec(len(chunks), queue='parallel_chunks')
+
+        prs = new_presentation(config)
+
+        built = []
+        for chunk_result in chunk_results:
+            for slide_xml, rels in chunk_result:
+                built.append((add_blank_slide(prs), slide_xml, rels))
+
+        # 按串行生成的顺序建立关系：先全部内容关系，再全部装饰图片，
+        # 使部件编号与 rId 与串行结果一致
+        image_parts = {}
+        for phase in (PHASE_CONTENT, PHASE_DECORATION):
+            for slide, _, rels in built:
+                for rId, reltype, payload, rel_phase in rels:
+                    if rel_phase != phase:
+                        continue
+                    if reltype == RT.CHART:
+                        new_rId = _add_chart_part(slide, *payload)
+                    else:
+                        IMAGE_BYTES.inc(len(payload), source=PHASE_IMAGE_SOURCES[phase])
+                        sha1 = hashlib.sha1(payload).hexdigest()
+                        if sha1 in image_parts:
+                            new_rId = slide.part.relate_to(image_parts[sha1], RT.IMAGE)
+                        else:
+                            image_parts[sha1], new_rId = slide.part.get_or_add_image_part(io.BytesIO(payload))
+                    if new_rId != rId:
+                        raise RuntimeError(f"关系编号不一致: {new_rId} != {rId}")
+
+        # 用子进程生成的内容替换空白幻灯片的XML
+        for slide, slide_xml, _ in built:
+            element = slide.part._element
+            for child in list(element):
+                element.remove(child)
+            for child in etree.fromstring(slide_xml):
+                element.append(child)
+        governor.check(stage='assemble')
+
+        # 保存到内存
+        ppt_buffer = save_presentation(prs, config)
+        governor.check_output(len(ppt_buffer.getvalue()))
+
+    BUILD_SLIDES.observe(len(prs.slides))
+    OUTPUT_BYTES.observe(len(ppt_buffer.getvalue()), kind='presentation')
+    return ppt_buffer
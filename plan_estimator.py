@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""
+生成成本估算模块
+根据幻灯片计划在生成之前估算耗时、内存峰值与输出文件大小，
+供界面与调度器提前拒绝或排队超大任务。估算系数可在目标机器上重新标定
+"""
+
+import io
+import sys
+import json
+import time
+import hashlib
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from config_presets import DEFAULT_CONFIG
+from ppt_generator import build_presentation, plan_slides
+from slide_plan import SHAPE_CHART, SHAPE_PICTURE, SHAPE_TABLE
+
+
+# 线性模型的特征，顺序与系数一一对应
+FEATURES = ('base', 'slides', 'shapes', 'pictures', 'media_bytes', 'chart_points', 'table_cells')
+
+# 估算目标
+TARGETS = ('seconds', 'memory_bytes', 'output_bytes')
+
+# 默认系数：在单核参考机器上由 calibrate_cost_model() 标定
+COST_MODEL = {
+    'seconds': {
+        'base': 0.19, 'slides': 8.3e-6, 'shapes': 8.3e-4, 'pictures': 1.7e-3,
+        'media_bytes': 0.0, 'chart_points': 1.7e-4, 'table_cells': 1.4e-5,
+    },
+    'memory_bytes': {
+        'base': 7.7e5, 'slides': 0.0, 'shapes': 5.6e3, 'pictures': 4.0e4,
+        'media_bytes': 0.0, 'chart_points': 1.4e3, 'table_cells': 640.0,
+    },
+    'output_bytes': {
+        'base': 2.8e4, 'slides': 1.4e3, 'shapes': 14.0, 'pictures': 140.0,
+        'media_bytes': 1.0, 'chart_points': 36.0, 'table_cells': 9.0,
+    },
+}
+
+# 默认上限：超出任一项的任务应拒绝或排队
+DEFAULT_LIMITS = {
+    'slides': 5000,
+    'seconds': 300,
+    'memory_bytes': 2 * 1024 ** 3,
+    'output_bytes': 500 * 1024 ** 2,
+}
+
+LIMIT_NAMES = {
+    'slides': '页数',
+    'seconds': '预计耗时（秒）',
+    'memory_bytes': '预计内存（字节）',
+    'output_bytes': '预计文件大小（字节）',
+}
+
+
+class PlanEstimate:
+    """幻灯片计划的规模与成本估算结果"""
+
+    __slots__ = FEATURES[1:] + TARGETS
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name, 0))
+
+    def as_dict(self) -> dict:
+        """
+        转为字典
+
+        返回:
+            {字段名: 值}
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return (f"PlanEstimate(slides={self.slides}, seconds={self.seconds:.2f}, "
+                f"memory={self.memory_bytes / 1024 ** 2:.1f}MB, output={self.output_bytes / 1024 ** 2:.1f}MB)")
+
+
+def plan_features(plan: list, config: dict, logo_bytes: bytes = None) -> dict:
+    """
+    统计幻灯片计划的规模特征
+
+    包括水印、Logo、页脚等装饰形状；相同的图片只计一次数据量。
+
+    参数:
+        plan: SlideSpec 列表
+        config: 主题配置字典
+        logo_bytes: Logo图片字节数据（可选）
+    返回:
+        {特征名: 数值}
+    """
+    features = dict.fromkeys(FEATURES, 0)
+    features['base'] = 1
+    media = set()
+
+    def add_media(data: bytes):
+        digest = hashlib.sha1(data).digest()
+        if digest not in media:
+            media.add(digest)
+            features['media_bytes'] += len(data)
+
+    for spec in plan:
+        features['slides'] += spec.pages
+        for shape in spec.shapes:
+            count = shape.count * spec.pages
+            features['shapes'] += count
+            if shape.kind == SHAPE_PICTURE:
+                features['pictures'] += count
+                if shape.media:
+                    add_media(shape.media)
+            elif shape.kind == SHAPE_CHART:
+                features['chart_points'] += shape.weight * count
+            elif shape.kind == SHAPE_TABLE:
+                features['table_cells'] += shape.weight * count
+
+    # 装饰：水印、Logo 每页一个，页脚文字与页码从第二页起每页各一个
+    slides = features['slides']
+    decorations = 0
+    if config.get('watermark_enabled', False):
+        decorations += slides
+    if logo_bytes:
+        decorations += slides
+        features['pictures'] += slides
+        add_media(logo_bytes)
+    footer_items = bool(config.get('footer_text', '')) + bool(config.get('show_page_number', True))
+    decorations += footer_items * max(0, slides - 1)
+    features['shapes'] += decorations
+    return features
+
+
+def estimate_plan(plan: list, config: dict, logo_bytes: bytes = None,
+                  cost_model: dict = None) -> PlanEstimate:
+    """
+    估算按计划生成PPT的耗时、内存峰值与输出大小
+
+    参数:
+        plan: SlideSpec 列表
+        config: 主题配置字典
+        logo_bytes: Logo图片字节数据（可选）
+        cost_model: 估算系数（可选，默认 COST_MODEL）
+    返回:
+        PlanEstimate对象
+    """
+    cost_model = cost_model or COST_MODEL
+    features = plan_features(plan, config, logo_bytes)
+    values = {name: features[name] for name in FEATURES[1:]}
+    for target in TARGETS:
+        coefficients = cost_model[target]
+        values[target] = sum(coefficients.get(name, 0.0) * features[name] for name in FEATURES)
+    return PlanEstimate(**values)
+
+
+def estimate_presentation(config: dict, layouts_config: dict, logo_bytes: bytes = None,
+                          uploaded_images: list = None, cost_model: dict = None) -> PlanEstimate:
+    """
+    按配置估算生成成本（参数与 build_presentation 相同）
+
+    参数:
+        config: 主题配置字典
+        layouts_config: 版式配置
+        logo_bytes: Logo图片字节数据（可选）
+        uploaded_images: 上传的图片列表（可选）
+        cost_model: 估算系数（可选）
+    返回:
+        PlanEstimate对象
+    """
+    plan = plan_slides(layouts_config, uploaded_images)
+    return estimate_plan(plan, config, logo_bytes, cost_model)
+
+
+def check_limits(estimate: PlanEstimate, limits: dict = None) -> list:
+    """
+    检查估算结果是否超出上限
+
+    参数:
+        estimate: PlanEstimate对象
+        limits: 上限字典（可选，默认 DEFAULT_LIMITS），值为None表示不限制
+    返回:
+        超限说明列表，为空表示未超限
+    """
+    limits = DEFAULT_LIMITS if limits is None else limits
+    problems = []
+    for name, limit in limits.items():
+        value = getattr(estimate, name)
+        if limit is not None and value > limit:
+            problems.append(f"{LIMIT_NAMES.get(name, name)} {value:,.0f} 超过上限 {limit:,.0f}")
+    return problems
+
+
+def load_cost_model(path: str) -> dict:
+    """
+    读取 calibrate_cost_model() 保存的估算系数
+
+    参数:
+        path: JSON文件路径
+    返回:
+        估算系数字典，缺失的目标沿用默认系数
+    """
+    with open(path, encoding='utf-8') as f:
+        model = json.load(f)
+    return {target: model.get(target, COST_MODEL[target]) for target in TARGETS}
+
+
+# ==================== 标定 ====================
+def _calibration_samples() -> list:
+    """
+    生成标定用的样本配置，各样本侧重不同的特征以便分离系数
+
+    返回:
+        [(版式配置, 是否使用Logo与图片), ...]
+    """
+    off = {key: {'enabled': False} for key in DEFAULT_CONFIG['layouts']}
+
+    def layouts(**overrides):
+        return dict(off, **{key: dict({'enabled': True}, **value) for key, value in overrides.items()})
+
+    rng = np.random.default_rng(0)
+    chart_slots = {'series': {'a': rng.normal(size=20000).cumsum(), 'b': rng.normal(size=20000).cumsum()},
+                   'max_points': 4000}
+    table_rows = [('项目', '负责人', '状态', '说明')] + [
+        (f"任务{i}", f"成员{i % 17}", "进行中", "说明文字" * (i % 5)) for i in range(8000)
+    ]
+    kpi_slots = {'kpis': [("1,234", "指标", "+1%")] * 12}
+
+    return [
+        (layouts(title={'count': 1}), False),
+        (layouts(content={'count': 200}), False),
+        (layouts(content={'count': 400}), True),
+        (layouts(kpi={'count': 100, 'slots': kpi_slots}), False),
+        (layouts(image_text={'count': 60}), True),
+        (layouts(chart={'count': 10, 'slots': chart_slots}), False),
+        (layouts(table={'count': 1, 'slots': {'rows': table_rows}}), False),
+        (layouts(agenda={'count': 50}, timeline={'count': 50}, chart={'count': 5, 'slots': chart_slots}), True),
+    ]
+
+
+def _measure_sample(config: dict, layouts_config: dict, logo_bytes: bytes,
+                    uploaded_images: list) -> tuple:
+    """
+    在独立子进程中生成一次并测量
+
+    参数:
+        config: 主题配置字典
+        layouts_config: 版式配置
+        logo_bytes: Logo图片字节数据（可选）
+        uploaded_images: 上传的图片列表（可选）
+    返回:
+        (耗时秒数, 内存峰值增量字节, 输出字节数)，无法测量内存（如 Windows）时内存为 None
+    """
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else 0
+    start = time.perf_counter()
+    ppt_buffer = build_presentation(config, layouts_config, logo_bytes, uploaded_images)
+    seconds = time.perf_counter() - start
+    memory = None
+    if resource:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss 在 macOS 上以字节、Linux 上以KB为单位
+        memory = (peak - baseline) * (1 if sys.platform == 'darwin' else 1024)
+    return seconds, memory, len(ppt_buffer.getvalue())
+
+
+def _sample_image(seed: int, size: int = 400) -> bytes:
+    """生成标定用的随机PNG图片"""
+    pixels = np.random.default_rng(seed).integers(0, 256, (size, size, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def calibrate_cost_model(config: dict = None, repeats: int = 1) -> dict:
+    """
+    在当前机器上生成样本演示文稿并用最小二乘拟合估算系数
+
+    每个样本在新的子进程中生成，避免内存峰值相互影响。
+
+    参数:
+        config: 主题配置字典（可选，默认启用水印的 DEFAULT_CONFIG，估算偏保守）
+        repeats: 每个样本的重复次数，耗时取最小值
+    返回:
+        估算系数字典，格式同 COST_MODEL（无法测量内存的平台上内存系数沿用 COST_MODEL）
+    """
+    config = config or dict(DEFAULT_CONFIG, watermark_enabled=True)
+    logo_bytes = _sample_image(0, 120)
+    images = [{'bytes': _sample_image(seed)} for seed in range(1, 5)]
+    context = multiprocessing.get_context('spawn')
+
+    rows, measured = [], []
+    for layouts_config, with_media in _calibration_samples():
+        logo, uploaded = (logo_bytes, images) if with_media else (None, [])
+        plan = plan_slides(layouts_config, uploaded)
+        features = plan_features(plan, config, logo)
+        results = []
+        for _ in range(repeats):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results.append(executor.submit(_measure_sample, config, layouts_config, logo, uploaded).result())
+        rows.append([features[name] for name in FEATURES])
+        memory = None if any(r[1] is None for r in results) else max(r[1] for r in results)
+        measured.append([min(r[0] for r in results), memory, results[0][2]])
+
+    x = np.array(rows, dtype=np.float64)
+    y = np.array(measured, dtype=np.float64)
+    # 按列缩放后求解，避免特征量级差异导致病态
+    scale = np.maximum(x.max(axis=0), 1.0)
+    model = {}
+    for j, target in enumerate(TARGETS):
+        if any(row[j] is None for row in measured):
+            model[target] = dict(COST_MODEL[target])
+            continue
+        coefficients, *_ = np.linalg.lstsq(x / scale, y[:, j], rcond=None)
+        coefficients = np.clip(coefficients / scale, 0.0, None)
+        model[target] = {name: float(c) for name, c in zip(FEATURES, coefficients)}
+    return model
+
+
+def main():
+    """命令行入口：估算配置的生成成本，或在本机重新标定系数"""
+    parser = argparse.ArgumentParser(description="估算PPT生成的耗时、内存与文件大小")
+    parser.add_argument('config', nargs='?', help="导出的配置JSON")
+    parser.add_argument('--model', help="估算系数JSON（calibrate 的输出）")
+    parser.add_argument('--calibrate', metavar='OUTPUT', help="在本机标定系数并保存到指定文件")
+    args = parser.parse_args()
+
+    if args.calibrate:
+        model = calibrate_cost_model()
+        with open(args.calibrate, 'w', encoding='utf-8') as f:
+            json.dump(model, f, indent=2)
+        print(f"已保存估算系数: {args.calibrate}")
+        return
+
+    if not args.config:
+        parser.error("需要指定配置JSON或 --calibrate")
+    with open(args.config, encoding='utf-8') as f:
+        config = json.load(f)
+    cost_model = load_cost_model(args.model) if args.model else None
+    estimate = estimate_presentation(config, config.get('layouts', {}), cost_model=cost_model)
+    for name, value in estimate.as_dict().items():
+        print(f"{name}: {value:,.2f}" if isinstance(value, float) else f"{name}: {value:,}")
+    for problem in check_limits(estimate):
+        print(f"超限: {problem}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,44 @@ PPT生成器模块
 """
 
 import io
+import os
+import re
+import csv
+import zlib
+import weakref
+import contextvars
+import tempfile
+import threading
+import warnings
+from contextlib import contextmanager
+from datetime import datetime
+
 from pptx import Presentation
-from pptx.util import Inches, Pt
+from pptx.util import Inches, Pt, Emu, lazyproperty
+from pptx.oxml import parse_xml
+from pptx.oxml.ns import nsdecls
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.oxml import serialize_part_xml
+from pptx.parts.slide import SlidePart
+from lxml import etree
 from pptx.dml.color import RGBColor
 from pptx.enum.text import PP_ALIGN, MSO_ANCHOR
 from pptx.enum.shapes import MSO_SHAPE
+from pptx.enum.chart import XL_CHART_TYPE, XL_LEGEND_POSITION, XL_MARKER_STYLE
+from pptx.chart.data import CategoryChartData
+from pptx.chart.xlsx import CategoryWorkbookWriter
+from xlsxwriter import Workbook
 
+from base_template import choose_blank_layout, layout_placeholder_types, load_base_template
 from config_presets import SLIDE_RATIOS
+from downsample import DEFAULT_MAX_POINTS, downsample_series
+from governor import ResourceGovernor
+from metrics import BUILD_SLIDES, IMAGE_BYTES, OUTPUT_BYTES, track_build
+from slide_plan import (
+    SHAPE_AUTO, SHAPE_CHART, SHAPE_PICTURE, SHAPE_TABLE, SHAPE_TEXT,
+    ShapeSpec, compile_plan, execute_plan, fixed_shapes, register_layout,
+)
+from text_metrics import count_lines, fit_font_size, text_fits, text_height
 
 
 def hex_to_rgb(hex_color: str) -> RGBColor:
@@ -67,6 +98,79 @@ def set_text_style(text_frame, text: str, font_name: str, font_size: int,
     p.alignment = align
 
 
+# 文本框内边距（英寸），与python-pptx/PowerPoint默认值一致
+TEXT_INSET_X = 0.1
+TEXT_INSET_Y = 0.05
+
+# 自动缩小字号时的最小字号（磅）
+MIN_FIT_FONT_SIZE = 8
+
+# 当前生成的文字溢出处理方式与溢出提示列表，由 text_fit() 设置；
+# 按线程/上下文隔离，并发的生成（页面会话、推测生成线程）互不影响
+_text_fit = contextvars.ContextVar('text_fit', default=('none', None))
+
+
+class TextOverflowWarning(UserWarning):
+    """文字超出文本框时发出的警告"""
+
+
+@contextmanager
+def text_fit(mode: str, overflows: list = None):
+    """
+    在一次生成期间设置文字溢出处理方式（只作用于当前线程/上下文）
+    
+    参数:
+        mode: 'none'（不测量）、'warn'（溢出时提示）
+              或 'shrink'（缩小字号直到放得下，最小字号仍放不下时提示）
+        overflows: 收集溢出提示的列表（可选；未提供时发出 TextOverflowWarning）
+    """
+    token = _text_fit.set((mode, overflows))
+    try:
+        yield
+    finally:
+        _text_fit.reset(token)
+
+
+def fit_text_size(text: str, font_name: str, font_size: int, width: float, height: float,
+                  bold: bool = False) -> int:
+    """
+    按当前溢出处理方式检查文字是否放得下，必要时缩小字号
+    
+    参数:
+        text: 文本内容
+        font_name: 字体名称
+        font_size: 字体大小（磅）
+        width, height: 文本框尺寸（英寸）
+        bold: 是否加粗
+    返回:
+        实际使用的字号
+    """
+    mode, overflows = _text_fit.get()
+    if mode == 'none' or not text:
+        return font_size
+    
+    # 文字可以延伸进下内边距，只要不超出文本框外框
+    inner_width = width - 2 * TEXT_INSET_X
+    inner_height = height - TEXT_INSET_Y
+    fits = True
+    if mode == 'shrink':
+        font_size, fits = fit_font_size(text, font_name, font_size, inner_width, inner_height,
+                                        MIN_FIT_FONT_SIZE, bold)
+    else:
+        fits = text_fits(text, font_name, font_size, inner_width, inner_height, bold)
+    
+    if not fits:
+        needed = text_height(text, font_name, font_size, inner_width, bold)
+        preview = text if len(text) <= 20 else text[:20] + '…'
+        message = (f"文字超出文本框: “{preview}”（{font_name} {font_size}磅，需要高度 {needed:.2f} 英寸，"
+                   f"可用 {inner_height:.2f} 英寸）")
+        if overflows is not None:
+            overflows.append(message)
+        else:
+            warnings.warn(TextOverflowWarning(message), stacklevel=3)
+    return font_size
+
+
 def add_text_box(slide, left: float, top: float, width: float, height: float,
                  text: str, font_name: str, font_size: int, color_hex: str,
                  bold: bool = False, align: PP_ALIGN = PP_ALIGN.LEFT,
@@ -95,6 +199,7 @@ def add_text_box(slide, left: float, top: float, width: float, height: float,
     # 设置垂直对齐
     tf.anchor = vertical_anchor
     
+    font_size = fit_text_size(text, font_name, font_size, width, height, bold)
     set_text_style(tf, text, font_name, font_size, color_hex, bold, align)
     return txBox
 
@@ -140,16 +245,94 @@ def set_slide_background(slide, color_hex: str):
     fill.fore_color.rgb = hex_to_rgb(color_hex)
 
 
-def add_title_slide(prs: Presentation, config: dict):
+# 每个演示文稿下一个可用的幻灯片ID，避免每次添加幻灯片都扫描全部ID
+_next_slide_ids = weakref.WeakKeyDictionary()
+
+# 每个演示文稿的空白版式
+_blank_layouts = weakref.WeakKeyDictionary()
+
+
+def blank_layout(prs: Presentation):
+    """
+    查找演示文稿的空白版式（按名称匹配，企业底版中的版式顺序不固定）
+    
+    参数:
+        prs: Presentation对象
+    返回:
+        空白版式对象
+    """
+    presentation_part = prs.part
+    layout = _blank_layouts.get(presentation_part)
+    if layout is None:
+        layouts = list(prs.slide_layouts)
+        index = choose_blank_layout(
+            [(item.name, layout_placeholder_types(item._element)) for item in layouts])
+        layout = _blank_layouts[presentation_part] = layouts[index]
+    return layout
+
+
+def add_blank_slide(prs: Presentation, part_class: type = SlidePart):
+    """
+    添加一页空白布局的幻灯片
+    
+    与 prs.slides.add_slide 结果相同，但不再逐页扫描演示文稿的全部关系与幻灯片ID，
+    生成上千页时添加幻灯片的总耗时由平方级降为线性。
+    
+    参数:
+        prs: Presentation对象
+        part_class: 幻灯片部件类（可选，SlidePart 的子类，如表格页部件）
+    返回:
+        新建的幻灯片对象
+    """
+    slide_layout = blank_layout(prs)
+    presentation_part = prs.part
+    sldIdLst = presentation_part._element.get_or_add_sldIdLst()
+    
+    slide_part = part_class.new(
+        presentation_part._next_slide_partname, presentation_part.package, slide_layout.part
+    )
+    # 新建的部件不可能已有关系，直接添加而不查找已有关系
+    rId = presentation_part.rels._add_relationship(RT.SLIDE, slide_part)
+    slide = slide_part.slide
+    slide.shapes.clone_layout_placeholders(slide_layout)
+    
+    # 缓存的ID失效（例如期间有其他途径添加了幻灯片）时重新扫描
+    next_id = _next_slide_ids.get(presentation_part)
+    # 只读取最后一个 <p:sldId>：sldId_lst 每次都会遍历全部子元素，页数多时生成变为平方复杂度
+    if next_id is None or (len(sldIdLst) and sldIdLst[-1].id >= next_id):
+        next_id = sldIdLst._next_id
+    sldIdLst._add_sldId(id=next_id, rId=rId)
+    _next_slide_ids[presentation_part] = next_id + 1
+    
+    return slide
+
+
+def get_slot(slots: dict, name: str, default):
+    """
+    读取版式数据槽的值，未提供时返回默认占位内容
+    
+    参数:
+        slots: 数据槽字典（可为None）
+        name: 数据槽名称
+        default: 默认占位内容
+    返回:
+        数据槽的值
+    """
+    if slots and slots.get(name) is not None:
+        return slots[name]
+    return default
+
+
+def add_title_slide(prs: Presentation, config: dict, slots: dict = None):
     """
     添加标题页
     
     参数:
         prs: Presentation对象
         config: 配置字典
+        slots: 数据槽（可选）：title, subtitle, info
     """
-    slide_layout = prs.slide_layouts[6]  # 空白布局
-    slide = prs.slides.add_slide(slide_layout)
+    slide = add_blank_slide(prs)
     
     # 设置背景
     set_slide_background(slide, config['background'])
@@ -164,7 +347,7 @@ def add_title_slide(prs: Presentation, config: dict):
     # 主标题
     add_text_box(
         slide, 0.5, slide_height * 0.35, slide_width - 1, 1.2,
-        "在此输入演示文稿标题",
+        get_slot(slots, 'title', "在此输入演示文稿标题"),
         config['title_font'], 44, config['primary'],
         bold=True, align=PP_ALIGN.CENTER
     )
@@ -172,7 +355,7 @@ def add_title_slide(prs: Presentation, config: dict):
     # 副标题
     add_text_box(
         slide, 0.5, slide_height * 0.55, slide_width - 1, 0.8,
-        "在此输入副标题或简短描述",
+        get_slot(slots, 'subtitle', "在此输入副标题或简短描述"),
         config['body_font'], 24, config['secondary'],
         align=PP_ALIGN.CENTER
     )
@@ -181,22 +364,32 @@ def add_title_slide(prs: Presentation, config: dict):
     add_rectangle(slide, 0, slide_height - 0.8, slide_width, 0.8, config['primary'])
     add_text_box(
         slide, 0.5, slide_height - 0.6, slide_width - 1, 0.4,
-        "演讲者姓名  |  公司名称  |  日期",
+        get_slot(slots, 'info', "演讲者姓名  |  公司名称  |  日期"),
         config['body_font'], 14, "#ffffff",
         align=PP_ALIGN.CENTER
     )
 
 
-def add_agenda_slide(prs: Presentation, config: dict):
+# 目录页默认条目
+DEFAULT_AGENDA_ITEMS = [
+    "01  第一部分标题",
+    "02  第二部分标题",
+    "03  第三部分标题",
+    "04  第四部分标题",
+    "05  第五部分标题"
+]
+
+
+def add_agenda_slide(prs: Presentation, config: dict, slots: dict = None):
     """
     添加目录页
     
     参数:
         prs: Presentation对象
         config: 配置字典
+        slots: 数据槽（可选）：heading, items（目录条目列表）
     """
-    slide_layout = prs.slide_layouts[6]
-    slide = prs.slides.add_slide(slide_layout)
+    slide = add_blank_slide(prs)
     
     set_slide_background(slide, config['background'])
     
@@ -209,7 +402,7 @@ def add_agenda_slide(prs: Presentation, config: dict):
     # 页面标题
     add_text_box(
         slide, 0.8, 0.5, slide_width - 1.5, 0.8,
-        "目 录",
+        get_slot(slots, 'heading', "目 录"),
         config['title_font'], 36, config['primary'],
         bold=True
     )
@@ -218,13 +411,7 @@ def add_agenda_slide(prs: Presentation, config: dict):
     add_rectangle(slide, 0.8, 1.3, 2, 0.05, config['accent'])
     
     # 目录条目
-    agenda_items = [
-        "01  第一部分标题",
-        "02  第二部分标题", 
-        "03  第三部分标题",
-        "04  第四部分标题",
-        "05  第五部分标题"
-    ]
+    agenda_items = get_slot(slots, 'items', DEFAULT_AGENDA_ITEMS)
     
     start_y = 1.8
     for i, item in enumerate(agenda_items):
@@ -239,7 +426,42 @@ def add_agenda_slide(prs: Presentation, config: dict):
         )
 
 
-def add_content_slide(prs: Presentation, config: dict, page_num: int = 1):
+# 内容页与图文页正文文本框的字号（磅）
+CONTENT_BODY_FONT_SIZE = 18
+IMAGE_TEXT_BODY_FONT_SIZE = 16
+
+
+def content_body_box(slide_width: float, slide_height: float) -> tuple:
+    """
+    内容页正文文本框的位置与尺寸
+
+    参数:
+        slide_width, slide_height: 幻灯片尺寸（英寸）
+    返回:
+        (left, top, width, height)，单位英寸
+    """
+    return 0.8, 1.6, slide_width - 1.6, slide_height - 2.5
+
+
+def image_text_body_box(layout_variant: str, slide_width: float, slide_height: float) -> tuple:
+    """
+    图文页说明文字文本框的位置与尺寸
+
+    参数:
+        layout_variant: 布局变体 ('left-image' 或 'right-image')
+        slide_width, slide_height: 幻灯片尺寸（英寸）
+    返回:
+        (left, top, width, height)，单位英寸
+    """
+    content_y = 1.3
+    content_height = slide_height - 1.8
+    if layout_variant == 'left-image':
+        return 6.3, content_y + 0.2, slide_width - 7, content_height - 0.4
+    return 0.5, content_y + 0.2, 5.5, content_height - 0.4
+
+
+def add_content_slide(prs: Presentation, config: dict, page_num: int = 1, slide_num: int = None,
+                      slots: dict = None):
     """
     添加内容页
     
@@ -247,9 +469,10 @@ def add_content_slide(prs: Presentation, config: dict, page_num: int = 1):
         prs: Presentation对象
         config: 配置字典
         page_num: 页码（用于区分不同内容页）
+        slide_num: 在整份演示文稿中的页序（可选，默认取当前幻灯片数）
+        slots: 数据槽（可选）：heading, body
     """
-    slide_layout = prs.slide_layouts[6]
-    slide = prs.slides.add_slide(slide_layout)
+    slide = add_blank_slide(prs)
     
     set_slide_background(slide, config['background'])
     
@@ -260,13 +483,13 @@ def add_content_slide(prs: Presentation, config: dict, page_num: int = 1):
     add_rectangle(slide, 0, 0, slide_width, 1.2, config['primary'])
     add_text_box(
         slide, 0.5, 0.35, slide_width - 1, 0.6,
-        f"内容页标题 - 第{page_num}页",
+        get_slot(slots, 'heading', f"内容页标题 - 第{page_num}页"),
         config['title_font'], 32, "#ffffff",
         bold=True
     )
     
     # 内容区域
-    content_text = """• 在此输入第一个要点内容
+    content_text = get_slot(slots, 'body', """• 在此输入第一个要点内容
     
 • 在此输入第二个要点内容
     - 子要点说明文字
@@ -274,24 +497,42 @@ def add_content_slide(prs: Presentation, config: dict, page_num: int = 1):
     
 • 在此输入第三个要点内容
 
-• 在此输入第四个要点内容"""
+• 在此输入第四个要点内容""")
     
     add_text_box(
-        slide, 0.8, 1.6, slide_width - 1.6, slide_height - 2.5,
+        slide, *content_body_box(slide_width, slide_height),
         content_text,
-        config['body_font'], 18, config['secondary']
+        config['body_font'], CONTENT_BODY_FONT_SIZE, config['secondary']
     )
     
     # 底部页码
+    if slide_num is None:
+        slide_num = len(prs.slides)
     add_text_box(
         slide, slide_width - 1.5, slide_height - 0.5, 1, 0.3,
-        f"第 {len(prs.slides)} 页",
+        f"第 {slide_num} 页",
         config['body_font'], 10, config['secondary'],
         align=PP_ALIGN.RIGHT
     )
 
 
-def add_image_text_slide(prs: Presentation, config: dict, layout_variant: str = 'left-image', image_bytes: bytes = None):
+def picture_size(image_info, max_width: float, max_height: float) -> dict:
+    """
+    图片区内的图片尺寸参数：默认按宽度铺满，已知图片比例且过高时改为按高度放入
+
+    参数:
+        image_info: 图片信息（image_check.ImageInfo，None 表示未知）
+        max_width, max_height: 图片区尺寸（英寸）
+    返回:
+        add_picture 的 width / height 关键字参数
+    """
+    if image_info is not None and image_info.fit(max_width, max_height)[0] < max_width:
+        return {'height': Inches(max_height)}
+    return {'width': Inches(max_width)}
+
+
+def add_image_text_slide(prs: Presentation, config: dict, layout_variant: str = 'left-image', image_bytes: bytes = None,
+                         slots: dict = None, image_info=None):
     """
     添加图文页
     
@@ -300,9 +541,10 @@ def add_image_text_slide(prs: Presentation, config: dict, layout_variant: str =
         config: 配置字典
         layout_variant: 布局变体 ('left-image' 或 'right-image')
         image_bytes: 图片字节数据（可选）
+        slots: 数据槽（可选）：heading, body
+        image_info: 上传时校验得到的图片信息（可选，image_check.ImageInfo），用于按比例放入图片区
     """
-    slide_layout = prs.slide_layouts[6]
-    slide = prs.slides.add_slide(slide_layout)
+    slide = add_blank_slide(prs)
     
     set_slide_background(slide, config['background'])
     
@@ -312,7 +554,7 @@ def add_image_text_slide(prs: Presentation, config: dict, layout_variant: str =
     # 页面标题
     add_text_box(
         slide, 0.5, 0.3, slide_width - 1, 0.7,
-        "图文混排页标题",
+        get_slot(slots, 'heading', "图文混排页标题"),
         config['title_font'], 28, config['primary'],
         bold=True
     )
@@ -335,8 +577,9 @@ def add_image_text_slide(prs: Presentation, config: dict, layout_variant: str =
                 slide.shapes.add_picture(
                     img_stream,
                     Inches(img_left), Inches(content_y),
-                    width=Inches(img_width)
+                    **picture_size(image_info, img_width, content_height)
                 )
+                IMAGE_BYTES.inc(len(image_bytes), source='upload')
             except Exception:
                 # 图片插入失败，显示占位区
                 add_rectangle(slide, img_left, content_y, img_width, content_height, "#e2e8f0", config['secondary'])
@@ -349,7 +592,7 @@ def add_image_text_slide(prs: Presentation, config: dict, layout_variant: str =
                 "📷 图片占位区域\n点击添加图片", config['body_font'], 16, config['secondary'], align=PP_ALIGN.CENTER)
         
         # 右侧文字
-        text_content = """在此输入说明文字
+        text_content = get_slot(slots, 'body', """在此输入说明文字
 
 • 要点一：详细描述内容
 
@@ -357,17 +600,17 @@ def add_image_text_slide(prs: Presentation, config: dict, layout_variant: str =
 
 • 要点三：详细描述内容
 
-可以在这里添加更多的解释性文字来配合左侧的图片内容。"""
+可以在这里添加更多的解释性文字来配合左侧的图片内容。""")
         
         add_text_box(
-            slide, 6.3, content_y + 0.2, slide_width - 7, content_height - 0.4,
+            slide, *image_text_body_box(layout_variant, slide_width, slide_height),
             text_content,
-            config['body_font'], 16, config['secondary']
+            config['body_font'], IMAGE_TEXT_BODY_FONT_SIZE, config['secondary']
         )
     else:
         # 右图左文布局
         # 左侧文字
-        text_content = """在此输入说明文字
+        text_content = get_slot(slots, 'body', """在此输入说明文字
 
 • 要点一：详细描述内容
 
@@ -375,12 +618,12 @@ def add_image_text_slide(prs: Presentation, config: dict, layout_variant: str =
 
 • 要点三：详细描述内容
 
-可以在这里添加更多的解释性文字来配合右侧的图片内容。"""
+可以在这里添加更多的解释性文字来配合右侧的图片内容。""")
         
         add_text_box(
-            slide, 0.5, content_y + 0.2, 5.5, content_height - 0.4,
+            slide, *image_text_body_box(layout_variant, slide_width, slide_height),
             text_content,
-            config['body_font'], 16, config['secondary']
+            config['body_font'], IMAGE_TEXT_BODY_FONT_SIZE, config['secondary']
         )
         
         # 右侧图片区
@@ -393,8 +636,9 @@ def add_image_text_slide(prs: Presentation, config: dict, layout_variant: str =
                 slide.shapes.add_picture(
                     img_stream,
                     Inches(img_left), Inches(content_y),
-                    width=Inches(img_width)
+                    **picture_size(image_info, img_width, content_height)
                 )
+                IMAGE_BYTES.inc(len(image_bytes), source='upload')
             except Exception:
                 add_rectangle(slide, img_left, content_y, img_width, content_height, "#e2e8f0", config['secondary'])
                 add_text_box(slide, img_left, content_y + content_height/2 - 0.3, img_width, 0.6,
@@ -405,16 +649,16 @@ def add_image_text_slide(prs: Presentation, config: dict, layout_variant: str =
                 "📷 图片占位区域\n点击添加图片", config['body_font'], 16, config['secondary'], align=PP_ALIGN.CENTER)
 
 
-def add_comparison_slide(prs: Presentation, config: dict):
+def add_comparison_slide(prs: Presentation, config: dict, slots: dict = None):
     """
     添加对比页
     
     参数:
         prs: Presentation对象
         config: 配置字典
+        slots: 数据槽（可选）：heading, left_title, left_body, right_title, right_body
     """
-    slide_layout = prs.slide_layouts[6]
-    slide = prs.slides.add_slide(slide_layout)
+    slide = add_blank_slide(prs)
     
     set_slide_background(slide, config['background'])
     
@@ -424,7 +668,7 @@ def add_comparison_slide(prs: Presentation, config: dict):
     # 页面标题
     add_text_box(
         slide, 0.5, 0.3, slide_width - 1, 0.7,
-        "对比分析页",
+        get_slot(slots, 'heading', "对比分析页"),
         config['title_font'], 28, config['primary'],
         bold=True, align=PP_ALIGN.CENTER
     )
@@ -438,18 +682,18 @@ def add_comparison_slide(prs: Presentation, config: dict):
     add_rectangle(slide, 0.4, 1.3, left_width, 0.6, config['primary'])
     add_text_box(
         slide, 0.4, 1.4, left_width, 0.4,
-        "方案 A",
+        get_slot(slots, 'left_title', "方案 A"),
         config['title_font'], 20, "#ffffff",
         bold=True, align=PP_ALIGN.CENTER
     )
     
-    left_content = """✓ 优势点一
+    left_content = get_slot(slots, 'left_body', """✓ 优势点一
 
 ✓ 优势点二
 
 ✓ 优势点三
 
-✗ 不足之处"""
+✗ 不足之处""")
     
     add_text_box(
         slide, 0.5, 2.1, left_width - 0.2, slide_height - 2.8,
@@ -463,18 +707,18 @@ def add_comparison_slide(prs: Presentation, config: dict):
     add_rectangle(slide, right_x, 1.3, left_width, 0.6, config['accent'])
     add_text_box(
         slide, right_x, 1.4, left_width, 0.4,
-        "方案 B",
+        get_slot(slots, 'right_title', "方案 B"),
         config['title_font'], 20, "#ffffff",
         bold=True, align=PP_ALIGN.CENTER
     )
     
-    right_content = """✓ 优势点一
+    right_content = get_slot(slots, 'right_body', """✓ 优势点一
 
 ✓ 优势点二
 
 ✓ 优势点三
 
-✗ 不足之处"""
+✗ 不足之处""")
     
     add_text_box(
         slide, right_x + 0.1, 2.1, left_width - 0.2, slide_height - 2.8,
@@ -483,16 +727,16 @@ def add_comparison_slide(prs: Presentation, config: dict):
     )
 
 
-def add_thankyou_slide(prs: Presentation, config: dict):
+def add_thankyou_slide(prs: Presentation, config: dict, slots: dict = None):
     """
     添加致谢页
     
     参数:
         prs: Presentation对象
         config: 配置字典
+        slots: 数据槽（可选）：title, subtitle, contact
     """
-    slide_layout = prs.slide_layouts[6]
-    slide = prs.slides.add_slide(slide_layout)
+    slide = add_blank_slide(prs)
     
     set_slide_background(slide, config['background'])
     
@@ -509,7 +753,7 @@ def add_thankyou_slide(prs: Presentation, config: dict):
     # 主标题
     add_text_box(
         slide, 0.5, center_y - 0.8, slide_width - 1, 1,
-        "感谢观看",
+        get_slot(slots, 'title', "感谢观看"),
         config['title_font'], 48, "#ffffff",
         bold=True, align=PP_ALIGN.CENTER
     )
@@ -517,7 +761,7 @@ def add_thankyou_slide(prs: Presentation, config: dict):
     # 副文本
     add_text_box(
         slide, 0.5, center_y + 0.3, slide_width - 1, 0.6,
-        "THANK YOU FOR WATCHING",
+        get_slot(slots, 'subtitle', "THANK YOU FOR WATCHING"),
         config['body_font'], 18, "#ffffff",
         align=PP_ALIGN.CENTER
     )
@@ -525,22 +769,31 @@ def add_thankyou_slide(prs: Presentation, config: dict):
     # 底部联系信息
     add_text_box(
         slide, 0.5, slide_height - 1, slide_width - 1, 0.5,
-        "联系方式：email@example.com  |  电话：123-4567-8900",
+        get_slot(slots, 'contact', "联系方式：email@example.com  |  电话：123-4567-8900"),
         config['body_font'], 12, config['secondary'],
         align=PP_ALIGN.CENTER
     )
 
 
-def add_timeline_slide(prs: Presentation, config: dict):
+# 时间轴页默认节点
+DEFAULT_TIMELINE_NODES = [
+    ("2024 Q1", "第一阶段\n项目启动"),
+    ("2024 Q2", "第二阶段\n设计开发"),
+    ("2024 Q3", "第三阶段\n测试优化"),
+    ("2024 Q4", "第四阶段\n正式上线")
+]
+
+
+def add_timeline_slide(prs: Presentation, config: dict, slots: dict = None):
     """
     添加时间轴页
     
     参数:
         prs: Presentation对象
         config: 配置字典
+        slots: 数据槽（可选）：heading, nodes（[(日期, 描述), ...]）
     """
-    slide_layout = prs.slide_layouts[6]
-    slide = prs.slides.add_slide(slide_layout)
+    slide = add_blank_slide(prs)
     
     set_slide_background(slide, config['background'])
     
@@ -550,7 +803,7 @@ def add_timeline_slide(prs: Presentation, config: dict):
     # 页面标题
     add_text_box(
         slide, 0.5, 0.3, slide_width - 1, 0.7,
-        "项目时间轴 / 里程碑",
+        get_slot(slots, 'heading', "项目时间轴 / 里程碑"),
         config['title_font'], 28, config['primary'],
         bold=True
     )
@@ -563,12 +816,7 @@ def add_timeline_slide(prs: Presentation, config: dict):
     add_rectangle(slide, 0.8, timeline_y - 0.03, slide_width - 1.6, 0.06, config['primary'])
     
     # 时间节点
-    nodes = [
-        ("2024 Q1", "第一阶段\n项目启动"),
-        ("2024 Q2", "第二阶段\n设计开发"),
-        ("2024 Q3", "第三阶段\n测试优化"),
-        ("2024 Q4", "第四阶段\n正式上线")
-    ]
+    nodes = get_slot(slots, 'nodes', DEFAULT_TIMELINE_NODES)
     
     node_spacing = (slide_width - 2) / (len(nodes) + 1)
     
@@ -600,16 +848,25 @@ def add_timeline_slide(prs: Presentation, config: dict):
         )
 
 
-def add_kpi_slide(prs: Presentation, config: dict):
+# 数据概览页默认指标
+DEFAULT_KPIS = [
+    ("1,234", "总用户数", "+12.5%"),
+    ("98.6%", "系统可用率", "+2.1%"),
+    ("56.7万", "月访问量", "+25.3%"),
+    ("4.8/5", "用户满意度", "+0.3")
+]
+
+
+def add_kpi_slide(prs: Presentation, config: dict, slots: dict = None):
     """
     添加数据概览页 (KPI展示)
     
     参数:
         prs: Presentation对象
         config: 配置字典
+        slots: 数据槽（可选）：heading, kpis（[(数字, 标签, 变化), ...]）
     """
-    slide_layout = prs.slide_layouts[6]
-    slide = prs.slides.add_slide(slide_layout)
+    slide = add_blank_slide(prs)
     
     set_slide_background(slide, config['background'])
     
@@ -619,20 +876,18 @@ def add_kpi_slide(prs: Presentation, config: dict):
     # 页面标题
     add_text_box(
         slide, 0.5, 0.3, slide_width - 1, 0.7,
-        "核心数据概览",
+        get_slot(slots, 'heading', "核心数据概览"),
         config['title_font'], 28, config['primary'],
         bold=True, align=PP_ALIGN.CENTER
     )
     
     # KPI 卡片
-    kpis = [
-        ("1,234", "总用户数", "+12.5%"),
-        ("98.6%", "系统可用率", "+2.1%"),
-        ("56.7万", "月访问量", "+25.3%"),
-        ("4.8/5", "用户满意度", "+0.3")
-    ]
-    
-    card_width = (slide_width - 1.5) / 4
+    kpis = get_slot(slots, 'kpis', DEFAULT_KPIS)
+    if not kpis:
+        # 数据为空（如邮件合并记录中没有指标）时只保留标题，不画卡片
+        return
+    
+    card_width = (slide_width - 1.5) / len(kpis)
     card_height = 2.5
     start_y = (slide_height - card_height) / 2
     
@@ -668,16 +923,401 @@ def add_kpi_slide(prs: Presentation, config: dict):
         )
 
 
-def add_quote_slide(prs: Presentation, config: dict):
+# 图表页默认数据
+DEFAULT_CHART_CATEGORIES = [f"{m}月" for m in range(1, 13)]
+DEFAULT_CHART_SERIES = {
+    "本年": [120, 132, 101, 134, 190, 230, 210, 182, 191, 234, 290, 330],
+    "上年": [98, 110, 95, 120, 150, 180, 175, 160, 170, 200, 230, 260]
+}
+
+
+class _FixedDateWorkbookWriter(CategoryWorkbookWriter):
+    """内嵌工作簿写入器：固定创建时间，使相同数据生成相同的工作簿"""
+
+    CREATED = datetime(2024, 1, 1)
+
+    @contextmanager
+    def _open_worksheet(self, xlsx_file):
+        workbook = Workbook(xlsx_file, {"in_memory": True})
+        workbook.set_properties({'created': self.CREATED})
+        worksheet = workbook.add_worksheet()
+        yield workbook, worksheet
+        workbook.close()
+
+
+class _ChartData(CategoryChartData):
+    """使用固定创建时间工作簿的图表数据"""
+
+    @lazyproperty
+    def _workbook_writer(self):
+        return _FixedDateWorkbookWriter(self)
+
+
+def add_chart_slide(prs: Presentation, config: dict, slots: dict = None):
+    """
+    添加图表页（原生折线图/柱状图）
+    
+    大规模数据在写入图表XML与内嵌工作簿前先降采样，点数不超过 max_points。
+    
+    参数:
+        prs: Presentation对象
+        config: 配置字典
+        slots: 数据槽（可选）：heading, chart_type（'line' 或 'bar'）,
+               categories（横轴序列）, series（{序列名: 数值序列}，可为NumPy数组）,
+               max_points, method（'lttb'、'minmax' 或 'mean'）, number_format
+    """
+    slide = add_blank_slide(prs)
+    
+    set_slide_background(slide, config['background'])
+    
+    slide_width = prs.slide_width.inches
+    slide_height = prs.slide_height.inches
+    
+    # 页面标题
+    add_text_box(
+        slide, 0.5, 0.3, slide_width - 1, 0.7,
+        get_slot(slots, 'heading', "数据趋势图表"),
+        config['title_font'], 28, config['primary'],
+        bold=True
+    )
+    
+    # 标题下划线
+    add_rectangle(slide, 0.5, 1.0, 3, 0.05, config['accent'])
+    
+    # 图表数据
+    chart_type = get_slot(slots, 'chart_type', 'line')
+    series = get_slot(slots, 'series', None)
+    if series is None:
+        categories = DEFAULT_CHART_CATEGORIES
+        series = DEFAULT_CHART_SERIES
+    else:
+        # 未提供横轴时按序号作为类别
+        categories = get_slot(slots, 'categories', None)
+    method = get_slot(slots, 'method', 'lttb' if chart_type == 'line' else 'mean')
+    categories, series = downsample_series(
+        categories, series,
+        max_points=get_slot(slots, 'max_points', DEFAULT_MAX_POINTS),
+        method=method
+    )
+    
+    chart_data = _ChartData(number_format=get_slot(slots, 'number_format', 'General'))
+    chart_data.categories = categories.tolist()
+    for name, values in series.items():
+        # NaN 写为空值，避免生成非法的图表XML
+        chart_data.add_series(name, [None if v != v else v for v in values.tolist()])
+    
+    xl_chart_type = XL_CHART_TYPE.LINE if chart_type == 'line' else XL_CHART_TYPE.COLUMN_CLUSTERED
+    graphic_frame = slide.shapes.add_chart(
+        xl_chart_type,
+        Inches(0.5), Inches(1.3), Inches(slide_width - 1), Inches(slide_height - 2.0),
+        chart_data
+    )
+    chart = graphic_frame.chart
+    
+    # 图表样式
+    chart.font.name = config['body_font']
+    chart.font.size = Pt(12)
+    chart.font.color.rgb = hex_to_rgb(config['secondary'])
+    chart.has_legend = len(series) > 1
+    if chart.has_legend:
+        chart.legend.position = XL_LEGEND_POSITION.BOTTOM
+        chart.legend.include_in_layout = False
+    
+    colors = [config['primary'], config['accent'], config['secondary']]
+    for i, plot_series in enumerate(chart.plots[0].series):
+        color = colors[i % len(colors)]
+        if chart_type == 'line':
+            plot_series.format.line.color.rgb = hex_to_rgb(color)
+            plot_series.format.line.width = Pt(2)
+            plot_series.smooth = False
+            plot_series.marker.style = XL_MARKER_STYLE.NONE
+        else:
+            plot_series.format.fill.solid()
+            plot_series.format.fill.fore_color.rgb = hex_to_rgb(color)
+
+
+# 表格单元格内边距（英寸），与PowerPoint默认值一致
+TABLE_CELL_MARGIN_X = 0.1
+TABLE_CELL_MARGIN_Y = 0.05
+
+# XML 1.0 不允许出现的控制字符
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# 表格页默认数据（首行为表头）
+DEFAULT_TABLE_ROWS = [
+    ("任务", "负责人", "状态", "进度"),
+    ("需求调研", "张三", "已完成", "100%"),
+    ("方案设计", "李四", "已完成", "100%"),
+    ("开发实现", "王五", "进行中", "60%"),
+    ("测试验收", "赵六", "未开始", "0%")
+]
+
+# 表格数据行在幻灯片XML中的占位注释
+TABLE_ROWS_MARKER = 'pptx-table-rows'
+
+
+class _RowSpool:
+    """
+    表格数据行的临时文件：每页的数据行压缩后追加写入，保存文件时按偏移读回，
+    数十万行表格的数据行不在内存中累积（文件在对象回收时删除）
+    """
+
+    __slots__ = ('_file', '_lock')
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile(prefix='ppt_rows_')
+        self._lock = threading.Lock()
+
+    def append(self, xml: str) -> tuple:
+        """
+        写入一页的数据行
+
+        参数:
+            xml: 数据行XML
+        返回:
+            (偏移, 长度)
+        """
+        data = zlib.compress(xml.encode('utf-8'), 1)
+        with self._lock:
+            offset = self._file.seek(0, io.SEEK_END)
+            self._file.write(data)
+        return offset, len(data)
+
+    def read(self, offset: int, length: int) -> bytes:
+        """读回一页的数据行XML"""
+        with self._lock:
+            self._file.seek(offset)
+            data = self._file.read(length)
+        return zlib.decompress(data)
+
+
+class _TableSlidePart(SlidePart):
+    """
+    表格页部件：数据行保存在临时文件中，保存文件时再拼接到占位处，
+    避免数十万行表格在内存中展开为XML元素树或累积为字符串
+
+    由 add_blank_slide(prs, _TableSlidePart) 创建，之后调用 set_rows 写入数据行。
+    """
+
+    _spool = None
+    _rows_at = (0, 0)
+
+    def set_rows(self, spool: _RowSpool, rows_xml: str):
+        """
+        写入本页的数据行
+
+        参数:
+            spool: 表格共用的临时文件
+            rows_xml: 数据行XML
+        """
+        self._spool = spool
+        self._rows_at = spool.append(rows_xml)
+
+    @property
+    def blob(self) -> bytes:
+        xml = serialize_part_xml(self._element)
+        rows = self._spool.read(*self._rows_at) if self._spool is not None else b''
+        marker = f'<!--{TABLE_ROWS_MARKER}-->'.encode('utf-8')
+        return xml.replace(marker, rows, 1)
+
+
+def _escape_cell_text(text) -> str:
+    """
+    转义单元格文本以便直接写入XML
+
+    参数:
+        text: 单元格内容
+    返回:
+        转义后的文本
+    """
+    text = '' if text is None else str(text)
+    text = INVALID_XML_CHARS.sub('', text)
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _escape_attr(value: str) -> str:
+    """转义XML属性值（双引号包围）"""
+    return _escape_cell_text(value).replace('"', '&quot;')
+
+
+def _table_row_xml(cells: list, height: float, font_name: str, font_size: int,
+                   color_hex: str, fill_hex: str, bold: bool = False, nsdecl: bool = False) -> str:
+    """
+    生成表格行XML
+
+    表格可能有数十万行，直接拼接XML比逐个单元格调用python-pptx接口快一个数量级。
+
+    参数:
+        cells: 单元格文本列表
+        height: 行高（英寸）
+        font_name: 字体名称
+        font_size: 字体大小
+        color_hex: 字体颜色
+        fill_hex: 单元格填充颜色
+        bold: 是否加粗
+        nsdecl: 是否声明命名空间（单独解析时需要）
+    返回:
+        <a:tr> XML文本
+    """
+    typeface = _escape_attr(font_name)
+    rpr = (
+        f'<a:rPr lang="zh-CN" sz="{font_size * 100}" b="{int(bold)}" dirty="0">'
+        f'<a:solidFill><a:srgbClr val="{color_hex.lstrip("#").upper()}"/></a:solidFill>'
+        f'<a:latin typeface="{typeface}"/><a:ea typeface="{typeface}"/></a:rPr>'
+    )
+    tcpr = (
+        f'<a:tcPr anchor="ctr"><a:solidFill><a:srgbClr val="{fill_hex.lstrip("#").upper()}"/>'
+        f'</a:solidFill></a:tcPr>'
+    )
+    tcs = []
+    for text in cells:
+        paragraphs = ''.join(
+            f'<a:p><a:r>{rpr}<a:t>{line}</a:t></a:r></a:p>'
+            for line in _escape_cell_text(text).split('\n')
+        )
+        tcs.append(f'<a:tc><a:txBody><a:bodyPr/><a:lstStyle/>{paragraphs}</a:txBody>{tcpr}</a:tc>')
+    ns = f' {nsdecls("a")}' if nsdecl else ''
+    return f'<a:tr{ns} h="{int(Inches(height))}">{"".join(tcs)}</a:tr>'
+
+
+def _iter_table_rows(slots: dict):
+    """
+    逐行读取表格数据，CSV文件以流方式读取
+
+    参数:
+        slots: 数据槽字典
+    返回:
+        行列表的生成器
+    """
+    source = get_slot(slots, 'source', None)
+    if source:
+        with open(source, newline='', encoding='utf-8-sig') as f:
+            yield from csv.reader(f)
+    else:
+        yield from get_slot(slots, 'rows', DEFAULT_TABLE_ROWS)
+
+
+def add_table_slides(prs: Presentation, config: dict, slots: dict = None, governor=None) -> int:
+    """
+    添加表格页，数据超出一页时自动续页并重复表头
+    
+    数据逐行读取、逐页输出，内存中最多只保留一页的行；
+    已输出页的数据行压缩后写入临时文件，直到保存文件时才逐页读回。
+    行高按正文字体与字号测量折行后计算。
+    
+    参数:
+        prs: Presentation对象
+        config: 配置字典
+        slots: 数据槽（可选）：heading, header（表头列表）, rows（行的可迭代对象）,
+               source（CSV文件路径，首行为表头）, col_widths（列宽比例）, font_size
+        governor: ResourceGovernor对象（可选，每输出一页检查一次资源预算）
+    返回:
+        生成的幻灯片数
+    """
+    slide_width = prs.slide_width.inches
+    slide_height = prs.slide_height.inches
+    
+    heading = get_slot(slots, 'heading', "数据明细表")
+    font_size = get_slot(slots, 'font_size', 12)
+    font_name = config['body_font']
+    
+    rows = _iter_table_rows(slots)
+    header = get_slot(slots, 'header', None)
+    if header is None:
+        header = next(rows, None)
+        if header is None:
+            return 0
+    header = list(header)
+    n_cols = len(header)
+    
+    # 列宽
+    table_left, table_top = 0.5, 1.3
+    table_width = slide_width - 1
+    weights = get_slot(slots, 'col_widths', [1] * n_cols)
+    col_widths = [table_width * w / sum(weights) for w in weights]
+    text_widths = [w - 2 * TABLE_CELL_MARGIN_X for w in col_widths]
+    # 页脚上方为表格可用区域
+    max_bottom = slide_height - 0.6
+    
+    def row_height(cells: list, size: int) -> float:
+        lines = max(
+            count_lines(text, font_name, size, width)
+            for text, width in zip(cells, text_widths)
+        )
+        return lines * size * 1.2 / 72 + 2 * TABLE_CELL_MARGIN_Y
+    
+    header_height = row_height(header, font_size)
+    header_xml = _table_row_xml(header, header_height, config['title_font'], font_size,
+                                "#ffffff", config['primary'], bold=True, nsdecl=True)
+    
+    spool = _RowSpool()
+    
+    def add_page(page_rows: list, page_height: float, page_index: int):
+        slide = add_blank_slide(prs, _TableSlidePart)
+        set_slide_background(slide, config['background'])
+        
+        # 页面标题，续页标注“续”
+        title = heading if page_index == 0 else f"{heading}（续）"
+        add_text_box(
+            slide, 0.5, 0.3, slide_width - 1, 0.7,
+            title,
+            config['title_font'], 28, config['primary'],
+            bold=True
+        )
+        add_rectangle(slide, 0.5, 1.0, 3, 0.05, config['accent'])
+        
+        graphic_frame = slide.shapes.add_table(
+            1, n_cols, Inches(table_left), Inches(table_top),
+            Inches(table_width), Inches(page_height)
+        )
+        tbl = graphic_frame._element.graphic.graphicData.tbl
+        for gridCol, width in zip(tbl.tblGrid.gridCol_lst, col_widths):
+            gridCol.w = Emu(int(Inches(width)))
+        tbl.remove(tbl.tr_lst[0])
+        tbl.append(parse_xml(header_xml))
+        tbl.append(etree.Comment(TABLE_ROWS_MARKER))
+        
+        slide.part.set_rows(spool, ''.join(page_rows))
+        if governor is not None:
+            governor.check(len(prs.slides), 'slides')
+    
+    pages = 0
+    page_rows = []
+    page_height = header_height
+    for row in rows:
+        cells = [str(cell) for cell in list(row)[:n_cols]]
+        cells += [''] * (n_cols - len(cells))
+        height = row_height(cells, font_size)
+        
+        # 当前页放不下则先输出当前页（单行超过一页时独占一页）
+        if page_rows and table_top + page_height + height > max_bottom:
+            add_page(page_rows, page_height, pages)
+            pages += 1
+            page_rows = []
+            page_height = header_height
+        
+        fill = "#ffffff" if len(page_rows) % 2 == 0 else "#f8f9fa"
+        page_rows.append(_table_row_xml(cells, height, font_name, font_size,
+                                        config['secondary'], fill))
+        page_height += height
+    
+    if page_rows or pages == 0:
+        add_page(page_rows, page_height, pages)
+        pages += 1
+    
+    return pages
+
+
+def add_quote_slide(prs: Presentation, config: dict, slots: dict = None):
     """
     添加引用页
     
     参数:
         prs: Presentation对象
         config: 配置字典
+        slots: 数据槽（可选）：quote, author
     """
-    slide_layout = prs.slide_layouts[6]
-    slide = prs.slides.add_slide(slide_layout)
+    slide = add_blank_slide(prs)
     
     set_slide_background(slide, config['background'])
     
@@ -700,7 +1340,7 @@ def add_quote_slide(prs: Presentation, config: dict):
     # 引用文字
     add_text_box(
         slide, 1.5, center_y - 0.8, slide_width - 3, 1.6,
-        "在此输入引言或重要语句，\n用于强调核心观点或名人名言。",
+        get_slot(slots, 'quote', "在此输入引言或重要语句，\n用于强调核心观点或名人名言。"),
         config['body_font'], 28, config['primary'],
         align=PP_ALIGN.LEFT
     )
@@ -708,7 +1348,7 @@ def add_quote_slide(prs: Presentation, config: dict):
     # 作者/来源
     add_text_box(
         slide, 1.5, center_y + 1.2, slide_width - 3, 0.5,
-        "—— 作者姓名，《来源出处》",
+        get_slot(slots, 'author', "—— 作者姓名，《来源出处》"),
         config['body_font'], 16, config['secondary'],
         align=PP_ALIGN.LEFT
     )
@@ -770,6 +1410,7 @@ def add_logo_to_slide(slide, logo_bytes: bytes, slide_width: float, slide_height
         Inches(left), Inches(top),
         height=Inches(logo_height)
     )
+    IMAGE_BYTES.inc(len(logo_bytes), source='logo')
 
 
 def add_footer(slide, config: dict, slide_num: int, slide_width: float, slide_height: float):
@@ -804,7 +1445,222 @@ def add_footer(slide, config: dict, slide_num: int, slide_width: float, slide_he
         )
 
 
-def build_presentation(config: dict, layouts_config: dict, logo_bytes: bytes = None, uploaded_images: list = None) -> io.BytesIO:
+def get_slide_size(config: dict) -> tuple:
+    """
+    根据画布比例配置获取幻灯片尺寸
+    
+    参数:
+        config: 主题配置字典
+    返回:
+        (宽度, 高度) 英寸
+    """
+    ratio = config.get('ratio', '16:9')
+    ratio_config = SLIDE_RATIOS.get(ratio, SLIDE_RATIOS['16:9'])
+    return ratio_config['width'], ratio_config['height']
+
+
+def new_presentation(config: dict) -> Presentation:
+    """
+    创建空白演示文稿并按配置设置画布尺寸
+    
+    配置中指定 base_template 时以企业底版（.pptx / .potx）的母版与版式为基础。
+    
+    参数:
+        config: 主题配置字典
+    返回:
+        Presentation对象
+    """
+    base = config.get('base_template')
+    prs = load_base_template(base).open() if base else Presentation()
+    
+    slide_width, slide_height = get_slide_size(config)
+    prs.slide_width = Inches(slide_width)
+    prs.slide_height = Inches(slide_height)
+    return prs
+
+
+def save_presentation(prs: Presentation, config: dict) -> io.BytesIO:
+    """
+    保存演示文稿到内存；使用企业底版时换回底版中的大体积媒体
+    
+    参数:
+        prs: Presentation对象
+        config: 主题配置字典
+    返回:
+        包含PPT文件的BytesIO对象
+    """
+    ppt_buffer = io.BytesIO()
+    prs.save(ppt_buffer)
+    base = config.get('base_template')
+    if base:
+        ppt_buffer = io.BytesIO(load_base_template(base).restore(ppt_buffer.getvalue()))
+    ppt_buffer.seek(0)
+    return ppt_buffer
+
+
+# ==================== 幻灯片计划 ====================
+# 表格页数估算时抽样读取的字节数与测量的行数
+TABLE_SAMPLE_BYTES = 64 * 1024
+TABLE_SAMPLE_ROWS = 200
+
+
+def _image_text_kwargs(i: int, slide_num: int, uploaded_images: list) -> dict:
+    """图文页参数：左右布局交替，依次使用上传的图片"""
+    image_bytes = image_info = None
+    if i < len(uploaded_images):
+        image_bytes = uploaded_images[i].get('bytes')
+        image_info = uploaded_images[i].get('info')
+    return {'layout_variant': 'left-image' if i % 2 == 0 else 'right-image', 'image_bytes': image_bytes,
+            'image_info': image_info}
+
+
+def _agenda_shapes(kwargs: dict) -> tuple:
+    """目录页形状规格：条目数决定文本框与隔行底色的数量"""
+    n = len(get_slot(kwargs.get('slots'), 'items', DEFAULT_AGENDA_ITEMS))
+    return [ShapeSpec(SHAPE_AUTO, 2 + (n + 1) // 2), ShapeSpec(SHAPE_TEXT, 1 + n)], 1
+
+
+def _image_text_shapes(kwargs: dict) -> tuple:
+    """图文页形状规格：无图片时为占位区"""
+    image_bytes = kwargs.get('image_bytes')
+    if image_bytes:
+        return [ShapeSpec(SHAPE_AUTO, 1), ShapeSpec(SHAPE_TEXT, 2),
+                ShapeSpec(SHAPE_PICTURE, 1, len(image_bytes), image_bytes)], 1
+    return [ShapeSpec(SHAPE_AUTO, 2), ShapeSpec(SHAPE_TEXT, 3)], 1
+
+
+def _timeline_shapes(kwargs: dict) -> tuple:
+    """时间轴页形状规格：每个节点一个圆圈与两个文本框"""
+    n = len(get_slot(kwargs.get('slots'), 'nodes', DEFAULT_TIMELINE_NODES))
+    return [ShapeSpec(SHAPE_AUTO, 2 + n), ShapeSpec(SHAPE_TEXT, 1 + 2 * n)], 1
+
+
+def _kpi_shapes(kwargs: dict) -> tuple:
+    """数据概览页形状规格：每个指标一张卡片与三个文本框"""
+    n = len(get_slot(kwargs.get('slots'), 'kpis', DEFAULT_KPIS))
+    return [ShapeSpec(SHAPE_AUTO, n), ShapeSpec(SHAPE_TEXT, 1 + 3 * n)], 1
+
+
+def _chart_shapes(kwargs: dict) -> tuple:
+    """图表页形状规格：数据点数按降采样上限截断"""
+    slots = kwargs.get('slots')
+    series = get_slot(slots, 'series', None)
+    if series is None:
+        points = len(DEFAULT_CHART_CATEGORIES) * len(DEFAULT_CHART_SERIES)
+    else:
+        n = min((len(values) for values in series.values()), default=0)
+        points = min(n, get_slot(slots, 'max_points', DEFAULT_MAX_POINTS)) * len(series)
+    return [ShapeSpec(SHAPE_AUTO, 1), ShapeSpec(SHAPE_TEXT, 1), ShapeSpec(SHAPE_CHART, 1, points)], 1
+
+
+def _table_shapes(kwargs: dict) -> tuple:
+    """
+    表格页形状规格：按抽样行的测量行高估算续页数
+
+    CSV数据源只读取开头部分，按文件大小推算总行数。
+    """
+    slots = kwargs.get('slots')
+    source = get_slot(slots, 'source', None)
+    if source:
+        with open(source, 'rb') as f:
+            sample = f.read(TABLE_SAMPLE_BYTES)
+        sample_rows = list(csv.reader(io.StringIO(sample.decode('utf-8-sig', errors='ignore'))))[:-1]
+        rows = round(os.path.getsize(source) * len(sample_rows) / len(sample)) if sample else 0
+    else:
+        data = get_slot(slots, 'rows', DEFAULT_TABLE_ROWS)
+        sample_rows = [list(row) for row in data[:TABLE_SAMPLE_ROWS]] if hasattr(data, '__len__') else []
+        rows = len(data) if sample_rows else 0
+    header = get_slot(slots, 'header', None)
+    if header is None:
+        header = sample_rows[0] if sample_rows else []
+        sample_rows = sample_rows[1:]
+        rows = max(0, rows - 1)
+    n_cols = max(1, len(header))
+
+    # 与 add_table_slides 相同的行高算法（按16:9画布）
+    font_size = get_slot(slots, 'font_size', 12)
+    table_width = SLIDE_RATIOS['16:9']['width'] - 1
+    weights = get_slot(slots, 'col_widths', [1] * n_cols)
+    text_widths = [table_width * w / sum(weights) - 2 * TABLE_CELL_MARGIN_X for w in weights]
+    line_height = font_size * 1.2 / 72
+    lines = [
+        max(count_lines(str(text), None, font_size, width) for text, width in zip(row, text_widths))
+        for row in sample_rows[:TABLE_SAMPLE_ROWS] if row
+    ] or [1]
+    row_height = sum(lines) / len(lines) * line_height + 2 * TABLE_CELL_MARGIN_Y
+    header_height = line_height + 2 * TABLE_CELL_MARGIN_Y
+
+    rows_per_page = max(1, int((SLIDE_RATIOS['16:9']['height'] - 1.9 - header_height) / row_height))
+    pages = max(1, -(-rows // rows_per_page))
+    cells = -(-(rows + pages) * n_cols // pages)
+    return [ShapeSpec(SHAPE_AUTO, 1), ShapeSpec(SHAPE_TEXT, 1), ShapeSpec(SHAPE_TABLE, 1, cells)], pages
+
+
+# 版式注册表，登记顺序即幻灯片顺序
+register_layout('title', add_title_slide, shapes=fixed_shapes(2, 3))
+register_layout('agenda', add_agenda_slide, shapes=_agenda_shapes)
+register_layout('content', add_content_slide, default_count=2,
+                kwargs=lambda i, slide_num, images: {'page_num': i + 1, 'slide_num': slide_num},
+                shapes=fixed_shapes(1, 3))
+register_layout('image_text', add_image_text_slide, default_count=2,
+                kwargs=_image_text_kwargs, shapes=_image_text_shapes)
+register_layout('comparison', add_comparison_slide, shapes=fixed_shapes(3, 5))
+register_layout('timeline', add_timeline_slide, shapes=_timeline_shapes)
+register_layout('kpi', add_kpi_slide, shapes=_kpi_shapes)
+# 图表页、表格页为新增版式，旧配置中缺省时不启用；表格页一项计划可能生成多页
+register_layout('chart', add_chart_slide, enabled_default=False, shapes=_chart_shapes)
+register_layout('table', add_table_slides, enabled_default=False, shapes=_table_shapes, paginated=True)
+register_layout('quote', add_quote_slide, shapes=fixed_shapes(1, 3))
+register_layout('thankyou', add_thankyou_slide, shapes=fixed_shapes(1, 3))
+
+
+def plan_slides(layouts_config: dict, uploaded_images: list = None) -> list:
+    """
+    根据版式配置生成幻灯片计划
+    
+    串行与并行生成共用同一份计划，保证两种模式输出一致；计划同时用于生成前的成本估算。
+    
+    参数:
+        layouts_config: 版式配置，指定每种版式的启用状态、数量和数据槽
+        uploaded_images: 上传的图片列表（可选）
+    返回:
+        SlideSpec 列表，顺序即幻灯片顺序
+    """
+    return compile_plan(layouts_config, uploaded_images)
+
+
+def decorate_slide(slide, idx: int, config: dict, logo_bytes: bytes,
+                   slide_width: float, slide_height: float):
+    """
+    为单页幻灯片添加水印、Logo、页脚
+    
+    参数:
+        slide: 幻灯片对象
+        idx: 幻灯片在整份演示文稿中的下标（从0开始）
+        config: 配置字典
+        logo_bytes: Logo图片字节数据（可选）
+        slide_width, slide_height: 幻灯片尺寸
+    """
+    # 添加水印
+    if config.get('watermark_enabled', False):
+        watermark_text = config.get('watermark_text', '内部资料')
+        watermark_opacity = config.get('watermark_opacity', 15)
+        add_watermark(slide, watermark_text, watermark_opacity, slide_width, slide_height)
+    
+    # 添加Logo
+    if logo_bytes:
+        try:
+            add_logo_to_slide(slide, logo_bytes, slide_width, slide_height, "bottom-right")
+        except Exception:
+            pass  # 如果Logo添加失败，静默跳过
+    
+    # 添加页脚（跳过第一页标题页）
+    if idx > 0:
+        add_footer(slide, config, idx + 1, slide_width, slide_height)
+
+
+def build_presentation(config: dict, layouts_config: dict, logo_bytes: bytes = None, uploaded_images: list = None,
+                       budget=None, overflows: list = None) -> io.BytesIO:
     """
     根据配置生成完整的PPT模板
     
@@ -813,107 +1669,36 @@ def build_presentation(config: dict, layouts_config: dict, logo_bytes: bytes = N
         layouts_config: 版式配置，指定每种版式的启用状态和数量
         logo_bytes: Logo图片字节数据（可选）
         uploaded_images: 上传的图片列表（可选）
+        budget: BuildBudget资源预算（可选），超出时抛出 governor.BudgetExceeded
+        overflows: 收集文字溢出提示的列表（可选，text_fit 为 'warn' 或 'shrink' 时有效；
+                   未提供时以 TextOverflowWarning 警告发出）
     
     返回:
         包含PPT文件的BytesIO对象
     """
-    if uploaded_images is None:
-        uploaded_images = []
-    # 创建演示文稿
-    prs = Presentation()
-    
-    # 设置幻灯片尺寸
-    ratio = config.get('ratio', '16:9')
-    ratio_config = SLIDE_RATIOS.get(ratio, SLIDE_RATIOS['16:9'])
-    prs.slide_width = Inches(ratio_config['width'])
-    prs.slide_height = Inches(ratio_config['height'])
-    
-    slide_width = ratio_config['width']
-    slide_height = ratio_config['height']
-    
-    # 根据配置添加各类幻灯片
-    
-    # 标题页
-    if layouts_config.get('title', {}).get('enabled', True):
-        count = layouts_config['title'].get('count', 1)
-        for _ in range(count):
-            add_title_slide(prs, config)
-    
-    # 目录页
-    if layouts_config.get('agenda', {}).get('enabled', True):
-        count = layouts_config['agenda'].get('count', 1)
-        for _ in range(count):
-            add_agenda_slide(prs, config)
-    
-    # 内容页
-    if layouts_config.get('content', {}).get('enabled', True):
-        count = layouts_config['content'].get('count', 2)
-        for i in range(count):
-            add_content_slide(prs, config, page_num=i+1)
-    
-    # 图文页
-    if layouts_config.get('image_text', {}).get('enabled', True):
-        count = layouts_config['image_text'].get('count', 2)
-        for i in range(count):
-            variant = 'left-image' if i % 2 == 0 else 'right-image'
-            # 获取对应的图片
-            image_bytes = None
-            if i < len(uploaded_images):
-                image_bytes = uploaded_images[i].get('bytes')
-            add_image_text_slide(prs, config, layout_variant=variant, image_bytes=image_bytes)
-    
-    # 对比页
-    if layouts_config.get('comparison', {}).get('enabled', True):
-        count = layouts_config['comparison'].get('count', 1)
-        for _ in range(count):
-            add_comparison_slide(prs, config)
-    
-    # 时间轴页
-    if layouts_config.get('timeline', {}).get('enabled', True):
-        count = layouts_config['timeline'].get('count', 1)
-        for _ in range(count):
-            add_timeline_slide(prs, config)
-    
-    # 数据概览页
-    if layouts_config.get('kpi', {}).get('enabled', True):
-        count = layouts_config['kpi'].get('count', 1)
-        for _ in range(count):
-            add_kpi_slide(prs, config)
-    
-    # 引用页
-    if layouts_config.get('quote', {}).get('enabled', True):
-        count = layouts_config['quote'].get('count', 1)
-        for _ in range(count):
-            add_quote_slide(prs, config)
-    
-    # 致谢页
-    if layouts_config.get('thankyou', {}).get('enabled', True):
-        count = layouts_config['thankyou'].get('count', 1)
-        for _ in range(count):
-            add_thankyou_slide(prs, config)
-    
-    # 为所有幻灯片添加水印、Logo、页脚
-    for idx, slide in enumerate(prs.slides):
-        # 添加水印
-        if config.get('watermark_enabled', False):
-            watermark_text = config.get('watermark_text', '内部资料')
-            watermark_opacity = config.get('watermark_opacity', 15)
-            add_watermark(slide, watermark_text, watermark_opacity, slide_width, slide_height)
+    with track_build('serial'):
+        governor = ResourceGovernor(budget)
+        plan = plan_slides(layouts_config, uploaded_images)
+        governor.check_planned(sum(spec.pages for spec in plan))
         
-        # 添加Logo
-        if logo_bytes:
-            try:
-                add_logo_to_slide(slide, logo_bytes, slide_width, slide_height, "bottom-right")
-            except Exception:
-                pass  # 如果Logo添加失败，静默跳过
+        # 创建演示文稿
+        prs = new_presentation(config)
         
-        # 添加页脚（跳过第一页标题页）
-        if idx > 0:
-            add_footer(slide, config, idx + 1, slide_width, slide_height)
-    
-    # 保存到内存
-    ppt_buffer = io.BytesIO()
-    prs.save(ppt_buffer)
-    ppt_buffer.seek(0)
+        slide_width, slide_height = get_slide_size(config)
+        
+        with text_fit(config.get('text_fit', 'none'), overflows):
+            # 先编译幻灯片计划，再按计划添加各类幻灯片（每项计划之后检查预算）
+            execute_plan(prs, config, plan, governor)
+            
+            # 为所有幻灯片添加水印、Logo、页脚
+            for idx, slide in enumerate(prs.slides):
+                decorate_slide(slide, idx, config, logo_bytes, slide_width, slide_height)
+                governor.check(stage='decorate')
+        
+        # 保存到内存
+        ppt_buffer = save_presentation(prs, config)
+        governor.check_output(len(ppt_buffer.getvalue()))
     
+    BUILD_SLIDES.observe(len(prs.slides))
+    OUTPUT_BYTES.observe(len(ppt_buffer.getvalue()), kind='presentation')
     return ppt_buffer
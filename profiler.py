@@ -0,0 +1,444 @@
+# -*- coding: utf-8 -*-
+"""
+生成性能分析模块
+对单次PPT生成进行性能分析：cProfile 确定性分析或采样分析，
+输出火焰图工具可读的折叠调用栈、耗时排名前N的函数表，以及 tracemalloc 内存分配热点
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import pstats
+import marshal
+import cProfile
+import zipfile
+import argparse
+import threading
+import tracemalloc
+from collections import Counter
+
+from governor import checkpoint_hook
+from ppt_generator import build_presentation
+
+
+# 分析方式
+PROFILE_MODES = {
+    'cprofile': '确定性分析（cProfile）',
+    'sampling': '采样分析',
+}
+
+# 默认采样间隔（秒）与排名行数
+DEFAULT_SAMPLE_INTERVAL = 0.002
+DEFAULT_TOP_N = 30
+
+# tracemalloc 保留的调用栈深度
+TRACEMALLOC_FRAMES = 1
+
+# 已跟踪内存比上次快照增长超过此比例时，在检查点重新拍摄峰值快照
+PEAK_SNAPSHOT_GROWTH = 1.1
+
+# 由 cProfile 调用关系展开折叠栈时的最大深度，以及可忽略的耗时（秒）
+MAX_STACK_DEPTH = 64
+MIN_STACK_SECONDS = 1e-5
+
+
+class ProfileReport:
+    """单次生成的性能分析结果"""
+
+    __slots__ = ('mode', 'seconds', 'collapsed', 'top', 'allocations', 'stats', 'ppt_buffer',
+                 'peak_memory')
+
+    def __init__(self, mode: str, seconds: float, collapsed: dict, top: list,
+                 allocations: list, stats: bytes, ppt_buffer, peak_memory: int = 0):
+        """
+        参数:
+            mode: 分析方式
+            seconds: 生成耗时（秒）
+            collapsed: 折叠调用栈 {"帧;帧;帧": 权重}
+            top: 函数排名 [(函数, 调用次数, 自身耗时, 累计耗时)]，采样分析的调用次数为 None
+            allocations: 内存峰值时相对生成开始新增的分配热点 [(代码位置, 字节数, 分配次数)]
+            stats: cProfile 原始统计数据（pstats 格式），采样分析时为 None
+            ppt_buffer: 生成的PPT文件
+            peak_memory: 检查点观测到的已跟踪内存峰值（相对生成开始，字节）
+        """
+        self.mode = mode
+        self.seconds = seconds
+        self.collapsed = collapsed
+        self.top = top
+        self.allocations = allocations
+        self.stats = stats
+        self.ppt_buffer = ppt_buffer
+        self.peak_memory = peak_memory
+
+    def collapsed_text(self) -> str:
+        """
+        折叠调用栈文本，每行 "帧;帧;帧 权重"，可直接交给 flamegraph.pl、speedscope 等工具
+
+        cProfile 的权重为微秒，采样分析的权重为采样次数。
+        """
+        return ''.join(f"{stack} {weight}\n" for stack, weight in
+                       sorted(self.collapsed.items()) if weight > 0)
+
+    def top_text(self) -> str:
+        """耗时排名表文本"""
+        lines = [f"分析方式: {PROFILE_MODES[self.mode]}    总耗时: {self.seconds:.3f} 秒", '',
+                 f"{'调用次数':>10} {'自身耗时(秒)':>12} {'累计耗时(秒)':>12}  函数"]
+        for function, calls, self_seconds, total_seconds in self.top:
+            calls = '-' if calls is None else str(calls)
+            lines.append(f"{calls:>14} {self_seconds:>16.4f} {total_seconds:>16.4f}  {function}")
+        return '\n'.join(lines) + '\n'
+
+    def allocations_text(self) -> str:
+        """内存分配热点文本"""
+        if not self.allocations:
+            return "未跟踪内存分配\n"
+        lines = [f"内存峰值: {self.peak_memory / 1024:.1f} KB（相对生成开始）", '',
+                 f"{'大小(KB)':>10} {'次数':>8}  代码位置"]
+        for location, size, count in self.allocations:
+            lines.append(f"{size / 1024:>12.1f} {count:>10}  {location}")
+        return '\n'.join(lines) + '\n'
+
+    def files(self) -> dict:
+        """
+        分析结果文件
+
+        返回:
+            {文件名: 字节数据}
+        """
+        files = {
+            'profile.collapsed': self.collapsed_text().encode('utf-8'),
+            'profile_top.txt': self.top_text().encode('utf-8'),
+            'allocations.txt': self.allocations_text().encode('utf-8'),
+        }
+        if self.stats is not None:
+            files['profile.prof'] = self.stats
+        return files
+
+    def zip_bytes(self) -> bytes:
+        """将全部分析结果文件打包为zip，供页面下载"""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as package:
+            for name, data in self.files().items():
+                package.writestr(name, data)
+        return buffer.getvalue()
+
+    def write(self, output_dir: str) -> list:
+        """
+        将分析结果文件写入目录
+
+        参数:
+            output_dir: 输出目录
+        返回:
+            写入的文件路径列表
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        paths = []
+        for name, data in self.files().items():
+            path = os.path.join(output_dir, name)
+            with open(path, 'wb') as f:
+                f.write(data)
+            paths.append(path)
+        return paths
+
+
+def _frame_label(filename: str, name: str) -> str:
+    """
+    生成折叠栈中的帧名：文件名:函数名
+
+    参数:
+        filename: 源文件路径（内置函数为 '~'）
+        name: 函数名
+    返回:
+        帧名（去掉会破坏折叠格式的分号）
+    """
+    if filename == '~':
+        label = name
+    else:
+        label = f"{os.path.basename(filename)}:{name}"
+    return label.replace(';', ',')
+
+
+def _collapse_cprofile(stats: pstats.Stats) -> dict:
+    """
+    由 cProfile 的调用关系展开折叠调用栈
+
+    cProfile 只记录调用者与被调用者的关系，函数的自身耗时按各调用者贡献的
+    累计耗时比例向上分摊，得到近似的完整调用栈。
+
+    参数:
+        stats: pstats.Stats 对象
+    返回:
+        折叠调用栈 {"帧;帧;帧": 微秒}
+    """
+    entries = stats.stats
+    collapsed = Counter()
+
+    def walk(func, seconds, path):
+        callers = entries[func][4]
+        shares = [(caller, timing[3]) for caller, timing in callers.items()
+                  if caller in entries and caller not in path]
+        total = sum(share for _, share in shares)
+        if not shares or total <= 0 or len(path) >= MAX_STACK_DEPTH:
+            shares = []
+        rest = seconds
+        for caller, share in shares:
+            portion = seconds * share / total
+            if portion >= MIN_STACK_SECONDS:
+                walk(caller, portion, path + (caller,))
+                rest -= portion
+        # 无法继续分摊的耗时（根函数、过小的分支）记在当前调用栈上，保证总量不丢失
+        if rest >= MIN_STACK_SECONDS / 2:
+            collapsed[';'.join(_frame_label(f[0], f[2]) for f in reversed(path))] += round(rest * 1e6)
+
+    for func, (_, _, tottime, _, _) in entries.items():
+        if tottime >= MIN_STACK_SECONDS:
+            walk(func, tottime, (func,))
+    return dict(collapsed)
+
+
+def _profile_cprofile(build, top_n: int) -> tuple:
+    """
+    在 cProfile 下执行一次生成
+
+    参数:
+        build: 无参数的生成函数
+        top_n: 排名行数
+    返回:
+        (生成结果, 生成耗时, 折叠调用栈, 函数排名, 原始统计数据)
+    """
+    profile = cProfile.Profile()
+    start = time.perf_counter()
+    result = profile.runcall(build)
+    elapsed = time.perf_counter() - start
+    stats = pstats.Stats(profile)
+
+    ranked = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)
+    top = [(_frame_label(func[0], func[2]), calls, tottime, cumtime)
+           for func, (_, calls, tottime, cumtime, _) in ranked[:top_n]]
+
+    # 与 pstats.Stats.dump_stats 写出的 .prof 文件格式相同
+    return result, elapsed, _collapse_cprofile(stats), top, marshal.dumps(stats.stats)
+
+
+def _profile_sampling(build, top_n: int, interval: float) -> tuple:
+    """
+    在采样分析下执行一次生成：后台线程定时读取生成线程的调用栈
+
+    参数:
+        build: 无参数的生成函数
+        top_n: 排名行数
+        interval: 采样间隔（秒）
+    返回:
+        (生成结果, 生成耗时, 折叠调用栈, 函数排名, None)
+    """
+    target = threading.get_ident()
+    root = build.__code__
+    stacks = Counter()
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(interval):
+            frame = sys._current_frames().get(target)
+            labels = []
+            # 只保留生成函数及其以下的帧，去掉分析器自身的调用栈
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code.co_filename, frame.f_code.co_name))
+                if frame.f_code is root:
+                    break
+                frame = frame.f_back
+            else:
+                labels = []
+            if labels:
+                stacks[';'.join(reversed(labels))] += 1
+
+    sampler = threading.Thread(target=sample, name='profile-sampler', daemon=True)
+    start = time.perf_counter()
+    sampler.start()
+    try:
+        result = build()
+    finally:
+        done.set()
+        sampler.join()
+    elapsed = time.perf_counter() - start
+
+    # 按采样次数折算耗时：栈顶帧计入自身耗时，栈中出现过的帧计入累计耗时
+    self_samples = Counter()
+    total_samples = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        self_samples[frames[-1]] += count
+        for label in set(frames):
+            total_samples[label] += count
+    per_sample = elapsed / max(1, sum(stacks.values()))
+    top = [(label, None, count * per_sample, total_samples[label] * per_sample)
+           for label, count in self_samples.most_common(top_n)]
+    return result, elapsed, dict(stacks), top, None
+
+
+# 多个分析可能同时进行（页面多个会话），共用同一个 tracemalloc：
+# 第一个使用者开始跟踪，最后一个使用者停止；分析前已在跟踪时不停止
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_owned = False
+
+
+def _start_tracing():
+    """登记一个 tracemalloc 使用者，必要时开始跟踪"""
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        if _tracing_users == 0:
+            _tracing_owned = not tracemalloc.is_tracing()
+            if _tracing_owned:
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+        _tracing_users += 1
+
+
+def _stop_tracing():
+    """注销一个 tracemalloc 使用者，最后一个注销时停止跟踪"""
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_owned:
+            tracemalloc.stop()
+
+
+def _take_snapshot():
+    """拍摄内存快照，去掉分析器自身（cProfile、tracemalloc 与本模块）的分配"""
+    return tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, module.__file__)
+        for module in (cProfile, pstats, tracemalloc, sys.modules[__name__])
+    ])
+
+
+class _PeakTracker:
+    """
+    内存峰值跟踪：生成开始时拍摄基准快照，之后在每个生成检查点读取已跟踪内存，
+    创新高且增长足够多时重新拍摄快照，最终报告峰值快照相对基准的新增分配
+
+    生成结束后大部分中间对象已释放，结束时的快照看不到峰值时的分配热点。
+    已跟踪内存是整个进程的，同时进行的其他生成也会计入。
+    """
+
+    __slots__ = ('baseline', 'base_size', 'peak', 'snapshot', 'snapshot_size')
+
+    def __init__(self):
+        self.baseline = _take_snapshot()
+        self.base_size = tracemalloc.get_traced_memory()[0]
+        self.peak = 0
+        self.snapshot = None
+        self.snapshot_size = 0
+
+    def __call__(self):
+        """检查点回调"""
+        current = tracemalloc.get_traced_memory()[0] - self.base_size
+        if current <= self.peak:
+            return
+        self.peak = current
+        if self.snapshot is None or current > self.snapshot_size * PEAK_SNAPSHOT_GROWTH:
+            self.snapshot = _take_snapshot()
+            self.snapshot_size = current
+
+    def allocations(self, top_n: int) -> list:
+        """
+        峰值快照相对基准快照新增的分配热点
+
+        参数:
+            top_n: 行数
+        返回:
+            [(代码位置, 字节数, 分配次数)]
+        """
+        self()
+        if self.snapshot is None:
+            return []
+        allocations = []
+        for stat in self.snapshot.compare_to(self.baseline, 'lineno')[:top_n]:
+            if stat.size_diff <= 0:
+                break
+            frame = stat.traceback[0]
+            allocations.append((f"{frame.filename}:{frame.lineno}", stat.size_diff, stat.count_diff))
+        return allocations
+
+
+def profile_build(config: dict, layouts_config: dict, logo_bytes: bytes = None,
+                  uploaded_images: list = None, mode: str = 'cprofile',
+                  top_n: int = DEFAULT_TOP_N, trace_memory: bool = True,
+                  interval: float = DEFAULT_SAMPLE_INTERVAL, overflows: list = None) -> ProfileReport:
+    """
+    对一次 build_presentation 进行性能分析
+
+    参数:
+        config: 主题配置字典
+        layouts_config: 版式配置字典
+        logo_bytes: Logo图片字节数据（可选）
+        uploaded_images: 上传的图片列表（可选）
+        mode: 分析方式，'cprofile' 或 'sampling'
+        top_n: 函数排名与内存热点的行数
+        trace_memory: 是否同时用 tracemalloc 跟踪内存分配（会明显拖慢生成）
+        interval: 采样间隔（秒，仅采样分析）
+        overflows: 收集文字溢出提示的列表（可选，见 build_presentation）
+    返回:
+        ProfileReport 对象
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"未知的分析方式: {mode}")
+
+    def build():
+        return build_presentation(config, layouts_config, logo_bytes, uploaded_images, overflows=overflows)
+
+    def run():
+        if mode == 'cprofile':
+            return _profile_cprofile(build, top_n)
+        return _profile_sampling(build, top_n, interval)
+
+    if not trace_memory:
+        ppt_buffer, seconds, collapsed, top, stats = run()
+        return ProfileReport(mode, seconds, collapsed, top, [], stats, ppt_buffer)
+
+    _start_tracing()
+    try:
+        tracker = _PeakTracker()
+        # 生成在当前线程执行（采样分析的采样器在后台线程），检查点回调随之生效
+        with checkpoint_hook(tracker):
+            ppt_buffer, seconds, collapsed, top, stats = run()
+        allocations = tracker.allocations(top_n)
+    finally:
+        _stop_tracing()
+
+    return ProfileReport(mode, seconds, collapsed, top, allocations, stats, ppt_buffer, tracker.peak)
+
+
+def main():
+    """命令行入口：python profiler.py config.json -o profile_out/"""
+    parser = argparse.ArgumentParser(description="对一次PPT生成进行性能分析")
+    parser.add_argument('config', help="导出的配置JSON")
+    parser.add_argument('-o', '--output-dir', default='profile_out', help="分析结果输出目录")
+    parser.add_argument('--mode', choices=list(PROFILE_MODES), default='cprofile', help="分析方式")
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP_N, help="排名行数")
+    parser.add_argument('--interval', type=float, default=DEFAULT_SAMPLE_INTERVAL, help="采样间隔（秒）")
+    parser.add_argument('--no-memory', action='store_true', help="不跟踪内存分配")
+    parser.add_argument('--logo', help="Logo图片")
+    parser.add_argument('--images', nargs='*', default=[], help="图文页图片")
+    args = parser.parse_args()
+
+    with open(args.config, encoding='utf-8') as f:
+        config = json.load(f)
+    logo_bytes = None
+    if args.logo:
+        with open(args.logo, 'rb') as f:
+            logo_bytes = f.read()
+    uploaded_images = []
+    for path in args.images:
+        with open(path, 'rb') as f:
+            uploaded_images.append({'name': os.path.basename(path), 'bytes': f.read()})
+
+    report = profile_build(config, config.get('layouts', {}), logo_bytes, uploaded_images,
+                           args.mode, args.top, not args.no_memory, args.interval)
+    paths = report.write(args.output_dir)
+    print(report.top_text())
+    print(f"分析结果已写入: {', '.join(paths)}")
+
+
+if __name__ == "__main__":
+    main()
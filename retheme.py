@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+"""
+批量换肤模块
+将已生成的PPT从一套主题配色与字体直接改写为另一套：
+只替换幻灯片、版式、母版、主题与图表XML中的颜色和字体属性，其余条目原样复制，
+不经过python-pptx重建，保留手工修改的内容
+"""
+
+import io
+import os
+import re
+import time
+import zipfile
+import argparse
+from xml.sax.saxutils import escape
+from concurrent.futures import ProcessPoolExecutor
+
+from config_presets import THEME_PRESETS
+from package_io import ZipStreamWriter
+
+
+# 参与换肤的颜色与字体配置项，靠前的优先（多个旧值相同时以靠前的映射为准）
+COLOR_KEYS = ('primary', 'secondary', 'accent')
+FONT_KEYS = ('body_font', 'title_font')
+
+# 背景色只在幻灯片背景中替换，避免误改与背景同色的白色文字等固定颜色
+BACKGROUND_KEY = 'background'
+
+# 需要改写的部件
+RETHEME_PART_PATTERN = re.compile(
+    r'^ppt/(slides|slideLayouts|slideMasters|theme|charts|notesSlides)/[^/]+\.xml$'
+)
+
+SRGB_PATTERN = re.compile(rb'(<a:srgbClr val=")([0-9A-Fa-f]{6})(")')
+BACKGROUND_PATTERN = re.compile(rb'<p:bg>.*?</p:bg>', re.S)
+TYPEFACE_PATTERN = re.compile(rb'(<a:(?:latin|ea|cs) typeface=")([^"]*)(")')
+
+# 改写后的部件压缩级别
+RETHEME_COMPRESS_LEVEL = 6
+
+
+def resolve_theme(theme) -> dict:
+    """
+    获取主题配置
+
+    参数:
+        theme: THEME_PRESETS 中的主题名称，或含颜色与字体的配置字典
+    返回:
+        主题配置字典
+    """
+    if isinstance(theme, str):
+        if theme not in THEME_PRESETS:
+            raise KeyError(f"未知的主题: {theme}")
+        return THEME_PRESETS[theme]
+    return theme
+
+
+def build_mapping(old_theme, new_theme) -> tuple:
+    """
+    根据新旧主题生成颜色与字体的替换表
+
+    参数:
+        old_theme: 旧主题（名称或配置字典）
+        new_theme: 新主题（名称或配置字典）
+    返回:
+        (颜色替换表, 背景色替换表, 字体替换表)，键和值均为可直接写入XML属性的字节串
+    """
+    old_theme = resolve_theme(old_theme)
+    new_theme = resolve_theme(new_theme)
+
+    def color(theme, key):
+        return theme[key].lstrip('#').upper().encode('ascii')
+
+    color_map = {}
+    for key in COLOR_KEYS:
+        if key in old_theme and key in new_theme:
+            color_map.setdefault(color(old_theme, key), color(new_theme, key))
+
+    background_map = {}
+    if BACKGROUND_KEY in old_theme and BACKGROUND_KEY in new_theme:
+        background_map[color(old_theme, BACKGROUND_KEY)] = color(new_theme, BACKGROUND_KEY)
+
+    font_map = {}
+    for key in FONT_KEYS:
+        if key in old_theme and key in new_theme:
+            old = escape(old_theme[key], {'"': '&quot;'}).encode('utf-8')
+            new = escape(new_theme[key], {'"': '&quot;'}).encode('utf-8')
+            font_map.setdefault(old, new)
+
+    # 去掉不需要改变的映射
+    color_map = {old: new for old, new in color_map.items() if old != new}
+    background_map = {old: new for old, new in background_map.items() if old != new}
+    font_map = {old: new for old, new in font_map.items() if old != new}
+    return color_map, background_map, font_map
+
+
+def _replace_colors(xml: bytes, color_map: dict) -> bytes:
+    """
+    按替换表改写 <a:srgbClr> 颜色值
+
+    参数:
+        xml: XML字节
+        color_map: 颜色替换表
+    返回:
+        改写后的XML字节
+    """
+    return SRGB_PATTERN.sub(
+        lambda m: m.group(1) + color_map.get(m.group(2).upper(), m.group(2)) + m.group(3),
+        xml
+    )
+
+
+def retheme_xml(xml: bytes, color_map: dict, background_map: dict, font_map: dict) -> bytes:
+    """
+    改写XML中的颜色与字体属性
+
+    背景与其余内容分开处理，同一颜色值在背景与形状中可映射到不同的新颜色。
+
+    参数:
+        xml: 部件XML字节
+        color_map: 颜色替换表
+        background_map: 背景色替换表
+        font_map: 字体替换表
+    返回:
+        改写后的XML字节
+    """
+    if color_map or background_map:
+        pieces = []
+        pos = 0
+        for bg in BACKGROUND_PATTERN.finditer(xml):
+            pieces.append(_replace_colors(xml[pos:bg.start()], color_map))
+            pieces.append(_replace_colors(bg.group(0), background_map))
+            pos = bg.end()
+        pieces.append(_replace_colors(xml[pos:], color_map))
+        xml = b''.join(pieces)
+    if font_map:
+        xml = TYPEFACE_PATTERN.sub(
+            lambda m: m.group(1) + font_map.get(m.group(2), m.group(2)) + m.group(3),
+            xml
+        )
+    return xml
+
+
+def is_lossless(old_theme, new_theme, fixed_colors=(), fixed_fonts=()) -> bool:
+    """
+    判断换肤结果是否与直接用新主题生成的一致
+
+    旧主题中取值相同的配置项（如标题与正文同一字体）在替换时无法区分，
+    若新主题中它们的取值不同，换肤结果就会与直接生成的不同；
+    旧主题的颜色或字体与版式中写死的颜色、字体相同时，后者也会被误改。
+
+    参数:
+        old_theme: 旧主题（名称或配置字典）
+        new_theme: 新主题（名称或配置字典）
+        fixed_colors: 版式中写死的颜色（6位十六进制，可选）
+        fixed_fonts: 版式中写死的字体（可选）
+    返回:
+        是否一致
+    """
+    old_theme = resolve_theme(old_theme)
+    new_theme = resolve_theme(new_theme)
+
+    def normalize(theme, key):
+        value = str(theme.get(key, ''))
+        return value.lstrip('#').upper() if key in COLOR_KEYS else value
+
+    fixed = {color.lstrip('#').upper() for color in fixed_colors} | set(fixed_fonts)
+    for keys in (COLOR_KEYS, FONT_KEYS):
+        targets = {}
+        for key in keys:
+            old, new = normalize(old_theme, key), normalize(new_theme, key)
+            if old != new and old in fixed:
+                return False
+            if targets.setdefault(old, new) != new:
+                return False
+    return True
+
+
+def _retheme_stream(src_fp, dst_fp, mapping: tuple) -> int:
+    """
+    逐条目流式改写一个PPT文件包
+
+    参数:
+        src_fp: 源文件对象（可随机读取）
+        dst_fp: 输出文件对象
+        mapping: build_mapping 返回的替换表
+    返回:
+        改写的部件数
+    """
+    changed = 0
+    with zipfile.ZipFile(src_fp) as package, ZipStreamWriter(dst_fp) as writer:
+        for info in package.infolist():
+            if RETHEME_PART_PATTERN.match(info.filename):
+                xml = package.read(info)
+                new_xml = retheme_xml(xml, *mapping)
+                if new_xml != xml:
+                    writer.write(info.filename, new_xml, RETHEME_COMPRESS_LEVEL)
+                    changed += 1
+                    continue
+            writer.copy_raw(src_fp, info)
+    return changed
+
+
+def retheme_bytes(data: bytes, mapping: tuple) -> bytes:
+    """
+    对内存中的PPT文件换肤
+
+    参数:
+        data: PPT文件字节数据
+        mapping: build_mapping 返回的替换表
+    返回:
+        换肤后的PPT文件字节数据
+    """
+    dst_fp = io.BytesIO()
+    _retheme_stream(io.BytesIO(data), dst_fp, mapping)
+    return dst_fp.getvalue()
+
+
+def retheme_file(src_path: str, dst_path: str, mapping: tuple) -> int:
+    """
+    对单个PPT文件换肤，逐条目流式读写
+
+    未改变的条目直接复制压缩数据；dst_path 与 src_path 相同时先写临时文件再替换。
+
+    参数:
+        src_path: 源文件路径
+        dst_path: 输出文件路径
+        mapping: build_mapping 返回的替换表
+    返回:
+        改写的部件数
+    """
+    tmp_path = f"{dst_path}.{os.getpid()}.tmp"
+    try:
+        with open(src_path, 'rb') as src_fp, open(tmp_path, 'wb') as dst_fp:
+            changed = _retheme_stream(src_fp, dst_fp, mapping)
+        os.replace(tmp_path, dst_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return changed
+
+
+# 子进程内缓存的替换表，由进程池初始化函数写入
+_worker_state = {}
+
+
+def _init_worker(mapping: tuple):
+    """
+    子进程初始化：每个进程只接收一次替换表
+
+    参数:
+        mapping: build_mapping 返回的替换表
+    """
+    _worker_state['mapping'] = mapping
+
+
+def _retheme_task(task: tuple) -> tuple:
+    """
+    子进程任务：换肤一个文件
+
+    参数:
+        task: (源文件路径, 输出文件路径)
+    返回:
+        (源文件路径, 改写的部件数, 错误信息)
+    """
+    src_path, dst_path = task
+    try:
+        changed = retheme_file(src_path, dst_path, _worker_state['mapping'])
+        return src_path, changed, None
+    except Exception as e:
+        return src_path, 0, str(e)
+
+
+def _output_paths(paths: list, output_dir: str) -> list:
+    """
+    输出路径：保留相对于所有输入文件公共目录的子目录结构，不同子目录中的同名文件不会互相覆盖
+
+    参数:
+        paths: PPT文件路径列表
+        output_dir: 输出目录
+    返回:
+        与 paths 对应的输出路径列表
+    """
+    sources = [os.path.abspath(path) for path in paths]
+    root = os.path.commonpath([os.path.dirname(path) for path in sources]) if sources else ''
+    targets = [os.path.join(output_dir, os.path.relpath(path, root)) for path in sources]
+    seen = set()
+    for path, target in zip(paths, targets):
+        if target in seen:
+            raise ValueError(f"输出文件重复（同一文件被指定多次？）: {path}")
+        seen.add(target)
+    return targets
+
+
+def retheme_files(paths: list, old_theme, new_theme, output_dir: str = None,
+                  workers: int = None) -> dict:
+    """
+    批量换肤
+
+    参数:
+        paths: PPT文件路径列表
+        old_theme: 旧主题（名称或配置字典）
+        new_theme: 新主题（名称或配置字典）
+        output_dir: 输出目录（可选，默认原地改写；保留输入文件的子目录结构）
+        workers: 子进程数量（可选，默认为CPU核数）
+    返回:
+        统计信息字典：files, changed_parts, failed, seconds, files_per_second
+    """
+    mapping = build_mapping(old_theme, new_theme)
+    workers = workers or os.cpu_count() or 1
+
+    if output_dir:
+        # 先检查输出路径是否冲突，再创建目录与写入
+        targets = _output_paths(paths, output_dir)
+        for directory in sorted({os.path.dirname(target) for target in targets}):
+            os.makedirs(directory, exist_ok=True)
+    else:
+        targets = list(paths)
+    tasks = list(zip(paths, targets))
+
+    start = time.perf_counter()
+    if workers <= 1:
+        _init_worker(mapping)
+        results = [_retheme_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(mapping,)) as executor:
+            results = list(executor.map(_retheme_task, tasks, chunksize=max(1, len(tasks) // (workers * 8))))
+    seconds = time.perf_counter() - start
+
+    return {
+        'files': len(tasks),
+        'changed_parts': sum(changed for _, changed, _ in results),
+        'failed': [(path, error) for path, _, error in results if error],
+        'seconds': seconds,
+        'files_per_second': len(tasks) / seconds if seconds > 0 else 0.0,
+    }
+
+
+def _collect_paths(inputs: list) -> list:
+    """
+    展开命令行输入：目录下的所有 .pptx 文件与单个文件
+
+    参数:
+        inputs: 文件或目录路径列表
+    返回:
+        PPT文件路径列表
+    """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.extend(os.path.join(root, name) for name in sorted(files) if name.endswith('.pptx'))
+        else:
+            paths.append(item)
+    return paths
+
+
+def main():
+    """命令行入口：python retheme.py --from 商务简约 --to 科技风格 decks/ -o out/"""
+    parser = argparse.ArgumentParser(description="将已生成的PPT批量换为另一套主题配色与字体")
+    parser.add_argument('inputs', nargs='+', help="PPT文件或目录")
+    parser.add_argument('--from', dest='old_theme', required=True, choices=list(THEME_PRESETS), help="原主题")
+    parser.add_argument('--to', dest='new_theme', required=True, choices=list(THEME_PRESETS), help="新主题")
+    parser.add_argument('-o', '--output-dir', help="输出目录（默认原地改写）")
+    parser.add_argument('--workers', type=int, default=None, help="子进程数量")
+    args = parser.parse_args()
+
+    stats = retheme_files(_collect_paths(args.inputs), args.old_theme, args.new_theme,
+                          args.output_dir, args.workers)
+    print(f"已处理 {stats['files']} 个文件，改写 {stats['changed_parts']} 个部件，"
+          f"耗时 {stats['seconds']:.2f} 秒（{stats['files_per_second']:.1f} 个/秒）")
+    for path, error in stats['failed']:
+        print(f"失败: {path}: {error}")
+
+
+if __name__ == "__main__":
+    main()
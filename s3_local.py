@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+S3 兼容的本地替身服务
+在本机目录上实现产物存储用到的 S3 接口子集：对象的 PUT / GET / HEAD / DELETE、分段上传
+（创建、上传分段、合并、中止），校验 AWS 签名 V4（请求头签名与预签名链接）。
+用于没有网络或没有对象存储时测试 artifact_store 的 S3 后端，不用于生产
+"""
+
+import os
+import time
+import uuid
+import calendar
+import shutil
+import asyncio
+import hashlib
+import argparse
+import threading
+from urllib.parse import unquote, urlsplit, parse_qsl
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from artifact_store import MIN_PART_BYTES, UNSIGNED_PAYLOAD, sign_v4
+
+
+DEFAULT_PORT = 9000
+DEFAULT_ACCESS_KEY = 'local'
+DEFAULT_SECRET_KEY = 'local-secret'
+
+# 签名时间与服务端时间允许的偏差（秒）
+MAX_CLOCK_SKEW = 15 * 60
+# 分段上传的临时目录名（位于根目录下，不会与存储桶重名）
+UPLOADS_DIR = '.uploads'
+
+REASONS = {200: 'OK', 204: 'No Content', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+           405: 'Method Not Allowed', 411: 'Length Required'}
+
+
+class _S3Error(Exception):
+    """以 S3 错误响应返回给客户端的错误"""
+
+    def __init__(self, status: int, code: str, message: str = ''):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+def _error_body(code: str, message: str) -> bytes:
+    return (f'<?xml version="1.0" encoding="UTF-8"?>\n<Error><Code>{code}</Code>'
+            f'<Message>{escape(message)}</Message></Error>').encode('utf-8')
+
+
+def _etag(digest: str) -> str:
+    return f'"{digest}"'
+
+
+def _parse_amz_date(amz_date: str) -> float:
+    """签名时间（YYYYMMDDTHHMMSSZ，UTC）转为时间戳"""
+    try:
+        return calendar.timegm(time.strptime(amz_date, '%Y%m%dT%H%M%SZ'))
+    except ValueError:
+        raise _S3Error(403, 'AccessDenied', "签名时间格式错误") from None
+
+
+class LocalS3Server:
+    """本地 S3 替身服务：start() 在后台线程运行，或在已有事件循环中 await serve()"""
+
+    def __init__(self, root: str, access_key: str = DEFAULT_ACCESS_KEY, secret_key: str = DEFAULT_SECRET_KEY,
+                 region: str = 'us-east-1', host: str = '127.0.0.1', port: int = 0):
+        """
+        参数:
+            root: 数据目录（每个存储桶一个子目录，不存在时自动创建）
+            access_key: 接受的访问密钥ID
+            secret_key: 访问密钥
+            region: 区域
+            host: 监听地址
+            port: 端口（0 表示自动分配）
+        """
+        self.root = root
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.host = host
+        self.port = port
+        # 接受的连接数与处理的请求数（用于观察客户端的连接复用）
+        self.stats = {'connections': 0, 'requests': 0}
+        self._server = None
+        self._loop = None
+
+    @property
+    def endpoint(self) -> str:
+        """服务地址，如 http://127.0.0.1:9000"""
+        return f"http://{self.host}:{self.port}"
+
+    async def serve(self, ready: threading.Event = None):
+        """在当前事件循环中运行服务直到被取消"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._loop = asyncio.get_running_loop()
+        if ready is not None:
+            ready.set()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start(self) -> 'LocalS3Server':
+        """
+        在后台线程启动服务
+
+        返回:
+            服务对象本身（endpoint 为实际地址）
+        """
+        ready = threading.Event()
+        threading.Thread(target=lambda: asyncio.run(self._serve_until_stopped(ready)),
+                         name='s3-local', daemon=True).start()
+        ready.wait()
+        return self
+
+    async def _serve_until_stopped(self, ready: threading.Event):
+        try:
+            await self.serve(ready)
+        except asyncio.CancelledError:
+            pass
+
+    def stop(self):
+        """停止后台线程中的服务"""
+        if self._server is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+            for task in asyncio.all_tasks(self._loop):
+                self._loop.call_soon_threadsafe(task.cancel)
+
+    # ---------- 连接与请求解析 ----------
+
+    async def _handle_connection(self, reader, writer):
+        self.stats['connections'] += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                if 'chunked' in headers.get('transfer-encoding', '').lower():
+                    status, response_headers, body = 411, {}, _error_body('MissingContentLength', '')
+                    keep_alive = False
+                else:
+                    payload = await reader.readexactly(int(headers.get('content-length', 0) or 0))
+                    self.stats['requests'] += 1
+                    status, response_headers, body = await self._dispatch(method, target, headers, payload)
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+
+                head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+                response_headers.setdefault('Content-Length', str(len(body)))
+                response_headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+                head += [f"{name}: {value}" for name, value in response_headers.items()]
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+                if method != 'HEAD' and body:
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, target: str, headers: dict, payload: bytes) -> tuple:
+        parts = urlsplit(target)
+        path = unquote(parts.path)
+        params = parse_qsl(parts.query, keep_blank_values=True)
+        try:
+            self._authenticate(method, path, params, headers, payload)
+            bucket, _, key = path.lstrip('/').partition('/')
+            if not bucket or not key or bucket == UPLOADS_DIR or '..' in key.split('/'):
+                raise _S3Error(400, 'InvalidRequest', "只支持对象级请求")
+            return await self._route(method, bucket, key, dict(params), payload)
+        except _S3Error as e:
+            body = _error_body(e.code, e.message)
+            return e.status, {'Content-Type': 'application/xml'}, body
+
+    # ---------- 签名校验 ----------
+
+    def _authenticate(self, method: str, path: str, params: list, headers: dict, payload: bytes):
+        query = dict(params)
+        if 'X-Amz-Signature' in query:
+            self._check_presigned(method, path, params, headers, query)
+            return
+
+        authorization = headers.get('authorization', '')
+        if not authorization.startswith('AWS4-HMAC-SHA256 '):
+            raise _S3Error(403, 'AccessDenied', "缺少签名")
+        fields = dict(item.strip().split('=', 1) for item in authorization[len('AWS4-HMAC-SHA256 '):].split(','))
+        access_key, _, scope = fields.get('Credential', '').partition('/')
+        amz_date = headers.get('x-amz-date', '')
+        payload_hash = headers.get('x-amz-content-sha256', '')
+        self._check_credential(access_key, scope, amz_date)
+        if payload_hash != UNSIGNED_PAYLOAD and payload_hash != hashlib.sha256(payload).hexdigest():
+            raise _S3Error(400, 'XAmzContentSHA256Mismatch', "请求体摘要不一致")
+        signed = {name: headers.get(name, '') for name in fields.get('SignedHeaders', '').split(';')}
+        signature, _, _ = sign_v4(self.secret_key, self.region, method, path, params, signed,
+                                  payload_hash, amz_date)
+        if signature != fields.get('Signature'):
+            raise _S3Error(403, 'SignatureDoesNotMatch', "签名不一致")
+
+    def _check_presigned(self, method: str, path: str, params: list, headers: dict, query: dict):
+        access_key, _, scope = query.get('X-Amz-Credential', '').partition('/')
+        amz_date = query.get('X-Amz-Date', '')
+        self._check_credential(access_key, scope, amz_date, skew=False)
+        expires = query.get('X-Amz-Expires', '')
+        if not expires.isdigit():
+            raise _S3Error(403, 'AccessDenied', "缺少有效期")
+        if _parse_amz_date(amz_date) + int(expires) < time.time():
+            raise _S3Error(403, 'AccessDenied', "链接已过期")
+        signed = {name: headers.get(name, '') for name in query.get('X-Amz-SignedHeaders', '').split(';')}
+        unsigned_params = [(k, v) for k, v in params if k != 'X-Amz-Signature']
+        signature, _, _ = sign_v4(self.secret_key, self.region, method, path, unsigned_params, signed,
+                                  UNSIGNED_PAYLOAD, amz_date)
+        if signature != query['X-Amz-Signature']:
+            raise _S3Error(403, 'SignatureDoesNotMatch', "签名不一致")
+
+    def _check_credential(self, access_key: str, scope: str, amz_date: str, skew: bool = True):
+        if access_key != self.access_key:
+            raise _S3Error(403, 'InvalidAccessKeyId', "访问密钥ID不存在")
+        if scope != f"{amz_date[:8]}/{self.region}/s3/aws4_request":
+            raise _S3Error(403, 'SignatureDoesNotMatch', "凭证范围不一致")
+        if skew:
+            if abs(time.time() - _parse_amz_date(amz_date)) > MAX_CLOCK_SKEW:
+                raise _S3Error(403, 'RequestTimeTooSkewed', "签名时间与服务端相差过大")
+
+    # ---------- 对象与分段上传 ----------
+
+    def _object_path(self, bucket: str, key: str) -> str:
+        return os.path.join(self.root, bucket, *key.split('/'))
+
+    def _upload_dir(self, upload_id: str) -> str:
+        if not upload_id or not all(c in '0123456789abcdef' for c in upload_id):
+            raise _S3Error(404, 'NoSuchUpload', "分段上传不存在")
+        return os.path.join(self.root, UPLOADS_DIR, upload_id)
+
+    async def _route(self, method: str, bucket: str, key: str, query: dict, payload: bytes) -> tuple:
+        path = self._object_path(bucket, key)
+        if 'uploads' in query and method == 'POST':
+            return await asyncio.to_thread(self._create_upload, bucket, key)
+        if 'uploadId' in query:
+            upload_dir = self._upload_dir(query['uploadId'])
+            if not os.path.isdir(upload_dir):
+                raise _S3Error(404, 'NoSuchUpload', "分段上传不存在")
+            if method == 'PUT' and 'partNumber' in query:
+                return await asyncio.to_thread(self._put_part, upload_dir, query['partNumber'], payload)
+            if method == 'POST':
+                return await asyncio.to_thread(self._complete_upload, upload_dir, path, payload)
+            if method == 'DELETE':
+                await asyncio.to_thread(shutil.rmtree, upload_dir, True)
+                return 204, {}, b''
+            raise _S3Error(405, 'MethodNotAllowed', method)
+
+        if method in ('GET', 'HEAD'):
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read() if method == 'GET' else b''
+                    size = os.fstat(f.fileno()).st_size
+            except (FileNotFoundError, IsADirectoryError):
+                raise _S3Error(404, 'NoSuchKey', "对象不存在") from None
+            headers = {'Content-Type': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+                       'Content-Length': str(size)}
+            if 'response-content-disposition' in query:
+                headers['Content-Disposition'] = query['response-content-disposition']
+            return 200, headers, data
+        if method == 'PUT':
+            digest = await asyncio.to_thread(self._write_object, path, [payload])
+            return 200, {'ETag': _etag(digest)}, b''
+        if method == 'DELETE':
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return 204, {}, b''
+        raise _S3Error(405, 'MethodNotAllowed', method)
+
+    @staticmethod
+    def _write_object(path: str, chunks: list) -> str:
+        """原子写入对象，返回内容的 MD5"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        digest = hashlib.md5()
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                digest.update(chunk)
+                f.write(chunk)
+        os.replace(tmp_path, path)
+        return digest.hexdigest()
+
+    def _create_upload(self, bucket: str, key: str) -> tuple:
+        upload_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self.root, UPLOADS_DIR, upload_id))
+        body = (f'<?xml version="1.0" encoding="UTF-8"?>\n<InitiateMultipartUploadResult>'
+                f'<Bucket>{escape(bucket)}</Bucket><Key>{escape(key)}</Key><UploadId>{upload_id}</UploadId>'
+                f'</InitiateMultipartUploadResult>').encode('utf-8')
+        return 200, {'Content-Type': 'application/xml'}, body
+
+    @staticmethod
+    def _put_part(upload_dir: str, part_number: str, payload: bytes) -> tuple:
+        if not part_number.isdigit() or not 1 <= int(part_number) <= 10000:
+            raise _S3Error(400, 'InvalidArgument', "分段编号应为 1-10000")
+        digest = LocalS3Server._write_object(os.path.join(upload_dir, f"{int(part_number):05d}"), [payload])
+        return 200, {'ETag': _etag(digest)}, b''
+
+    def _complete_upload(self, upload_dir: str, path: str, payload: bytes) -> tuple:
+        try:
+            root = ElementTree.fromstring(payload)
+        except ElementTree.ParseError:
+            raise _S3Error(400, 'MalformedXML', "合并请求格式错误") from None
+        requested = [(int(part.findtext('PartNumber')), part.findtext('ETag'))
+                     for part in root.iter('Part')]
+        if not requested or [number for number, _ in requested] != sorted({n for n, _ in requested}):
+            raise _S3Error(400, 'InvalidPartOrder', "分段编号需递增且不重复")
+
+        chunks, md5s = [], []
+        for index, (number, etag) in enumerate(requested):
+            try:
+                with open(os.path.join(upload_dir, f"{number:05d}"), 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                raise _S3Error(400, 'InvalidPart', f"分段 {number} 不存在") from None
+            digest = hashlib.md5(data)
+            if _etag(digest.hexdigest()) != etag:
+                raise _S3Error(400, 'InvalidPart', f"分段 {number} 的 ETag 不一致")
+            if index < len(requested) - 1 and len(data) < MIN_PART_BYTES:
+                raise _S3Error(400, 'EntityTooSmall', f"分段 {number} 小于 5MB")
+            chunks.append(data)
+            md5s.append(digest.digest())
+        self._write_object(path, chunks)
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        etag = _etag(f"{hashlib.md5(b''.join(md5s)).hexdigest()}-{len(md5s)}")
+        body = (f'<?xml version="1.0" encoding="UTF-8"?>\n<CompleteMultipartUploadResult>'
+                f'<ETag>{escape(etag)}</ETag></CompleteMultipartUploadResult>').encode('utf-8')
+        return 200, {'Content-Type': 'application/xml'}, body
+
+
+def main():
+    """命令行入口：python s3_local.py ./s3data --port 9000"""
+    parser = argparse.ArgumentParser(description="启动 S3 兼容的本地替身服务（仅用于测试）")
+    parser.add_argument('root', help="数据目录")
+    parser.add_argument('--host', default='127.0.0.1', help="监听地址")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="端口")
+    parser.add_argument('--access-key', default=DEFAULT_ACCESS_KEY, help="访问密钥ID")
+    parser.add_argument('--secret-key', default=DEFAULT_SECRET_KEY, help="访问密钥")
+    parser.add_argument('--region', default='us-east-1', help="区域")
+    args = parser.parse_args()
+
+    server = LocalS3Server(args.root, args.access_key, args.secret_key, args.region, args.host, args.port)
+    print(f"S3 替身服务：{server.endpoint}（数据目录 {os.path.abspath(args.root)}）")
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
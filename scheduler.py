@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+生成调度模块
+在 build_presentation 之前按优先级与租户分配生成名额：
+交互式（页面点击）优先于推测生成，推测生成优先于批量任务；同一优先级内按租户已占用的时间公平轮转。
+推测与批量任务在每个检查点（页与页之间）检查是否有更高优先级的任务在等待，
+有则让出名额、排队等待恢复，使交互式生成的延迟不受后台批量任务影响
+
+说明：同一进程内的线程受 GIL 限制不能并行生成，名额数默认为 1；
+多进程的批量任务应降低进程优先级（如 work_queue 工作进程的 nice 值）
+"""
+
+import os
+import time
+import itertools
+import threading
+from contextlib import contextmanager
+
+from governor import checkpoint_hook
+from metrics import QUEUE_DEPTH, SCHEDULER_WAIT_SECONDS, SCHEDULER_YIELDS
+from ppt_generator import build_presentation
+
+
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_SPECULATIVE = 'speculative'
+PRIORITY_BATCH = 'batch'
+
+# 优先级顺序：数值越小越优先
+PRIORITY_RANKS = {
+    PRIORITY_INTERACTIVE: 0,
+    PRIORITY_SPECULATIVE: 1,
+    PRIORITY_BATCH: 2,
+}
+
+# 同时进行的生成数，可由环境变量覆盖
+DEFAULT_SLOTS = 1
+SLOTS_ENV = 'PPT_BUILD_SLOTS'
+
+# 同一优先级内，持有名额超过该时间（秒）且有占用更少的租户在等待时让出
+FAIR_SHARE_QUANTUM = 0.5
+
+
+class _Ticket:
+    """一次名额申请"""
+
+    __slots__ = ('rank', 'priority', 'tenant', 'seq', 'granted', 'since')
+
+    def __init__(self, priority: str, tenant: str, seq: int):
+        self.rank = PRIORITY_RANKS[priority]
+        self.priority = priority
+        self.tenant = tenant
+        self.seq = seq
+        self.granted = False
+        self.since = 0.0
+
+
+class BuildScheduler:
+    """按优先级与租户公平分配生成名额"""
+
+    def __init__(self, slots: int = None, quantum: float = FAIR_SHARE_QUANTUM):
+        """
+        参数:
+            slots: 同时进行的生成数（可选，默认读取环境变量 PPT_BUILD_SLOTS，未设置时为 1）
+            quantum: 同一优先级内公平轮转的时间片（秒）
+        """
+        self.slots = slots or int(os.environ.get(SLOTS_ENV, DEFAULT_SLOTS))
+        self.quantum = quantum
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._running = 0
+        # 已获得名额的申请（提升优先级时需要）
+        self._held = set()
+        # 各租户累计占用名额的时间（秒），同一优先级内占用少者优先
+        self._usage = {}
+        self._seq = itertools.count()
+
+    def _key(self, ticket: _Ticket) -> tuple:
+        return ticket.rank, self._usage.get(ticket.tenant, 0.0), ticket.seq
+
+    def _dispatch(self):
+        """把空闲名额分给等待中最优先的申请（调用时需持有锁）"""
+        granted = False
+        while self._running < self.slots and self._waiting:
+            ticket = min(self._waiting, key=self._key)
+            self._waiting.remove(ticket)
+            ticket.granted = True
+            ticket.since = time.perf_counter()
+            self._held.add(ticket)
+            self._running += 1
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _acquire(self, ticket: _Ticket):
+        start = time.perf_counter()
+        with self._cond:
+            # 新出现的租户从当前最少的占用量开始计，不会因从未占用而长期优先
+            if ticket.tenant not in self._usage:
+                self._usage[ticket.tenant] = min(self._usage.values(), default=0.0)
+            ticket.granted = False
+            self._waiting.append(ticket)
+            QUEUE_DEPTH.set(len(self._waiting), queue='scheduler')
+            self._dispatch()
+            while not ticket.granted:
+                self._cond.wait()
+            QUEUE_DEPTH.set(len(self._waiting), queue='scheduler')
+        SCHEDULER_WAIT_SECONDS.observe(time.perf_counter() - start, priority=ticket.priority)
+
+    def _release(self, ticket: _Ticket):
+        with self._cond:
+            self._usage[ticket.tenant] = self._usage.get(ticket.tenant, 0.0) + time.perf_counter() - ticket.since
+            ticket.granted = False
+            self._held.discard(ticket)
+            self._running -= 1
+            self._dispatch()
+
+    def _should_yield(self, ticket: _Ticket) -> bool:
+        """名额已满且有更高优先级、或同优先级中占用更少且本任务已超出时间片的申请在等待（调用时需持有锁）"""
+        if not self._waiting or self._running < self.slots:
+            return False
+        best = min(self._waiting, key=self._key)
+        if best.rank != ticket.rank:
+            return best.rank < ticket.rank
+        held = time.perf_counter() - ticket.since
+        return (best.tenant != ticket.tenant and held >= self.quantum
+                and self._usage[best.tenant] < self._usage[ticket.tenant] + held)
+
+    def _checkpoint(self, ticket: _Ticket):
+        """检查点回调：需要时让出名额并重新排队（保留原来的先后次序）"""
+        with self._cond:
+            # 已提升为交互式的任务不再让出
+            if ticket.rank == PRIORITY_RANKS[PRIORITY_INTERACTIVE] or not self._should_yield(ticket):
+                return
+        SCHEDULER_YIELDS.inc(priority=ticket.priority)
+        self._release(ticket)
+        self._acquire(ticket)
+
+    @contextmanager
+    def slot(self, priority: str = PRIORITY_INTERACTIVE, tenant: str = 'default'):
+        """
+        占用一个生成名额，with 块内的生成在检查点按需让出
+
+        交互式任务不让出；推测与批量任务在页与页之间让给更高优先级或占用更少的租户。
+
+        参数:
+            priority: 'interactive' / 'speculative' / 'batch'
+            tenant: 租户标识（如会话ID、批量任务名）
+        """
+        if priority not in PRIORITY_RANKS:
+            raise ValueError(f"未知的优先级: {priority}")
+        ticket = _Ticket(priority, tenant, next(self._seq))
+        self._acquire(ticket)
+        try:
+            if ticket.rank == PRIORITY_RANKS[PRIORITY_INTERACTIVE]:
+                yield
+            else:
+                with checkpoint_hook(lambda: self._checkpoint(ticket)):
+                    yield
+        finally:
+            self._release(ticket)
+
+    def promote(self, tenant: str, from_priority: str, to_priority: str = PRIORITY_INTERACTIVE) -> int:
+        """
+        提升某租户等待中与进行中的申请的优先级（如用户点击生成时，同一配置的推测生成即成为前台任务）
+
+        参数:
+            tenant: 租户标识
+            from_priority: 被提升的申请的当前优先级
+            to_priority: 新的优先级
+        返回:
+            被提升的申请数
+        """
+        from_rank = PRIORITY_RANKS[from_priority]
+        with self._cond:
+            tickets = [ticket for ticket in self._waiting + list(self._held)
+                       if ticket.tenant == tenant and ticket.rank == from_rank]
+            for ticket in tickets:
+                ticket.rank = PRIORITY_RANKS[to_priority]
+                ticket.priority = to_priority
+            # 提升后可能排到其他任务之前，由下一个检查点或释放的名额生效
+            self._dispatch()
+        return len(tickets)
+
+    def stats(self) -> dict:
+        """
+        当前状态
+
+        返回:
+            {'slots', 'running', 'waiting': {优先级: 数量}, 'usage': {租户: 秒}}
+        """
+        with self._cond:
+            waiting = {name: 0 for name in PRIORITY_RANKS}
+            for ticket in self._waiting:
+                waiting[ticket.priority] += 1
+            return {'slots': self.slots, 'running': self._running, 'waiting': waiting,
+                    'usage': dict(self._usage)}
+
+
+# 进程内共用的调度器
+SCHEDULER = BuildScheduler()
+
+
+def scheduled_build(config: dict, layouts_config: dict, logo_bytes: bytes = None,
+                    uploaded_images: list = None, budget=None, priority: str = PRIORITY_INTERACTIVE,
+                    tenant: str = 'default', scheduler: BuildScheduler = SCHEDULER, build=None):
+    """
+    经调度器生成PPT
+
+    参数同 build_presentation，另加:
+        priority: 优先级
+        tenant: 租户标识
+        scheduler: 调度器
+        build: 生成函数（可选，默认 build_presentation；可传入 output_cache.cached_build）
+    返回:
+        包含PPT文件的BytesIO对象
+    """
+    build = build or build_presentation
+    with scheduler.slot(priority, tenant):
+        return build(config, layouts_config, logo_bytes, uploaded_images, budget=budget)
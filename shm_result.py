@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+共享内存结果模块
+子进程生成的PPT不经 pickle 回传：写入 multiprocessing.shared_memory 段后只回传段名与长度，
+主进程映射同一段内存，直接从中写入磁盘或HTTP响应。
+/dev/shm 空间不足时（如容器默认的 64MB）改用临时文件的内存映射，避免写满 tmpfs 时进程收到 SIGBUS。
+段在主进程读取完毕后立即删除；主进程在创建进程池前调用 start_tracker()，
+异常退出时尚未读取的段由 multiprocessing 的资源跟踪进程兜底回收
+"""
+
+import os
+import mmap
+import tempfile
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+
+
+SHM_DIR = '/dev/shm'
+# 写入共享内存后 /dev/shm 至少保留的空闲空间，留给同时在途的其他结果
+SHM_HEADROOM = 64 * 1024 * 1024
+# 流式写出时的块大小
+STREAM_CHUNK_BYTES = 1024 * 1024
+
+KIND_SHM = 'shm'
+KIND_FILE = 'file'
+
+
+def _shm_has_room(size: int) -> bool:
+    """/dev/shm 的剩余空间是否足够（无法判断时按足够处理，如 macOS）"""
+    try:
+        stat = os.statvfs(SHM_DIR)
+    except OSError:
+        return True
+    return stat.f_bavail * stat.f_frsize >= size + SHM_HEADROOM
+
+
+def start_tracker():
+    """
+    在主进程中启动资源跟踪进程，需在创建进程池之前调用
+
+    子进程继承同一个跟踪进程，主进程异常退出时尚未读取的共享内存段也会被回收；
+    否则各子进程各自启动跟踪进程，子进程退出时会删除主进程还没读取的段。
+    """
+    resource_tracker.ensure_running()
+
+
+def _tracker_inherited() -> bool:
+    """当前进程是否使用主进程的资源跟踪进程"""
+    return getattr(resource_tracker._resource_tracker, '_fd', None) is not None
+
+
+class SharedResult:
+    """
+    子进程结果的句柄，只含段名与长度，可低成本地 pickle 回主进程
+
+    主进程用 attach() 读取，退出 with 块后删除底层的共享内存段或临时文件；
+    不需要结果时调用 discard()。
+    """
+
+    __slots__ = ('kind', 'name', 'size')
+
+    def __init__(self, kind: str, name: str, size: int):
+        """
+        参数:
+            kind: 'shm'（共享内存段）或 'file'（临时文件）
+            name: 共享内存段名或临时文件路径
+            size: 数据字节数
+        """
+        self.kind = kind
+        self.name = name
+        self.size = size
+
+    def __repr__(self):
+        return f"SharedResult({self.kind}, {self.name!r}, {self.size:,} 字节)"
+
+    @contextmanager
+    def attach(self):
+        """
+        映射结果数据，退出时解除映射并删除
+
+        返回:
+            只读 memoryview（只在 with 块内有效，需要保留时先 bytes() 复制）
+        """
+        if self.kind == KIND_SHM:
+            segment = shared_memory.SharedMemory(self.name)
+            view = segment.buf[:self.size].toreadonly()
+            try:
+                yield view
+            finally:
+                view.release()
+                segment.close()
+                segment.unlink()
+            return
+
+        with open(self.name, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        view = memoryview(mapped)[:self.size] if mapped is not None else memoryview(b'')
+        try:
+            yield view
+        finally:
+            view.release()
+            if mapped is not None:
+                mapped.close()
+            self._remove_file()
+
+    def write_to(self, fp, chunk_bytes: int = STREAM_CHUNK_BYTES) -> int:
+        """
+        将结果分块写入文件或响应流，写完后删除
+
+        参数:
+            fp: 可写的二进制文件对象（如 HTTP 处理器的 wfile）
+            chunk_bytes: 每次写入的字节数
+        返回:
+            写入的字节数
+        """
+        with self.attach() as view:
+            for offset in range(0, self.size, chunk_bytes):
+                fp.write(view[offset:offset + chunk_bytes])
+        return self.size
+
+    def read(self) -> bytes:
+        """
+        复制出结果数据并删除（需要长期持有数据时使用）
+
+        返回:
+            PPT文件字节数据
+        """
+        with self.attach() as view:
+            return bytes(view)
+
+    def discard(self):
+        """不读取直接删除（主进程放弃结果时调用，重复调用无害）"""
+        if self.kind == KIND_SHM:
+            try:
+                segment = shared_memory.SharedMemory(self.name)
+            except FileNotFoundError:
+                return
+            segment.close()
+            segment.unlink()
+        else:
+            self._remove_file()
+
+    def _remove_file(self):
+        try:
+            os.remove(self.name)
+        except FileNotFoundError:
+            pass
+
+
+def share_bytes(data) -> SharedResult:
+    """
+    在子进程中把结果写入共享内存（空间不足时写入临时文件），只复制一次
+
+    参数:
+        data: 字节数据或支持缓冲区协议的对象（如 BytesIO.getbuffer()）
+    返回:
+        SharedResult 句柄
+    """
+    with memoryview(data) as view:
+        size = view.nbytes
+        if _shm_has_room(size):
+            inherited = _tracker_inherited()
+            # 共享内存段不能为 0 字节
+            segment = shared_memory.SharedMemory(create=True, size=max(size, 1))
+            if not inherited:
+                # 跟踪进程属于本子进程，退出时会删除段，改由主进程负责回收
+                resource_tracker.unregister(segment._name, 'shared_memory')
+            try:
+                segment.buf[:size] = view.cast('B')
+            except BaseException:
+                segment.close()
+                segment.unlink()
+                raise
+            segment.close()
+            return SharedResult(KIND_SHM, segment.name, size)
+
+        fd, path = tempfile.mkstemp(prefix='ppt_result_', suffix='.pptx')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(view)
+        except BaseException:
+            os.remove(path)
+            raise
+        return SharedResult(KIND_FILE, path, size)
+
+
+def share_buffer(buffer) -> SharedResult:
+    """
+    把 BytesIO 中的结果写入共享内存（不经过 getvalue() 的额外复制）
+
+    参数:
+        buffer: io.BytesIO 对象（如 build_presentation 的返回值）
+    返回:
+        SharedResult 句柄
+    """
+    with buffer.getbuffer() as view:
+        return share_bytes(view)
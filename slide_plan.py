@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+幻灯片计划模块
+先将版式配置编译为紧凑的幻灯片计划（幻灯片与形状规格列表），再执行计划生成PPT。
+版式通过注册表登记生成函数与形状规格，同一份计划供串行、并行生成与成本估算共用
+"""
+
+from metrics import LAYOUT_SECONDS
+
+
+# 形状类别
+SHAPE_AUTO = 'shape'      # 矩形、圆形等自选图形
+SHAPE_TEXT = 'text'       # 文本框
+SHAPE_PICTURE = 'picture' # 图片，weight 为图片字节数
+SHAPE_CHART = 'chart'     # 图表，weight 为数据点数
+SHAPE_TABLE = 'table'     # 表格，weight 为单元格数
+
+
+class ShapeSpec:
+    """
+    形状规格：同一类别的若干个形状
+
+    weight 的含义随类别而定（图片字节数、图表数据点数、表格单元格数），
+    供成本估算使用。
+    """
+
+    __slots__ = ('kind', 'count', 'weight', 'media')
+
+    def __init__(self, kind: str, count: int = 1, weight: int = 0, media: bytes = None):
+        """
+        参数:
+            kind: 形状类别
+            count: 形状个数
+            weight: 类别相关的规模（可选）
+            media: 图片字节数据（可选，用于估算时对相同图片去重）
+        """
+        self.kind = kind
+        self.count = count
+        self.weight = weight
+        self.media = media
+
+    def __repr__(self):
+        return f"ShapeSpec({self.kind!r}, count={self.count}, weight={self.weight})"
+
+
+class SlideSpec:
+    """
+    幻灯片规格：一次版式生成调用
+
+    paginated 为真时一项规格可能生成多页（如表格续页），pages 为估算页数。
+    """
+
+    __slots__ = ('layout', 'builder', 'kwargs', 'shapes', 'pages', 'paginated')
+
+    def __init__(self, layout: str, builder, kwargs: dict, shapes: list,
+                 pages: int = 1, paginated: bool = False):
+        """
+        参数:
+            layout: 版式键名
+            builder: 生成函数 builder(prs, config, **kwargs)，可续页的版式另接受 governor 参数
+            kwargs: 生成函数的关键字参数
+            shapes: 每页的形状规格列表
+            pages: 生成的页数（paginated 为真时为估算值）
+            paginated: 页数是否在生成前未知
+        """
+        self.layout = layout
+        self.builder = builder
+        self.kwargs = kwargs
+        self.shapes = shapes
+        self.pages = pages
+        self.paginated = paginated
+
+    def __repr__(self):
+        return f"SlideSpec({self.layout!r}, pages={self.pages}, shapes={self.shapes!r})"
+
+
+class LayoutBuilder:
+    """版式注册项"""
+
+    __slots__ = ('key', 'builder', 'default_count', 'enabled_default', 'kwargs', 'shapes', 'paginated')
+
+    def __init__(self, key: str, builder, default_count: int, enabled_default: bool,
+                 kwargs, shapes, paginated: bool):
+        self.key = key
+        self.builder = builder
+        self.default_count = default_count
+        self.enabled_default = enabled_default
+        self.kwargs = kwargs
+        self.shapes = shapes
+        self.paginated = paginated
+
+
+# 版式注册表，登记顺序即幻灯片顺序
+LAYOUT_REGISTRY = {}
+
+
+def register_layout(key: str, builder, default_count: int = 1, enabled_default: bool = True,
+                    kwargs=None, shapes=None, paginated: bool = False):
+    """
+    登记版式
+
+    参数:
+        key: 版式键名（与 layouts_config 的键一致）
+        builder: 生成函数 builder(prs, config, **kwargs)
+        default_count: 配置缺省时的页数
+        enabled_default: 配置缺省时是否启用
+        kwargs: 参数函数 kwargs(i, slide_num, uploaded_images) -> dict，
+                补充页序、图片等与位置相关的参数（可选）
+        shapes: 形状规格函数 shapes(kwargs) -> (每页形状规格列表, 页数)（可选）
+        paginated: 一次调用是否可能生成多页（为真时生成函数需接受 governor 参数）
+    """
+    LAYOUT_REGISTRY[key] = LayoutBuilder(key, builder, default_count, enabled_default,
+                                         kwargs, shapes, paginated)
+
+
+def fixed_shapes(autos: int, texts: int):
+    """
+    生成固定形状数的形状规格函数
+
+    参数:
+        autos: 自选图形个数
+        texts: 文本框个数
+    返回:
+        形状规格函数
+    """
+    specs = [ShapeSpec(SHAPE_AUTO, autos), ShapeSpec(SHAPE_TEXT, texts)]
+    return lambda kwargs: (specs, 1)
+
+
+def compile_plan(layouts_config: dict, uploaded_images: list = None) -> list:
+    """
+    将版式配置编译为幻灯片计划
+
+    每种版式可通过 'slots' 指定数据槽：字典表示所有页共用，列表表示逐页指定。
+
+    参数:
+        layouts_config: 版式配置，指定每种版式的启用状态、数量和数据槽
+        uploaded_images: 上传的图片列表（可选）
+    返回:
+        SlideSpec 列表，顺序即幻灯片顺序
+    """
+    if uploaded_images is None:
+        uploaded_images = []
+
+    plan = []
+    for layout in LAYOUT_REGISTRY.values():
+        layout_config = layouts_config.get(layout.key, {})
+        if not layout_config.get('enabled', layout.enabled_default):
+            continue
+
+        all_slots = layout_config.get('slots')
+        for i in range(layout_config.get('count', layout.default_count)):
+            slots = all_slots
+            if isinstance(all_slots, list):
+                slots = all_slots[i] if i < len(all_slots) else None
+
+            # 页序在计划阶段确定，便于分块生成
+            kwargs = layout.kwargs(i, len(plan) + 1, uploaded_images) if layout.kwargs else {}
+            if slots:
+                kwargs['slots'] = slots
+
+            shapes, pages = layout.shapes(kwargs) if layout.shapes else ([], 1)
+            plan.append(SlideSpec(layout.key, layout.builder, kwargs, shapes, pages, layout.paginated))
+    return plan
+
+
+def execute_plan(prs, config: dict, plan: list, governor=None):
+    """
+    按幻灯片计划依次调用版式生成函数，并按版式记录耗时
+
+    参数:
+        prs: Presentation对象
+        config: 主题配置字典
+        plan: SlideSpec 列表
+        governor: ResourceGovernor对象（可选，每项计划执行后检查资源预算；
+                  可续页的版式另在每页之后检查，一项计划生成大量页时也能及时中止或让出）
+    """
+    for spec in plan:
+        kwargs = spec.kwargs
+        if spec.paginated and governor is not None:
+            kwargs = dict(kwargs, governor=governor)
+        with LAYOUT_SECONDS.time(layout=spec.layout):
+            spec.builder(prs, config, **kwargs)
+        if governor is not None:
+            governor.check(len(prs.slides), 'slides')
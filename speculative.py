@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+推测生成模块
+配置停止变化一段时间后（去抖），在低优先级后台线程中按当前配置提前生成并写入输出缓存；
+配置再次变化时在下一个检查点取消并重新开始。用户点击生成时若推测结果已就绪则直接命中缓存，
+正在生成则等待其完成，避免重复生成。推测结果的使用次数与浪费的CPU时间计入运行指标
+"""
+
+import os
+import json
+import time
+import threading
+
+from governor import BuildCancelled, checkpoint_hook
+from metrics import SPECULATIVE_BUILDS, SPECULATIVE_CPU_SECONDS
+from output_cache import OUTPUT_CACHE, OutputCache, cache_key, cached_build
+from scheduler import PRIORITY_SPECULATIVE, SCHEDULER, BuildScheduler
+
+
+# 配置停止变化多久后开始推测生成（秒）
+DEBOUNCE_SECONDS = 1.5
+# 后台线程的 nice 值增量（仅 Linux 可按线程设置）
+SPECULATIVE_NICE = 10
+# 点击生成后最多等待推测任务多久（秒），超时则取消并改在前台生成
+CLAIM_TIMEOUT_SECONDS = 10.0
+
+# 任务状态
+STATE_WAITING = 'waiting'
+STATE_RUNNING = 'running'
+STATE_READY = 'ready'
+STATE_FINISHED = 'finished'
+
+
+def _lower_thread_priority(increment: int = SPECULATIVE_NICE):
+    """降低当前线程的调度优先级（Linux 上 setpriority 作用于线程ID；其他平台忽略）"""
+    try:
+        tid = threading.get_native_id()
+        os.setpriority(os.PRIO_PROCESS, tid, os.getpriority(os.PRIO_PROCESS, tid) + increment)
+    except (AttributeError, OSError):
+        pass
+
+
+class _SpeculativeJob:
+    """一次推测生成"""
+
+    __slots__ = ('key', 'args', 'budget', 'state', 'cpu_seconds', 'claimed', 'cancelled', 'done')
+
+    def __init__(self, key: str, args: tuple, budget):
+        self.key = key
+        self.args = args
+        self.budget = budget
+        self.state = STATE_WAITING
+        self.cpu_seconds = 0.0
+        self.claimed = False
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+
+
+class SpeculativeBuilder:
+    """
+    单个会话的推测生成器：每次页面重新执行时以当前配置调用 submit()，点击生成时调用 claim()
+
+    同一时刻最多只有一个推测任务，新配置会取消旧任务。
+    """
+
+    def __init__(self, cache: OutputCache = OUTPUT_CACHE, debounce: float = DEBOUNCE_SECONDS,
+                 scheduler: BuildScheduler = SCHEDULER, tenant: str = 'default'):
+        """
+        参数:
+            cache: 推测结果写入的输出缓存（点击生成时经 cached_build 读取）
+            debounce: 去抖时间（秒）
+            scheduler: 生成调度器（推测生成以 speculative 优先级排队，让出给交互式生成）
+            tenant: 租户标识（如会话ID）
+        """
+        self.cache = cache
+        self.debounce = debounce
+        self.scheduler = scheduler
+        self.tenant = tenant
+        self._lock = threading.Lock()
+        self._job = None
+
+    def submit(self, config: dict, layouts_config: dict, logo_bytes: bytes = None,
+               uploaded_images: list = None, budget=None) -> str:
+        """
+        登记当前配置：与进行中的任务相同时不做任何事，否则取消旧任务并在去抖后开始新任务
+
+        参数:
+            config: 主题配置字典
+            layouts_config: 版式配置
+            logo_bytes: Logo图片字节数据（可选）
+            uploaded_images: 上传的图片列表（可选）
+            budget: BuildBudget资源预算（可选）
+        返回:
+            缓存键，配置无法计算缓存键时为 None（不做推测生成）
+        """
+        try:
+            key = cache_key(config, layouts_config, logo_bytes, uploaded_images)
+        except TypeError:
+            self.cancel()
+            return None
+        with self._lock:
+            if self._job is not None and self._job.key == key:
+                return key
+            self._retire(self._job)
+            if key in self.cache:
+                self._job = None
+                return key
+            # 页面上的配置字典会被后续操作原地修改，后台线程使用独立副本
+            args = (json.loads(json.dumps(config)), json.loads(json.dumps(layouts_config)),
+                    logo_bytes, list(uploaded_images or []))
+            job = self._job = _SpeculativeJob(key, args, budget)
+        threading.Thread(target=self._run, args=(job,), name='speculative-build', daemon=True).start()
+        return key
+
+    def claim(self, config: dict, layouts_config: dict, logo_bytes: bytes = None,
+              uploaded_images: list = None, timeout: float = CLAIM_TIMEOUT_SECONDS) -> bool:
+        """
+        点击生成时调用：推测任务与当前配置一致且正在生成时，提升为交互式优先级并等待其完成
+
+        参数:
+            config, layouts_config, logo_bytes, uploaded_images: 同 submit
+            timeout: 最长等待时间（秒，None 表示一直等待），超时后取消推测任务，由调用方在前台生成
+        返回:
+            推测结果是否已写入缓存（之后调用 cached_build 直接命中）
+        """
+        try:
+            key = cache_key(config, layouts_config, logo_bytes, uploaded_images)
+        except TypeError:
+            self.cancel()
+            return False
+        with self._lock:
+            job = self._job
+            if job is None or job.key != key:
+                self._retire(job)
+                self._job = None
+                return False
+            if job.state == STATE_WAITING:
+                # 还在去抖期间，不如直接在前台生成
+                self._retire(job)
+                self._job = None
+                return False
+            job.claimed = True
+        # 用户已在等待这次生成，不再让出给其他会话的交互式生成之外的任务
+        self.scheduler.promote(self.tenant, PRIORITY_SPECULATIVE)
+        if not job.done.wait(timeout):
+            with self._lock:
+                self._retire(job)
+                if self._job is job:
+                    self._job = None
+            return False
+        with self._lock:
+            if job.state != STATE_READY:
+                return False
+            job.state = STATE_FINISHED
+            if self._job is job:
+                self._job = None
+        SPECULATIVE_BUILDS.inc(result='used')
+        SPECULATIVE_CPU_SECONDS.inc(job.cpu_seconds, outcome='used')
+        return True
+
+    def cancel(self):
+        """取消进行中的推测任务（如会话结束）"""
+        with self._lock:
+            self._retire(self._job)
+            self._job = None
+
+    @staticmethod
+    def _retire(job):
+        """
+        放弃任务（调用时需持有锁）：等待或生成中的任务在下一个检查点取消，已就绪的结果记为未使用
+
+        缓存中的结果保留，配置改回原样时仍可命中。
+        """
+        if job is None:
+            return
+        job.cancelled.set()
+        if job.state == STATE_READY:
+            job.state = STATE_FINISHED
+            SPECULATIVE_BUILDS.inc(result='unused')
+            SPECULATIVE_CPU_SECONDS.inc(job.cpu_seconds, outcome='wasted')
+
+    def _check_cancelled(self, job: _SpeculativeJob):
+        if job.cancelled.is_set():
+            raise BuildCancelled()
+
+    def _run(self, job: _SpeculativeJob):
+        """后台线程：去抖等待后生成，生成过程在每个检查点响应取消"""
+        if job.cancelled.wait(self.debounce):
+            job.done.set()
+            return
+        with self._lock:
+            if job.cancelled.is_set():
+                job.done.set()
+                return
+            job.state = STATE_RUNNING
+        _lower_thread_priority()
+
+        result = 'ready'
+        cpu_start = time.thread_time()
+        try:
+            if job.key in self.cache:
+                result = 'cached'
+            else:
+                with checkpoint_hook(lambda: self._check_cancelled(job)), \
+                        self.scheduler.slot(PRIORITY_SPECULATIVE, self.tenant):
+                    if job.claimed:
+                        # 排队等待名额期间已被点击领取
+                        self.scheduler.promote(self.tenant, PRIORITY_SPECULATIVE)
+                    cached_build(*job.args, cache=self.cache, budget=job.budget)
+        except BuildCancelled:
+            result = 'cancelled'
+        except Exception:
+            # 超出预算或生成出错：点击时由前台生成给出提示
+            result = 'failed'
+        job.cpu_seconds = time.thread_time() - cpu_start
+        job.args = None
+
+        with self._lock:
+            if result == 'ready':
+                job.state = STATE_READY
+                if job.cancelled.is_set():
+                    # 生成完成前的最后一刻被放弃
+                    self._retire(job)
+            else:
+                job.state = STATE_FINISHED
+                SPECULATIVE_BUILDS.inc(result=result)
+                if result != 'cached':
+                    SPECULATIVE_CPU_SECONDS.inc(job.cpu_seconds, outcome='wasted')
+        job.done.set()
@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+"""
+文本测量模块
+估算文字在指定字体与字号下的宽度、折行数与高度，用于表格分页、文字溢出检测与自动缩小字号。
+本机装有对应字体时从字体文件读取字形宽度（内存映射，按字体缓存），否则按字符类别估算
+"""
+
+import os
+import re
+import mmap
+import struct
+import unicodedata
+from bisect import bisect_left
+from functools import lru_cache
+
+from metrics import REGISTRY
+
+
+# 行高与字号之比（PowerPoint 单倍行距约为 1.2 倍字号），字体文件缺失时使用
+LINE_SPACING = 1.2
+
+# 拉丁字符的平均宽度（em），按常见无衬线字体估算
+LATIN_WIDTH_EM = 0.55
+NARROW_WIDTH_EM = 0.3
+NARROW_CHARS = set(" .,:;!|'`il1()[]{}")
+
+# 字体文件搜索目录，可通过环境变量 PPT_FONT_DIRS（以路径分隔符分隔）追加
+SYSTEM_FONT_DIRS = [
+    'C:/Windows/Fonts',
+    os.path.expanduser('~/AppData/Local/Microsoft/Windows/Fonts'),
+    '/Library/Fonts',
+    '/System/Library/Fonts',
+    os.path.expanduser('~/Library/Fonts'),
+    '/usr/share/fonts',
+    '/usr/local/share/fonts',
+    os.path.expanduser('~/.fonts'),
+    os.path.expanduser('~/.local/share/fonts'),
+]
+
+# 字体名称到字体文件名：(常规体文件, 粗体文件)；未列出的字体按“去空格的名称.ttf/.ttc”查找
+FONT_FILES = {
+    "Microsoft YaHei": (("msyh.ttc", "msyh.ttf"), ("msyhbd.ttc", "msyhbd.ttf")),
+    "微软雅黑": (("msyh.ttc", "msyh.ttf"), ("msyhbd.ttc", "msyhbd.ttf")),
+    "SimSun": (("simsun.ttc",), ()),
+    "宋体": (("simsun.ttc",), ()),
+    "SimHei": (("simhei.ttf",), ()),
+    "黑体": (("simhei.ttf",), ()),
+    "KaiTi": (("simkai.ttf",), ()),
+    "FangSong": (("simfang.ttf",), ()),
+    "DengXian": (("deng.ttf",), ("dengb.ttf",)),
+    "PingFang SC": (("pingfang.ttc",), ()),
+    "Arial": (("arial.ttf",), ("arialbd.ttf",)),
+    "Calibri": (("calibri.ttf",), ("calibrib.ttf",)),
+    "Times New Roman": (("times.ttf",), ("timesbd.ttf",)),
+}
+
+# 折行单元：连续的非CJK字符（单词）连同其后的空白，或单个字符
+WRAP_TOKEN = re.compile(
+    r'[^\s\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef\u3000-\u303f]+[ \t]*|\s+|.',
+    re.S
+)
+
+
+@lru_cache(maxsize=65536)
+def estimate_char_width_em(ch: str) -> float:
+    """
+    按字符类别估算单个字符的宽度
+
+    参数:
+        ch: 单个字符
+    返回:
+        字符宽度（em，即字号的倍数）
+    """
+    if unicodedata.east_asian_width(ch) in ('W', 'F'):
+        return 1.0
+    if ch in NARROW_CHARS:
+        return NARROW_WIDTH_EM
+    return LATIN_WIDTH_EM
+
+
+class GlyphMetrics:
+    """
+    TrueType/OpenType 字体的字形宽度表
+
+    字体文件以内存映射方式打开，只解析 head/hhea/hmtx/cmap 表头，
+    字符宽度在首次查询时读取并缓存。
+    """
+
+    def __init__(self, path: str, index: int = 0):
+        """
+        参数:
+            path: 字体文件路径（.ttf/.otf/.ttc）
+            index: 字体集合（.ttc）中的字体序号
+        """
+        with open(path, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data = self._data
+
+        offset = 0
+        if data[:4] == b'ttcf':
+            offset = struct.unpack_from('>I', data, 12 + 4 * index)[0]
+        num_tables = struct.unpack_from('>H', data, offset + 4)[0]
+        tables = {}
+        for i in range(num_tables):
+            tag, _, table_offset, _ = struct.unpack_from('>4sIII', data, offset + 12 + 16 * i)
+            tables[tag] = table_offset
+
+        self.units_per_em = struct.unpack_from('>H', data, tables[b'head'] + 18)[0]
+        hhea = tables[b'hhea']
+        ascender, descender, line_gap = struct.unpack_from('>hhh', data, hhea + 4)
+        self.line_spacing = (ascender - descender + line_gap) / self.units_per_em
+        self._num_hmetrics = struct.unpack_from('>H', data, hhea + 34)[0]
+        self._hmtx = tables[b'hmtx']
+        self._lookup = self._load_cmap(tables[b'cmap'])
+        self._cache = {}
+
+    def _load_cmap(self, cmap: int):
+        """
+        选择Unicode字符映射子表，返回字符码到字形序号的查找函数
+
+        参数:
+            cmap: cmap 表的偏移
+        返回:
+            lookup(code) -> 字形序号（0 表示缺字）
+        """
+        data = self._data
+        num_subtables = struct.unpack_from('>H', data, cmap + 2)[0]
+        subtables = {}
+        for i in range(num_subtables):
+            platform, encoding, offset = struct.unpack_from('>HHI', data, cmap + 4 + 8 * i)
+            subtable = cmap + offset
+            subtables.setdefault((struct.unpack_from('>H', data, subtable)[0], platform, encoding), subtable)
+
+        # 优先使用覆盖全部平面的格式12，其次为基本多文种平面的格式4
+        for key in ((12, 3, 10), (12, 0, 4), (12, 0, 6)):
+            if key in subtables:
+                offset = subtables[key]
+                n_groups = struct.unpack_from('>I', data, offset + 12)[0]
+                groups = struct.unpack_from(f'>{3 * n_groups}I', data, offset + 16)
+                starts, ends, glyphs = groups[0::3], groups[1::3], groups[2::3]
+
+                def lookup(code):
+                    i = bisect_left(ends, code)
+                    if i < len(ends) and starts[i] <= code:
+                        return glyphs[i] + code - starts[i]
+                    return 0
+                return lookup
+
+        for key in ((4, 3, 1), (4, 0, 3), (4, 0, 4), (4, 0, 1), (4, 0, 0)):
+            if key in subtables:
+                offset = subtables[key]
+                seg_count = struct.unpack_from('>H', data, offset + 6)[0] // 2
+                ends = struct.unpack_from(f'>{seg_count}H', data, offset + 14)
+                starts_offset = offset + 16 + 2 * seg_count
+                starts = struct.unpack_from(f'>{seg_count}H', data, starts_offset)
+                deltas = struct.unpack_from(f'>{seg_count}H', data, starts_offset + 2 * seg_count)
+                range_offsets_at = starts_offset + 4 * seg_count
+                range_offsets = struct.unpack_from(f'>{seg_count}H', data, range_offsets_at)
+
+                def lookup(code):
+                    i = bisect_left(ends, code)
+                    if i >= seg_count or starts[i] > code:
+                        return 0
+                    if range_offsets[i] == 0:
+                        return (code + deltas[i]) & 0xFFFF
+                    address = range_offsets_at + 2 * i + range_offsets[i] + 2 * (code - starts[i])
+                    glyph = struct.unpack_from('>H', data, address)[0]
+                    return (glyph + deltas[i]) & 0xFFFF if glyph else 0
+                return lookup
+
+        return lambda code: 0
+
+    def advance_em(self, ch: str):
+        """
+        获取字符的前进宽度
+
+        参数:
+            ch: 单个字符
+        返回:
+            字符宽度（em）；字体中没有该字符时返回None
+        """
+        width = self._cache.get(ch, False)
+        if width is False:
+            glyph = self._lookup(ord(ch)) if ch >= ' ' else 0
+            if glyph:
+                index = min(glyph, self._num_hmetrics - 1)
+                advance = struct.unpack_from('>H', self._data, self._hmtx + 4 * index)[0]
+                width = advance / self.units_per_em
+            else:
+                width = None
+            self._cache[ch] = width
+        return width
+
+
+@lru_cache(maxsize=None)
+def _font_file_index() -> dict:
+    """
+    扫描字体目录，建立小写文件名到路径的索引（只扫描一次）
+
+    返回:
+        {小写文件名: 路径}
+    """
+    dirs = [d for d in os.environ.get('PPT_FONT_DIRS', '').split(os.pathsep) if d] + SYSTEM_FONT_DIRS
+    index = {}
+    for font_dir in dirs:
+        if not os.path.isdir(font_dir):
+            continue
+        for root, _, files in os.walk(font_dir):
+            for name in files:
+                if name.lower().endswith(('.ttf', '.ttc', '.otf')):
+                    index.setdefault(name.lower(), os.path.join(root, name))
+    return index
+
+
+@lru_cache(maxsize=64)
+def load_font(font_name: str, bold: bool = False):
+    """
+    按字体名称加载字形宽度表，每种字体只加载一次
+
+    粗体文件缺失时使用常规体。
+
+    参数:
+        font_name: 字体名称
+        bold: 是否粗体
+    返回:
+        GlyphMetrics对象；本机没有该字体时返回None
+    """
+    if not font_name:
+        return None
+    regular, bold_files = FONT_FILES.get(font_name, ((), ()))
+    compact = font_name.replace(' ', '').lower()
+    candidates = list(bold_files if bold else ()) + list(regular) + [f"{compact}.ttf", f"{compact}.ttc", f"{compact}.otf"]
+    if bold:
+        candidates.insert(0, f"{compact}-bold.ttf")
+
+    index = _font_file_index()
+    for filename in candidates:
+        path = index.get(filename.lower())
+        if path:
+            try:
+                return GlyphMetrics(path)
+            except (OSError, KeyError, struct.error):
+                continue
+    return None
+
+
+def char_width_em(ch: str, font_name: str = None, bold: bool = False) -> float:
+    """
+    获取单个字符的宽度：优先取字体文件中的字形宽度，否则按字符类别估算
+
+    参数:
+        ch: 单个字符
+        font_name: 字体名称（可选）
+        bold: 是否粗体
+    返回:
+        字符宽度（em，即字号的倍数）
+    """
+    font = load_font(font_name, bold) if font_name else None
+    if font is not None:
+        width = font.advance_em(ch)
+        if width is not None:
+            return width
+    return estimate_char_width_em(ch)
+
+
+def line_spacing(font_name: str = None, bold: bool = False) -> float:
+    """
+    获取字体的单倍行距与字号之比
+
+    参数:
+        font_name: 字体名称（可选）
+        bold: 是否粗体
+    返回:
+        行距倍数
+    """
+    font = load_font(font_name, bold) if font_name else None
+    return font.line_spacing if font is not None else LINE_SPACING
+
+
+@lru_cache(maxsize=65536)
+def _token_width_em(token: str, font_name: str, bold: bool) -> float:
+    """折行单元的宽度（em），同一单词在同一字体下只计算一次"""
+    return sum(char_width_em(ch, font_name, bold) for ch in token)
+
+
+def text_width(text: str, font_name: str, font_size: float, bold: bool = False) -> float:
+    """
+    计算单行文字宽度
+
+    参数:
+        text: 文本内容（不含换行）
+        font_name: 字体名称
+        font_size: 字体大小（磅）
+        bold: 是否粗体
+    返回:
+        文字宽度（磅）
+    """
+    return sum(_token_width_em(token, font_name, bold) for token in WRAP_TOKEN.findall(text)) * font_size
+
+
+@lru_cache(maxsize=65536)
+def _count_lines(text: str, font_name: str, font_size: float, width: float, bold: bool) -> int:
+    max_width = width * 72
+    lines = 0
+    for paragraph in text.split('\n'):
+        lines += 1
+        line_width = 0.0
+        for token in WRAP_TOKEN.findall(paragraph):
+            token_width = _token_width_em(token, font_name, bold) * font_size
+            # 行尾空白不参与折行判断
+            visible_width = _token_width_em(token.rstrip(), font_name, bold) * font_size
+            if line_width + visible_width <= max_width:
+                line_width += token_width
+                continue
+            if line_width > 0:
+                lines += 1
+                line_width = 0.0
+            if visible_width <= max_width:
+                line_width = token_width
+                continue
+            # 单词长于整行时按字符断开
+            for ch in token:
+                w = char_width_em(ch, font_name, bold) * font_size
+                if line_width + w > max_width and line_width > 0:
+                    lines += 1
+                    line_width = 0.0
+                line_width += w
+    return lines
+
+
+REGISTRY.register_cache('text_tokens', _token_width_em)
+REGISTRY.register_cache('text_lines', _count_lines)
+
+
+def count_lines(text: str, font_name: str, font_size: float, width: float, bold: bool = False) -> int:
+    """
+    计算文字在给定宽度内自动折行后的行数
+
+    拉丁文字按单词折行，中日韩文字按字符折行；结果按文本、字体、字号与宽度缓存。
+
+    参数:
+        text: 文本内容，可含换行
+        font_name: 字体名称
+        font_size: 字体大小（磅）
+        width: 可用宽度（英寸）
+        bold: 是否粗体
+    返回:
+        行数
+    """
+    return _count_lines(str(text), font_name, font_size, width, bold)
+
+
+def text_height(text: str, font_name: str, font_size: float, width: float, bold: bool = False) -> float:
+    """
+    计算文字在给定宽度内的排版高度
+
+    参数:
+        text: 文本内容
+        font_name: 字体名称
+        font_size: 字体大小（磅）
+        width: 可用宽度（英寸）
+        bold: 是否粗体
+    返回:
+        文字高度（英寸）
+    """
+    lines = count_lines(text, font_name, font_size, width, bold)
+    return lines * font_size * line_spacing(font_name, bold) / 72
+
+
+def text_fits(text: str, font_name: str, font_size: float, width: float, height: float,
+              bold: bool = False) -> bool:
+    """
+    判断文字能否放入给定区域
+
+    按行数比较：区域至少容纳一行（单行文字略高于文本框时PowerPoint不会裁切）。
+
+    参数:
+        text: 文本内容
+        font_name: 字体名称
+        font_size: 字体大小（磅）
+        width: 可用宽度（英寸）
+        height: 可用高度（英寸）
+        bold: 是否粗体
+    返回:
+        是否放得下
+    """
+    line_height = font_size * line_spacing(font_name, bold) / 72
+    max_lines = max(1, int(height / line_height + 1e-9))
+    return count_lines(text, font_name, font_size, width, bold) <= max_lines
+
+
+def fit_font_size(text: str, font_name: str, font_size: float, width: float, height: float,
+                  min_size: float, bold: bool = False) -> tuple:
+    """
+    在不超过原字号的整数字号中找出能放入给定区域的最大字号
+
+    参数:
+        text: 文本内容
+        font_name: 字体名称
+        font_size: 原字体大小（磅）
+        width: 可用宽度（英寸）
+        height: 可用高度（英寸）
+        min_size: 最小字号（磅）
+        bold: 是否粗体
+    返回:
+        (字号, 是否放得下)；最小字号仍放不下时返回 (最小字号, False)
+    """
+    if text_fits(text, font_name, font_size, width, height, bold):
+        return font_size, True
+
+    # 能否放下随字号单调变化，二分查找
+    low, high = int(min_size), int(font_size) - 1
+    best = None
+    while low <= high:
+        size = (low + high) // 2
+        if text_fits(text, font_name, size, width, height, bold):
+            best = size
+            low = size + 1
+        else:
+            high = size - 1
+    if best is None:
+        return min_size, False
+    return best, True
@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+"""
+共享目录任务队列模块
+多台机器挂载同一目录即可横向扩展，不需要消息中间件：
+任务以JSON文件放入 pending/，工作进程以原子改名领取到 running/ 并定期更新修改时间作为租约，
+生成结果写在 done/ 中与任务文件并列，出错的任务移入 failed/；
+租约过期（领取的进程崩溃或所在机器掉线）的任务由任一工作进程放回 pending/ 重试
+
+目录结构:
+    pending/<任务ID>.json              待领取
+    running/<任务ID>.json              已领取，修改时间即租约心跳
+    done/<任务ID>.json / .pptx / .result.json
+    failed/<任务ID>.json / .error.json
+    tmp/                               写入中的临时文件（同一文件系统内改名保证原子性）
+
+注意：租约按文件修改时间判断，各节点时钟需同步（如 NTP），租约时长应远大于时钟偏差
+"""
+
+import os
+import json
+import time
+import uuid
+import random
+import socket
+import argparse
+import threading
+import multiprocessing
+
+from governor import BudgetExceeded, BuildBudget
+from image_check import inspect_image
+from metrics import QUEUE_DEPTH
+from ppt_generator import build_presentation
+
+
+QUEUE_DIRS = ('pending', 'running', 'done', 'failed', 'tmp')
+
+# 默认租约时长（秒）：心跳间隔为其三分之一
+DEFAULT_LEASE_SECONDS = 60.0
+# 一个任务最多领取次数，超过后视为会导致进程崩溃的任务移入 failed/
+DEFAULT_MAX_ATTEMPTS = 3
+# 领取时只在最早的若干个任务中随机挑选，减少多个进程争抢同一个文件
+CLAIM_WINDOW = 16
+
+
+def new_job_id() -> str:
+    """按提交时间排序的任务ID"""
+    return f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+
+
+def default_worker_id() -> str:
+    """工作进程标识：主机名与进程号"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """共享目录中的任务队列，所有状态都在文件系统中，可被多台机器上的多个进程同时使用"""
+
+    __slots__ = ('root',)
+
+    def __init__(self, root: str):
+        """
+        参数:
+            root: 队列根目录（不存在时创建）
+        """
+        self.root = root
+        for name in QUEUE_DIRS:
+            os.makedirs(os.path.join(root, name), exist_ok=True)
+
+    def _path(self, state: str, job_id: str, suffix: str = '.json') -> str:
+        return os.path.join(self.root, state, job_id + suffix)
+
+    def _write_atomic(self, path: str, data: bytes):
+        """先写入 tmp/ 再改名，其他进程只会看到完整的文件"""
+        tmp_path = os.path.join(self.root, 'tmp', f"{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _dump(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+
+    def submit(self, job: dict, job_id: str = None) -> str:
+        """
+        提交任务
+
+        参数:
+            job: 任务字典：config、layouts，可选 logo、images（相对队列根目录或绝对路径）与 budget
+            job_id: 任务ID（可选，默认按提交时间生成）
+        返回:
+            任务ID
+        """
+        job_id = job_id or new_job_id()
+        self._write_atomic(self._path('pending', job_id), self._dump(dict(job, attempts=0)))
+        return job_id
+
+    def list(self, state: str) -> list:
+        """
+        某状态下的任务ID（按提交顺序）
+
+        参数:
+            state: 'pending' / 'running' / 'done' / 'failed'
+        返回:
+            任务ID列表
+        """
+        suffix = '.json'
+        return sorted(entry.name[:-len(suffix)] for entry in os.scandir(os.path.join(self.root, state))
+                      if entry.name.endswith(suffix) and not entry.name.endswith(('.result.json', '.error.json')))
+
+    def counts(self) -> dict:
+        """
+        各状态的任务数
+
+        返回:
+            {状态: 任务数}
+        """
+        return {state: len(self.list(state)) for state in ('pending', 'running', 'done', 'failed')}
+
+    def claim(self) -> tuple:
+        """
+        领取一个任务：把任务文件从 pending/ 改名到 running/，改名成功的进程即获得该任务
+
+        返回:
+            (任务ID, 任务字典)，没有可领取的任务时为 (None, None)
+        """
+        pending = self.list('pending')
+        QUEUE_DEPTH.set(len(pending), queue='work_queue')
+        candidates = pending[:CLAIM_WINDOW]
+        random.shuffle(candidates)
+        for job_id in candidates:
+            pending_path = self._path('pending', job_id)
+            running = self._path('running', job_id)
+            try:
+                # 改名保留原修改时间，先更新作为租约起点，
+                # 否则改名后到更新之前其他进程的 requeue_expired 会把它当作过期任务回收
+                os.utime(pending_path)
+                os.rename(pending_path, running)
+            except FileNotFoundError:
+                # 已被其他进程领取
+                continue
+            try:
+                with open(running, encoding='utf-8') as f:
+                    return job_id, json.load(f)
+            except FileNotFoundError:
+                # 领取后立即被回收（如时钟跳变），视为未领取到
+                continue
+        return None, None
+
+    def heartbeat(self, job_id: str) -> bool:
+        """
+        续租
+
+        参数:
+            job_id: 任务ID
+        返回:
+            是否仍持有租约（任务已因租约过期被放回时为 False）
+        """
+        try:
+            os.utime(self._path('running', job_id))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def complete(self, job_id: str, data: bytes, result: dict):
+        """
+        写入生成结果并将任务移入 done/
+
+        租约过期后被其他进程重复执行的任务会写入相同的结果，改名覆盖不会留下不完整的文件。
+
+        参数:
+            job_id: 任务ID
+            data: PPT文件字节数据
+            result: 结果信息（耗时、工作进程等）
+        """
+        self._write_atomic(self._path('done', job_id, '.pptx'), data)
+        self._write_atomic(self._path('done', job_id, '.result.json'), self._dump(result))
+        self._finish(job_id, 'done')
+
+    def fail(self, job_id: str, error: dict):
+        """
+        记录错误并将任务移入 failed/
+
+        参数:
+            job_id: 任务ID
+            error: 错误信息字典
+        """
+        self._write_atomic(self._path('failed', job_id, '.error.json'), self._dump(error))
+        self._finish(job_id, 'failed')
+
+    def _finish(self, job_id: str, state: str):
+        try:
+            os.replace(self._path('running', job_id), self._path(state, job_id))
+        except FileNotFoundError:
+            # 租约已过期并被放回队列：结果已写入，撤回重复的待领取任务
+            try:
+                os.replace(self._path('pending', job_id), self._path(state, job_id))
+            except FileNotFoundError:
+                pass
+
+    def requeue_expired(self, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                        max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> int:
+        """
+        将租约过期的任务放回 pending/，领取次数达到上限的移入 failed/
+
+        参数:
+            lease_seconds: 租约时长
+            max_attempts: 最多领取次数
+        返回:
+            放回或移出的任务数
+        """
+        now = time.time()
+        requeued = 0
+        for job_id in self.list('running'):
+            running = self._path('running', job_id)
+            try:
+                if now - os.stat(running).st_mtime < lease_seconds:
+                    continue
+                # 先改名到私有的临时文件，多个进程同时回收时只有一个成功
+                reaping = os.path.join(self.root, 'tmp', f"{job_id}.{uuid.uuid4().hex}.reap")
+                os.rename(running, reaping)
+            except FileNotFoundError:
+                continue
+            with open(reaping, encoding='utf-8') as f:
+                job = json.load(f)
+            job['attempts'] = job.get('attempts', 0) + 1
+            if job['attempts'] >= max_attempts:
+                self._write_atomic(self._path('failed', job_id, '.error.json'), self._dump({
+                    'error': 'lease_expired',
+                    'message': f"租约连续过期 {job['attempts']} 次，任务可能导致工作进程崩溃",
+                }))
+                self._write_atomic(self._path('failed', job_id), self._dump(job))
+            else:
+                self._write_atomic(self._path('pending', job_id), self._dump(job))
+            os.remove(reaping)
+            requeued += 1
+        return requeued
+
+
+def _read_file(queue: WorkQueue, path: str) -> bytes:
+    with open(os.path.join(queue.root, path), 'rb') as f:
+        return f.read()
+
+
+def run_job(queue: WorkQueue, job: dict) -> bytes:
+    """
+    按任务生成PPT
+
+    参数:
+        queue: 任务队列（相对路径以队列根目录为基准）
+        job: 任务字典
+    返回:
+        PPT文件字节数据
+    """
+    config = job['config']
+    layouts = job.get('layouts', config.get('layouts', {}))
+    logo_bytes = _read_file(queue, job['logo']) if job.get('logo') else None
+    images = []
+    for path in job.get('images', []):
+        data = _read_file(queue, path)
+        images.append({'name': os.path.basename(path), 'bytes': data, 'info': inspect_image(data, path)})
+    budget = BuildBudget.from_limits(job['budget']) if job.get('budget') else None
+    return build_presentation(config, layouts, logo_bytes, images, budget).getvalue()
+
+
+class _Heartbeat(threading.Thread):
+    """生成期间定期续租的后台线程"""
+
+    def __init__(self, queue: WorkQueue, job_id: str, interval: float):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.job_id = job_id
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            if not self.queue.heartbeat(self.job_id):
+                break
+
+
+def run_worker(root: str, worker_id: str = None, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+               poll_seconds: float = 1.0, max_jobs: int = None, exit_when_empty: bool = False,
+               max_attempts: int = DEFAULT_MAX_ATTEMPTS, nice: int = 0) -> int:
+    """
+    工作进程主循环：回收过期租约、领取任务、生成并写回结果
+
+    参数:
+        root: 队列根目录
+        worker_id: 工作进程标识（可选）
+        lease_seconds: 租约时长
+        poll_seconds: 队列为空时的轮询间隔
+        max_jobs: 处理任务数上限（可选）
+        exit_when_empty: 队列中没有待领取与执行中的任务时退出
+        max_attempts: 最多领取次数
+        nice: 进程 nice 值增量（与页面服务共用机器时降低批量任务的调度优先级；不支持的平台如 Windows 上忽略）
+    返回:
+        本进程处理的任务数
+    """
+    if nice and hasattr(os, 'nice'):
+        os.nice(nice)
+    queue = WorkQueue(root)
+    worker_id = worker_id or default_worker_id()
+    processed = 0
+    while max_jobs is None or processed < max_jobs:
+        queue.requeue_expired(lease_seconds, max_attempts)
+        job_id, job = queue.claim()
+        if job_id is None:
+            if exit_when_empty and not queue.list('running'):
+                break
+            time.sleep(poll_seconds * random.uniform(0.5, 1.5))
+            continue
+
+        heartbeat = _Heartbeat(queue, job_id, lease_seconds / 3)
+        heartbeat.start()
+        start = time.perf_counter()
+        try:
+            data = run_job(queue, job)
+        except BudgetExceeded as e:
+            queue.fail(job_id, dict(e.as_dict(), worker=worker_id))
+        except Exception as e:
+            queue.fail(job_id, {'error': type(e).__name__, 'message': str(e), 'worker': worker_id})
+        else:
+            queue.complete(job_id, data, {
+                'worker': worker_id,
+                'seconds': time.perf_counter() - start,
+                'output_bytes': len(data),
+                'attempts': job.get('attempts', 0) + 1,
+                'finished': time.time(),
+            })
+        finally:
+            heartbeat.stopped.set()
+            heartbeat.join()
+        processed += 1
+    return processed
+
+
+def run_workers(root: str, processes: int, **kwargs) -> int:
+    """
+    在本机启动多个工作进程并等待全部退出
+
+    参数:
+        root: 队列根目录
+        processes: 进程数
+        **kwargs: 传给 run_worker 的参数
+    返回:
+        退出码非零的进程数
+    """
+    workers = [multiprocessing.Process(target=run_worker, args=(root,), kwargs=kwargs)
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(1 for worker in workers if worker.exitcode)
+
+
+def main():
+    """命令行入口：submit / worker / status"""
+    parser = argparse.ArgumentParser(description="共享目录任务队列：多台机器挂载同一目录即可并行生成PPT")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    submit = subparsers.add_parser('submit', help="提交任务")
+    submit.add_argument('queue', help="队列根目录")
+    submit.add_argument('config', help="导出的配置JSON")
+    submit.add_argument('-n', '--count', type=int, default=1, help="提交份数")
+    submit.add_argument('--logo', help="Logo 图片路径（各节点都能访问）")
+    submit.add_argument('--images', nargs='*', default=[], help="图文页图片路径（各节点都能访问）")
+
+    worker = subparsers.add_parser('worker', help="启动工作进程")
+    worker.add_argument('queue', help="队列根目录")
+    worker.add_argument('-p', '--processes', type=int, default=os.cpu_count() or 1, help="本机进程数")
+    worker.add_argument('--lease', type=float, default=DEFAULT_LEASE_SECONDS, help="租约时长（秒）")
+    worker.add_argument('--exit-when-empty', action='store_true', help="队列处理完后退出")
+    worker.add_argument('--nice', type=int, default=10, help="工作进程的 nice 值增量（0 表示不调整）")
+
+    status = subparsers.add_parser('status', help="查看各状态任务数")
+    status.add_argument('queue', help="队列根目录")
+    args = parser.parse_args()
+
+    if args.command == 'submit':
+        with open(args.config, encoding='utf-8') as f:
+            config = json.load(f)
+        queue = WorkQueue(args.queue)
+        job = {'config': config, 'layouts': config.get('layouts', {}), 'images': args.images}
+        if args.logo:
+            job['logo'] = args.logo
+        for _ in range(args.count):
+            queue.submit(job)
+        print(f"已提交 {args.count} 个任务")
+    elif args.command == 'worker':
+        failed = run_workers(args.queue, args.processes, lease_seconds=args.lease,
+                             exit_when_empty=args.exit_when_empty, nice=args.nice)
+        raise SystemExit(1 if failed else 0)
+    else:
+        counts = WorkQueue(args.queue).counts()
+        print('，'.join(f"{state} {count}" for state, count in counts.items()))
+
+
+if __name__ == '__main__':
+    main()